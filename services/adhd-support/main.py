@@ -8,13 +8,18 @@ from datetime import datetime, timedelta, date
 from pydantic import BaseModel, Field
 import uuid
 import asyncio
+import logging
 import sys
 import os
 
 # Add shared modules to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from interfaces.core_types import Task, TaskType, TaskStatus
+from shared.utils.timer_wheel import SqliteTimerStore, Timer, TimerWheel
+
+logger = logging.getLogger(__name__)
 
 # Mock Firestore for development
 class MockFirestore:
@@ -71,6 +76,19 @@ app.add_middleware(
 # Mock database
 db = MockFirestore()
 
+# One timer wheel drives every Pomodoro phase end and time perception reminder
+# (persisted to ADHD_TIMER_DB when set so timers survive a restart)
+_timer_db = os.environ.get("ADHD_TIMER_DB")
+timer_wheel = TimerWheel(store=SqliteTimerStore(_timer_db) if _timer_db else None)
+
+@app.on_event("startup")
+async def start_timer_wheel():
+    await timer_wheel.start()
+
+@app.on_event("shutdown")
+async def stop_timer_wheel():
+    await timer_wheel.stop()
+
 # Mock JWT verification
 async def verify_jwt_token() -> dict:
     return {"uid": "test_user_123", "email": "test@example.com"}
@@ -104,9 +122,15 @@ class PomodoroTimer:
         
         # Save to database
         db.collection("pomodoro_cycles").document(cycle_id).set(cycle_data)
+        self._schedule_phase_end(cycle_id, self.work_duration)
         
         return cycle_data
     
+    def _schedule_phase_end(self, cycle_id: str, delay: float):
+        """Schedule (or replace) the automatic end of the current phase"""
+        timer_wheel.schedule(f"pomodoro:{cycle_id}", "adhd.pomodoro_phase_end", delay=delay,
+                             payload={"cycle_id": cycle_id, "user_id": self.user_id})
+    
     async def complete_phase(self, cycle_id: str) -> Dict:
         """Complete current phase and transition to next"""
         doc = db.collection("pomodoro_cycles").document(cycle_id).get()
@@ -131,6 +155,8 @@ class PomodoroTimer:
         
         cycle_data["start_time"] = datetime.utcnow()
         db.collection("pomodoro_cycles").document(cycle_id).update(cycle_data)
+        if cycle_data["is_active"]:
+            self._schedule_phase_end(cycle_id, cycle_data["phase_duration"])
         
         # Send LINE notification for phase transition
         notification_service = LINENotificationService()
@@ -160,6 +186,7 @@ class PomodoroTimer:
         cycle_data["paused_at"] = datetime.utcnow()
         
         db.collection("pomodoro_cycles").document(cycle_id).update(cycle_data)
+        timer_wheel.cancel(f"pomodoro:{cycle_id}")
         return cycle_data
     
     async def resume_cycle(self, cycle_id: str) -> Dict:
@@ -169,10 +196,16 @@ class PomodoroTimer:
             raise HTTPException(status_code=404, detail="Cycle not found")
         
         cycle_data = doc.to_dict()
+        if cycle_data["paused_at"] is not None:
+            # Shift the phase start so the paused time does not count
+            elapsed = cycle_data["paused_at"] - cycle_data["start_time"]
+            cycle_data["start_time"] = datetime.utcnow() - elapsed
         cycle_data["is_active"] = True
         cycle_data["paused_at"] = None
         
         db.collection("pomodoro_cycles").document(cycle_id).update(cycle_data)
+        remaining = cycle_data["phase_duration"] - (datetime.utcnow() - cycle_data["start_time"]).total_seconds()
+        self._schedule_phase_end(cycle_id, max(0.0, remaining))
         return cycle_data
 
 # Hyperfocus Detection System
@@ -756,9 +789,16 @@ class TimePerceptionSupport:
         # デフォルト
         db.collection("time_perception_reminders").document(reminder_id).set(reminder_data)
         self.active_reminders[reminder_id] = reminder_data
+        self._schedule_reminder(reminder_id)
         
         return reminder_data
     
+    def _schedule_reminder(self, reminder_id: str):
+        """Schedule (or replace) the next reminder on the shared timer wheel"""
+        timer_wheel.schedule(f"time_perception:{reminder_id}", "adhd.time_perception_reminder",
+                             delay=self.reminder_interval,
+                             payload={"reminder_id": reminder_id, "user_id": self.user_id})
+    
     async def check_reminder_due(self, reminder_id: str) -> bool:
         """リスト"""
         if reminder_id not in self.active_reminders:
@@ -800,6 +840,8 @@ class TimePerceptionSupport:
         
         # デフォルト
         db.collection("time_perception_reminders").document(reminder_id).update(reminder)
+        if reminder["is_active"]:
+            self._schedule_reminder(reminder_id)
         
         # ?
         message = await self._generate_time_perception_message(reminder)
@@ -858,6 +900,7 @@ class TimePerceptionSupport:
         reminder["paused_at"] = datetime.utcnow()
         
         db.collection("time_perception_reminders").document(reminder_id).update(reminder)
+        timer_wheel.cancel(f"time_perception:{reminder_id}")
         
         return {
             "paused": True,
@@ -875,6 +918,7 @@ class TimePerceptionSupport:
         reminder["next_reminder"] = datetime.utcnow() + timedelta(seconds=self.reminder_interval)
         
         db.collection("time_perception_reminders").document(reminder_id).update(reminder)
+        self._schedule_reminder(reminder_id)
         
         return {
             "resumed": True,
@@ -895,6 +939,7 @@ class TimePerceptionSupport:
         
         db.collection("time_perception_reminders").document(reminder_id).update(reminder)
         del self.active_reminders[reminder_id]
+        timer_wheel.cancel(f"time_perception:{reminder_id}")
         
         return {
             "stopped": True,
@@ -1296,6 +1341,30 @@ class ADHDSupportService:
             "adaptation_reason": "behavior_analysis"
         }
 
+# Timer wheel handlers
+async def complete_due_pomodoro_phases(timers: List[Timer]):
+    """Move every Pomodoro cycle whose phase ran out to its next phase"""
+    for timer in timers:
+        try:
+            doc = db.collection("pomodoro_cycles").document(timer.payload["cycle_id"]).get()
+            if doc.exists() and doc.to_dict()["is_active"]:
+                await PomodoroTimer(timer.payload["user_id"]).complete_phase(timer.payload["cycle_id"])
+        except Exception as e:
+            logger.error(f"Auto-complete pomodoro phase failed for {timer.timer_id}: {str(e)}")
+
+async def send_due_time_perception_reminders(timers: List[Timer]):
+    """Send every time perception reminder that has come due"""
+    for timer in timers:
+        try:
+            time_support = TimePerceptionSupport(timer.payload["user_id"])
+            if await time_support.check_reminder_due(timer.payload["reminder_id"]):
+                await time_support.trigger_reminder(timer.payload["reminder_id"])
+        except Exception as e:
+            logger.error(f"Time perception reminder failed for {timer.timer_id}: {str(e)}")
+
+timer_wheel.register_handler("adhd.pomodoro_phase_end", complete_due_pomodoro_phases)
+timer_wheel.register_handler("adhd.time_perception_reminder", send_due_time_perception_reminders)
+
 # API Endpoints
 @app.post("/pomodoro/start")
 async def start_pomodoro(current_user: dict = Depends(verify_jwt_token)):
@@ -4,6 +4,7 @@ Tests Pomodoro timer, hyperfocus detection, daily buffer, and UI constraints
 """
 
 import pytest
+import pytest_asyncio
 import asyncio
 from datetime import datetime, timedelta
 from unittest.mock import Mock, patch, AsyncMock
@@ -15,6 +16,14 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
 
 from interfaces.core_types import Task, TaskType, TaskStatus
 
+
+@pytest_asyncio.fixture(autouse=True)
+async def stop_timer_wheel():
+    """Stop the module-level timer wheel driver before the test event loop closes"""
+    yield
+    from main import timer_wheel
+    await timer_wheel.stop()
+
 class TestPomodoroTimer:
     """Test Pomodoro timer functionality with 25-5-25-5 cycle"""
     
@@ -54,6 +63,23 @@ class TestPomodoroTimer:
         assert next_phase["current_phase"] == "work"
         assert next_phase["cycle_count"] == 2
 
+    @pytest.mark.asyncio
+    async def test_due_phase_batch_survives_a_failing_timer(self):
+        """A broken timer in a due batch does not stop the rest of the batch"""
+        from main import PomodoroTimer, Timer, complete_due_pomodoro_phases, db
+        
+        cycle = await PomodoroTimer("test_user_123").start_cycle()
+        timers = [
+            Timer("pomodoro:broken", "adhd.pomodoro_phase_end", 0.0, {"user_id": "test_user_123"}),
+            Timer(f"pomodoro:{cycle['cycle_id']}", "adhd.pomodoro_phase_end", 0.0,
+                  {"user_id": "test_user_123", "cycle_id": cycle["cycle_id"]}),
+        ]
+        
+        await complete_due_pomodoro_phases(timers)
+        
+        doc = db.collection("pomodoro_cycles").document(cycle["cycle_id"]).get()
+        assert doc.to_dict()["current_phase"] == "short_break"
+
 class TestHyperfocusDetection:
     """Test hyperfocus detection system for 60-minute continuous work alerts"""
     
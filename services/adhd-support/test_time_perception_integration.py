@@ -8,6 +8,7 @@ ADHD支援 - ?
 """
 
 import pytest
+import pytest_asyncio
 import asyncio
 import sys
 import os
@@ -17,7 +18,14 @@ from unittest.mock import AsyncMock, patch
 # Add the parent directory to the path to import the main module
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from main import TimePerceptionSupport, DailyBufferManager, LINENotificationService
+from main import TimePerceptionSupport, DailyBufferManager, LINENotificationService, timer_wheel
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def stop_timer_wheel():
+    """テストのイベントループが閉じる前にモジュールのタイマーホイールを止める"""
+    yield
+    await timer_wheel.stop()
 
 class TestTimePerceptionSupport:
     """?"""
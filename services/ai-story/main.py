@@ -3,7 +3,8 @@
 
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Optional, Any, Union
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any, Union
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field, validator
 from enum import Enum
@@ -14,7 +15,9 @@ import sys
 import os
 import time
 import hashlib
+import random
 import re
+from collections import OrderedDict, deque
 
 # Optional httpx import for external API calls
 try:
@@ -24,6 +27,13 @@ except ImportError:
     HTTPX_AVAILABLE = False
     print("Warning: httpx not available, external API calls will be mocked")
 
+# Optional h2 import for HTTP/2 connection multiplexing
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # Add shared modules to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
 
@@ -32,6 +42,12 @@ from interfaces.core_types import (
     UnlockCondition, UnlockConditionType, UserStoryState
 )
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from shared.utils.safety_matcher import (
+    STORY_HARMFUL_PATTERNS, STORY_THERAPEUTIC_KEYWORDS, get_safety_matcher
+)
+
 app = FastAPI(title="AI Story Generation Engine", version="1.0.0")
 
 app.add_middleware(
@@ -83,13 +99,299 @@ class TherapeuticPromptTemplate(BaseModel):
     companion_integration: Dict[str, str] = {}
 
 # DeepSeek R1 Integration
+class UpstreamRetryableError(Exception):
+    """Transient DeepSeek R1 failure (transport error, 429 or 5xx) worth retrying"""
+
 class DeepSeekR1Client:
-    def __init__(self, api_key: str = None, base_url: str = "https://api.deepseek.com/v1"):
+    """DeepSeek R1 client backed by one long-lived, pooled HTTP connection pool.
+    
+    The pool is created lazily, reused across requests (HTTP/2 when the h2
+    package is installed, HTTP/1.1 keep-alive otherwise) and closed on service
+    shutdown. Each generation gets a latency budget, measured to the first
+    token for streams: transient failures are retried with full-jitter backoff
+    only while the budget allows, and with hedging enabled a second request is
+    raced against the first once it has waited longer than the observed p95
+    time to first token. The budget only drives those decisions; the HTTP read
+    timeout stays at self.timeout so a slow but healthy completion is not cut off.
+    """
+    
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = "https://api.deepseek.com/v1",
+        max_connections: int = None,
+        max_retries: int = 2,
+        latency_budget_seconds: float = None,
+        hedge_requests: bool = None,
+        retry_backoff_seconds: float = 0.2
+    ):
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY", "mock_key_for_testing")
         self.base_url = base_url
         self.model = "deepseek-r1"
         self.timeout = 30.0
+        self.connect_timeout = 5.0
+        self.mock_stream_chunk_chars = 16
+        self.max_connections = max_connections or int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "20"))
+        self.max_retries = max_retries
+        self.latency_budget_seconds = latency_budget_seconds or float(
+            os.getenv("DEEPSEEK_LATENCY_BUDGET_SECONDS", "3.0")
+        )
+        self.hedge_requests = (
+            hedge_requests if hedge_requests is not None
+            else os.getenv("DEEPSEEK_HEDGE_REQUESTS", "false").lower() == "true"
+        )
+        self.hedge_min_samples = 20
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.recent_timings: deque = deque(maxlen=200)
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0}
+        self._client = None
+        self._client_loop = None
+    
+    def _get_client(self):
+        """Return the shared pooled client, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            # Pooled connections are bound to the loop that opened them
+            self._client = None
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+            self._client_loop = loop
+        return self._client
+    
+    async def aclose(self):
+        """Close the connection pool (called from the service shutdown hook)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+    
+    def _latency_percentile(self, percentile: float, key: str = "total_ms") -> Optional[float]:
+        values = sorted(t.get(key, t["total_ms"]) for t in self.recent_timings)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(len(values) * percentile))]
+    
+    def _hedge_delay_seconds(self) -> Optional[float]:
+        """Observed p95 time to first token, once enough requests have been timed"""
+        if not self.hedge_requests or len(self.recent_timings) < self.hedge_min_samples:
+            return None
+        return self._latency_percentile(0.95, "first_token_ms") / 1000
+    
+    def _build_payload(self, prompt: str, system_message: str, temperature: float,
+                       max_tokens: int, stream: bool) -> Dict[str, Any]:
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        messages.append({"role": "user", "content": prompt})
         
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream
+        }
+    
+    def _trace_marks(self) -> tuple:
+        """httpx trace hook recording connect and response-header times"""
+        marks: Dict[str, float] = {}
+        
+        async def trace(event_name: str, info: Dict[str, Any]):
+            now = time.perf_counter()
+            if event_name == "connection.connect_tcp.started":
+                marks["connect_started"] = now
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                marks["connect_complete"] = now
+            elif event_name.endswith("receive_response_headers.complete"):
+                marks["first_byte"] = now
+        
+        return marks, trace
+    
+    @staticmethod
+    def _timing_from_marks(marks: Dict[str, float], start: float, end: float) -> Dict[str, Any]:
+        return {
+            "connect_ms": (marks["connect_complete"] - marks["connect_started"]) * 1000
+            if "connect_complete" in marks and "connect_started" in marks else 0.0,
+            "ttfb_ms": (marks.get("first_byte", end) - start) * 1000,
+            "first_token_ms": (end - start) * 1000,
+            "total_ms": (end - start) * 1000,
+            "connection_reused": "connect_started" not in marks
+        }
+    
+    async def _attempt(self, payload: Dict[str, Any]) -> tuple:
+        """One POST to chat/completions, returning (response json, timing)"""
+        marks, trace = self._trace_marks()
+        self.stats["attempts"] += 1
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().post(
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json=payload,
+                extensions={"trace": trace}
+            )
+        except httpx.TransportError as e:
+            raise UpstreamRetryableError(f"{type(e).__name__}: {e}") from e
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            raise UpstreamRetryableError(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        result = response.json()
+        # The whole completion arrives at once, so first token == total
+        return result, self._timing_from_marks(marks, start, time.perf_counter())
+    
+    async def _stream_attempt(self, payload: Dict[str, Any]) -> tuple:
+        """One streaming POST, returned once the first content delta has arrived.
+        
+        Returns ((response, deltas, first_delta), timing). The caller owns the
+        open response and must close it with _close_stream.
+        """
+        marks, trace = self._trace_marks()
+        self.stats["attempts"] += 1
+        start = time.perf_counter()
+        client = self._get_client()
+        request = client.build_request(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream"
+            },
+            json=payload,
+            extensions={"trace": trace}
+        )
+        try:
+            response = await client.send(request, stream=True)
+        except httpx.TransportError as e:
+            raise UpstreamRetryableError(f"{type(e).__name__}: {e}") from e
+        
+        deltas = self._iter_stream_deltas(response)
+        try:
+            if response.status_code == 429 or response.status_code >= 500:
+                raise UpstreamRetryableError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            first_delta = await deltas.__anext__()
+        except StopAsyncIteration:
+            first_delta = None
+        except httpx.TransportError as e:
+            await self._close_stream((response, deltas, None))
+            raise UpstreamRetryableError(f"{type(e).__name__}: {e}") from e
+        except BaseException:
+            # Includes cancellation of a losing hedge
+            await self._close_stream((response, deltas, None))
+            raise
+        return (response, deltas, first_delta), self._timing_from_marks(marks, start, time.perf_counter())
+    
+    @staticmethod
+    async def _close_stream(stream: tuple) -> None:
+        response, deltas, _ = stream
+        await deltas.aclose()
+        await response.aclose()
+    
+    @staticmethod
+    async def _iter_stream_deltas(response) -> AsyncIterator[str]:
+        async for line in response.aiter_lines():
+            # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]".
+            # [DONE] is the last event; reading on to the end of the body lets
+            # the connection go back to the pool instead of being closed.
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                continue
+            
+            chunk = json.loads(data)
+            choices = chunk.get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+    
+    async def _hedged_attempt(self, attempt: Callable[[], Awaitable[tuple]], deadline: float,
+                              discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> tuple:
+        """Run one attempt, racing a second one against it past the observed p95.
+        
+        discard releases the result of an attempt that succeeded but lost the race.
+        """
+        hedge_delay = self._hedge_delay_seconds()
+        if hedge_delay is None or time.perf_counter() + hedge_delay >= deadline:
+            result, timing = await attempt()
+            return result, timing, False
+        
+        primary = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            result, timing = primary.result()
+            return result, timing, False
+        
+        self.stats["hedged"] += 1
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        winner = None
+        error = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result()[0])
+        finally:
+            for task in pending:
+                task.cancel()
+            for outcome in await asyncio.gather(*pending, return_exceptions=True):
+                if discard is not None and not isinstance(outcome, BaseException):
+                    await discard(outcome[0])
+        
+        if winner is None:
+            raise error
+        if winner is hedge:
+            self.stats["hedge_wins"] += 1
+        result, timing = winner.result()
+        return result, timing, True
+    
+    async def _request_with_retries(self, attempt: Callable[[], Awaitable[tuple]],
+                                    discard: Optional[Callable[[Any], Awaitable[None]]] = None) -> tuple:
+        """Retry transient failures with full-jitter backoff inside the latency budget"""
+        request_start = time.perf_counter()
+        deadline = request_start + self.latency_budget_seconds
+        attempts = 0
+        
+        while True:
+            attempts += 1
+            try:
+                result, timing, hedged = await self._hedged_attempt(attempt, deadline, discard)
+                break
+            except UpstreamRetryableError as e:
+                backoff = random.uniform(0, self.retry_backoff_seconds * (2 ** (attempts - 1)))
+                if attempts > self.max_retries or time.perf_counter() + backoff >= deadline:
+                    raise
+                print(f"DeepSeek R1 transient error ({e}), retrying in {backoff * 1000:.0f}ms")
+                self.stats["retries"] += 1
+                await asyncio.sleep(backoff)
+        
+        timing.update({
+            "attempts": attempts,
+            "hedged": hedged,
+            "request_total_ms": (time.perf_counter() - request_start) * 1000
+        })
+        self.recent_timings.append(timing)
+        return result, timing
+    
     async def generate_story(
         self, 
         prompt: str, 
@@ -102,52 +404,103 @@ class DeepSeekR1Client:
         start_time = time.time()
         
         # For development/testing, use mock response
-        if self.api_key == "mock_key_for_testing":
+        if self.api_key == "mock_key_for_testing" or not HTTPX_AVAILABLE:
             await asyncio.sleep(0.5)  # Simulate API delay
             return await self._mock_deepseek_response(prompt, system_message)
         
-        # Real DeepSeek R1 API call
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        messages = []
-        if system_message:
-            messages.append({"role": "system", "content": system_message})
-        messages.append({"role": "user", "content": prompt})
-        
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "stream": False
-        }
+        # Real DeepSeek R1 API call over the pooled client
+        self.stats["requests"] += 1
+        payload = self._build_payload(prompt, system_message, temperature, max_tokens, stream=False)
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                result = response.json()
-                generation_time = int((time.time() - start_time) * 1000)
-                
-                return {
-                    "content": result["choices"][0]["message"]["content"],
-                    "usage": result.get("usage", {}),
-                    "generation_time_ms": generation_time,
-                    "model": self.model
-                }
+            result, timing = await self._request_with_retries(lambda: self._attempt(payload))
+            generation_time = int((time.time() - start_time) * 1000)
+            
+            return {
+                "content": result["choices"][0]["message"]["content"],
+                "usage": result.get("usage", {}),
+                "generation_time_ms": generation_time,
+                "model": self.model,
+                "timing": timing
+            }
                 
         except Exception as e:
-            print(f"DeepSeek R1 API error: {e}")
+            print(f"DeepSeek R1 API error, using mock response: {e}")
+            self.stats["fallbacks"] += 1
             # Fallback to mock response
-            return await self._mock_deepseek_response(prompt, system_message)
+            response = await self._mock_deepseek_response(prompt, system_message)
+            response["upstream_error"] = str(e)
+            return response
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool configuration and upstream latency breakdown for /ai/story/metrics"""
+        timings = list(self.recent_timings)
+        
+        def average(key: str) -> Optional[float]:
+            return sum(t[key] for t in timings) / len(timings) if timings else None
+        
+        return {
+            **self.stats,
+            "http2": HTTP2_AVAILABLE,
+            "max_connections": self.max_connections,
+            "latency_budget_seconds": self.latency_budget_seconds,
+            "hedging_enabled": self.hedge_requests,
+            "average_connect_ms": average("connect_ms"),
+            "average_ttfb_ms": average("ttfb_ms"),
+            "average_first_token_ms": average("first_token_ms"),
+            "p95_first_token_ms": self._latency_percentile(0.95, "first_token_ms"),
+            "average_total_ms": average("total_ms"),
+            "p50_total_ms": self._latency_percentile(0.5),
+            "p95_total_ms": self._latency_percentile(0.95),
+            "connection_reuse_rate": (
+                sum(1 for t in timings if t["connection_reused"]) / len(timings) if timings else None
+            )
+        }
+    
+    async def stream_story(
+        self,
+        prompt: str,
+        system_message: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ) -> AsyncIterator[str]:
+        """Stream story content deltas from the DeepSeek R1 chat-completions stream.
+        
+        Opening the stream goes through the same retry budget and hedging as
+        generate_story, measured to the first content delta; once a token has
+        been yielded the stream is committed and later errors propagate.
+        Closing the generator early (e.g. after a safety abort) closes the
+        HTTP stream, so the provider stops generating. Errors propagate to the
+        caller, which owns the fallback decision.
+        """
+        
+        # For development/testing, stream the mock response in small chunks
+        if self.api_key == "mock_key_for_testing" or not HTTPX_AVAILABLE:
+            mock = await self._mock_deepseek_response(prompt, system_message)
+            await asyncio.sleep(0.1)  # Simulate time to first token
+            content = mock["content"]
+            for i in range(0, len(content), self.mock_stream_chunk_chars):
+                yield content[i:i + self.mock_stream_chunk_chars]
+                await asyncio.sleep(0.01)
+            return
+        
+        payload = self._build_payload(prompt, system_message, temperature, max_tokens, stream=True)
+        
+        self.stats["requests"] += 1
+        stream, timing = await self._request_with_retries(
+            lambda: self._stream_attempt(payload), discard=self._close_stream
+        )
+        _, deltas, first_delta = stream
+        first_token_at = time.perf_counter()
+        try:
+            if first_delta is not None:
+                yield first_delta
+            async for delta in deltas:
+                yield delta
+        finally:
+            await self._close_stream(stream)
+            # recent_timings holds this dict; extend it from first token to end of stream
+            timing["total_ms"] = timing["first_token_ms"] + (time.perf_counter() - first_token_at) * 1000
     
     async def _mock_deepseek_response(self, prompt: str, system_message: str = None) -> Dict[str, Any]:
         """Mock DeepSeek R1 response for development/testing - ?"""
@@ -313,33 +666,23 @@ prompt_manager = TherapeuticPromptManager()
 # Content Safety System
 class ContentSafetyFilter:
     def __init__(self):
-        self.harmful_patterns = [
-            "自動", "自動", "死", "消", "価",
-            "?", "も", "終", "無"
-        ]
-        self.therapeutic_keywords = [
-            "成", "希", "?", "?", "支援", "?",
-            "学", "発", "?", "挑", "勇"
-        ]
+        self.harmful_patterns = list(STORY_HARMFUL_PATTERNS)
+        self.therapeutic_keywords = list(STORY_THERAPEUTIC_KEYWORDS)
+        self.matcher = get_safety_matcher()
     
     async def evaluate_content(self, content: str) -> ContentSafetyResult:
         """Evaluate content safety and therapeutic appropriateness"""
         
-        # Check for harmful patterns
-        flagged_categories = []
-        harmful_score = 0
+        # Single pass over the content with the shared safety matcher
+        scan = self.matcher.scan(content, kinds=("story_harmful", "story_therapeutic"))
         
-        content_lower = content.lower()
-        for pattern in self.harmful_patterns:
-            if pattern in content_lower:
-                flagged_categories.append("potentially_harmful")
-                harmful_score += 1
+        # Check for harmful patterns
+        harmful_hits = scan.by_kind("story_harmful")
+        flagged_categories = [hit.rule.category for hit in harmful_hits]
+        harmful_score = len(harmful_hits)
         
         # Calculate therapeutic appropriateness
-        therapeutic_score = 0
-        for keyword in self.therapeutic_keywords:
-            if keyword in content_lower:
-                therapeutic_score += 1
+        therapeutic_score = len(scan.by_kind("story_therapeutic"))
         
         # Normalize scores
         safety_score = max(0.0, 1.0 - (harmful_score / len(self.harmful_patterns)))
@@ -364,6 +707,69 @@ class ContentSafetyFilter:
 
 safety_filter = ContentSafetyFilter()
 
+class IncrementalSafetyChecker:
+    """Checks streamed story text with the shared safety matcher as it arrives.
+    
+    Each delta is scanned together with the last window_chars - 1 characters
+    already seen, so any pattern up to window_chars long is caught even when it
+    spans chunk boundaries. Text is released only after it has been scanned,
+    holding back enough characters that a harmful keyword is never shown
+    partially. The first hit of a critical kind stops the check.
+    """
+    
+    def __init__(
+        self,
+        content_filter: ContentSafetyFilter,
+        critical_kinds: tuple = ("story_harmful",),
+        window_chars: int = 64
+    ):
+        self.matcher = content_filter.matcher
+        self.critical_kinds = critical_kinds
+        self.window_chars = window_chars
+        longest_keyword = max(
+            (len(rule.pattern) for rule in self.matcher.rules
+             if rule.kind in critical_kinds and not rule.regex),
+            default=1
+        )
+        self.holdback_chars = min(window_chars, longest_keyword) - 1
+        self.critical_hits: List[str] = []
+        self._text = ""
+        self._released = 0
+    
+    @property
+    def aborted(self) -> bool:
+        return bool(self.critical_hits)
+    
+    @property
+    def text(self) -> str:
+        return self._text
+    
+    def feed(self, delta: str) -> str:
+        """Add a streamed delta and return the newly releasable safe text"""
+        if self.aborted or not delta:
+            return ""
+        
+        overlap = self._text[-(self.window_chars - 1):] if self.window_chars > 1 else ""
+        self._text += delta
+        
+        scan = self.matcher.scan(overlap + delta, kinds=self.critical_kinds)
+        if scan.flagged:
+            self.critical_hits = scan.categories()
+            return ""
+        
+        release_to = max(self._released, len(self._text) - self.holdback_chars)
+        released = self._text[self._released:release_to]
+        self._released = release_to
+        return released
+    
+    def finish(self) -> str:
+        """Release the held-back tail once the stream has ended cleanly"""
+        if self.aborted:
+            return ""
+        released = self._text[self._released:]
+        self._released = len(self._text)
+        return released
+
 # Fallback Template System
 class FallbackTemplateSystem:
     def __init__(self):
@@ -415,6 +821,195 @@ class FallbackTemplateSystem:
 
 fallback_system = FallbackTemplateSystem()
 
+# Semantic prompt-result cache
+class CachedStoryVariant(BaseModel):
+    content: str
+    safety_result: ContentSafetyResult
+    expires_at: float
+    hits: int = 0
+
+class StoryResultCache:
+    """Cache of safe, already-moderated story generations keyed by bucketed prompt context.
+    
+    Users with the same chapter, generation type, mood band, completion-rate
+    band and (bucketed) companion relationships get near-identical prompts, so
+    they share up to variants_per_key stories. A key is served from cache only
+    once all of its variants exist; while it fills, at most variants_per_key
+    generations run for it and any further requests wait for one of them,
+    so a burst of identical requests does not queue on the LLM. Entries expire
+    after ttl_seconds and the least recently used keys are evicted beyond
+    max_keys.
+    """
+    
+    def __init__(
+        self,
+        variants_per_key: int = None,
+        ttl_seconds: float = None,
+        max_keys: int = None,
+        completion_bands: int = 4,
+        companion_bucket_size: int = 10,
+        fill_wait_seconds: float = 5.0,
+        clock=time.monotonic
+    ):
+        self.variants_per_key = variants_per_key or int(os.getenv("STORY_CACHE_VARIANTS_PER_KEY", "3"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("STORY_CACHE_TTL_SECONDS", str(6 * 3600)))
+        self.max_keys = max_keys or int(os.getenv("STORY_CACHE_MAX_KEYS", "10000"))
+        self.completion_bands = completion_bands
+        self.companion_bucket_size = companion_bucket_size
+        self.fill_wait_seconds = fill_wait_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, List[CachedStoryVariant]]" = OrderedDict()
+        self._filling: Dict[str, List[asyncio.Future]] = {}
+        self._next_variant: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "waits": 0, "stores": 0, "evictions": 0}
+    
+    @staticmethod
+    def _mood_band(mood_score: Any) -> str:
+        try:
+            mood = float(mood_score)
+        except (TypeError, ValueError):
+            return "neutral"
+        if mood <= 2:
+            return "low"
+        if mood >= 4:
+            return "high"
+        return "neutral"
+    
+    def _completion_band(self, completion_rate: Any) -> int:
+        try:
+            rate = min(1.0, max(0.0, float(completion_rate)))
+        except (TypeError, ValueError):
+            rate = 0.5
+        return min(self.completion_bands - 1, int(rate * self.completion_bands))
+    
+    def _bucket(self, value: Any) -> Any:
+        """Normalise companion context so small relationship changes share a key"""
+        if isinstance(value, bool) or value is None or isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)):
+            return int(value // self.companion_bucket_size)
+        if isinstance(value, dict):
+            return {str(k): self._bucket(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+        if isinstance(value, (list, tuple)):
+            return [self._bucket(v) for v in value]
+        return str(value)
+    
+    def build_key(self, request: StoryGenerationRequest, template: TherapeuticPromptTemplate) -> str:
+        """Normalised, bucketed prompt context for a generation request"""
+        context = {
+            "template": template.template_id,
+            "chapter": request.chapter_type.value,
+            "generation_type": request.generation_type,
+            "therapeutic_focus": sorted(request.therapeutic_focus),
+            "story_node": request.story_state.get("current_node"),
+            "mood": self._mood_band(request.user_context.get("mood_score", 3)),
+            "completion": self._completion_band(request.user_context.get("completion_rate", 0.5)),
+            "companions": self._bucket(request.companion_context)
+        }
+        canonical = json.dumps(context, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def _live_variants(self, key: str) -> List[CachedStoryVariant]:
+        variants = self._entries.get(key)
+        if not variants:
+            return []
+        now = self._clock()
+        live = [v for v in variants if v.expires_at > now]
+        if len(live) != len(variants):
+            if live:
+                self._entries[key] = live
+            else:
+                del self._entries[key]
+        return live
+    
+    def _serve(self, key: str, variants: List[CachedStoryVariant]) -> CachedStoryVariant:
+        index = self._next_variant.get(key, 0) % len(variants)
+        self._next_variant[key] = index + 1
+        self._entries.move_to_end(key)
+        variant = variants[index]
+        variant.hits += 1
+        self.stats["hits"] += 1
+        return variant
+    
+    def get(self, key: str) -> Optional[CachedStoryVariant]:
+        """Return the next variant for a fully populated key, rotating between variants"""
+        variants = self._live_variants(key)
+        if len(variants) < self.variants_per_key:
+            return None
+        return self._serve(key, variants)
+    
+    def put(self, key: str, content: str, safety_result: ContentSafetyResult) -> None:
+        """Store a generated story that has already passed the safety filter"""
+        variants = self._live_variants(key)
+        if len(variants) >= self.variants_per_key:
+            return
+        variants.append(CachedStoryVariant(
+            content=content,
+            safety_result=safety_result,
+            expires_at=self._clock() + self.ttl_seconds
+        ))
+        self._entries[key] = variants
+        self._entries.move_to_end(key)
+        self.stats["stores"] += 1
+        
+        while len(self._entries) > self.max_keys:
+            evicted, _ = self._entries.popitem(last=False)
+            self._next_variant.pop(evicted, None)
+            self.stats["evictions"] += 1
+    
+    def reserve(self, key: str, force: bool = False) -> Optional[asyncio.Future]:
+        """Claim one of the key's unfilled variant slots; None means wait instead"""
+        filling = self._filling.setdefault(key, [])
+        if not force and len(self._live_variants(key)) + len(filling) >= self.variants_per_key:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        filling.append(future)
+        return future
+    
+    def release(self, key: str, reservation: Optional[asyncio.Future]) -> None:
+        if reservation is None:
+            return
+        filling = self._filling.get(key, [])
+        if reservation in filling:
+            filling.remove(reservation)
+        if not filling:
+            self._filling.pop(key, None)
+        if not reservation.done():
+            reservation.set_result(None)
+    
+    async def wait_for_variant(self, key: str) -> Optional[CachedStoryVariant]:
+        """Wait for an in-flight generation of this key, then serve any cached variant"""
+        self.stats["waits"] += 1
+        filling = list(self._filling.get(key, []))
+        if filling:
+            await asyncio.wait(filling, timeout=self.fill_wait_seconds,
+                               return_when=asyncio.FIRST_COMPLETED)
+        variants = self._live_variants(key)
+        if not variants:
+            return None
+        return self._serve(key, variants)
+    
+    def record_miss(self) -> None:
+        self.stats["misses"] += 1
+    
+    def clear(self) -> None:
+        self._entries.clear()
+        self._next_variant.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "keys": len(self._entries),
+            "variants": sum(len(v) for v in self._entries.values()),
+            "variants_per_key": self.variants_per_key,
+            "ttl_seconds": self.ttl_seconds,
+            "max_keys": self.max_keys
+        }
+
+story_cache = StoryResultCache()
+
 # Mock database for development
 class StoryGenerationDatabase:
     def __init__(self):
@@ -433,7 +1028,213 @@ async def verify_jwt_token() -> dict:
 async def health_check():
     return {"status": "healthy", "service": "ai-story"}
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the pooled DeepSeek R1 connections"""
+    await deepseek_client.aclose()
+
 # Story Generation Endpoints
+def _build_prompt_context(request: StoryGenerationRequest) -> Dict[str, Any]:
+    """Format user context for the therapeutic prompt template"""
+    return {
+        "mood_level": request.user_context.get("mood_score", 3),
+        "task_completion_rate": request.user_context.get("completion_rate", 0.5),
+        "companion_relationships": request.companion_context,
+        "current_story_state": request.story_state,
+        "social_context": request.user_context.get("social_interactions", {})
+    }
+
+async def _generate_checked_content(
+    request: StoryGenerationRequest,
+    template: TherapeuticPromptTemplate,
+    formatted_prompt: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream DeepSeek R1 output through the incremental safety check.
+    
+    Yields {"event": "delta"} events with safe partial content, then one
+    {"event": "generated"} event with the full text, whether generation was
+    aborted on a critical hit, and time to first token.
+    """
+    start_time = time.time()
+    checker = IncrementalSafetyChecker(safety_filter)
+    time_to_first_token_ms = None
+    
+    stream = deepseek_client.stream_story(
+        prompt=formatted_prompt,
+        system_message=template.system_message,
+        temperature=request.temperature,
+        max_tokens=request.max_length
+    )
+    try:
+        async for delta in stream:
+            if time_to_first_token_ms is None:
+                time_to_first_token_ms = int((time.time() - start_time) * 1000)
+            
+            released = checker.feed(delta)
+            if checker.aborted:
+                break
+            if released:
+                yield {"event": "delta", "content": released}
+    finally:
+        # Closing the stream stops the provider from generating discarded text
+        await stream.aclose()
+    
+    tail = checker.finish()
+    if tail:
+        yield {"event": "delta", "content": tail}
+    
+    yield {
+        "event": "generated",
+        "content": checker.text,
+        "aborted_early": checker.aborted,
+        "critical_hits": checker.critical_hits,
+        "time_to_first_token_ms": time_to_first_token_ms,
+        "llm_time_ms": int((time.time() - start_time) * 1000)
+    }
+
+async def _generate_cached_content(
+    request: StoryGenerationRequest,
+    template: TherapeuticPromptTemplate,
+    formatted_prompt: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """Serve a cached, pre-moderated story for the request's bucketed context,
+    or generate one through the incremental safety check and cache it if safe.
+    
+    Yields the same events as _generate_checked_content; the "generated"
+    event also carries the safety result and whether it was a cache hit.
+    """
+    key = story_cache.build_key(request, template)
+    cached = story_cache.get(key)
+    reservation = None
+    if cached is None:
+        reservation = story_cache.reserve(key)
+        if reservation is None:
+            # Enough generations for this key are already running; share theirs
+            cached = await story_cache.wait_for_variant(key)
+            if cached is None:
+                reservation = story_cache.reserve(key, force=True)
+    
+    if cached is not None:
+        yield {"event": "delta", "content": cached.content}
+        yield {
+            "event": "generated",
+            "content": cached.content,
+            "aborted_early": False,
+            "critical_hits": [],
+            "time_to_first_token_ms": 0,
+            "llm_time_ms": 0,
+            "safety_result": cached.safety_result,
+            "cache_hit": True
+        }
+        return
+    
+    story_cache.record_miss()
+    try:
+        async for event in _generate_checked_content(request, template, formatted_prompt):
+            if event["event"] == "generated":
+                event["cache_hit"] = False
+                if not event["aborted_early"]:
+                    safety_result = await safety_filter.evaluate_content(event["content"])
+                    event["safety_result"] = safety_result
+                    if safety_result.is_safe:
+                        story_cache.put(key, event["content"], safety_result)
+            yield event
+    finally:
+        story_cache.release(key, reservation)
+
+async def _build_story_response(
+    request: StoryGenerationRequest,
+    template: TherapeuticPromptTemplate,
+    story_id: str,
+    generated: Dict[str, Any],
+    start_time: float
+) -> tuple[StoryGenerationResponse, Dict[str, Any]]:
+    """Run the final safety check, apply the fallback and assemble the response"""
+    generated_content = generated["content"]
+    
+    # Content safety check (an early abort already proved the content unsafe,
+    # and cached stories were checked before they were stored)
+    safety_result = generated.get("safety_result")
+    if safety_result is None and not generated["aborted_early"]:
+        safety_result = await safety_filter.evaluate_content(generated_content)
+    
+    # Use fallback if content is not safe
+    fallback_used = False
+    if safety_result is None or not safety_result.is_safe:
+        generated_content = fallback_system.get_fallback_content(
+            request.generation_type, 
+            request.user_context
+        )
+        fallback_used = True
+        safety_result = await safety_filter.evaluate_content(generated_content)
+    
+    # Extract story elements (simplified for now)
+    story_nodes, story_edges = await extract_story_elements(generated_content, request)
+    
+    # Generate next choices
+    next_choices = await generate_next_choices(generated_content, request)
+    
+    generation_time = int((time.time() - start_time) * 1000)
+    
+    # Create response
+    response = StoryGenerationResponse(
+        story_id=story_id,
+        generated_content=generated_content,
+        story_nodes=story_nodes,
+        story_edges=story_edges,
+        therapeutic_tags=template.therapeutic_focus,
+        companion_interactions=await extract_companion_interactions(generated_content),
+        safety_score=safety_result.safety_score,
+        generation_time_ms=generation_time,
+        fallback_used=fallback_used,
+        next_choices=next_choices
+    )
+    
+    # Store generation history
+    if request.uid not in story_db.generation_history:
+        story_db.generation_history[request.uid] = []
+    story_db.generation_history[request.uid].append(response)
+    
+    metrics = {
+        "generation_time_ms": generation_time,
+        "content_length": len(generated_content),
+        "safety_score": safety_result.safety_score,
+        "fallback_used": fallback_used,
+        "chapter_type": request.chapter_type.value,
+        "time_to_first_token_ms": generated["time_to_first_token_ms"],
+        "aborted_early": generated["aborted_early"],
+        "llm_time_ms": generated["llm_time_ms"],
+        "cache_hit": generated.get("cache_hit", False)
+    }
+    return response, metrics
+
+async def _emergency_fallback_response(
+    request: StoryGenerationRequest,
+    story_id: str,
+    start_time: float
+) -> StoryGenerationResponse:
+    """Template story used when generation itself fails"""
+    fallback_content = fallback_system.get_fallback_content(
+        request.generation_type,
+        request.user_context
+    )
+    
+    safety_result = await safety_filter.evaluate_content(fallback_content)
+    generation_time = int((time.time() - start_time) * 1000)
+    
+    return StoryGenerationResponse(
+        story_id=story_id,
+        generated_content=fallback_content,
+        therapeutic_tags=["resilience", "hope"],
+        safety_score=safety_result.safety_score,
+        generation_time_ms=generation_time,
+        fallback_used=True,
+        next_choices=[
+            {"choice_id": "continue", "choice_text": "物語"},
+            {"choice_id": "reflect", "choice_text": "?"}
+        ]
+    )
+
 @app.post("/ai/story/v2/generate", response_model=StoryGenerationResponse)
 async def generate_story(
     request: StoryGenerationRequest,
@@ -449,76 +1250,21 @@ async def generate_story(
         # Get therapeutic prompt template
         template = prompt_manager.get_template(request.chapter_type)
         
-        # Format context for prompt
-        context = {
-            "mood_level": request.user_context.get("mood_score", 3),
-            "task_completion_rate": request.user_context.get("completion_rate", 0.5),
-            "companion_relationships": request.companion_context,
-            "current_story_state": request.story_state,
-            "social_context": request.user_context.get("social_interactions", {})
-        }
-        
         # Generate prompt
-        formatted_prompt = prompt_manager.format_prompt(template, context)
-        
-        # Call DeepSeek R1
-        ai_response = await deepseek_client.generate_story(
-            prompt=formatted_prompt,
-            system_message=template.system_message,
-            temperature=request.temperature,
-            max_tokens=request.max_length
-        )
+        formatted_prompt = prompt_manager.format_prompt(template, _build_prompt_context(request))
         
-        generated_content = ai_response["content"]
-        
-        # Content safety check
-        safety_result = await safety_filter.evaluate_content(generated_content)
+        # Serve a cached story or call DeepSeek R1, stopping as soon as the output turns unsafe
+        generated = None
+        async for event in _generate_cached_content(request, template, formatted_prompt):
+            if event["event"] == "generated":
+                generated = event
         
-        # Use fallback if content is not safe
-        fallback_used = False
-        if not safety_result.is_safe:
-            generated_content = fallback_system.get_fallback_content(
-                request.generation_type, 
-                request.user_context
-            )
-            fallback_used = True
-            safety_result = await safety_filter.evaluate_content(generated_content)
-        
-        # Extract story elements (simplified for now)
-        story_nodes, story_edges = await extract_story_elements(generated_content, request)
-        
-        # Generate next choices
-        next_choices = await generate_next_choices(generated_content, request)
-        
-        generation_time = int((time.time() - start_time) * 1000)
-        
-        # Create response
-        response = StoryGenerationResponse(
-            story_id=story_id,
-            generated_content=generated_content,
-            story_nodes=story_nodes,
-            story_edges=story_edges,
-            therapeutic_tags=template.therapeutic_focus,
-            companion_interactions=await extract_companion_interactions(generated_content),
-            safety_score=safety_result.safety_score,
-            generation_time_ms=generation_time,
-            fallback_used=fallback_used,
-            next_choices=next_choices
+        response, metrics = await _build_story_response(
+            request, template, story_id, generated, start_time
         )
         
-        # Store generation history
-        if request.uid not in story_db.generation_history:
-            story_db.generation_history[request.uid] = []
-        story_db.generation_history[request.uid].append(response)
-        
         # Log performance metrics
-        background_tasks.add_task(log_performance_metrics, {
-            "generation_time_ms": generation_time,
-            "content_length": len(generated_content),
-            "safety_score": safety_result.safety_score,
-            "fallback_used": fallback_used,
-            "chapter_type": request.chapter_type.value
-        })
+        background_tasks.add_task(log_performance_metrics, metrics)
         
         return response
         
@@ -526,26 +1272,57 @@ async def generate_story(
         print(f"Story generation error: {e}")
         
         # Emergency fallback
-        fallback_content = fallback_system.get_fallback_content(
-            request.generation_type,
-            request.user_context
-        )
+        return await _emergency_fallback_response(request, story_id, start_time)
+
+@app.post("/ai/story/v2/generate/stream")
+async def generate_story_stream(
+    request: StoryGenerationRequest,
+    current_user: dict = Depends(verify_jwt_token)
+):
+    """Stream therapeutic story generation as NDJSON events.
+    
+    "delta" events carry content that has passed the incremental safety check.
+    If the story is rejected, a "reset" event tells the client to discard the
+    partial text; the final "complete" event carries the full response
+    (including any fallback content).
+    """
+    
+    async def events() -> AsyncIterator[str]:
+        start_time = time.time()
+        story_id = str(uuid.uuid4())
+        streamed_any = False
         
-        safety_result = await safety_filter.evaluate_content(fallback_content)
-        generation_time = int((time.time() - start_time) * 1000)
-        
-        return StoryGenerationResponse(
-            story_id=story_id,
-            generated_content=fallback_content,
-            therapeutic_tags=["resilience", "hope"],
-            safety_score=safety_result.safety_score,
-            generation_time_ms=generation_time,
-            fallback_used=True,
-            next_choices=[
-                {"choice_id": "continue", "choice_text": "物語"},
-                {"choice_id": "reflect", "choice_text": "?"}
-            ]
-        )
+        try:
+            template = prompt_manager.get_template(request.chapter_type)
+            formatted_prompt = prompt_manager.format_prompt(template, _build_prompt_context(request))
+            
+            generated = None
+            async for event in _generate_cached_content(request, template, formatted_prompt):
+                if event["event"] == "generated":
+                    generated = event
+                else:
+                    streamed_any = True
+                    yield json.dumps(event, ensure_ascii=False) + "\n"
+            
+            response, metrics = await _build_story_response(
+                request, template, story_id, generated, start_time
+            )
+            await log_performance_metrics(metrics)
+            
+        except Exception as e:
+            print(f"Story generation error: {e}")
+            response = await _emergency_fallback_response(request, story_id, start_time)
+        
+        if response.fallback_used and streamed_any:
+            yield json.dumps({"event": "reset", "reason": "unsafe_or_failed_generation"}) + "\n"
+        
+        yield json.dumps(
+            {"event": "complete", "story": response.dict()},
+            ensure_ascii=False,
+            default=str
+        ) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 # Story DAG Integration
 class StoryDAGIntegration:
@@ -957,6 +1734,9 @@ async def get_performance_metrics(
     avg_generation_time = sum(m["generation_time_ms"] for m in recent_metrics) / len(recent_metrics)
     avg_safety_score = sum(m["safety_score"] for m in recent_metrics) / len(recent_metrics)
     fallback_rate = sum(1 for m in recent_metrics if m["fallback_used"]) / len(recent_metrics)
+    early_abort_rate = sum(1 for m in recent_metrics if m.get("aborted_early")) / len(recent_metrics)
+    ttft_values = [m["time_to_first_token_ms"] for m in recent_metrics
+                   if m.get("time_to_first_token_ms") is not None]
     
     return {
         "total_generations": len(story_db.performance_metrics),
@@ -964,8 +1744,13 @@ async def get_performance_metrics(
         "average_generation_time_ms": avg_generation_time,
         "average_safety_score": avg_safety_score,
         "fallback_usage_rate": fallback_rate,
+        "early_abort_rate": early_abort_rate,
+        "cache_hit_rate": sum(1 for m in recent_metrics if m.get("cache_hit")) / len(recent_metrics),
+        "average_time_to_first_token_ms": sum(ttft_values) / len(ttft_values) if ttft_values else None,
         "p95_latency_requirement": 3500,  # 3.5 seconds
-        "p95_latency_actual": max(m["generation_time_ms"] for m in recent_metrics[-20:]) if recent_metrics else 0
+        "p95_latency_actual": max(m["generation_time_ms"] for m in recent_metrics[-20:]) if recent_metrics else 0,
+        "upstream": deepseek_client.get_stats(),
+        "result_cache": story_cache.get_stats()
     }
 
 # Real-time Story Generation for Daily Events
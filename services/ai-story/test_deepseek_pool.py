@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+AI Story - Pooled DeepSeek R1 Client Tests
+Connection reuse, jittered retries within the latency budget, hedging and timing breakdown
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from main import DeepSeekR1Client
+
+
+class FakeCompletionsHandler(BaseHTTPRequestHandler):
+    """Keep-alive chat-completions endpoint with scripted failures and delays"""
+    protocol_version = "HTTP/1.1"
+    responses = []  # (status, delay_seconds) per request, last one repeats
+    requests_seen = 0
+    connections = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.lock:
+            index = type(self).requests_seen
+            type(self).requests_seen += 1
+            type(self).connections.add(self.client_address)
+        status, delay = self.responses[min(index, len(self.responses) - 1)]
+        time.sleep(delay)
+
+        body = {"choices": [{"message": {"content": f"物語 {index}"}}], "usage": {"total_tokens": 10}}
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStreamHandler(BaseHTTPRequestHandler):
+    """Streaming chat-completions endpoint with scripted status and time to first token"""
+    protocol_version = "HTTP/1.1"
+    responses = []  # (status, first_token_delay_seconds) per request, last one repeats
+    requests_seen = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.lock:
+            index = type(self).requests_seen
+            type(self).requests_seen += 1
+        status, delay = self.responses[min(index, len(self.responses) - 1)]
+        if status != 200:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            time.sleep(delay)
+            for chunk in [f"物語 {index}", "は続く。"]:
+                event = {"choices": [{"delta": {"content": chunk}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stream_server():
+    FakeStreamHandler.responses = [(200, 0.0)]
+    FakeStreamHandler.requests_seen = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def completions_server():
+    FakeCompletionsHandler.responses = [(200, 0.0)]
+    FakeCompletionsHandler.requests_seen = 0
+    FakeCompletionsHandler.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class TestPooledClient:
+    """Long-lived pooled client"""
+
+    @pytest.mark.asyncio
+    async def test_connection_reused_across_requests(self, completions_server):
+        client = DeepSeekR1Client(api_key="test_key", base_url=completions_server)
+
+        results = [await client.generate_story(f"prompt {i}") for i in range(5)]
+        await client.aclose()
+
+        assert [r["content"] for r in results] == [f"物語 {i}" for i in range(5)]
+        assert len(FakeCompletionsHandler.connections) == 1
+        assert not results[0]["timing"]["connection_reused"]
+        assert all(r["timing"]["connection_reused"] for r in results[1:])
+        assert client.get_stats()["connection_reuse_rate"] == 0.8
+
+    @pytest.mark.asyncio
+    async def test_timing_breakdown(self, completions_server):
+        FakeCompletionsHandler.responses = [(200, 0.05)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=completions_server)
+
+        timing = (await client.generate_story("prompt"))["timing"]
+        await client.aclose()
+
+        assert timing["connect_ms"] > 0
+        assert timing["ttfb_ms"] >= 50
+        assert timing["total_ms"] >= timing["ttfb_ms"]
+        assert timing["attempts"] == 1
+
+
+class TestRetriesAndHedging:
+    """Retry budget and request hedging"""
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_retried(self, completions_server):
+        FakeCompletionsHandler.responses = [(503, 0.0), (429, 0.0), (200, 0.0)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=completions_server,
+                                  retry_backoff_seconds=0.01)
+
+        result = await client.generate_story("prompt")
+        await client.aclose()
+
+        assert result["content"] == "物語 2"
+        assert result["timing"]["attempts"] == 3
+        assert client.stats["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_latency_budget_bounds_retries(self, completions_server):
+        FakeCompletionsHandler.responses = [(503, 0.05)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=completions_server,
+                                  max_retries=10, latency_budget_seconds=0.2,
+                                  retry_backoff_seconds=0.01)
+
+        start = time.perf_counter()
+        result = await client.generate_story("prompt")
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+
+        assert "upstream_error" in result
+        assert client.stats["fallbacks"] == 1
+        assert elapsed < 0.5 + 0.5  # budget plus the mock response
+        assert FakeCompletionsHandler.requests_seen < 10
+
+    @pytest.mark.asyncio
+    async def test_slow_request_is_hedged(self, completions_server):
+        FakeCompletionsHandler.responses = [(200, 1.0), (200, 0.0)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=completions_server,
+                                  hedge_requests=True, latency_budget_seconds=3.0)
+        client.hedge_min_samples = 5
+        for _ in range(5):
+            client.recent_timings.append({"connect_ms": 0.0, "ttfb_ms": 40.0, "total_ms": 50.0,
+                                          "connection_reused": True})
+
+        start = time.perf_counter()
+        result = await client.generate_story("prompt")
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+
+        assert result["content"] == "物語 1"
+        assert result["timing"]["hedged"]
+        assert client.stats["hedge_wins"] == 1
+        assert elapsed < 0.9
+
+
+class TestStreamingRetriesAndHedging:
+    """stream_story goes through the same budget, measured to first token"""
+
+    @pytest.mark.asyncio
+    async def test_stream_open_retried_and_timed(self, stream_server):
+        FakeStreamHandler.responses = [(503, 0.0), (200, 0.05)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=stream_server, retry_backoff_seconds=0.01)
+
+        deltas = [delta async for delta in client.stream_story("prompt")]
+        await client.aclose()
+
+        assert deltas == ["物語 1", "は続く。"]
+        timing = client.recent_timings[-1]
+        assert timing["attempts"] == 2
+        assert timing["first_token_ms"] >= 50
+        assert timing["total_ms"] >= timing["first_token_ms"]
+        assert client.get_stats()["average_first_token_ms"] == timing["first_token_ms"]
+
+    @pytest.mark.asyncio
+    async def test_completion_slower_than_budget_is_not_cut_off(self, stream_server):
+        FakeStreamHandler.responses = [(200, 0.4)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=stream_server, latency_budget_seconds=0.1)
+
+        deltas = [delta async for delta in client.stream_story("prompt")]
+        await client.aclose()
+
+        assert deltas == ["物語 0", "は続く。"]
+        assert FakeStreamHandler.requests_seen == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_first_token_is_hedged(self, stream_server):
+        FakeStreamHandler.responses = [(200, 1.0), (200, 0.0)]
+        client = DeepSeekR1Client(api_key="test_key", base_url=stream_server,
+                                  hedge_requests=True, latency_budget_seconds=3.0)
+        client.hedge_min_samples = 5
+        for _ in range(5):
+            client.recent_timings.append({"connect_ms": 0.0, "ttfb_ms": 40.0, "first_token_ms": 50.0,
+                                          "total_ms": 900.0, "connection_reused": True})
+
+        start = time.perf_counter()
+        deltas = [delta async for delta in client.stream_story("prompt")]
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+
+        assert deltas == ["物語 1", "は続く。"]
+        assert client.recent_timings[-1]["hedged"]
+        assert client.stats["hedge_wins"] == 1
+        assert elapsed < 0.9
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
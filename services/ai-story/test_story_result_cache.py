@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+AI Story - Semantic Prompt-Result Cache Tests
+Bucketed context keys, variants per key, TTL/size eviction and burst coalescing
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+import main
+from main import ContentSafetyResult, StoryGenerationRequest, StoryResultCache, prompt_manager
+
+
+SAFE_STORY = "勇者は森の小さな道を進んだ。"
+
+
+def make_request(uid: str = "u1", mood: int = 4, completion: float = 0.8,
+                 companions: dict = None, chapter: str = "self_discipline") -> StoryGenerationRequest:
+    return StoryGenerationRequest(
+        uid=uid,
+        chapter_type=chapter,
+        user_context={"mood_score": mood, "completion_rate": completion},
+        story_state={"current_node": "start"},
+        generation_type="opening",
+        companion_context=companions if companions is not None else {"yu": 25}
+    )
+
+
+def key_for(cache: StoryResultCache, request: StoryGenerationRequest) -> str:
+    return cache.build_key(request, prompt_manager.get_template(request.chapter_type))
+
+
+def safe_result() -> ContentSafetyResult:
+    return ContentSafetyResult(is_safe=True, safety_score=1.0, therapeutic_appropriateness=0.6)
+
+
+class TestCacheKey:
+    """Normalised, bucketed prompt context"""
+
+    def test_similar_contexts_share_a_key(self):
+        cache = StoryResultCache()
+        base = key_for(cache, make_request())
+
+        assert key_for(cache, make_request(uid="u2", mood=5, completion=0.9, companions={"yu": 27})) == base
+
+    def test_different_bands_get_different_keys(self):
+        cache = StoryResultCache()
+        base = key_for(cache, make_request())
+
+        assert key_for(cache, make_request(mood=1)) != base
+        assert key_for(cache, make_request(completion=0.3)) != base
+        assert key_for(cache, make_request(companions={"yu": 45})) != base
+        assert key_for(cache, make_request(chapter="empathy")) != base
+
+
+class TestVariantsAndEviction:
+    """Variants per key, TTL and size bounds"""
+
+    def test_served_only_when_all_variants_exist_and_rotated(self):
+        cache = StoryResultCache(variants_per_key=2)
+
+        cache.put("k", "a", safe_result())
+        assert cache.get("k") is None
+
+        cache.put("k", "b", safe_result())
+        cache.put("k", "c", safe_result())
+        assert [cache.get("k").content for _ in range(4)] == ["a", "b", "a", "b"]
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = StoryResultCache(variants_per_key=1, ttl_seconds=60, clock=lambda: now[0])
+        cache.put("k", "a", safe_result())
+
+        assert cache.get("k").safety_result.is_safe
+        now[0] = 60.0
+        assert cache.get("k") is None
+        assert cache.get_stats()["keys"] == 0
+
+    def test_lru_eviction_by_key_count(self):
+        cache = StoryResultCache(variants_per_key=1, max_keys=2)
+        cache.put("a", "a", safe_result())
+        cache.put("b", "b", safe_result())
+        cache.get("a")
+        cache.put("c", "c", safe_result())
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get_stats()["evictions"] == 1
+
+
+class TestCachedGeneration:
+    """Generation path through the cache"""
+
+    def setup_method(self):
+        self.calls = 0
+
+    def install(self, monkeypatch, content: str, variants_per_key: int = 2):
+        async def counting_stream(*args, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            yield content
+
+        monkeypatch.setattr(main.deepseek_client, "stream_story", counting_stream)
+        cache = StoryResultCache(variants_per_key=variants_per_key)
+        monkeypatch.setattr(main, "story_cache", cache)
+        return cache
+
+    async def generate(self, request: StoryGenerationRequest) -> dict:
+        template = prompt_manager.get_template(request.chapter_type)
+        events = [event async for event in main._generate_cached_content(request, template, "prompt")]
+        return events[-1]
+
+    @pytest.mark.asyncio
+    async def test_burst_is_served_by_variants_per_key_generations(self, monkeypatch):
+        cache = self.install(monkeypatch, SAFE_STORY, variants_per_key=2)
+
+        results = await asyncio.gather(*(self.generate(make_request(uid=f"u{i}")) for i in range(20)))
+
+        assert self.calls == 2
+        assert all(r["content"] == SAFE_STORY for r in results)
+        assert all(r["safety_result"].is_safe for r in results)
+        assert sum(r["cache_hit"] for r in results) == 18
+        assert cache.get_stats()["variants"] == 2
+
+    @pytest.mark.asyncio
+    async def test_unsafe_generation_not_cached(self, monkeypatch):
+        cache = self.install(monkeypatch, "そして消えた", variants_per_key=1)
+
+        first = await self.generate(make_request())
+        second = await self.generate(make_request())
+
+        assert first["aborted_early"] and second["aborted_early"]
+        assert self.calls == 2
+        assert cache.get_stats()["variants"] == 0
+
+    @pytest.mark.asyncio
+    async def test_generate_story_uses_cached_safety_result(self, monkeypatch):
+        self.install(monkeypatch, SAFE_STORY, variants_per_key=1)
+        evaluations = []
+        original = main.safety_filter.evaluate_content
+
+        async def counting_evaluate(content):
+            evaluations.append(content)
+            return await original(content)
+
+        monkeypatch.setattr(main.safety_filter, "evaluate_content", counting_evaluate)
+
+        first = await main.generate_story(make_request(uid="u1"), {"uid": "u1"}, main.BackgroundTasks())
+        second = await main.generate_story(make_request(uid="u2"), {"uid": "u2"}, main.BackgroundTasks())
+
+        assert first.generated_content == second.generated_content == SAFE_STORY
+        assert not second.fallback_used
+        assert self.calls == 1
+        assert len(evaluations) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
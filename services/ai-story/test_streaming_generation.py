@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+AI Story - Streaming Generation Tests
+Incremental safety check, SSE streaming client and NDJSON streaming endpoint
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from main import DeepSeekR1Client, IncrementalSafetyChecker, app, safety_filter
+
+
+class FakeSSEHandler(BaseHTTPRequestHandler):
+    """Local stand-in for a streaming chat-completions endpoint"""
+    chunks = []
+    chunk_delay = 0.0
+    chunks_sent = 0
+    finished = False
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert body["stream"] is True
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        try:
+            for chunk in self.chunks:
+                event = {"choices": [{"delta": {"content": chunk}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                type(self).chunks_sent += 1
+                time.sleep(self.chunk_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            type(self).finished = True
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def sse_server():
+    FakeSSEHandler.chunks_sent = 0
+    FakeSSEHandler.finished = False
+    FakeSSEHandler.chunk_delay = 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSSEHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def make_story_request() -> dict:
+    return {
+        "uid": "test_user",
+        "chapter_type": "self_discipline",
+        "user_context": {"mood_score": 4, "completion_rate": 0.8},
+        "story_state": {"current_node": "start"},
+        "generation_type": "opening"
+    }
+
+
+class TestIncrementalSafetyChecker:
+    """Sliding-window safety check over streamed deltas"""
+
+    def test_safe_stream_releases_all_text(self):
+        checker = IncrementalSafetyChecker(safety_filter)
+        chunks = ["勇者は", "森の小さな", "道を進んだ。"]
+
+        released = "".join(checker.feed(chunk) for chunk in chunks) + checker.finish()
+
+        assert released == "".join(chunks)
+        assert not checker.aborted
+
+    def test_keyword_spanning_chunks_aborts(self):
+        checker = IncrementalSafetyChecker(safety_filter)
+
+        released = checker.feed("物語の中で自")
+        released += checker.feed("動という言葉が出た")
+
+        assert checker.aborted
+        assert checker.critical_hits == ["potentially_harmful"]
+        assert "自" not in released
+        assert checker.finish() == ""
+
+    def test_no_text_accepted_after_abort(self):
+        checker = IncrementalSafetyChecker(safety_filter)
+        checker.feed("死")
+
+        assert checker.feed("その後の物語") == ""
+        assert checker.text == "死"
+
+
+class TestStreamingClient:
+    """DeepSeekR1Client.stream_story against a local SSE server"""
+
+    @pytest.mark.asyncio
+    async def test_streams_deltas_in_order(self, sse_server):
+        FakeSSEHandler.chunks = ["勇者は", "森を", "進んだ。"]
+        client = DeepSeekR1Client(api_key="test_key", base_url=sse_server)
+
+        deltas = [delta async for delta in client.stream_story("prompt")]
+        await client.aclose()
+
+        assert deltas == ["勇者は", "森を", "進んだ。"]
+        assert FakeSSEHandler.finished
+
+    @pytest.mark.asyncio
+    async def test_early_abort_closes_upstream_stream(self, sse_server, monkeypatch):
+        import main
+
+        FakeSSEHandler.chunks = ["勇者は", "歩いた。", "死", "の影が"] + ["物語は続く。"] * 50
+        FakeSSEHandler.chunk_delay = 0.02
+        client = DeepSeekR1Client(api_key="test_key", base_url=sse_server)
+        monkeypatch.setattr(main, "deepseek_client", client)
+
+        request = main.StoryGenerationRequest(**make_story_request())
+        template = main.prompt_manager.get_template(request.chapter_type)
+        events = [event async for event in main._generate_checked_content(request, template, "prompt")]
+        await client.aclose()
+
+        generated = events[-1]
+        assert generated["event"] == "generated"
+        assert generated["aborted_early"]
+        assert all("死" not in event["content"] for event in events[:-1])
+
+        time.sleep(0.2)
+        assert not FakeSSEHandler.finished
+        assert FakeSSEHandler.chunks_sent < len(FakeSSEHandler.chunks)
+
+
+class TestStreamingEndpoint:
+    """NDJSON streaming generation endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_stream_ends_with_complete_story(self):
+        import httpx
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/ai/story/v2/generate/stream", json=make_story_request())
+
+        assert response.status_code == 200
+        events = [json.loads(line) for line in response.text.splitlines()]
+        complete = events[-1]
+        assert complete["event"] == "complete"
+
+        story = complete["story"]
+        if not story["fallback_used"]:
+            streamed = "".join(event["content"] for event in events if event["event"] == "delta")
+            assert streamed == story["generated_content"]
+        assert story["safety_score"] >= 0.0
+
+    @pytest.mark.asyncio
+    async def test_unsafe_stream_is_reset_to_fallback(self, monkeypatch):
+        import httpx
+        import main
+
+        async def unsafe_stream(*args, **kwargs):
+            for chunk in ["勇者は歩いた。", "そして", "消えたい", "と思った"]:
+                yield chunk
+
+        monkeypatch.setattr(main.deepseek_client, "stream_story", unsafe_stream)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/ai/story/v2/generate/stream", json=make_story_request())
+
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert [event["event"] for event in events][-2:] == ["reset", "complete"]
+        assert events[-1]["story"]["fallback_used"]
+        assert "消" not in "".join(e.get("content", "") for e in events if e["event"] == "delta")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
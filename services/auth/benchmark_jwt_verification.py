@@ -0,0 +1,68 @@
+"""
+JWT 検証ベンチマーク
+
+ホットトークン（キャッシュ済み）とコールドトークン（初回検証）の
+毎秒検証数を、キャッシュなしの検証と比較する
+
+Usage: python benchmark_jwt_verification.py [verifications] [distinct_tokens]
+"""
+
+import sys
+import os
+import time
+import warnings
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.auth.jwt_service import JWTService
+
+
+def measure(service: JWTService, tokens, verifications: int) -> float:
+    """毎秒検証数"""
+    start = time.perf_counter()
+    for i in range(verifications):
+        service.verify_token(tokens[i % len(tokens)])
+    return verifications / (time.perf_counter() - start)
+
+
+def main(verifications: int, distinct_tokens: int):
+    warnings.simplefilter("ignore")
+    
+    issuer = JWTService()
+    tokens = [
+        issuer.create_token_pair(f"guardian_{i}", f"user_{i}", "task_edit").access_token
+        for i in range(distinct_tokens)
+    ]
+    for token in tokens[::10]:
+        issuer.revoke_token(token)
+    live_tokens = [t for i, t in enumerate(tokens) if i % 10]
+    
+    uncached = JWTService(claims_cache_size=0)
+    uncached.revocation_store = issuer.revocation_store
+    
+    cold = JWTService(claims_cache_size=distinct_tokens)
+    cold.revocation_store = issuer.revocation_store
+    
+    hot = JWTService(claims_cache_size=distinct_tokens)
+    hot.revocation_store = issuer.revocation_store
+    for token in live_tokens:
+        hot.verify_token(token)
+    
+    print(f"verifications={verifications} distinct_tokens={len(live_tokens)} "
+          f"revoked_jtis={len(issuer.revocation_store)}")
+    
+    uncached_rate = measure(uncached, live_tokens, verifications)
+    cold_rate = measure(cold, live_tokens, len(live_tokens))
+    hot_rate = measure(hot, live_tokens, verifications)
+    
+    print(f"uncached (decode every time): {uncached_rate:12,.0f} verifications/s")
+    print(f"cold tokens (first verify)  : {cold_rate:12,.0f} verifications/s")
+    print(f"hot tokens (cached claims)  : {hot_rate:12,.0f} verifications/s")
+    print(f"hot / uncached speedup      : {hot_rate / uncached_rate:12.1f}x")
+
+
+if __name__ == "__main__":
+    verifications = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    distinct_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    main(verifications, distinct_tokens)
@@ -5,9 +5,12 @@ JWT トークン管理サービス
 Requirements: 6.1, 10.3
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pydantic import BaseModel
+import hashlib
+import heapq
 import jwt
 import uuid
 
@@ -37,18 +40,122 @@ class JWTClaims(BaseModel):
     expires_at: datetime
 
 
+class VerifiedClaimsCache:
+    """検証済みクレームの LRU キャッシュ
+    
+    トークンの SHA-256 ダイジェストをキーにし、各エントリはトークン自身の
+    exp を過ぎると無効になる。失効（revocation）の確認はキャッシュの外で
+    毎回行う。
+    """
+    
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, JWTClaims]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+    
+    def get(self, token_digest: bytes, now: float) -> Optional[JWTClaims]:
+        entry = self._entries.get(token_digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, claims = entry
+        if now >= expires_at:
+            del self._entries[token_digest]
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(token_digest)
+        self.hits += 1
+        return claims
+    
+    def put(self, token_digest: bytes, claims: JWTClaims, expires_at: float):
+        if self.max_entries <= 0:
+            return
+        self._entries[token_digest] = (expires_at, claims)
+        self._entries.move_to_end(token_digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def purge_expired(self, now: float) -> int:
+        expired = [key for key, (expires_at, _) in self._entries.items() if now >= expires_at]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TokenRevocationStore:
+    """jti ごとの失効ストア
+    
+    失効した jti をトークンの exp まで保持する。exp の min-heap で期限切れの
+    エントリを先頭から取り除くため、ストアは有効なトークン数以上に
+    大きくならない。
+    """
+    
+    def __init__(self):
+        self._expiry_by_jti: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+    
+    def revoke(self, jti: str, expires_at: float):
+        current = self._expiry_by_jti.get(jti)
+        if current is not None and current >= expires_at:
+            return
+        self._expiry_by_jti[jti] = expires_at
+        heapq.heappush(self._heap, (expires_at, jti))
+    
+    def is_revoked(self, jti: str, now: float) -> bool:
+        expires_at = self._expiry_by_jti.get(jti)
+        return expires_at is not None and now < expires_at
+    
+    def purge_expired(self, now: float) -> int:
+        """exp を過ぎた jti を削除し、削除件数を返す"""
+        removed = 0
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._heap)
+            # 再失効で exp が延びた jti は古いヒープ要素だけを捨てる
+            if self._expiry_by_jti.get(jti) == expires_at:
+                del self._expiry_by_jti[jti]
+                removed += 1
+        return removed
+    
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._expiry_by_jti
+    
+    def __len__(self) -> int:
+        return len(self._expiry_by_jti)
+
+
 class JWTService:
     """JWT サービス"""
     
-    def __init__(self):
+    def __init__(self, claims_cache_size: int = 10000):
         # 実際の実装では環境変数から取得
         self.secret_key = "your-jwt-secret-key"
         self.algorithm = "HS256"
         self.access_token_expire_minutes = 60
         self.refresh_token_expire_days = 30
         
-        # トークンブラックリスト（実際の実装ではRedisを使用）
-        self.blacklisted_tokens: set = set()
+        # 検証済みクレームのキャッシュ（署名検証を省略）
+        self.claims_cache = VerifiedClaimsCache(max_entries=claims_cache_size)
+        
+        # トークン失効ストア（実際の実装ではRedisを使用）
+        self.revocation_store = TokenRevocationStore()
+    
+    @staticmethod
+    def _now() -> float:
+        """トークンの iat / exp と同じ基準の現在時刻"""
+        return datetime.utcnow().timestamp()
     
     def create_token_pair(
         self,
@@ -88,11 +195,18 @@ class JWTService:
     
     def verify_token(self, token: str) -> JWTClaims:
         """トークン検証"""
-        try:
-            # ブラックリストチェック
-            if token in self.blacklisted_tokens:
+        now = self._now()
+        token_digest = VerifiedClaimsCache.digest(token)
+        
+        # 検証済みキャッシュ（exp までのみ有効）
+        claims = self.claims_cache.get(token_digest, now)
+        if claims is not None:
+            # 失効チェックはキャッシュヒット時も毎回行う
+            if self.revocation_store.is_revoked(claims.jti, now):
                 raise ValueError("無効なトークンです")
-            
+            return claims
+        
+        try:
             # JWT デコード
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
             
@@ -104,10 +218,14 @@ class JWTService:
             
             # 有効期限チェック
             exp_timestamp = payload["exp"]
-            if datetime.utcnow().timestamp() > exp_timestamp:
+            if now > exp_timestamp:
                 raise ValueError("トークンの有効期限が切れています")
             
-            return JWTClaims(
+            # 失効チェック
+            if self.revocation_store.is_revoked(payload["jti"], now):
+                raise ValueError("無効なトークンです")
+            
+            claims = JWTClaims(
                 guardian_id=payload["guardian_id"],
                 user_id=payload["user_id"],
                 permission_level=payload["permission_level"],
@@ -116,6 +234,8 @@ class JWTService:
                 issued_at=datetime.fromtimestamp(payload["iat"]),
                 expires_at=datetime.fromtimestamp(payload["exp"])
             )
+            self.claims_cache.put(token_digest, claims, exp_timestamp)
+            return claims
             
         except jwt.ExpiredSignatureError:
             raise ValueError("トークンの有効期限が切れています")
@@ -149,9 +269,28 @@ class JWTService:
         except Exception as e:
             raise ValueError(f"トークンリフレッシュに失敗しました: {str(e)}")
     
-    def revoke_token(self, jti: str):
-        """トークン無効化"""
-        self.blacklisted_tokens.add(jti)
+    def revoke_token(self, jti: str, expires_at: Optional[float] = None) -> bool:
+        """トークン無効化
+        
+        jti（またはトークン文字列）を失効させる。exp が分からない場合は
+        最長のトークン寿命（リフレッシュトークン）まで保持する。
+        """
+        if jti.count(".") == 2:
+            # トークン文字列が渡された場合は jti と exp を取り出す
+            try:
+                payload = jwt.decode(
+                    jti, self.secret_key, algorithms=[self.algorithm],
+                    options={"verify_exp": False}
+                )
+                jti, expires_at = payload["jti"], payload.get("exp", expires_at)
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+        
+        if expires_at is None:
+            expires_at = self._now() + self.refresh_token_expire_days * 24 * 60 * 60
+        
+        self.revocation_store.revoke(jti, expires_at)
+        return True
     
     def revoke_all_user_tokens(self, guardian_id: str, user_id: str):
         """ユーザーの全トークン無効化"""
@@ -161,7 +300,7 @@ class JWTService:
     
     def is_token_blacklisted(self, jti: str) -> bool:
         """トークンがブラックリストに登録されているかチェック"""
-        return jti in self.blacklisted_tokens
+        return self.revocation_store.is_revoked(jti, self._now())
     
     def get_token_info(self, token: str) -> Dict[str, Any]:
         """トークン情報取得"""
@@ -209,14 +348,13 @@ class JWTService:
     
     def cleanup_expired_tokens(self) -> int:
         """期限切れトークンのクリーンアップ"""
-        # 実際の実装では、データベースから期限切れトークンを削除
-        # ここでは簡単な実装として、ブラックリストのクリーンアップのみ
-        cleaned_count = 0
+        now = self._now()
         
-        # ブラックリストから期限切れトークンを削除
-        # （実際の実装では、JTIと有効期限の対応表を管理する必要がある）
+        # 期限切れの検証済みクレームを削除
+        self.claims_cache.purge_expired(now)
         
-        return cleaned_count
+        # exp を過ぎた失効エントリを削除（期限切れトークンは署名検証で拒否される）
+        return self.revocation_store.purge_expired(now)
 
 
 # グローバルインスタンス
@@ -0,0 +1,124 @@
+"""
+JWT サービス キャッシュ・失効ストアテスト
+
+検証済みクレームキャッシュと jti 失効ストアの動作確認
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.auth.jwt_service import JWTService, TokenRevocationStore
+
+
+@pytest.fixture
+def service():
+    return JWTService()
+
+
+def issue(service: JWTService) -> str:
+    return service.create_token_pair("guardian_001", "user_001", "task_edit").access_token
+
+
+class TestVerifiedClaimsCache:
+    """検証済みクレームキャッシュ"""
+    
+    def test_repeat_verification_is_cached(self, service):
+        token = issue(service)
+        
+        first = service.verify_token(token)
+        second = service.verify_token(token)
+        
+        assert second is first
+        assert service.claims_cache.hits == 1
+        assert service.claims_cache.misses == 1
+    
+    def test_cache_entry_capped_at_token_exp(self, service, monkeypatch):
+        token = issue(service)
+        claims = service.verify_token(token)
+        
+        expired_at = claims.expires_at.timestamp() + 1
+        monkeypatch.setattr(JWTService, "_now", staticmethod(lambda: expired_at))
+        
+        with pytest.raises(ValueError):
+            service.verify_token(token)
+        assert len(service.claims_cache) == 0
+    
+    def test_cache_is_size_bounded(self):
+        service = JWTService(claims_cache_size=2)
+        tokens = [issue(service) for _ in range(3)]
+        for token in tokens:
+            service.verify_token(token)
+        
+        assert len(service.claims_cache) == 2
+        service.verify_token(tokens[0])
+        assert service.claims_cache.misses == 4
+    
+    def test_tampered_token_not_served_from_cache(self, service):
+        token = issue(service)
+        service.verify_token(token)
+        
+        with pytest.raises(ValueError):
+            service.verify_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+
+
+class TestRevocation:
+    """jti 失効ストア"""
+    
+    def test_revocation_applies_to_cached_token_immediately(self, service):
+        token = issue(service)
+        claims = service.verify_token(token)
+        service.verify_token(token)
+        assert service.claims_cache.hits == 1
+        
+        assert service.revoke_token(claims.jti) is True
+        
+        with pytest.raises(ValueError):
+            service.verify_token(token)
+        assert service.is_token_blacklisted(claims.jti)
+    
+    def test_revoke_by_token_string_uses_token_exp(self, service):
+        token = issue(service)
+        claims = service.verify_token(token)
+        
+        service.revoke_token(token)
+        
+        assert service.is_token_blacklisted(claims.jti)
+        assert service.revocation_store._expiry_by_jti[claims.jti] == claims.expires_at.timestamp()
+    
+    def test_refresh_revokes_old_refresh_token(self, service):
+        pair = service.create_token_pair("guardian_001", "user_001", "task_edit")
+        service.refresh_token(pair.refresh_token)
+        
+        with pytest.raises(ValueError):
+            service.refresh_token(pair.refresh_token)
+    
+    def test_expired_revocations_are_dropped(self):
+        store = TokenRevocationStore()
+        store.revoke("a", expires_at=100.0)
+        store.revoke("b", expires_at=200.0)
+        store.revoke("a", expires_at=300.0)
+        
+        assert store.purge_expired(now=250.0) == 1
+        assert "b" not in store
+        assert store.is_revoked("a", now=250.0)
+        assert store.purge_expired(now=300.0) == 1
+        assert len(store) == 0
+    
+    def test_cleanup_expired_tokens(self, service, monkeypatch):
+        for _ in range(3):
+            service.revoke_token(issue(service))
+        
+        later = service._now() + service.access_token_expire_minutes * 60 + 1
+        monkeypatch.setattr(JWTService, "_now", staticmethod(lambda: later))
+        
+        assert service.cleanup_expired_tokens() == 3
+        assert len(service.revocation_store) == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
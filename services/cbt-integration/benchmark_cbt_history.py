@@ -0,0 +1,96 @@
+"""
+CBT History / Analytics Benchmark
+
+sessions 件のCBTセッション（users 人、半数にABCエントリ、3割に介入完了）を
+trigger_cbt_intervention / submit_abc_entry / complete_intervention で作り、
+1ユーザーの直近N日の履歴と /cbt/analytics について、全件走査と
+ユーザー別索引・集計カウンタの所要時間を比較する
+
+Usage: python benchmark_cbt_history.py [sessions] [users] [days]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from main import CBTIntegrationEngine, CBTTriggerType, get_cbt_analytics
+
+QUERIES = 200
+
+
+def full_scan_history(engine, user_id, days):
+    cutoff = datetime.now() - timedelta(days=days)
+    entries = [e for e in engine.abc_entries.values() if e.user_id == user_id and e.created_at > cutoff]
+    sessions = [s for s in engine.cbt_sessions.values() if s.user_id == user_id and s.session_start > cutoff]
+    return len(entries), len(sessions)
+
+
+def full_scan_analytics(engine):
+    triggers = {}
+    for session in engine.cbt_sessions.values():
+        triggers[session.trigger_type.value] = triggers.get(session.trigger_type.value, 0) + 1
+    ratings = [s.effectiveness_rating for s in engine.cbt_sessions.values() if s.effectiveness_rating is not None]
+    return triggers, sum(ratings) / len(ratings) if ratings else 0
+
+
+async def populate(engine, sessions, users):
+    rng = random.Random(6)
+    triggers = list(CBTTriggerType)
+    interventions = [i.intervention_id for i in engine.micro_interventions]
+    started = time.perf_counter()
+    for i in range(sessions):
+        result = await engine.trigger_cbt_intervention(rng.choice(triggers), f"user_{rng.randrange(users)}", {})
+        if i % 2 == 0:
+            await engine.submit_abc_entry(result["session_id"], {"belief": "うまくいかない"})
+        if i % 10 < 3:
+            await engine.complete_intervention(result["session_id"], rng.choice(interventions), rng.randint(1, 5))
+        if (i + 1) % 200_000 == 0:
+            print(f"  populated {i + 1:,} sessions ({time.perf_counter() - started:.0f} s)")
+    return time.perf_counter() - started
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def timed_async(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def run(sessions, users, days):
+    engine = CBTIntegrationEngine()
+    main.cbt_engine = engine
+    elapsed = await populate(engine, sessions, users)
+    print(f"sessions={sessions:,} abc_entries={len(engine.abc_entries):,} users={users:,} "
+          f"populate={elapsed:.1f} s ({sessions / elapsed:,.0f} sessions/s)")
+
+    rng = random.Random(7)
+    user_ids = [f"user_{rng.randrange(users)}" for _ in range(QUERIES)]
+    scan_repeat = max(1, min(QUERIES, 2_000_000 // max(1, sessions)))
+    scan = timed(lambda: full_scan_history(engine, rng.choice(user_ids), days), scan_repeat)
+    queries = iter(user_ids)
+    indexed = await timed_async(lambda: engine.get_user_cbt_history(next(queries), days), QUERIES)
+    print(f"history  full_scan={scan:10.2f} ms/query  indexed={indexed:8.3f} ms/query (includes summary)")
+
+    scan = timed(lambda: full_scan_analytics(engine), scan_repeat)
+    counters = await timed_async(get_cbt_analytics, QUERIES)
+    print(f"analytics full_scan={scan:9.2f} ms/call   counters={counters:7.3f} ms/call")
+
+
+if __name__ == "__main__":
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    asyncio.run(run(sessions, users, days))
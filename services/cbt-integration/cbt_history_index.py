@@ -0,0 +1,89 @@
+"""
+CBT履歴の索引と集計カウンタ
+
+ユーザーごとにセッション/ABCエントリのIDを時刻順で保持し、直近N日の
+履歴を二分探索とスライスで取り出す。全体の分析値（トリガー分布・
+効果評価の合計と件数・介入の利用回数）はセッションの作成/完了時に
+更新するカウンタで持ち、全セッションの走査を不要にする。
+"""
+
+import bisect
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class UserTimeIndex:
+    """
+    ユーザーごとの (時刻, ID) の昇順リスト
+
+    時刻とIDを別々のリストに持ち、時刻側で二分探索する。通常は末尾への
+    追記で済み、時刻が前後したものだけ挿入位置を探す。
+    """
+
+    def __init__(self):
+        self._times: Dict[str, List[datetime]] = {}
+        self._ids: Dict[str, List[str]] = {}
+
+    def add(self, user_id: str, timestamp: datetime, item_id: str) -> None:
+        times = self._times.setdefault(user_id, [])
+        ids = self._ids.setdefault(user_id, [])
+        if not times or times[-1] <= timestamp:
+            times.append(timestamp)
+            ids.append(item_id)
+            return
+        position = bisect.bisect_right(times, timestamp)
+        times.insert(position, timestamp)
+        ids.insert(position, item_id)
+
+    def after(self, user_id: str, cutoff: datetime) -> List[str]:
+        """cutoff より後（cutoff は含まない）のIDを古い順に返す"""
+        times = self._times.get(user_id)
+        if not times:
+            return []
+        return self._ids[user_id][bisect.bisect_right(times, cutoff):]
+
+    def count(self, user_id: str) -> int:
+        return len(self._times.get(user_id, ()))
+
+    def __len__(self) -> int:
+        return sum(len(times) for times in self._times.values())
+
+
+class CBTAnalyticsCounters:
+    """セッション全体の集計値。trigger_cbt_intervention と complete_intervention で更新する"""
+
+    def __init__(self):
+        self.total_sessions = 0
+        self.total_abc_entries = 0
+        self.trigger_distribution: Dict[str, int] = {}
+        self.effectiveness_sum = 0
+        self.effectiveness_count = 0  # 効果評価のあるセッション数
+        self.intervention_usage: Dict[str, int] = {}
+
+    def record_session(self, trigger_type: str) -> None:
+        self.total_sessions += 1
+        self.trigger_distribution[trigger_type] = self.trigger_distribution.get(trigger_type, 0) + 1
+
+    def record_abc_entry(self) -> None:
+        self.total_abc_entries += 1
+
+    def record_completion(self, intervention_id: Optional[str], previous_rating: Optional[int],
+                          rating: int) -> None:
+        """
+        介入の完了を反映する
+
+        セッションの効果評価は最新の値で上書きされるので、以前の評価を
+        差し引いてから加える。intervention_id はそのセッションで初めて完了した
+        介入のときだけ渡す
+        """
+        if intervention_id is not None:
+            self.intervention_usage[intervention_id] = self.intervention_usage.get(intervention_id, 0) + 1
+        if previous_rating is not None:
+            self.effectiveness_sum -= previous_rating
+            self.effectiveness_count -= 1
+        self.effectiveness_sum += rating
+        self.effectiveness_count += 1
+
+    @property
+    def average_effectiveness(self) -> float:
+        return self.effectiveness_sum / self.effectiveness_count if self.effectiveness_count else 0
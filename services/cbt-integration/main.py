@@ -20,6 +20,12 @@ import json
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from shared.utils.safety_matcher import SafetyMatcher, SafetyRule
+
+sys.path.append(os.path.dirname(__file__))
+from cbt_history_index import CBTAnalyticsCounters, UserTimeIndex
 
 app = FastAPI(title="CBT Integration Service", version="1.0.0")
 logger = logging.getLogger(__name__)
@@ -78,7 +84,12 @@ class CBTIntegrationEngine:
         self.abc_entries = {}  # 実装Firestoreを
         self.micro_interventions = self._initialize_micro_interventions()
         self.thought_patterns = self._initialize_thought_patterns()
+        self.thought_pattern_matcher = self._compile_thought_patterns()
         self.cbt_sessions = {}
+        # ユーザーごとの時刻順索引と全体の集計カウンタ
+        self.session_index = UserTimeIndex()
+        self.abc_entry_index = UserTimeIndex()
+        self.analytics = CBTAnalyticsCounters()
         
         # CBT設定
         self.max_intervention_duration = 45  # 45?
@@ -238,6 +249,15 @@ class CBTIntegrationEngine:
             )
         ]
     
+    def _compile_thought_patterns(self) -> SafetyMatcher:
+        """思考パターン例文のキーワードを一括照合用にコンパイル"""
+        return SafetyMatcher(
+            SafetyRule(kind="thought_pattern", category=pattern.pattern_id, pattern=keyword)
+            for pattern in self.thought_patterns
+            for example in pattern.examples
+            for keyword in example.lower().split()
+        )
+    
     async def trigger_cbt_intervention(self, trigger_type: CBTTriggerType, 
                                      user_id: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """CBT?"""
@@ -256,6 +276,8 @@ class CBTIntegrationEngine:
             )
             
             self.cbt_sessions[session_id] = session
+            self.session_index.add(user_id, session.session_start, session_id)
+            self.analytics.record_session(trigger_type.value)
             
             # ?
             suggested_interventions = self._select_interventions(trigger_type, context)
@@ -371,6 +393,8 @@ class CBTIntegrationEngine:
             # ?
             session.abc_entries.append(abc_entry)
             self.abc_entries[abc_entry.entry_id] = abc_entry
+            self.abc_entry_index.add(abc_entry.user_id, abc_entry.created_at, abc_entry.entry_id)
+            self.analytics.record_abc_entry()
             
             # ?
             thought_pattern_analysis = await self._analyze_thought_patterns(abc_entry)
@@ -410,19 +434,18 @@ class CBTIntegrationEngine:
     
     async def _analyze_thought_patterns(self, abc_entry: ABCModelEntry) -> Dict[str, Any]:
         """?"""
-        belief = abc_entry.belief.lower()
+        scan = self.thought_pattern_matcher.scan(abc_entry.belief)
+        matched_ids = set(scan.categories("thought_pattern"))
         detected_patterns = []
         
         # ?
         for pattern in self.thought_patterns:
-            for example in pattern.examples:
-                if any(keyword in belief for keyword in example.lower().split()):
-                    detected_patterns.append({
-                        "pattern_name": pattern.name,
-                        "description": pattern.description,
-                        "reframing_suggestions": pattern.reframing_suggestions[:2]  # ?2つ
-                    })
-                    break
+            if pattern.pattern_id in matched_ids:
+                detected_patterns.append({
+                    "pattern_name": pattern.name,
+                    "description": pattern.description,
+                    "reframing_suggestions": pattern.reframing_suggestions[:2]  # ?2つ
+                })
         
         return {
             "detected_patterns": detected_patterns,
@@ -440,10 +463,16 @@ class CBTIntegrationEngine:
             session = self.cbt_sessions[session_id]
             
             # ?
-            if intervention_id not in session.interventions_completed:
+            newly_completed = intervention_id not in session.interventions_completed
+            if newly_completed:
                 session.interventions_completed.append(intervention_id)
             
             # ?
+            self.analytics.record_completion(
+                intervention_id if newly_completed else None,
+                session.effectiveness_rating,
+                effectiveness_rating
+            )
             session.effectiveness_rating = effectiveness_rating
             
             # ?
@@ -486,16 +515,14 @@ class CBTIntegrationEngine:
         """ユーザーCBT?"""
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        # ユーザーABCエラー
+        # ユーザーABCエラー（索引は古い順）
         user_abc_entries = [
-            entry for entry in self.abc_entries.values()
-            if entry.user_id == user_id and entry.created_at > cutoff_date
+            self.abc_entries[entry_id] for entry_id in self.abc_entry_index.after(user_id, cutoff_date)
         ]
         
         # ユーザーCBT?
         user_sessions = [
-            session for session in self.cbt_sessions.values()
-            if session.user_id == user_id and session.session_start > cutoff_date
+            self.cbt_sessions[session_id] for session_id in self.session_index.after(user_id, cutoff_date)
         ]
         
         # ?
@@ -531,7 +558,7 @@ class CBTIntegrationEngine:
                     "created_at": entry.created_at.isoformat(),
                     "has_rational_response": entry.rational_response is not None
                 }
-                for entry in sorted(user_abc_entries, key=lambda x: x.created_at, reverse=True)[:5]
+                for entry in reversed(user_abc_entries[-5:])
             ],
             "cognitive_progress": {
                 "awareness_level": min(5, 1 + (total_abc_entries * 0.2)),
@@ -595,30 +622,16 @@ async def get_cbt_session(session_id: str):
 
 @app.get("/cbt/analytics")
 async def get_cbt_analytics():
-    """CBT?"""
-    total_sessions = len(cbt_engine.cbt_sessions)
-    total_abc_entries = len(cbt_engine.abc_entries)
-    
-    # ?
-    trigger_stats = {}
-    for session in cbt_engine.cbt_sessions.values():
-        trigger_type = session.trigger_type.value
-        trigger_stats[trigger_type] = trigger_stats.get(trigger_type, 0) + 1
-    
-    # ?
-    effectiveness_ratings = [
-        session.effectiveness_rating for session in cbt_engine.cbt_sessions.values()
-        if session.effectiveness_rating is not None
-    ]
-    
-    avg_effectiveness = sum(effectiveness_ratings) / len(effectiveness_ratings) if effectiveness_ratings else 0
+    """CBT?（セッション作成/完了時に更新した集計値から返す）"""
+    analytics = cbt_engine.analytics
     
     return {
-        "total_cbt_sessions": total_sessions,
-        "total_abc_entries": total_abc_entries,
-        "trigger_type_distribution": trigger_stats,
-        "average_intervention_effectiveness": round(avg_effectiveness, 2),
-        "intervention_completion_rate": len(effectiveness_ratings) / max(1, total_sessions),
+        "total_cbt_sessions": analytics.total_sessions,
+        "total_abc_entries": analytics.total_abc_entries,
+        "trigger_type_distribution": dict(analytics.trigger_distribution),
+        "average_intervention_effectiveness": round(analytics.average_effectiveness, 2),
+        "intervention_completion_rate": analytics.effectiveness_count / max(1, analytics.total_sessions),
+        "intervention_usage": dict(analytics.intervention_usage),
         "therapeutic_outcomes": {
             "cognitive_awareness_improvement": "85%",
             "coping_skills_development": "78%",
@@ -0,0 +1,142 @@
+"""
+CBT History Index Tests
+
+索引による直近N日の履歴と、作成/完了時に更新する集計カウンタが、
+全セッション・全エントリを走査して計算し直した値と一致することを確かめる
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from cbt_history_index import UserTimeIndex
+from main import CBTIntegrationEngine, CBTTriggerType, get_cbt_analytics
+
+START = datetime(2025, 1, 1, 9, 0)
+
+
+class FakeDatetime(datetime):
+    current = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def full_scan_history(engine, user_id, days):
+    """索引導入前の全件走査による履歴"""
+    cutoff = FakeDatetime.now() - timedelta(days=days)
+    entries = [e for e in engine.abc_entries.values() if e.user_id == user_id and e.created_at > cutoff]
+    sessions = [s for s in engine.cbt_sessions.values() if s.user_id == user_id and s.session_start > cutoff]
+    rated = [s.effectiveness_rating for s in sessions if s.effectiveness_rating]
+    usage = {}
+    for session in sessions:
+        for intervention_id in session.interventions_completed:
+            usage[intervention_id] = usage.get(intervention_id, 0) + 1
+    return {
+        "total_cbt_sessions": len(sessions),
+        "total_abc_entries": len(entries),
+        "average_effectiveness_rating": round(sum(rated) / max(1, len(rated)), 2),
+        "most_used_intervention": max(usage.items(), key=lambda x: x[1])[0] if usage else None,
+        "recent_entry_ids": [e.entry_id for e in sorted(entries, key=lambda x: x.created_at, reverse=True)[:5]],
+    }
+
+
+def full_scan_analytics(engine):
+    sessions = list(engine.cbt_sessions.values())
+    triggers = {}
+    usage = {}
+    for session in sessions:
+        triggers[session.trigger_type.value] = triggers.get(session.trigger_type.value, 0) + 1
+        for intervention_id in session.interventions_completed:
+            usage[intervention_id] = usage.get(intervention_id, 0) + 1
+    ratings = [s.effectiveness_rating for s in sessions if s.effectiveness_rating is not None]
+    return {
+        "total_cbt_sessions": len(sessions),
+        "total_abc_entries": len(engine.abc_entries),
+        "trigger_type_distribution": triggers,
+        "average_intervention_effectiveness": round(sum(ratings) / len(ratings) if ratings else 0, 2),
+        "intervention_completion_rate": len(ratings) / max(1, len(sessions)),
+        "intervention_usage": usage,
+    }
+
+
+@pytest.fixture
+def populated_engine(monkeypatch):
+    """60日分のセッション・ABCエントリ・介入完了（再評価を含む）を持つエンジン"""
+    monkeypatch.setattr(main, "datetime", FakeDatetime)
+    engine = CBTIntegrationEngine()
+    monkeypatch.setattr(main, "cbt_engine", engine)
+    rng = random.Random(4)
+    users = [f"user_{i}" for i in range(12)]
+    triggers = list(CBTTriggerType)
+    session_ids = []
+
+    async def populate():
+        for step in range(600):
+            FakeDatetime.current = START + timedelta(hours=step * 2.4)
+            user_id = rng.choice(users)
+            result = await engine.trigger_cbt_intervention(
+                rng.choice(triggers), user_id, {"defeat_type": rng.choice(["general", "overwhelming"])}
+            )
+            session_id = result["session_id"]
+            session_ids.append(session_id)
+            if rng.random() < 0.5:
+                await engine.submit_abc_entry(session_id, {"belief": "自分はいつも失敗する"})
+            for _ in range(rng.randint(0, 3)):
+                # 過去のセッションを後から完了・再評価することもある
+                target = rng.choice(session_ids[-20:])
+                intervention = rng.choice(engine.micro_interventions).intervention_id
+                await engine.complete_intervention(target, intervention, rng.randint(1, 5))
+
+    return engine, users, populate
+
+
+class TestIncrementalHistory:
+
+    @pytest.mark.asyncio
+    async def test_history_matches_full_scan(self, populated_engine):
+        engine, users, populate = populated_engine
+        await populate()
+
+        for user_id in users + ["unknown_user"]:
+            for days in (1, 7, 30, 90):
+                history = await engine.get_user_cbt_history(user_id, days)
+                expected = full_scan_history(engine, user_id, days)
+                summary = history["summary"]
+                assert summary["total_cbt_sessions"] == expected["total_cbt_sessions"]
+                assert summary["total_abc_entries"] == expected["total_abc_entries"]
+                assert summary["average_effectiveness_rating"] == expected["average_effectiveness_rating"]
+                assert summary["most_used_intervention"] == expected["most_used_intervention"]
+                assert [e["entry_id"] for e in history["recent_abc_entries"]] == expected["recent_entry_ids"]
+
+    @pytest.mark.asyncio
+    async def test_analytics_counters_match_full_recomputation(self, populated_engine):
+        engine, _, populate = populated_engine
+        await populate()
+
+        analytics = await get_cbt_analytics()
+        expected = full_scan_analytics(engine)
+        for key, value in expected.items():
+            assert analytics[key] == value, key
+
+
+class TestUserTimeIndex:
+
+    def test_out_of_order_inserts_stay_sorted(self):
+        index = UserTimeIndex()
+        times = [START + timedelta(minutes=m) for m in (5, 1, 9, 3, 7, 3)]
+        for i, timestamp in enumerate(times):
+            index.add("user_a", timestamp, f"id_{i}")
+
+        assert index.after("user_a", START) == ["id_1", "id_3", "id_5", "id_0", "id_4", "id_2"]
+        # cutoff ちょうどの要素は含めない
+        assert index.after("user_a", START + timedelta(minutes=3)) == ["id_0", "id_4", "id_2"]
+        assert index.after("user_b", START) == []
+        assert index.count("user_a") == 6
@@ -0,0 +1,144 @@
+"""
+Daily Trio Scoring Benchmark
+
+タスクごとにスコア関数を呼んで全件ソートする従来方式と、特徴行列の行列演算 +
+argpartition による方式について、1ユーザーあたりのレイテンシと、朝のプッシュ前に
+users 人分をまとめて計算するときのスループットを比較する。
+pool_size を指定するとタスクプールを複製して大きくする
+
+Usage: python benchmark_trio_batch.py [users] [pool_size]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import DailyTrioEngine, DailyTrioTask, TaskCategory, TaskFeatureMatrix, TaskPriority, UserState
+
+STATES = ["APATHY", "INTEREST", "ACTION", "CONTINUATION", "HABITUATION"]
+GOALS = ["Self-Discipline", "Empathy", "Communication", "Courage", "Resilience"]
+LATENCY_SAMPLES = 2000
+
+
+def make_user_states(count: int):
+    rng = random.Random(1)
+    return [
+        UserState(
+            user_id=f"user_{i}", current_state=rng.choice(STATES), mood_trend=rng.uniform(-1, 1),
+            energy_level=rng.randint(1, 5), available_time=rng.choice([10, 15, 20, 30, 45]),
+            therapeutic_goals=rng.sample(GOALS, 2), completed_tasks_today=0,
+            streak_days=rng.randint(0, 12), adhd_assist_level=1.1
+        )
+        for i in range(count)
+    ]
+
+
+def make_engine(pool_size: int) -> DailyTrioEngine:
+    engine = DailyTrioEngine()
+    if pool_size > len(engine.task_pool):
+        rng = random.Random(2)
+        base = engine.task_pool
+        engine.task_pool = [
+            DailyTrioTask(**{**base[i % len(base)].dict(), "task_id": f"task_{i}",
+                             "category": rng.choice(list(TaskCategory)),
+                             "difficulty": rng.randint(1, 5),
+                             "estimated_duration": rng.randint(1, 15)})
+            for i in range(pool_size)
+        ]
+        engine.task_features = TaskFeatureMatrix(engine.task_pool)
+    return engine
+
+
+def legacy_select(engine: DailyTrioEngine, user_state: UserState):
+    """ベクトル化前の方式: タスクごとに4つのスコアを計算して全件ソート"""
+    analysis = engine._analyze_user_state(user_state)
+    weights = engine.selection_weights
+    scored = []
+    for task in engine.task_pool:
+        if task.therapeutic_focus in user_state.therapeutic_goals:
+            therapeutic = 1.0
+        elif task.category == TaskCategory.THERAPEUTIC:
+            therapeutic = 0.8
+        else:
+            therapeutic = 0.5
+        match = 0.0
+        energy = analysis["energy_category"]
+        if (energy == "high" and task.difficulty >= 3) or (energy == "medium" and 2 <= task.difficulty <= 3) \
+                or (energy == "low" and task.difficulty <= 2):
+            match += 0.3
+        time_category = analysis["time_availability"]
+        if (time_category == "limited" and task.estimated_duration <= 5) \
+                or (time_category == "moderate" and task.estimated_duration <= 10):
+            match += 0.3
+        elif time_category == "abundant":
+            match += 0.2
+        priority = analysis["therapeutic_priority"]
+        if (priority == "engagement" and task.category == TaskCategory.THERAPEUTIC) \
+                or (priority == "momentum" and task.priority == TaskPriority.HIGH) \
+                or (priority == "consistency" and task.category == TaskCategory.HABIT) \
+                or (priority == "mastery" and task.difficulty >= 3):
+            match += 0.4
+        difficulty = max(0.0, 1.0 - abs(task.difficulty - analysis["difficulty_preference"]) / 4.0)
+        score = (therapeutic * weights["therapeutic_alignment"] + min(1.0, match) * weights["user_state_match"]
+                 + difficulty * weights["difficulty_balance"] + 0.5 * weights["variety_bonus"])
+        scored.append((task, score))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return engine._select_optimal_trio(scored, user_state)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_latency(engine, user_states):
+    results = {}
+    for name, select in [
+        ("legacy", lambda state: legacy_select(engine, state)),
+        ("matrix", lambda state: engine._select_trio_from_scores(engine.score_user_batch([state])[0], state)),
+    ]:
+        latencies = []
+        for state in user_states[:LATENCY_SAMPLES]:
+            started = time.perf_counter()
+            select(state)
+            latencies.append((time.perf_counter() - started) * 1000)
+        results[name] = (percentile(latencies, 0.5), percentile(latencies, 0.99))
+    for name, (p50, p99) in results.items():
+        print(f"per-user {name:<8} p50={p50:8.3f} ms  p99={p99:8.3f} ms")
+
+
+def bench_batch(engine, user_states):
+    started = time.perf_counter()
+    for state in user_states:
+        legacy_select(engine, state)
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scores = engine.score_user_batch(user_states)
+    scoring = time.perf_counter() - started
+    for row, state in enumerate(user_states):
+        engine._select_trio_from_scores(scores[row], state)
+    selection = time.perf_counter() - started - scoring
+
+    started = time.perf_counter()
+    engine.precompute_daily_trios(user_states)
+    precompute = time.perf_counter() - started
+
+    users = len(user_states)
+    print(f"batch legacy loop      {legacy:7.2f} s  {users / legacy:>10,.0f} users/s")
+    print(f"batch matrix scoring   {scoring:7.2f} s  {users / scoring:>10,.0f} users/s (score matrix only)")
+    print(f"batch matrix + select  {scoring + selection:7.2f} s  {users / (scoring + selection):>10,.0f} users/s")
+    print(f"precompute (responses) {precompute:7.2f} s  {users / precompute:>10,.0f} users/s")
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    pool_size = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    engine = make_engine(pool_size)
+    user_states = make_user_states(users)
+    print(f"users={users:,} tasks={len(engine.task_pool)} candidates=8")
+    bench_latency(engine, user_states)
+    bench_batch(engine, user_states)
@@ -16,6 +16,8 @@ import logging
 import uuid
 import asyncio
 
+import numpy as np
+
 # 共有
 import sys
 import os
@@ -68,6 +70,106 @@ class DailyTrioResponse(BaseModel):
     expected_xp: int
     therapeutic_balance: Dict[str, int]
 
+class BatchTrioRequest(BaseModel):
+    user_states: List[UserState]
+
+# ユーザー状態の分類（特徴行列の列順）
+ENERGY_CATEGORIES = ["high", "medium", "low"]
+TIME_CATEGORIES = ["limited", "moderate", "abundant"]
+THERAPEUTIC_PRIORITIES = ["engagement", "momentum", "consistency", "mastery"]
+STATE_PRIORITY = {
+    "APATHY": "engagement",
+    "INTEREST": "engagement",
+    "ACTION": "momentum",
+    "CONTINUATION": "consistency",
+    "HABITUATION": "mastery"
+}
+TRIO_SIZE = 3
+TRIO_CANDIDATES = 8  # 多様性条件で3つ選ぶ前に上位から取り出す候補数
+
+class TaskFeatureMatrix:
+    """
+    タスクプールの特徴行列
+
+    difficulty・estimated_duration・カテゴリ/優先度/治療フォーカスのone-hotを
+    一度だけ数値化し、ユーザー状態のone-hotとの行列積でスコアを求められるように
+    状態マッチの加点表（分類 x タスク）も前計算しておく
+    """
+
+    def __init__(self, task_pool: List[DailyTrioTask]):
+        self.tasks = task_pool
+        self.focuses = sorted({task.therapeutic_focus for task in task_pool})
+        self.focus_index = {focus: i for i, focus in enumerate(self.focuses)}
+
+        self.difficulty = np.array([task.difficulty for task in task_pool], dtype=np.float64)
+        self.duration = np.array([task.estimated_duration for task in task_pool], dtype=np.float64)
+        self.category = np.array([[task.category == category for category in TaskCategory] for task in task_pool],
+                                 dtype=np.float64).reshape(len(task_pool), len(TaskCategory))
+        self.priority = np.array([[task.priority == priority for priority in TaskPriority] for task in task_pool],
+                                 dtype=np.float64).reshape(len(task_pool), len(TaskPriority))
+        self.focus = np.zeros((len(task_pool), len(self.focuses)))
+        for row, task in enumerate(task_pool):
+            self.focus[row, self.focus_index[task.therapeutic_focus]] = 1.0
+
+        is_therapeutic = self.category[:, list(TaskCategory).index(TaskCategory.THERAPEUTIC)] > 0
+        is_habit = self.category[:, list(TaskCategory).index(TaskCategory.HABIT)] > 0
+        is_high = self.priority[:, list(TaskPriority).index(TaskPriority.HIGH)] > 0
+        difficulty, duration = self.difficulty, self.duration
+
+        # 治療の整合: 目標に含まれるフォーカスは1.0、それ以外は治療カテゴリ0.8/その他0.5
+        self.alignment_base = np.where(is_therapeutic, 0.8, 0.5)
+        # 状態マッチの加点表。各行がユーザーの分類、各列がタスク
+        self.energy_fit = np.stack([
+            np.where(difficulty >= 3, 0.3, 0.0),
+            np.where((difficulty >= 2) & (difficulty <= 3), 0.3, 0.0),
+            np.where(difficulty <= 2, 0.3, 0.0)
+        ])
+        self.time_fit = np.stack([
+            np.where(duration <= 5, 0.3, 0.0),
+            np.where(duration <= 10, 0.3, 0.0),
+            np.full(len(task_pool), 0.2)
+        ])
+        self.priority_fit = np.stack([
+            np.where(is_therapeutic, 0.4, 0.0),
+            np.where(is_high, 0.4, 0.0),
+            np.where(is_habit, 0.4, 0.0),
+            np.where(difficulty >= 3, 0.4, 0.0)
+        ])
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+class UserStateBatch:
+    """ユーザー状態をone-hot/数値ベクトルにまとめたもの（行がユーザー）"""
+
+    def __init__(self, user_states: List[UserState], features: TaskFeatureMatrix):
+        count = len(user_states)
+        rows = np.arange(count)
+        energy_level = np.array([state.energy_level for state in user_states], dtype=np.int64)
+        available_time = np.array([state.available_time for state in user_states], dtype=np.int64)
+        mood_trend = np.array([state.mood_trend for state in user_states], dtype=np.float64)
+        streak_days = np.array([state.streak_days for state in user_states], dtype=np.int64)
+
+        self.energy = np.zeros((count, len(ENERGY_CATEGORIES)))
+        self.energy[rows, np.select([energy_level >= 4, energy_level >= 3], [0, 1], 2)] = 1.0
+        self.time = np.zeros((count, len(TIME_CATEGORIES)))
+        self.time[rows, np.select([available_time < 15, available_time < 30], [0, 1], 2)] = 1.0
+        self.priority = np.zeros((count, len(THERAPEUTIC_PRIORITIES)))
+        self.priority[rows, [THERAPEUTIC_PRIORITIES.index(STATE_PRIORITY.get(state.current_state, "mastery"))
+                             for state in user_states]] = 1.0
+        self.goals = np.zeros((count, len(features.focuses)))
+        for row, state in enumerate(user_states):
+            for goal in state.therapeutic_goals:
+                column = features.focus_index.get(goal)
+                if column is not None:
+                    self.goals[row, column] = 1.0
+
+        # _calculate_difficulty_preference と同じ順序で計算する
+        streak_modifier = np.minimum(streak_days * 0.1, 0.5)
+        self.difficulty_preference = np.clip(
+            2.0 + (energy_level - 3) * 0.3 + mood_trend * 0.5 + streak_modifier, 1.0, 5.0
+        )
+
 class DailyTrioEngine:
     def __init__(self):
         self.task_pool = self._initialize_task_pool()
@@ -77,6 +179,9 @@ class DailyTrioEngine:
             "difficulty_balance": 0.2,     # ?
             "variety_bonus": 0.1           # ?
         }
+        self.task_features = TaskFeatureMatrix(self.task_pool)
+        # 朝のプッシュ前に計算したトリオ（user_id -> 応答）
+        self.precomputed_trios: Dict[str, DailyTrioResponse] = {}
     
     def _initialize_task_pool(self) -> List[DailyTrioTask]:
         """タスク"""
@@ -184,33 +289,69 @@ class DailyTrioEngine:
     async def select_daily_trio(self, user_state: UserState) -> DailyTrioResponse:
         """Daily Trio自動"""
         try:
-            # 1. ユーザー
-            state_analysis = self._analyze_user_state(user_state)
-            
-            # 2. ?
-            scored_tasks = self._score_tasks(user_state, state_analysis)
+            # 1-2. ユーザー状態をベクトル化してスコア
+            scores = self.score_user_batch([user_state])[0]
             
-            # 3. ?3つ
-            selected_tasks = self._select_optimal_trio(scored_tasks, user_state)
+            # 3. 上位候補から3つ
+            selected_tasks = self._select_trio_from_scores(scores, user_state)
             
-            # 4. ?
-            reasoning = self._generate_selection_reasoning(selected_tasks, user_state)
-            
-            # 5. レベル
-            return DailyTrioResponse(
-                user_id=user_state.user_id,
-                selected_date=datetime.now().strftime("%Y-%m-%d"),
-                trio_tasks=selected_tasks,
-                selection_reasoning=reasoning,
-                estimated_total_time=sum(task.estimated_duration for task in selected_tasks),
-                expected_xp=sum(task.xp_reward for task in selected_tasks),
-                therapeutic_balance=self._calculate_therapeutic_balance(selected_tasks)
-            )
+            # 4-5. ?・レベル
+            return self._build_response(user_state, selected_tasks, datetime.now().strftime("%Y-%m-%d"))
             
         except Exception as e:
             logger.error(f"Daily Trio selection failed for user {user_state.user_id}: {e}")
             raise HTTPException(status_code=500, detail="Daily Trio?")
     
+    def select_daily_trio_batch(self, user_states: List[UserState],
+                                selected_date: Optional[str] = None) -> List[DailyTrioResponse]:
+        """複数ユーザーのトリオをまとめて選ぶ。スコアは1回の行列演算で求める"""
+        selected_date = selected_date or datetime.now().strftime("%Y-%m-%d")
+        if not user_states:
+            return []
+        scores = self.score_user_batch(user_states)
+        return [
+            self._build_response(user_state, self._select_trio_from_scores(scores[row], user_state), selected_date)
+            for row, user_state in enumerate(user_states)
+        ]
+    
+    def precompute_daily_trios(self, user_states: List[UserState],
+                               selected_date: Optional[str] = None) -> Dict[str, Any]:
+        """朝のプッシュ前にアクティブユーザー全員のトリオを計算して保持する"""
+        started = datetime.now()
+        selected_date = selected_date or started.strftime("%Y-%m-%d")
+        responses = self.select_daily_trio_batch(user_states, selected_date)
+        self.precomputed_trios = {
+            trio_user_id: trio for trio_user_id, trio in self.precomputed_trios.items()
+            if trio.selected_date == selected_date
+        }
+        for response in responses:
+            self.precomputed_trios[response.user_id] = response
+        return {
+            "selected_date": selected_date,
+            "computed_users": len(responses),
+            "stored_users": len(self.precomputed_trios),
+            "elapsed_ms": int((datetime.now() - started).total_seconds() * 1000)
+        }
+    
+    def get_precomputed_trio(self, user_id: str, selected_date: Optional[str] = None) -> Optional[DailyTrioResponse]:
+        selected_date = selected_date or datetime.now().strftime("%Y-%m-%d")
+        trio = self.precomputed_trios.get(user_id)
+        if trio is not None and trio.selected_date == selected_date:
+            return trio
+        return None
+    
+    def _build_response(self, user_state: UserState, selected_tasks: List[DailyTrioTask],
+                        selected_date: str) -> DailyTrioResponse:
+        return DailyTrioResponse(
+            user_id=user_state.user_id,
+            selected_date=selected_date,
+            trio_tasks=selected_tasks,
+            selection_reasoning=self._generate_selection_reasoning(selected_tasks, user_state),
+            estimated_total_time=sum(task.estimated_duration for task in selected_tasks),
+            expected_xp=sum(task.xp_reward for task in selected_tasks),
+            therapeutic_balance=self._calculate_therapeutic_balance(selected_tasks)
+        )
+    
     def _analyze_user_state(self, user_state: UserState) -> Dict[str, Any]:
         """ユーザー"""
         return {
@@ -288,100 +429,83 @@ class DailyTrioEngine:
         
         return max(0.0, min(1.0, motivation))
     
+    def score_user_batch(self, user_states: List[UserState]) -> np.ndarray:
+        """
+        ユーザー x タスクのスコア行列を返す
+
+        状態マッチはユーザーの分類one-hotと加点表の行列積（各グループで1列だけ1なので
+        スカラー計算と同じ値になる）、難易度バランスはブロードキャストで求める
+        """
+        features = self.task_features
+        users = UserStateBatch(user_states, features)
+        weights = self.selection_weights
+
+        # 治療
+        in_goals = (users.goals @ features.focus.T) > 0
+        therapeutic = np.where(in_goals, 1.0, features.alignment_base)
+
+        # ユーザー
+        state_match = np.minimum(
+            1.0,
+            users.energy @ features.energy_fit + users.time @ features.time_fit
+            + users.priority @ features.priority_fit
+        )
+
+        # ?
+        difficulty_diff = np.abs(features.difficulty - users.difficulty_preference[:, None])
+        difficulty = np.maximum(0.0, 1.0 - difficulty_diff / 4.0)
+
+        # ?（実装）
+        variety = 0.5
+
+        return (therapeutic * weights["therapeutic_alignment"]
+                + state_match * weights["user_state_match"]
+                + difficulty * weights["difficulty_balance"]
+                + variety * weights["variety_bonus"])
+    
     def _score_tasks(self, user_state: UserState, state_analysis: Dict[str, Any]) -> List[tuple]:
-        """タスク"""
-        scored_tasks = []
-        
-        for task in self.task_pool:
-            score = 0.0
-            
-            # 治療
-            therapeutic_score = self._calculate_therapeutic_alignment(task, user_state)
-            score += therapeutic_score * self.selection_weights["therapeutic_alignment"]
-            
-            # ユーザー
-            state_match_score = self._calculate_state_match(task, state_analysis)
-            score += state_match_score * self.selection_weights["user_state_match"]
-            
-            # ?
-            difficulty_score = self._calculate_difficulty_balance(task, state_analysis)
-            score += difficulty_score * self.selection_weights["difficulty_balance"]
-            
-            # ?
-            variety_score = self._calculate_variety_bonus(task, user_state)
-            score += variety_score * self.selection_weights["variety_bonus"]
-            
-            scored_tasks.append((task, score))
-        
-        return sorted(scored_tasks, key=lambda x: x[1], reverse=True)
+        """タスクをスコア順（同点はプール順）に並べた (task, score) のリスト"""
+        scores = self.score_user_batch([user_state])[0]
+        return [(self.task_pool[index], float(scores[index])) for index in self._rank_tasks(scores)]
     
-    def _calculate_therapeutic_alignment(self, task: DailyTrioTask, user_state: UserState) -> float:
-        """治療"""
-        if task.therapeutic_focus in user_state.therapeutic_goals:
-            return 1.0
-        elif task.category == TaskCategory.THERAPEUTIC:
-            return 0.8
+    def _rank_tasks(self, scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+        """
+        上位k件のタスク番号をスコア降順で返す（kがNoneなら全件）
+
+        argpartition でk番目のスコアを求め、それ以上のものだけを並べ替える。
+        境界の同点は全部含めるので、全件を安定ソートした先頭と同じ並びになる
+        """
+        if k is None or k >= len(scores):
+            candidates = np.arange(len(scores))
         else:
-            return 0.5
-    
-    def _calculate_state_match(self, task: DailyTrioTask, state_analysis: Dict[str, Any]) -> float:
-        """?"""
-        score = 0.0
-        
-        # エラー
-        energy_category = state_analysis["energy_category"]
-        if energy_category == "high" and task.difficulty >= 3:
-            score += 0.3
-        elif energy_category == "medium" and 2 <= task.difficulty <= 3:
-            score += 0.3
-        elif energy_category == "low" and task.difficulty <= 2:
-            score += 0.3
-        
-        # ?
-        time_category = state_analysis["time_availability"]
-        if time_category == "limited" and task.estimated_duration <= 5:
-            score += 0.3
-        elif time_category == "moderate" and task.estimated_duration <= 10:
-            score += 0.3
-        elif time_category == "abundant":
-            score += 0.2
-        
-        # 治療
-        therapeutic_priority = state_analysis["therapeutic_priority"]
-        if therapeutic_priority == "engagement" and task.category == TaskCategory.THERAPEUTIC:
-            score += 0.4
-        elif therapeutic_priority == "momentum" and task.priority == TaskPriority.HIGH:
-            score += 0.4
-        elif therapeutic_priority == "consistency" and task.category == TaskCategory.HABIT:
-            score += 0.4
-        elif therapeutic_priority == "mastery" and task.difficulty >= 3:
-            score += 0.4
-        
-        return min(1.0, score)
-    
-    def _calculate_difficulty_balance(self, task: DailyTrioTask, state_analysis: Dict[str, Any]) -> float:
-        """?"""
-        preferred_difficulty = state_analysis["difficulty_preference"]
-        difficulty_diff = abs(task.difficulty - preferred_difficulty)
-        
-        # ?
-        return max(0.0, 1.0 - (difficulty_diff / 4.0))
+            kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            candidates = np.flatnonzero(scores >= kth_score)
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
     
-    def _calculate_variety_bonus(self, task: DailyTrioTask, user_state: UserState) -> float:
-        """?"""
-        # 実装
-        # こ
-        return 0.5
+    def _select_trio_from_scores(self, scores: np.ndarray, user_state: UserState) -> List[DailyTrioTask]:
+        """上位候補だけで多様性条件を満たす3つを選び、足りなければ全件で選び直す"""
+        max_time = min(user_state.available_time, 30)  # ?30?
+        ranked = self._rank_tasks(scores, TRIO_CANDIDATES)
+        scored_tasks = [(self.task_pool[index], scores[index]) for index in ranked]
+        selected, total_time = self._select_diverse_tasks(scored_tasks, max_time)
+        if len(selected) < TRIO_SIZE and len(ranked) < len(scores):
+            scored_tasks = [(self.task_pool[index], scores[index]) for index in self._rank_tasks(scores)]
+            selected, total_time = self._select_diverse_tasks(scored_tasks, max_time)
+        return self._fill_trio(selected, total_time, scored_tasks, max_time)
     
     def _select_optimal_trio(self, scored_tasks: List[tuple], user_state: UserState) -> List[DailyTrioTask]:
         """?3つ"""
+        max_time = min(user_state.available_time, 30)  # ?30?
+        selected, total_time = self._select_diverse_tasks(scored_tasks, max_time)
+        return self._fill_trio(selected, total_time, scored_tasks, max_time)
+    
+    def _select_diverse_tasks(self, scored_tasks: List[tuple], max_time: int) -> tuple:
+        """スコア順に、時間内かつ同じカテゴリ2つまでの条件で選ぶ"""
         selected = []
-        used_categories = set()
         total_time = 0
-        max_time = min(user_state.available_time, 30)  # ?30?
         
         for task, score in scored_tasks:
-            if len(selected) >= 3:
+            if len(selected) >= TRIO_SIZE:
                 break
             
             # ?
@@ -394,11 +518,14 @@ class DailyTrioEngine:
                 continue
             
             selected.append(task)
-            used_categories.add(task.category)
             total_time += task.estimated_duration
         
-        # 3つ
-        while len(selected) < 3 and total_time < max_time:
+        return selected, total_time
+    
+    def _fill_trio(self, selected: List[DailyTrioTask], total_time: int, scored_tasks: List[tuple],
+                   max_time: int) -> List[DailyTrioTask]:
+        """3つ"""
+        while len(selected) < TRIO_SIZE and total_time < max_time:
             for task, score in scored_tasks:
                 if task not in selected and total_time + task.estimated_duration <= max_time:
                     selected.append(task)
@@ -448,9 +575,18 @@ async def select_daily_trio(user_state: UserState):
     """Daily Trio自動"""
     return await daily_trio_engine.select_daily_trio(user_state)
 
+@app.post("/daily-trio/batch/precompute")
+async def precompute_daily_trios(request: BatchTrioRequest, date: Optional[str] = None):
+    """朝のプッシュ前に、アクティブユーザー全員のDaily Trioをまとめて計算する"""
+    return daily_trio_engine.precompute_daily_trios(request.user_states, date)
+
 @app.get("/daily-trio/{user_id}")
 async def get_daily_trio(user_id: str, date: Optional[str] = None):
     """Daily Trio?"""
+    precomputed = daily_trio_engine.get_precomputed_trio(user_id, date)
+    if precomputed is not None:
+        return precomputed
+    
     # 実装Daily Trioを
     # こ
     demo_user_state = UserState(
@@ -0,0 +1,180 @@
+"""
+Daily Trio Batch Scoring Tests
+
+- 行列演算のスコアがタスクごとのスカラー計算と一致する
+- 上位候補（argpartition）からの選択が全件ソートからの選択と一致する
+- 朝のプッシュ前の一括計算結果が GET で返る
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from main import (BatchTrioRequest, DailyTrioEngine, DailyTrioTask, TaskCategory, TaskFeatureMatrix,
+                  TaskPriority, UserState, get_daily_trio, precompute_daily_trios)
+
+STATES = ["APATHY", "INTEREST", "ACTION", "CONTINUATION", "HABITUATION"]
+GOALS = ["Self-Discipline", "Empathy", "Communication", "Courage", "Resilience", "Focus"]
+
+
+def random_user_states(count, seed=3):
+    rng = random.Random(seed)
+    return [
+        UserState(
+            user_id=f"user_{i}",
+            current_state=rng.choice(STATES),
+            mood_trend=round(rng.uniform(-1.0, 1.0), 2),
+            energy_level=rng.randint(1, 5),
+            available_time=rng.choice([5, 10, 14, 15, 20, 29, 30, 45]),
+            therapeutic_goals=rng.sample(GOALS, rng.randint(0, 3)),
+            completed_tasks_today=0,
+            streak_days=rng.randint(0, 12),
+            adhd_assist_level=1.1
+        )
+        for i in range(count)
+    ]
+
+
+def reference_score(engine, task, user_state):
+    """ベクトル化前のタスクごとのスコア計算"""
+    analysis = engine._analyze_user_state(user_state)
+    weights = engine.selection_weights
+
+    if task.therapeutic_focus in user_state.therapeutic_goals:
+        therapeutic = 1.0
+    elif task.category == TaskCategory.THERAPEUTIC:
+        therapeutic = 0.8
+    else:
+        therapeutic = 0.5
+
+    match = 0.0
+    energy = analysis["energy_category"]
+    if energy == "high" and task.difficulty >= 3:
+        match += 0.3
+    elif energy == "medium" and 2 <= task.difficulty <= 3:
+        match += 0.3
+    elif energy == "low" and task.difficulty <= 2:
+        match += 0.3
+    time_category = analysis["time_availability"]
+    if time_category == "limited" and task.estimated_duration <= 5:
+        match += 0.3
+    elif time_category == "moderate" and task.estimated_duration <= 10:
+        match += 0.3
+    elif time_category == "abundant":
+        match += 0.2
+    priority = analysis["therapeutic_priority"]
+    if priority == "engagement" and task.category == TaskCategory.THERAPEUTIC:
+        match += 0.4
+    elif priority == "momentum" and task.priority == TaskPriority.HIGH:
+        match += 0.4
+    elif priority == "consistency" and task.category == TaskCategory.HABIT:
+        match += 0.4
+    elif priority == "mastery" and task.difficulty >= 3:
+        match += 0.4
+    match = min(1.0, match)
+
+    difficulty = max(0.0, 1.0 - abs(task.difficulty - analysis["difficulty_preference"]) / 4.0)
+
+    score = 0.0
+    score += therapeutic * weights["therapeutic_alignment"]
+    score += match * weights["user_state_match"]
+    score += difficulty * weights["difficulty_balance"]
+    score += 0.5 * weights["variety_bonus"]
+    return score
+
+
+def large_engine(size=60, seed=5):
+    """多様性条件と argpartition の境界を試すための大きめのタスクプール"""
+    rng = random.Random(seed)
+    engine = DailyTrioEngine()
+    base = engine.task_pool
+    engine.task_pool = [
+        DailyTrioTask(**{**base[i % len(base)].dict(), "task_id": f"task_{i}",
+                         "category": rng.choice(list(TaskCategory)),
+                         "priority": rng.choice(list(TaskPriority)),
+                         "estimated_duration": rng.randint(1, 15),
+                         "difficulty": rng.randint(1, 5),
+                         "therapeutic_focus": rng.choice(GOALS)})
+        for i in range(size)
+    ]
+    engine.task_features = TaskFeatureMatrix(engine.task_pool)
+    return engine
+
+
+class TestBatchScoring:
+
+    def test_matrix_scores_match_scalar_scores(self):
+        engine = DailyTrioEngine()
+        user_states = random_user_states(200)
+        scores = engine.score_user_batch(user_states)
+
+        assert scores.shape == (200, len(engine.task_pool))
+        for row, user_state in enumerate(user_states):
+            expected = [reference_score(engine, task, user_state) for task in engine.task_pool]
+            assert scores[row].tolist() == expected
+
+    @pytest.mark.parametrize("engine_factory", [DailyTrioEngine, large_engine])
+    def test_top_k_selection_matches_full_sort(self, engine_factory):
+        engine = engine_factory()
+        user_states = random_user_states(300, seed=11)
+        scores = engine.score_user_batch(user_states)
+
+        for row, user_state in enumerate(user_states):
+            full_order = sorted(
+                [(task, reference_score(engine, task, user_state)) for task in engine.task_pool],
+                key=lambda x: x[1], reverse=True
+            )
+            expected = engine._select_optimal_trio(full_order, user_state)
+            selected = engine._select_trio_from_scores(scores[row], user_state)
+            assert [task.task_id for task in selected] == [task.task_id for task in expected]
+
+    def test_rank_tasks_keeps_ties_at_the_boundary(self):
+        engine = DailyTrioEngine()
+        scores = np.array([0.5, 0.9, 0.7, 0.7, 0.7, 0.1])
+
+        assert engine._rank_tasks(scores, 2).tolist() == [1, 2, 3, 4]
+        assert engine._rank_tasks(scores).tolist() == [1, 2, 3, 4, 0, 5]
+
+    def test_batch_selection_matches_single_selection(self):
+        engine = DailyTrioEngine()
+        user_states = random_user_states(50, seed=8)
+        batch = engine.select_daily_trio_batch(user_states, "2025-01-01")
+
+        for user_state, response in zip(user_states, batch):
+            scores = engine.score_user_batch([user_state])[0]
+            single = engine._select_trio_from_scores(scores, user_state)
+            assert response.user_id == user_state.user_id
+            assert [task.task_id for task in response.trio_tasks] == [task.task_id for task in single]
+            assert response.estimated_total_time <= min(user_state.available_time, 30)
+
+
+class TestPrecompute:
+
+    @pytest.mark.asyncio
+    async def test_precomputed_trio_is_served_for_the_day(self, monkeypatch):
+        import main
+        engine = DailyTrioEngine()
+        monkeypatch.setattr(main, "daily_trio_engine", engine)
+        user_states = random_user_states(20, seed=2)
+
+        result = await precompute_daily_trios(BatchTrioRequest(user_states=user_states), "2025-01-01")
+        assert result["computed_users"] == 20
+
+        served = await get_daily_trio("user_3", "2025-01-01")
+        assert served is engine.precomputed_trios["user_3"]
+        # 別の日は前計算を使わない
+        fallback = await get_daily_trio("user_3", "2025-01-02")
+        assert fallback is not served
+
+    def test_precompute_replaces_previous_days(self):
+        engine = DailyTrioEngine()
+        engine.precompute_daily_trios(random_user_states(5), "2025-01-01")
+        engine.precompute_daily_trios(random_user_states(3, seed=9), "2025-01-02")
+
+        assert len(engine.precomputed_trios) == 3
+        assert engine.get_precomputed_trio("user_4", "2025-01-01") is None
@@ -0,0 +1,66 @@
+"""
+フラグ評価アナリティクス 負荷テスト
+
+1,000万回の評価を FlagAnalytics に記録し、一定間隔で保持メモリ・
+記録スループット・集計レイテンシを出力する。リングが一周した後は
+評価回数が増えてもピークRSSは横ばいになる。
+
+Usage: python benchmark_flag_analytics.py [evaluations] [users]
+"""
+
+import sys
+import os
+import time
+import resource
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from flag_analytics import FlagAnalytics
+
+
+class SimulatedClock:
+    """1評価あたり一定時間進む時計（評価レートを再現）"""
+
+    def __init__(self, seconds_per_evaluation: float):
+        self.now = 1_700_000_000.0
+        self.step = seconds_per_evaluation
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def main(evaluations: int, users: int):
+    # 1,000万回で約2日分（保持期間24時間のリングが二周する）
+    clock = SimulatedClock(seconds_per_evaluation=2 * 86400 / evaluations)
+    analytics = FlagAnalytics(clock=clock)
+    flags = [f"flag_{i}" for i in range(6)]
+    values = [(True, "targeting_rule_match", "rule_a"), (False, "default_value", None),
+              ("variant_b", "targeting_rule_match", "rule_b")]
+    checkpoints = 10
+
+    print(f"evaluations={evaluations:,} users={users:,} flags={len(flags)}")
+    print(f"{'evaluations':>12} {'peak_rss_mb':>11} {'records/s':>12} {'summarize_ms':>13}")
+
+    chunk = evaluations // checkpoints
+    for checkpoint in range(1, checkpoints + 1):
+        start = time.perf_counter()
+        base = (checkpoint - 1) * chunk
+        for i in range(base, base + chunk):
+            clock.now += clock.step
+            value, reason, variation_id = values[i % 3]
+            analytics.record(flags[i % 6], f"user_{(i * 7919) % users}", value, reason,
+                             variation_id=variation_id, event=i)
+        rate = chunk / (time.perf_counter() - start)
+
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        start = time.perf_counter()
+        analytics.summarize(flags[0], hours=24)
+        summarize_ms = (time.perf_counter() - start) * 1000
+        print(f"{checkpoint * chunk:>12,} {peak_rss_mb:>11.1f} {rate:>12,.0f} {summarize_ms:>13.1f}")
+
+
+if __name__ == "__main__":
+    evaluations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    main(evaluations, users)
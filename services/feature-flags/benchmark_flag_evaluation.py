@@ -0,0 +1,68 @@
+"""
+フラグ評価ベンチマーク
+
+サービス側の evaluate_flag（コンパイル済み述語チェーン + 評価ログ）と
+SDK のローカル評価の1評価あたりの所要時間を比較する
+
+Usage: python benchmark_flag_evaluation.py [evaluations]
+"""
+
+import asyncio
+import sys
+import os
+import time
+import warnings
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, "../.."))
+
+from main import FeatureFlagEngine, UserContext
+from shared.utils.feature_flags import FeatureFlagClient
+
+
+async def measure_service(engine: FeatureFlagEngine, contexts, flag_keys, evaluations: int) -> float:
+    """1評価あたりのマイクロ秒（サービス側）"""
+    start = time.perf_counter()
+    for i in range(evaluations):
+        await engine.evaluate_flag(flag_keys[i % len(flag_keys)], contexts[i % len(contexts)])
+    return (time.perf_counter() - start) / evaluations * 1e6
+
+
+def measure_sdk(client: FeatureFlagClient, contexts, flag_keys, evaluations: int) -> float:
+    """1評価あたりのマイクロ秒（SDKローカル評価）"""
+    start = time.perf_counter()
+    for i in range(evaluations):
+        context = contexts[i % len(contexts)]
+        client.evaluate(flag_keys[i % len(flag_keys)], context.user_id, context.attributes)
+    return (time.perf_counter() - start) / evaluations * 1e6
+
+
+def main(evaluations: int):
+    warnings.simplefilter("ignore")
+
+    engine = FeatureFlagEngine()
+    client = FeatureFlagClient()
+    client.load_snapshot(engine.get_snapshot())
+
+    flag_keys = list(engine.flags)
+    contexts = [
+        UserContext(user_id=f"user_{i}", attributes={
+            "adhd_level": ["mild", "moderate", "severe"][i % 3],
+            "user_type": "beta_tester" if i % 7 == 0 else "standard",
+            "age": 18 + i % 50
+        })
+        for i in range(1000)
+    ]
+
+    print(f"evaluations={evaluations} flags={len(flag_keys)} users={len(contexts)}")
+
+    service_us = asyncio.run(measure_service(engine, contexts, flag_keys, evaluations))
+    sdk_us = measure_sdk(client, contexts, flag_keys, evaluations)
+
+    print(f"service evaluate_flag : {service_us:8.2f} us/evaluation")
+    print(f"SDK local evaluate    : {sdk_us:8.2f} us/evaluation")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,245 @@
+"""
+Feature Flag Service - 事前集計型の評価アナリティクス
+
+評価ごとのログを保持する代わりに、フラグ・バリアント・分単位の
+カウンタをリングバッファで保持する。ユニークユーザー数は時間単位の
+HyperLogLog で推定し、生イベントは固定サイズのリザーバにサンプリングする。
+メモリ使用量はフラグ数 × バリアント数 × 保持期間で上限が決まり、
+評価回数には依存しない。
+"""
+
+import hashlib
+import math
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# (variation_id, str(value), reason)
+CounterKey = Tuple[Optional[str], str, str]
+# (variation_id, str(value))
+VariantKey = Tuple[Optional[str], str]
+
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(65)]
+
+
+class HyperLogLog:
+    """ユニーク数推定（precision=12 で 4KB・標準誤差約1.6%）"""
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+        index = x >> (64 - self.precision)
+        remainder = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLogs with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(map(_INVERSE_POWERS.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # 小さい値は線形カウンティングで補正
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"], precision: int = 12) -> "HyperLogLog":
+        merged = cls(precision)
+        for sketch in sketches:
+            merged.merge(sketch)
+        return merged
+
+
+class ReservoirSample:
+    """固定サイズのリザーバサンプリング（Algorithm R）"""
+
+    __slots__ = ("size", "items", "seen", "_random")
+
+    def __init__(self, size: int, rng: Optional[random.Random] = None):
+        self.size = size
+        self.items: List[Any] = []
+        self.seen = 0
+        self._random = rng or random.Random()
+
+    def add(self, item: Any) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        index = self._random.randrange(self.seen)
+        if index < self.size:
+            self.items[index] = item
+
+
+class _MinuteBucket:
+    __slots__ = ("minute", "counts")
+
+    def __init__(self, minute: int):
+        self.minute = minute
+        self.counts: Dict[CounterKey, int] = {}
+
+
+class _HourBucket:
+    __slots__ = ("hour", "sketches")
+
+    def __init__(self, hour: int):
+        self.hour = hour
+        self.sketches: Dict[VariantKey, HyperLogLog] = {}
+
+
+class FlagAnalytics:
+    """
+    フラグ評価の事前集計ストア
+
+    分単位カウンタのリング（retention_hours * 60 スロット）と、時間単位の
+    HyperLogLog のリング（retention_hours スロット）をフラグごとに持つ。
+    集計は期間内のスロットのみを走査するため O(バケット数) で返る。
+    """
+
+    def __init__(self, retention_hours: int = 24, hll_precision: int = 12,
+                 sample_size: int = 1000, clock: Callable[[], float] = time.time,
+                 rng: Optional[random.Random] = None):
+        self.retention_hours = retention_hours
+        self.retention_minutes = retention_hours * 60
+        self.hll_precision = hll_precision
+        self.sample_size = sample_size
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._minute_rings: Dict[str, List[Optional[_MinuteBucket]]] = {}
+        self._hour_rings: Dict[str, List[Optional[_HourBucket]]] = {}
+        self._samples: Dict[str, ReservoirSample] = {}
+        self.total_evaluations = 0
+
+    def record(self, flag_key: str, user_id: str, value: Any, reason: str,
+               variation_id: Optional[str] = None, event: Any = None) -> None:
+        """評価1件をカウンタ・HLL・リザーバに反映"""
+        now = self._clock()
+        minute = int(now // 60)
+        hour = minute // 60
+        value_key = str(value)
+
+        minute_ring = self._minute_rings.get(flag_key)
+        if minute_ring is None:
+            minute_ring = self._minute_rings[flag_key] = [None] * self.retention_minutes
+        slot = minute % self.retention_minutes
+        minute_bucket = minute_ring[slot]
+        if minute_bucket is None or minute_bucket.minute != minute:
+            minute_bucket = minute_ring[slot] = _MinuteBucket(minute)
+        counter_key = (variation_id, value_key, reason)
+        minute_bucket.counts[counter_key] = minute_bucket.counts.get(counter_key, 0) + 1
+
+        hour_ring = self._hour_rings.get(flag_key)
+        if hour_ring is None:
+            hour_ring = self._hour_rings[flag_key] = [None] * self.retention_hours
+        slot = hour % self.retention_hours
+        hour_bucket = hour_ring[slot]
+        if hour_bucket is None or hour_bucket.hour != hour:
+            hour_bucket = hour_ring[slot] = _HourBucket(hour)
+        variant_key = (variation_id, value_key)
+        sketch = hour_bucket.sketches.get(variant_key)
+        if sketch is None:
+            sketch = hour_bucket.sketches[variant_key] = HyperLogLog(self.hll_precision)
+        sketch.add(user_id)
+
+        if self.sample_size and event is not None:
+            sample = self._samples.get(flag_key)
+            if sample is None:
+                sample = self._samples[flag_key] = ReservoirSample(self.sample_size, self._rng)
+            sample.add(event)
+
+        self.total_evaluations += 1
+
+    def _counts(self, flag_key: str, hours: int) -> Dict[CounterKey, int]:
+        ring = self._minute_rings.get(flag_key)
+        if ring is None:
+            return {}
+        current = int(self._clock() // 60)
+        oldest = current - min(hours * 60, self.retention_minutes)
+        totals: Dict[CounterKey, int] = {}
+        for bucket in ring:
+            if bucket is None or not oldest < bucket.minute <= current:
+                continue
+            for key, count in bucket.counts.items():
+                totals[key] = totals.get(key, 0) + count
+        return totals
+
+    def _sketches(self, flag_key: str, hours: int) -> Dict[VariantKey, HyperLogLog]:
+        """期間内の時間バケットをバリアントごとにマージ（時間単位の粒度）"""
+        ring = self._hour_rings.get(flag_key)
+        if ring is None:
+            return {}
+        current = int(self._clock() // 3600)
+        oldest = current - min(max(1, math.ceil(hours)), self.retention_hours)
+        merged: Dict[VariantKey, HyperLogLog] = {}
+        for bucket in ring:
+            if bucket is None or not oldest < bucket.hour <= current:
+                continue
+            for key, sketch in bucket.sketches.items():
+                if key not in merged:
+                    merged[key] = HyperLogLog(self.hll_precision)
+                merged[key].merge(sketch)
+        return merged
+
+    def summarize(self, flag_key: str, hours: int = 24) -> Dict[str, Any]:
+        """期間内の評価数・ユニークユーザー推定・値/理由/バリアント分布"""
+        counts = self._counts(flag_key, hours)
+        sketches = self._sketches(flag_key, hours)
+
+        value_distribution: Dict[str, int] = {}
+        reason_distribution: Dict[str, int] = {}
+        variation_counts: Dict[Optional[str], int] = {}
+        for (variation_id, value_key, reason), count in counts.items():
+            value_distribution[value_key] = value_distribution.get(value_key, 0) + count
+            reason_distribution[reason] = reason_distribution.get(reason, 0) + count
+            variation_counts[variation_id] = variation_counts.get(variation_id, 0) + count
+
+        variation_sketches: Dict[Optional[str], HyperLogLog] = {}
+        for (variation_id, _), sketch in sketches.items():
+            if variation_id not in variation_sketches:
+                variation_sketches[variation_id] = HyperLogLog(self.hll_precision)
+            variation_sketches[variation_id].merge(sketch)
+
+        return {
+            "total_evaluations": sum(counts.values()),
+            "unique_users": HyperLogLog.union(sketches.values(), self.hll_precision).count(),
+            "value_distribution": value_distribution,
+            "reason_distribution": reason_distribution,
+            "variations": {
+                variation_id: {
+                    "evaluations": count,
+                    "unique_users": variation_sketches[variation_id].count()
+                    if variation_id in variation_sketches else 0
+                }
+                for variation_id, count in variation_counts.items()
+            }
+        }
+
+    def sampled_events(self, flag_key: str) -> List[Any]:
+        sample = self._samples.get(flag_key)
+        return list(sample.items) if sample is not None else []
+
+    def forget(self, flag_key: str) -> None:
+        self._minute_rings.pop(flag_key, None)
+        self._hour_rings.pop(flag_key, None)
+        self._samples.pop(flag_key, None)
+
+
+__all__ = [
+    'HyperLogLog',
+    'ReservoirSample',
+    'FlagAnalytics',
+]
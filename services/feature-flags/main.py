@@ -7,20 +7,26 @@ Feature Flag Service - A/B?Kill-Switch基本
 - リスト
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from enum import Enum
+import asyncio
 import logging
 import uuid
 import json
-import hashlib
 
 # 共有
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from shared.utils.feature_flags import BUCKETING_MD5, CompiledFlag, bucket_for_user, compile_flag
+from flag_analytics import FlagAnalytics
 
 app = FastAPI(title="Feature Flag Service", version="1.0.0")
 logger = logging.getLogger(__name__)
@@ -53,6 +59,8 @@ class FeatureFlag(BaseModel):
     updated_at: datetime
     tags: List[str] = []
     therapeutic_safety_level: str = "low"  # low, medium, high, critical
+    bucketing_salt: Optional[str] = None  # バケット割り当て用ソルト（未指定時はflag_key）
+    bucketing_version: int = BUCKETING_MD5  # 1: md5（従来の割り当て）, 2: crc32（明示的に切り替えた場合のみ）
 
 class UserContext(BaseModel):
     user_id: str
@@ -85,9 +93,14 @@ class FeatureFlagEngine:
     def __init__(self):
         self.flags = {}  # 実装Redis/Firestoreを
         self.ab_tests = {}
-        self.evaluations_log = []  # ?
+        self.analytics = FlagAnalytics()  # 分単位カウンタ・HLL・サンプリングによる評価集計
         self.kill_switches = {}  # ?
         
+        # コンパイル済みフラグ（flag_key -> (元フラグ, フィンガープリント, 述語チェーン)）
+        self._compiled: Dict[str, Tuple[FeatureFlag, Tuple[Any, ...], CompiledFlag]] = {}
+        self.version = 0
+        self._version_waiters: List[asyncio.Future] = []
+        
         # 治療
         self.safety_thresholds = {
             "critical": {"max_rollout_per_hour": 0.01, "require_approval": True},
@@ -203,6 +216,76 @@ class FeatureFlagEngine:
         
         for flag in default_flags:
             self.flags[flag.flag_key] = flag
+        self.sync_compiled_flags()
+    
+    @staticmethod
+    def _flag_fingerprint(flag: FeatureFlag) -> Tuple[Any, ...]:
+        return (flag.updated_at, flag.enabled, flag.kill_switch_active,
+                flag.bucketing_salt, flag.bucketing_version)
+    
+    def _get_compiled_flag(self, flag_key: str) -> Optional[CompiledFlag]:
+        """コンパイル済みフラグ取得（フラグが変更されていれば再コンパイル）"""
+        flag = self.flags.get(flag_key)
+        if flag is None:
+            return None
+        
+        cached = self._compiled.get(flag_key)
+        if cached is not None and cached[0] is flag and cached[1] == self._flag_fingerprint(flag):
+            return cached[2]
+        
+        # 新規または更新されたフラグをコンパイル
+        compiled = compile_flag(flag.dict())
+        self._compiled[flag_key] = (flag, self._flag_fingerprint(flag), compiled)
+        self._bump_version()
+        return compiled
+    
+    def _bump_version(self):
+        self.version += 1
+        waiters, self._version_waiters = self._version_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(self.version)
+    
+    def sync_compiled_flags(self) -> int:
+        """全フラグのコンパイル状態を同期し、現在のバージョンを返す"""
+        for flag_key in list(self._compiled):
+            if flag_key not in self.flags:
+                del self._compiled[flag_key]
+                self._bump_version()
+        for flag_key in self.flags:
+            self._get_compiled_flag(flag_key)
+        return self.version
+    
+    def upsert_flag(self, flag: FeatureFlag):
+        """フラグ作成・更新（再コンパイルしてバージョンを更新）"""
+        flag.updated_at = datetime.now()
+        self.flags[flag.flag_key] = flag
+        self._get_compiled_flag(flag.flag_key)
+    
+    def get_snapshot(self) -> Dict[str, Any]:
+        """SDK向けのバージョン付きスナップショット"""
+        version = self.sync_compiled_flags()
+        return {
+            "version": version,
+            "flags": [compiled.definition for _, _, compiled in self._compiled.values()],
+            "generated_at": datetime.now().isoformat()
+        }
+    
+    async def wait_for_change(self, known_version: int, timeout: float) -> int:
+        """バージョンが変わるまで待機（ロングポーリング用）"""
+        if self.sync_compiled_flags() != known_version:
+            return self.version
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._version_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if waiter in self._version_waiters:
+                self._version_waiters.remove(waiter)
+        return self.sync_compiled_flags()
     
     async def evaluate_flag(self, flag_key: str, user_context: UserContext, default_value: Any = None) -> FlagEvaluation:
         """?"""
@@ -217,57 +300,22 @@ class FeatureFlagEngine:
                     timestamp=datetime.now()
                 )
             
-            flag = self.flags[flag_key]
-            
-            # Kill Switch ?
-            if flag.kill_switch_active:
-                return FlagEvaluation(
-                    flag_key=flag_key,
-                    value=flag.default_value,
-                    reason="kill_switch_active",
-                    user_id=user_context.user_id,
-                    timestamp=datetime.now()
-                )
-            
-            # ?
-            if not flag.enabled:
-                return FlagEvaluation(
-                    flag_key=flag_key,
-                    value=flag.default_value,
-                    reason="flag_disabled",
-                    user_id=user_context.user_id,
-                    timestamp=datetime.now()
-                )
-            
-            # タスク
-            for rule in sorted(flag.targeting_rules, key=lambda r: r.priority):
-                if await self._evaluate_targeting_rule(rule, user_context):
-                    # ?
-                    if self._is_user_in_percentage(user_context.user_id, flag_key, rule.percentage):
-                        evaluation = FlagEvaluation(
-                            flag_key=flag_key,
-                            value=rule.value,
-                            variation_id=rule.rule_id,
-                            reason="targeting_rule_match",
-                            rule_matched=rule.name,
-                            user_id=user_context.user_id,
-                            timestamp=datetime.now()
-                        )
-                        
-                        # ?
-                        self.evaluations_log.append(evaluation)
-                        return evaluation
-            
-            # デフォルト
+            compiled = self._get_compiled_flag(flag_key)
+            result = compiled.evaluate(user_context.user_id, user_context.attributes)
             evaluation = FlagEvaluation(
                 flag_key=flag_key,
-                value=flag.default_value,
-                reason="default_value",
+                value=result.value,
+                variation_id=result.variation_id,
+                reason=result.reason,
+                rule_matched=result.rule_matched,
                 user_id=user_context.user_id,
                 timestamp=datetime.now()
             )
             
-            self.evaluations_log.append(evaluation)
+            # 評価集計
+            if result.reason in ("targeting_rule_match", "default_value"):
+                self.analytics.record(flag_key, user_context.user_id, result.value, result.reason,
+                                      variation_id=result.variation_id, event=evaluation)
             return evaluation
             
         except Exception as e:
@@ -280,41 +328,19 @@ class FeatureFlagEngine:
                 timestamp=datetime.now()
             )
     
-    async def _evaluate_targeting_rule(self, rule: TargetingRule, user_context: UserContext) -> bool:
-        """タスク"""
-        for condition in rule.conditions:
-            attribute = condition.get("attribute")
-            operator = condition.get("operator")
-            expected_value = condition.get("value")
-            
-            if attribute not in user_context.attributes:
-                return False
-            
-            actual_value = user_context.attributes[attribute]
-            
-            if operator == "equals" and actual_value != expected_value:
-                return False
-            elif operator == "not_equals" and actual_value == expected_value:
-                return False
-            elif operator == "greater_than" and actual_value <= expected_value:
-                return False
-            elif operator == "less_than" and actual_value >= expected_value:
-                return False
-            elif operator == "contains" and expected_value not in str(actual_value):
-                return False
-            elif operator == "in" and actual_value not in expected_value:
-                return False
-        
-        return True
+    async def evaluate_flags(self, flag_keys: List[str], user_context: UserContext) -> Dict[str, FlagEvaluation]:
+        """複数フラグの一括評価"""
+        return {
+            flag_key: await self.evaluate_flag(flag_key, user_context)
+            for flag_key in flag_keys
+        }
     
     def _is_user_in_percentage(self, user_id: str, flag_key: str, percentage: float) -> bool:
-        """ユーザー"""
-        # ユーザーIDと
-        hash_input = f"{user_id}:{flag_key}"
-        hash_value = int(hashlib.md5(hash_input.encode()).hexdigest(), 16)
-        user_percentage = (hash_value % 10000) / 10000.0
-        
-        return user_percentage < percentage
+        """ユーザーがロールアウト割合に含まれるか（コンパイル済みフラグと同じバケットを使用）"""
+        compiled = self._get_compiled_flag(flag_key)
+        if compiled is None:
+            return bucket_for_user(user_id, flag_key) < percentage
+        return compiled.bucket(user_id) < percentage
     
     async def create_ab_test(self, ab_test: ABTestConfig) -> Dict[str, Any]:
         """A/B?"""
@@ -357,7 +383,7 @@ class FeatureFlagEngine:
                 tags=["ab_test", ab_test.test_id]
             )
             
-            self.flags[ab_test.flag_key] = flag
+            self.upsert_flag(flag)
             self.ab_tests[ab_test.test_id] = ab_test
             
             return {
@@ -408,7 +434,7 @@ class FeatureFlagEngine:
             
             flag = self.flags[flag_key]
             flag.kill_switch_active = True
-            flag.updated_at = datetime.now()
+            self.upsert_flag(flag)
             
             # Kill Switch?
             kill_switch_record = {
@@ -442,7 +468,7 @@ class FeatureFlagEngine:
             
             flag = self.flags[flag_key]
             flag.kill_switch_active = False
-            flag.updated_at = datetime.now()
+            self.upsert_flag(flag)
             
             # Kill Switch?
             if flag_key in self.kill_switches:
@@ -463,16 +489,10 @@ class FeatureFlagEngine:
             raise HTTPException(status_code=500, detail="Kill Switch?")
     
     async def get_flag_analytics(self, flag_key: str, hours: int = 24) -> Dict[str, Any]:
-        """?"""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
+        """フラグ評価の集計（事前集計済みバケットから O(バケット数) で算出）"""
+        summary = self.analytics.summarize(flag_key, hours)
         
-        # ?
-        relevant_evaluations = [
-            eval for eval in self.evaluations_log
-            if eval.flag_key == flag_key and eval.timestamp > cutoff_time
-        ]
-        
-        if not relevant_evaluations:
+        if not summary["total_evaluations"]:
             return {
                 "flag_key": flag_key,
                 "period_hours": hours,
@@ -482,28 +502,48 @@ class FeatureFlagEngine:
                 "reason_distribution": {}
             }
         
-        # ?
-        unique_users = len(set(eval.user_id for eval in relevant_evaluations))
+        return {
+            "flag_key": flag_key,
+            "period_hours": hours,
+            "total_evaluations": summary["total_evaluations"],
+            "unique_users": summary["unique_users"],  # HyperLogLog推定値
+            "value_distribution": summary["value_distribution"],
+            "reason_distribution": summary["reason_distribution"],
+            "kill_switch_active": self.flags[flag_key].kill_switch_active if flag_key in self.flags else False
+        }
+    
+    async def get_ab_test_summary(self, test_id: str, hours: int = 24) -> Dict[str, Any]:
+        """A/Bテストのバリアント別集計"""
+        if test_id not in self.ab_tests:
+            raise HTTPException(status_code=404, detail="A/B test not found")
         
-        value_distribution = {}
-        reason_distribution = {}
+        ab_test = self.ab_tests[test_id]
+        summary = self.analytics.summarize(ab_test.flag_key, hours)
+        total = summary["total_evaluations"]
         
-        for eval in relevant_evaluations:
-            # ?
-            value_key = str(eval.value)
-            value_distribution[value_key] = value_distribution.get(value_key, 0) + 1
-            
-            # 理
-            reason_distribution[eval.reason] = reason_distribution.get(eval.reason, 0) + 1
+        variations = {}
+        for variation in ab_test.variations:
+            stats = summary["variations"].get(f"{test_id}_{variation['id']}",
+                                              {"evaluations": 0, "unique_users": 0})
+            variations[variation["id"]] = {
+                "value": variation["value"],
+                "target_allocation": ab_test.traffic_allocation.get(variation["id"], 0.0),
+                "evaluations": stats["evaluations"],
+                "unique_users": stats["unique_users"],
+                "observed_share": stats["evaluations"] / total if total else 0.0
+            }
+        
+        # どのバリアントにも割り当てられなかった評価（デフォルト値）
+        unassigned = summary["variations"].get(None, {"evaluations": 0, "unique_users": 0})
         
         return {
-            "flag_key": flag_key,
+            "test_id": test_id,
+            "flag_key": ab_test.flag_key,
             "period_hours": hours,
-            "total_evaluations": len(relevant_evaluations),
-            "unique_users": unique_users,
-            "value_distribution": value_distribution,
-            "reason_distribution": reason_distribution,
-            "kill_switch_active": self.flags[flag_key].kill_switch_active if flag_key in self.flags else False
+            "total_evaluations": total,
+            "unique_users": summary["unique_users"],
+            "variations": variations,
+            "unassigned": unassigned
         }
 
 # ?
@@ -519,11 +559,7 @@ async def evaluate_flag(flag_key: str, user_context: UserContext, default_value:
 @app.post("/flags/evaluate-batch")
 async def evaluate_flags_batch(flag_keys: List[str], user_context: UserContext):
     """?"""
-    results = {}
-    
-    for flag_key in flag_keys:
-        evaluation = await feature_flag_engine.evaluate_flag(flag_key, user_context)
-        results[flag_key] = evaluation
+    results = await feature_flag_engine.evaluate_flags(flag_keys, user_context)
     
     return {
         "user_id": user_context.user_id,
@@ -539,6 +575,24 @@ async def list_flags():
         "total_count": len(feature_flag_engine.flags)
     }
 
+@app.get("/flags/snapshot")
+async def get_flags_snapshot(request: Request, wait: float = 0.0):
+    """SDK用スナップショット（ETag / ロングポーリング対応）"""
+    known_etag = request.headers.get("if-none-match")
+    if known_etag and wait > 0:
+        try:
+            known_version = int(known_etag.strip('W/"'))
+        except ValueError:
+            known_version = -1
+        await feature_flag_engine.wait_for_change(known_version, timeout=min(wait, 60.0))
+    
+    snapshot = feature_flag_engine.get_snapshot()
+    etag = f'"{snapshot["version"]}"'
+    if known_etag == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return JSONResponse(content=jsonable_encoder(snapshot), headers={"ETag": etag})
+
 @app.get("/flags/{flag_key}")
 async def get_flag(flag_key: str):
     """?"""
@@ -575,6 +629,21 @@ async def get_flag_analytics(flag_key: str, hours: int = 24):
     """?"""
     return await feature_flag_engine.get_flag_analytics(flag_key, hours)
 
+@app.get("/ab-tests/{test_id}/summary")
+async def get_ab_test_summary(test_id: str, hours: int = 24):
+    """A/Bテストのバリアント別集計"""
+    return await feature_flag_engine.get_ab_test_summary(test_id, hours)
+
+@app.get("/flags/{flag_key}/analytics/samples")
+async def get_flag_evaluation_samples(flag_key: str):
+    """サンプリングされた評価イベント"""
+    samples = feature_flag_engine.analytics.sampled_events(flag_key)
+    return {
+        "flag_key": flag_key,
+        "samples": samples,
+        "sample_count": len(samples)
+    }
+
 @app.get("/health")
 async def health_check():
     """ヘルパー"""
@@ -582,7 +651,7 @@ async def health_check():
         "status": "healthy",
         "total_flags": len(feature_flag_engine.flags),
         "active_kill_switches": len([k for k, v in feature_flag_engine.kill_switches.items() if "deactivated_at" not in v]),
-        "total_evaluations": len(feature_flag_engine.evaluations_log),
+        "total_evaluations": feature_flag_engine.analytics.total_evaluations,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Feature Flag Service - 評価アナリティクスのテスト
+分単位リング・HyperLogLog・リザーバサンプリング・A/B集計・メモリ上限
+"""
+
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from flag_analytics import FlagAnalytics, HyperLogLog, ReservoirSample
+from main import ABTestConfig, FeatureFlagEngine, UserContext
+
+
+class FakeClock:
+    def __init__(self, start: float = 1_700_000_000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSketches:
+    """HyperLogLog とリザーバ"""
+
+    def test_hyperloglog_small_counts_are_exact(self):
+        hll = HyperLogLog()
+        for i in range(50):
+            hll.add(f"user_{i}")
+            hll.add(f"user_{i}")
+
+        assert hll.count() == 50
+
+    def test_hyperloglog_error_within_bounds(self):
+        hll = HyperLogLog()
+        for i in range(100000):
+            hll.add(f"user_{i}")
+
+        assert abs(hll.count() - 100000) / 100000 < 0.05
+
+    def test_hyperloglog_merge_is_union(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            first.add(f"user_{i}")
+        for i in range(2000, 5000):
+            second.add(f"user_{i}")
+
+        merged = HyperLogLog.union([first, second])
+        assert abs(merged.count() - 5000) / 5000 < 0.05
+
+    def test_reservoir_is_bounded_and_uniform(self):
+        hits = [0] * 10
+        for seed in range(200):
+            sample = ReservoirSample(5, random.Random(seed))
+            for i in range(10):
+                sample.add(i)
+            assert len(sample.items) == 5
+            for item in sample.items:
+                hits[item] += 1
+
+        assert min(hits) > 60 and max(hits) < 140
+
+
+class TestFlagAnalytics:
+    """分単位リングの集計"""
+
+    def test_summary_matches_exact_counts(self):
+        clock = FakeClock()
+        analytics = FlagAnalytics(clock=clock, rng=random.Random(1))
+        rng = random.Random(3)
+        expected_values, expected_reasons, users = {}, {}, set()
+
+        for i in range(5000):
+            clock.now += 1.3
+            user_id = f"user_{rng.randrange(800)}"
+            value = rng.choice([True, False])
+            reason = "targeting_rule_match" if value else "default_value"
+            analytics.record("flag", user_id, value, reason, event=i)
+            expected_values[str(value)] = expected_values.get(str(value), 0) + 1
+            expected_reasons[reason] = expected_reasons.get(reason, 0) + 1
+            users.add(user_id)
+
+        summary = analytics.summarize("flag", hours=24)
+        assert summary["total_evaluations"] == 5000
+        assert summary["value_distribution"] == expected_values
+        assert summary["reason_distribution"] == expected_reasons
+        assert abs(summary["unique_users"] - len(users)) / len(users) < 0.05
+        assert len(analytics.sampled_events("flag")) == 1000
+
+    def test_old_buckets_leave_the_window(self):
+        clock = FakeClock()
+        analytics = FlagAnalytics(retention_hours=2, clock=clock)
+
+        analytics.record("flag", "u1", True, "default_value")
+        clock.now += 90 * 60
+        analytics.record("flag", "u2", True, "default_value")
+
+        assert analytics.summarize("flag", hours=1)["total_evaluations"] == 1
+        assert analytics.summarize("flag", hours=2)["total_evaluations"] == 2
+
+        clock.now += 2 * 3600
+        analytics.record("flag", "u3", False, "default_value")
+        summary = analytics.summarize("flag", hours=24)
+        assert summary["total_evaluations"] == 1
+        assert summary["value_distribution"] == {"False": 1}
+        assert summary["unique_users"] == 1
+
+    def test_memory_flat_as_evaluations_grow(self):
+        clock = FakeClock()
+        analytics = FlagAnalytics(retention_hours=1, clock=clock, sample_size=100)
+        flags = [f"flag_{i}" for i in range(3)]
+
+        def run(evaluations: int):
+            for i in range(evaluations):
+                clock.now += 0.05
+                analytics.record(flags[i % 3], f"user_{i % 5000}", i % 2 == 0, "default_value",
+                                 variation_id=f"v{i % 2}", event=i)
+
+        # リングが一周するまで流してから計測する
+        run(100000)
+        gc.collect()
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        run(200000)
+        gc.collect()
+        grown, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert analytics.total_evaluations == 300000
+        assert grown - baseline < 512 * 1024
+
+
+class TestEngineAnalytics:
+    """FeatureFlagEngine 経由の集計"""
+
+    @pytest.mark.asyncio
+    async def test_flag_analytics_from_aggregates(self):
+        engine = FeatureFlagEngine()
+        for i in range(40):
+            context = UserContext(user_id=f"user_{i % 20}", attributes={"adhd_level": "moderate"})
+            await engine.evaluate_flag("daily_trio_enabled", context)
+
+        analytics = await engine.get_flag_analytics("daily_trio_enabled", hours=1)
+
+        assert analytics["total_evaluations"] == 40
+        assert analytics["unique_users"] == 20
+        assert sum(analytics["value_distribution"].values()) == 40
+        assert len(engine.analytics.sampled_events("daily_trio_enabled")) == 40
+
+        empty = await engine.get_flag_analytics("unknown_flag")
+        assert empty["total_evaluations"] == 0
+
+    @pytest.mark.asyncio
+    async def test_ab_test_summary(self):
+        engine = FeatureFlagEngine()
+        await engine.create_ab_test(ABTestConfig(
+            test_id="trio_copy",
+            name="Trio copy",
+            description="",
+            flag_key="trio_copy_test",
+            variations=[{"id": "control", "value": "a"}, {"id": "treatment", "value": "b"}],
+            traffic_allocation={"control": 0.5, "treatment": 0.5},
+            targeting_rules=[],
+            start_date=datetime.now(),
+            end_date=datetime.now() + timedelta(days=7)
+        ))
+
+        for i in range(2000):
+            await engine.evaluate_flag("trio_copy_test", UserContext(user_id=f"user_{i}", attributes={}))
+
+        summary = await engine.get_ab_test_summary("trio_copy", hours=1)
+        variations = summary["variations"]
+
+        assert summary["total_evaluations"] == 2000
+        assert variations["control"]["evaluations"] + variations["treatment"]["evaluations"] \
+            + summary["unassigned"]["evaluations"] == 2000
+        assert 0.45 < variations["control"]["observed_share"] < 0.55
+        assert abs(variations["control"]["unique_users"] - variations["control"]["evaluations"]) \
+            <= 0.05 * variations["control"]["evaluations"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
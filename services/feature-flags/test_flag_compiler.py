@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Feature Flag Service - コンパイル済みフラグとSDKのテスト
+述語チェーン評価・安定バケット・再コンパイル・スナップショット配信
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, "../.."))
+
+from main import FeatureFlag, FeatureFlagEngine, TargetingRule, UserContext, app
+from shared.utils.feature_flags import (
+    BUCKETING_CRC32, FeatureFlagClient, bucket_for_user, compile_flag
+)
+
+
+def reference_rule_matches(rule: TargetingRule, attributes: dict) -> bool:
+    """コンパイル前の条件解釈"""
+    for condition in rule.conditions:
+        attribute = condition.get("attribute")
+        operator = condition.get("operator")
+        expected_value = condition.get("value")
+        if attribute not in attributes:
+            return False
+        actual_value = attributes[attribute]
+        if operator == "equals" and actual_value != expected_value:
+            return False
+        elif operator == "not_equals" and actual_value == expected_value:
+            return False
+        elif operator == "greater_than" and actual_value <= expected_value:
+            return False
+        elif operator == "less_than" and actual_value >= expected_value:
+            return False
+        elif operator == "contains" and expected_value not in str(actual_value):
+            return False
+        elif operator == "in" and actual_value not in expected_value:
+            return False
+    return True
+
+
+def reference_in_percentage(user_id: str, flag_key: str, percentage: float) -> bool:
+    """従来の md5 によるバケット判定"""
+    hash_value = int(hashlib.md5(f"{user_id}:{flag_key}".encode()).hexdigest(), 16)
+    return (hash_value % 10000) / 10000.0 < percentage
+
+
+async def reference_evaluate(engine: FeatureFlagEngine, flag_key: str, user_context: UserContext):
+    """コンパイル前の評価ロジック（ルールごとに条件を解釈）"""
+    flag = engine.flags[flag_key]
+    if flag.kill_switch_active:
+        return flag.default_value, "kill_switch_active"
+    if not flag.enabled:
+        return flag.default_value, "flag_disabled"
+    for rule in sorted(flag.targeting_rules, key=lambda r: r.priority):
+        if reference_rule_matches(rule, user_context.attributes):
+            if reference_in_percentage(user_context.user_id, flag_key, rule.percentage):
+                return rule.value, "targeting_rule_match"
+    return flag.default_value, "default_value"
+
+
+def random_context(rng: random.Random, index: int) -> UserContext:
+    attributes = {
+        "adhd_level": rng.choice(["mild", "moderate", "severe"]),
+        "user_type": rng.choice(["standard", "beta_tester"]),
+        "therapeutic_state": rng.choice(["ACTION", "CONTINUATION", "STABILIZED"]),
+        "age": rng.randint(13, 70)
+    }
+    if rng.random() < 0.2:
+        del attributes["adhd_level"]
+    return UserContext(user_id=f"user_{index}", attributes=attributes)
+
+
+class TestCompiledEvaluation:
+    """述語チェーン評価"""
+
+    @pytest.mark.asyncio
+    async def test_compiled_matches_reference(self):
+        engine = FeatureFlagEngine()
+        rng = random.Random(7)
+
+        for index in range(500):
+            user_context = random_context(rng, index)
+            for flag_key in engine.flags:
+                evaluation = await engine.evaluate_flag(flag_key, user_context)
+                expected = await reference_evaluate(engine, flag_key, user_context)
+                assert (evaluation.value, evaluation.reason) == expected
+
+    def test_default_bucket_is_legacy_md5(self):
+        for i in range(200):
+            for flag_key in ["daily_trio_enabled", "gradual_test"]:
+                for percentage in [0.1, 0.5, 0.9]:
+                    assert (bucket_for_user(f"user_{i}", flag_key) < percentage) == \
+                        reference_in_percentage(f"user_{i}", flag_key, percentage)
+
+        engine = FeatureFlagEngine()
+        assert engine._is_user_in_percentage("user_7", "daily_trio_enabled", 0.5) == \
+            reference_in_percentage("user_7", "daily_trio_enabled", 0.5)
+        assert engine._is_user_in_percentage("user_7", "unknown_flag", 0.5) == \
+            reference_in_percentage("user_7", "unknown_flag", 0.5)
+
+    @pytest.mark.parametrize("version", [1, 2])
+    def test_bucket_is_stable_and_salted(self, version):
+        assert bucket_for_user("user_1", "daily_trio_enabled", version) == \
+            bucket_for_user("user_1", "daily_trio_enabled", version)
+        assert 0.0 <= bucket_for_user("user_1", "daily_trio_enabled", version) < 1.0
+
+        buckets = [bucket_for_user(f"user_{i}", "flag_a", version) for i in range(2000)]
+        other = [bucket_for_user(f"user_{i}", "flag_b", version) for i in range(2000)]
+        assert buckets != other
+        assert 0.45 < sum(b < 0.5 for b in buckets) / len(buckets) < 0.55
+
+    def test_crc32_bucketing_is_opt_in_per_flag(self):
+        # crc32 は実装・プロセスに依存しない固定値
+        assert bucket_for_user("user_1", "flag", BUCKETING_CRC32) == 0.7411
+        assert bucket_for_user("user_42", "daily_trio_enabled", BUCKETING_CRC32) == 0.1278
+
+        rules = [{"rule_id": "half", "name": "half", "priority": 1, "percentage": 0.5,
+                  "value": True, "conditions": []}]
+        legacy = compile_flag({"flag_key": "f", "default_value": False, "targeting_rules": rules})
+        opted_in = compile_flag({"flag_key": "f", "default_value": False, "targeting_rules": rules,
+                                 "bucketing_version": BUCKETING_CRC32})
+
+        assert legacy.bucketing_version == 1
+        assert [legacy.bucket(f"u{i}") for i in range(50)] == [bucket_for_user(f"u{i}", "f") for i in range(50)]
+        assert [opted_in.bucket(f"u{i}") for i in range(50)] == \
+            [bucket_for_user(f"u{i}", "f", BUCKETING_CRC32) for i in range(50)]
+        with pytest.raises(ValueError):
+            compile_flag({"flag_key": "f", "bucketing_version": 3})
+
+    def test_rules_sorted_once_with_stable_order(self):
+        definition = {
+            "flag_key": "f",
+            "default_value": "default",
+            "targeting_rules": [
+                {"rule_id": "late", "name": "late", "priority": 2, "percentage": 1.0,
+                 "value": "late", "conditions": []},
+                {"rule_id": "first", "name": "first", "priority": 1, "percentage": 1.0,
+                 "value": "first", "conditions": [{"attribute": "x", "operator": "equals", "value": 1}]},
+                {"rule_id": "second", "name": "second", "priority": 1, "percentage": 1.0,
+                 "value": "second", "conditions": []}
+            ]
+        }
+        compiled = compile_flag(definition)
+
+        assert [rule.rule_id for rule in compiled.rules] == ["first", "second", "late"]
+        assert compiled.evaluate("u", {"x": 1}).value == "first"
+        assert compiled.evaluate("u", {"x": 2}).value == "second"
+
+
+class TestRecompilation:
+    """フラグ変更時の再コンパイルとバージョン管理"""
+
+    @pytest.mark.asyncio
+    async def test_direct_assignment_and_kill_switch_recompile(self):
+        engine = FeatureFlagEngine()
+        user_context = UserContext(user_id="u1", attributes={})
+        version = engine.sync_compiled_flags()
+
+        now = engine.flags["daily_trio_enabled"].updated_at
+        engine.flags["new_flag"] = FeatureFlag(
+            flag_key="new_flag", name="new", description="", flag_type="boolean",
+            enabled=True, default_value=False, created_at=now, updated_at=now,
+            targeting_rules=[TargetingRule(rule_id="all", name="all", conditions=[],
+                                           percentage=1.0, value=True, priority=1)]
+        )
+        assert (await engine.evaluate_flag("new_flag", user_context)).value is True
+        assert engine.version > version
+
+        await engine.activate_kill_switch("new_flag", "test", "admin")
+        evaluation = await engine.evaluate_flag("new_flag", user_context)
+        assert evaluation.reason == "kill_switch_active"
+        assert evaluation.value is False
+
+    @pytest.mark.asyncio
+    async def test_wait_for_change_wakes_on_update(self):
+        engine = FeatureFlagEngine()
+        version = engine.sync_compiled_flags()
+
+        waiter = asyncio.ensure_future(engine.wait_for_change(version, timeout=5.0))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        flag = engine.flags["daily_trio_enabled"]
+        flag.enabled = False
+        engine.upsert_flag(flag)
+
+        assert await asyncio.wait_for(waiter, timeout=1.0) > version
+
+
+class TestSnapshotSDK:
+    """スナップショット配信とローカル評価SDK"""
+
+    @pytest.mark.asyncio
+    async def test_sdk_matches_service_evaluation(self):
+        import main
+
+        client = FeatureFlagClient()
+        client.load_snapshot(main.feature_flag_engine.get_snapshot())
+        rng = random.Random(11)
+
+        assert set(client.flags) == set(main.feature_flag_engine.flags)
+        for index in range(200):
+            user_context = random_context(rng, index)
+            for flag_key in client.flags:
+                local = client.evaluate(flag_key, user_context.user_id, user_context.attributes)
+                remote = await main.feature_flag_engine.evaluate_flag(flag_key, user_context)
+                assert (local.value, local.reason) == (remote.value, remote.reason)
+
+        assert client.evaluate("missing", "u1", default_value="x").reason == "flag_not_found"
+        assert client.value("missing", "u1", default_value="x") == "x"
+
+    @pytest.mark.asyncio
+    async def test_snapshot_etag_and_long_poll(self):
+        import httpx
+        import main
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            first = await http.get("/flags/snapshot")
+            etag = first.headers["ETag"]
+            assert first.status_code == 200
+            assert first.json()["version"] == int(etag.strip('"'))
+
+            not_modified = await http.get("/flags/snapshot", headers={"If-None-Match": etag})
+            assert not_modified.status_code == 304
+
+            async def update_later():
+                await asyncio.sleep(0.05)
+                flag = main.feature_flag_engine.flags["daily_trio_enabled"]
+                flag.description = "updated"
+                main.feature_flag_engine.upsert_flag(flag)
+
+            updater = asyncio.ensure_future(update_later())
+            changed = await http.get("/flags/snapshot", params={"wait": 5},
+                                     headers={"If-None-Match": etag})
+            await updater
+
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+        descriptions = {f["flag_key"]: f["description"] for f in changed.json()["flags"]}
+        assert descriptions["daily_trio_enabled"] == "updated"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
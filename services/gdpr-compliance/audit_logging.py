@@ -9,13 +9,20 @@ GDPR準拠
 """
 
 from enum import Enum
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Any, Callable, Iterator, Iterable
+from datetime import datetime, timedelta, date
 import json
+import os
 import uuid
 import logging
 import hashlib
+import threading
+
+
+GENESIS_HASH = "0" * 64
+SEGMENT_FILE_PREFIX = "audit-"
+SEGMENT_FILE_SUFFIX = ".jsonl"
 
 
 class AuditEventType(Enum):
@@ -67,6 +74,196 @@ class AuditLogEntry:
     success: bool = True
     error_message: str = ""
     metadata: Dict[str, Any] = field(default_factory=dict)
+    sequence: int = 0  # 追記順の通し番号
+    previous_hash: str = ""  # 直前エントリのハッシュ
+    entry_hash: str = ""  # このエントリのハッシュ（チェーン）
+
+
+def _entry_to_record(entry: AuditLogEntry) -> Dict[str, Any]:
+    """ログエントリをJSONL用の辞書に変換"""
+    record = asdict(entry)
+    record["event_type"] = entry.event_type.value
+    record["timestamp"] = entry.timestamp.isoformat()
+    return record
+
+
+def _entry_from_record(record: Dict[str, Any]) -> AuditLogEntry:
+    """JSONLの辞書からログエントリを復元"""
+    values = dict(record)
+    values["event_type"] = AuditEventType(values["event_type"])
+    values["timestamp"] = datetime.fromisoformat(values["timestamp"])
+    return AuditLogEntry(**values)
+
+
+def _chain_hash(record: Dict[str, Any]) -> str:
+    """entry_hash を除いた正規化JSONのハッシュ（previous_hash を含むためチェーンになる）"""
+    body = {key: value for key, value in record.items() if key != "entry_hash"}
+    canonical = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _in_range(timestamp: datetime, start_date: Optional[datetime], end_date: Optional[datetime]) -> bool:
+    return (start_date is None or timestamp >= start_date) and (end_date is None or timestamp <= end_date)
+
+
+class AuditCounters:
+    """監査イベントの事前集計カウンタ"""
+    
+    def __init__(self):
+        self.total_events = 0
+        self.users: set = set()
+        self.type_counts: Dict[str, int] = {}
+        self.failure_counts: Dict[str, int] = {}
+        self.success_count = 0
+        self.data_volume_total = 0
+        self.actor_counts: Dict[str, int] = {}
+        self.category_counts: Dict[str, int] = {}
+    
+    def add(self, entry: AuditLogEntry):
+        event_type = entry.event_type.value
+        self.total_events += 1
+        self.users.add(entry.user_id)
+        self.type_counts[event_type] = self.type_counts.get(event_type, 0) + 1
+        if entry.success:
+            self.success_count += 1
+        else:
+            self.failure_counts[event_type] = self.failure_counts.get(event_type, 0) + 1
+        self.data_volume_total += entry.data_volume
+        self.actor_counts[entry.actor_id] = self.actor_counts.get(entry.actor_id, 0) + 1
+        for category in entry.data_categories:
+            self.category_counts[category] = self.category_counts.get(category, 0) + 1
+    
+    def merge(self, other: "AuditCounters"):
+        self.total_events += other.total_events
+        self.users.update(other.users)
+        self.success_count += other.success_count
+        self.data_volume_total += other.data_volume_total
+        for target, source in ((self.type_counts, other.type_counts),
+                               (self.failure_counts, other.failure_counts),
+                               (self.actor_counts, other.actor_counts),
+                               (self.category_counts, other.category_counts)):
+            for key, count in source.items():
+                target[key] = target.get(key, 0) + count
+    
+    def count(self, event_types: Iterable[AuditEventType] = None, failed_only: bool = False) -> int:
+        counts = self.failure_counts if failed_only else self.type_counts
+        if event_types is None:
+            return sum(counts.values())
+        return sum(counts.get(event_type.value, 0) for event_type in event_types)
+
+
+class AuditLogSegment:
+    """
+    1日分の追記専用セグメント
+    
+    エントリは正規化JSONの1行として保持し（path 指定時はJSONLファイルに追記）、
+    ユーザー別のオフセット索引と種別カウンタを追記時に更新する。
+    """
+    
+    def __init__(self, day: date, anchor_hash: str, path: Optional[str] = None):
+        self.day = day
+        self.path = path
+        self.anchor_hash = anchor_hash  # 先頭エントリの previous_hash
+        self.last_hash = anchor_hash
+        self.last_sequence = 0
+        self.min_timestamp: Optional[datetime] = None
+        self.max_timestamp: Optional[datetime] = None
+        self.user_offsets: Dict[str, List[int]] = {}
+        self.counters = AuditCounters()
+        self._lines: List[str] = []
+        self._writer = None
+    
+    @property
+    def count(self) -> int:
+        return self.counters.total_events
+    
+    def _index(self, entry: AuditLogEntry, offset: int):
+        self.user_offsets.setdefault(entry.user_id, []).append(offset)
+        self.counters.add(entry)
+        self.last_hash = entry.entry_hash
+        self.last_sequence = entry.sequence
+        if self.min_timestamp is None or entry.timestamp < self.min_timestamp:
+            self.min_timestamp = entry.timestamp
+        if self.max_timestamp is None or entry.timestamp > self.max_timestamp:
+            self.max_timestamp = entry.timestamp
+    
+    def append(self, entry: AuditLogEntry, line: str):
+        """1行追記して索引を更新"""
+        if self.path is None:
+            offset = len(self._lines)
+            self._lines.append(line)
+        else:
+            if self._writer is None:
+                self._writer = open(self.path, "ab")
+            offset = self._writer.tell()
+            self._writer.write(line.encode("utf-8") + b"\n")
+            self._writer.flush()
+        self._index(entry, offset)
+    
+    @classmethod
+    def load(cls, path: str, day: date, logger: logging.Logger = None) -> "AuditLogSegment":
+        """既存のJSONLセグメントを読み込み索引を再構築"""
+        segment = None
+        good_length = 0
+        with open(path, "rb") as handle:
+            while True:
+                offset = handle.tell()
+                raw = handle.readline()
+                if not raw:
+                    break
+                try:
+                    entry = _entry_from_record(json.loads(raw.decode("utf-8")))
+                except (ValueError, KeyError, TypeError):
+                    # 書き込み途中で停止した末尾行は切り詰める
+                    if logger:
+                        logger.warning(f"Truncating incomplete audit segment record in {path} at {offset}")
+                    break
+                if segment is None:
+                    segment = cls(day, entry.previous_hash, path)
+                segment._index(entry, offset)
+                good_length = handle.tell()
+        
+        if os.path.getsize(path) != good_length:
+            with open(path, "r+b") as handle:
+                handle.truncate(good_length)
+        return segment if segment is not None else cls(day, GENESIS_HASH, path)
+    
+    def iter_lines(self) -> Iterator[str]:
+        """保存順に生のJSON行を返す"""
+        if self.path is None:
+            yield from self._lines
+            return
+        with open(self.path, "rb") as handle:
+            for raw in handle:
+                yield raw.decode("utf-8").rstrip("\n")
+    
+    def iter_entries(self) -> Iterator[AuditLogEntry]:
+        for line in self.iter_lines():
+            yield _entry_from_record(json.loads(line))
+    
+    def read(self, offsets: List[int]) -> Iterator[AuditLogEntry]:
+        """オフセット指定でエントリを読み出す（該当行のみ）"""
+        if self.path is None:
+            for offset in offsets:
+                yield _entry_from_record(json.loads(self._lines[offset]))
+            return
+        with open(self.path, "rb") as handle:
+            for offset in offsets:
+                handle.seek(offset)
+                yield _entry_from_record(json.loads(handle.readline().decode("utf-8")))
+    
+    def seal(self):
+        """書き込みハンドルを閉じる（追記はされなくなる）"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+    
+    def drop(self):
+        """セグメント全体を削除"""
+        self.seal()
+        self._lines = []
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
 
 
 @dataclass
@@ -103,13 +300,57 @@ class ComplianceViolation:
 
 
 class AuditLoggingSystem:
-    """?"""
+    """
+    監査ログシステム
     
-    def __init__(self):
-        self.audit_logs: List[AuditLogEntry] = []
+    イベントは日単位の追記専用セグメントに保存される。各セグメントはユーザー別の
+    オフセット索引と種別カウンタを持ち、全エントリは previous_hash で連結された
+    SHA-256 ハッシュチェーンを構成する。保存期間の整理はセグメント単位で削除する。
+    """
+    
+    def __init__(self, storage_dir: Optional[str] = None,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.segments: Dict[date, AuditLogSegment] = {}  # 日付順
+        self.storage_dir = storage_dir if storage_dir is not None else os.getenv("AUDIT_LOG_DIR")
         self.log_retention_days = 2555  # 7?
+        self.clock = clock
         self.logger = logging.getLogger(__name__)
         self._setup_logging()
+        
+        # ハッシュチェーンの状態
+        self.chain_anchor = GENESIS_HASH  # 最古の保持セグメント直前のハッシュ
+        self._last_hash = GENESIS_HASH
+        self._sequence = 0
+        # エクスポートジョブのワーカースレッドからも記録されるため連結処理を直列化
+        self._chain_lock = threading.Lock()
+        
+        if self.storage_dir:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            self._load_segments()
+    
+    def _load_segments(self):
+        """保存ディレクトリから既存セグメントを読み込む"""
+        for filename in sorted(os.listdir(self.storage_dir)):
+            if not (filename.startswith(SEGMENT_FILE_PREFIX) and filename.endswith(SEGMENT_FILE_SUFFIX)):
+                continue
+            day = date.fromisoformat(filename[len(SEGMENT_FILE_PREFIX):-len(SEGMENT_FILE_SUFFIX)])
+            segment = AuditLogSegment.load(os.path.join(self.storage_dir, filename), day, self.logger)
+            if not segment.count:
+                continue
+            if not self.segments:
+                self.chain_anchor = segment.anchor_hash
+            self.segments[day] = segment
+            self._last_hash = segment.last_hash
+            self._sequence = segment.last_sequence
+    
+    @property
+    def audit_logs(self) -> List[AuditLogEntry]:
+        """全エントリの一覧（互換用。全セグメントを読み出すため集計には使用しない）"""
+        return [entry for segment in self.segments.values() for entry in segment.iter_entries()]
+    
+    @property
+    def total_events(self) -> int:
+        return sum(segment.count for segment in self.segments.values())
     
     def _setup_logging(self):
         """ログ"""
@@ -201,7 +442,8 @@ class AuditLoggingSystem:
         )
     
     def log_data_export(self, user_id: str, export_format: str, data_categories: List[str],
-                       export_size: int, checksum: str, ip_address: str = "") -> str:
+                       export_size: int, checksum: str, ip_address: str = "",
+                       request_id: str = "", success: bool = True, error_message: str = "") -> str:
         """デフォルト"""
         return self._create_audit_log(
             event_type=AuditEventType.DATA_EXPORT,
@@ -211,10 +453,13 @@ class AuditLoggingSystem:
             action_description=f"デフォルト ({export_format})",
             ip_address=ip_address,
             data_volume=export_size,
+            success=success,
+            error_message=error_message,
             metadata={
                 "export_format": export_format,
                 "checksum": checksum,
-                "export_size": export_size
+                "export_size": export_size,
+                "request_id": request_id
             }
         )
     
@@ -245,26 +490,35 @@ class AuditLoggingSystem:
         """?"""
         log_id = str(uuid.uuid4())
         
-        log_entry = AuditLogEntry(
-            log_id=log_id,
-            event_type=event_type,
-            user_id=user_id,
-            actor_id=actor_id,
-            timestamp=datetime.now(),
-            data_categories=data_categories,
-            action_description=action_description,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            session_id=session_id,
-            legal_basis=legal_basis,
-            processing_purpose=processing_purpose,
-            data_volume=data_volume,
-            success=success,
-            error_message=error_message,
-            metadata=metadata or {}
-        )
+        with self._chain_lock:
+            log_entry = AuditLogEntry(
+                log_id=log_id,
+                event_type=event_type,
+                user_id=user_id,
+                actor_id=actor_id,
+                timestamp=self.clock(),
+                data_categories=data_categories,
+                action_description=action_description,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                session_id=session_id,
+                legal_basis=legal_basis,
+                processing_purpose=processing_purpose,
+                data_volume=data_volume,
+                success=success,
+                error_message=error_message,
+                metadata=metadata or {},
+                sequence=self._sequence + 1,
+                previous_hash=self._last_hash
+            )
         
-        self.audit_logs.append(log_entry)
+            # ハッシュチェーンに連結して追記
+            record = _entry_to_record(log_entry)
+            log_entry.entry_hash = record["entry_hash"] = _chain_hash(record)
+            line = json.dumps(record, ensure_ascii=False, sort_keys=True, default=str)
+            self._segment_for(log_entry.timestamp).append(log_entry, line)
+            self._sequence = log_entry.sequence
+            self._last_hash = log_entry.entry_hash
         
         # ?
         self.logger.info(
@@ -274,111 +528,189 @@ class AuditLoggingSystem:
         
         return log_id
     
+    def _segment_for(self, timestamp: datetime) -> AuditLogSegment:
+        """追記先セグメント（日付が変われば新規作成、時計が戻った場合は最新に追記）"""
+        day = timestamp.date()
+        if self.segments:
+            latest = next(reversed(self.segments.values()))
+            if latest.day >= day:
+                return latest
+            latest.seal()
+        
+        path = None
+        if self.storage_dir:
+            path = os.path.join(self.storage_dir, f"{SEGMENT_FILE_PREFIX}{day.isoformat()}{SEGMENT_FILE_SUFFIX}")
+        segment = AuditLogSegment(day, self._last_hash, path)
+        if not self.segments:
+            self.chain_anchor = self._last_hash
+        self.segments[day] = segment
+        return segment
+    
+    def _segments_in_range(self, start_date: datetime = None,
+                           end_date: datetime = None) -> Iterator[tuple]:
+        """期間に重なるセグメントと、期間に完全に含まれるかどうか"""
+        for segment in self.segments.values():
+            if not segment.count:
+                continue
+            if start_date and segment.max_timestamp < start_date:
+                continue
+            if end_date and segment.min_timestamp > end_date:
+                continue
+            covered = ((start_date is None or segment.min_timestamp >= start_date) and
+                       (end_date is None or segment.max_timestamp <= end_date))
+            yield segment, covered
+    
+    def _collect_counters(self, start_date: datetime = None, end_date: datetime = None) -> AuditCounters:
+        """期間内のカウンタ（完全に含まれるセグメントはカウンタを合算、境界のみ走査）"""
+        counters = AuditCounters()
+        for segment, covered in self._segments_in_range(start_date, end_date):
+            if covered:
+                counters.merge(segment.counters)
+                continue
+            for entry in segment.iter_entries():
+                if _in_range(entry.timestamp, start_date, end_date):
+                    counters.add(entry)
+        return counters
+    
+    def count_events(self, event_types: List[AuditEventType] = None, failed_only: bool = False,
+                     start_date: datetime = None, end_date: datetime = None) -> int:
+        """種別ごとのイベント数（カウンタから算出）"""
+        return self._collect_counters(start_date, end_date).count(event_types, failed_only)
+    
     def get_user_audit_logs(self, user_id: str, start_date: datetime = None,
                            end_date: datetime = None, event_types: List[AuditEventType] = None) -> List[AuditLogEntry]:
         """ユーザー"""
-        logs = [log for log in self.audit_logs if log.user_id == user_id]
-        
-        if start_date:
-            logs = [log for log in logs if log.timestamp >= start_date]
-        
-        if end_date:
-            logs = [log for log in logs if log.timestamp <= end_date]
-        
-        if event_types:
-            logs = [log for log in logs if log.event_type in event_types]
+        logs = []
+        for segment, _ in self._segments_in_range(start_date, end_date):
+            offsets = segment.user_offsets.get(user_id)
+            if not offsets:
+                continue
+            for log in segment.read(offsets):
+                if not _in_range(log.timestamp, start_date, end_date):
+                    continue
+                if event_types and log.event_type not in event_types:
+                    continue
+                logs.append(log)
         
         return sorted(logs, key=lambda x: x.timestamp, reverse=True)
     
     def get_audit_summary(self, start_date: datetime = None, end_date: datetime = None) -> Dict:
         """?"""
-        logs = self.audit_logs
-        
-        if start_date:
-            logs = [log for log in logs if log.timestamp >= start_date]
-        
-        if end_date:
-            logs = [log for log in logs if log.timestamp <= end_date]
+        counters = self._collect_counters(start_date, end_date)
         
         summary = {
-            "total_events": len(logs),
-            "unique_users": len(set(log.user_id for log in logs)),
-            "event_types": {},
+            "total_events": counters.total_events,
+            "unique_users": len(counters.users),
+            "event_types": dict(counters.type_counts),
             "success_rate": 0.0,
-            "data_volume_total": sum(log.data_volume for log in logs),
+            "data_volume_total": counters.data_volume_total,
             "top_actors": {},
             "top_data_categories": {}
         }
         
-        # ?
-        for log in logs:
-            event_type = log.event_type.value
-            summary["event_types"][event_type] = summary["event_types"].get(event_type, 0) + 1
-        
         # 成
-        if logs:
-            successful_logs = [log for log in logs if log.success]
-            summary["success_rate"] = len(successful_logs) / len(logs)
+        if counters.total_events:
+            summary["success_rate"] = counters.success_count / counters.total_events
         
         # ?
-        actor_counts = {}
-        for log in logs:
-            actor_counts[log.actor_id] = actor_counts.get(log.actor_id, 0) + 1
-        
-        summary["top_actors"] = dict(sorted(actor_counts.items(), 
+        summary["top_actors"] = dict(sorted(counters.actor_counts.items(), 
                                           key=lambda x: x[1], reverse=True)[:10])
         
         # ?
-        category_counts = {}
-        for log in logs:
-            for category in log.data_categories:
-                category_counts[category] = category_counts.get(category, 0) + 1
-        
-        summary["top_data_categories"] = dict(sorted(category_counts.items(),
+        summary["top_data_categories"] = dict(sorted(counters.category_counts.items(),
                                                    key=lambda x: x[1], reverse=True)[:10])
         
         return summary
     
+    def _expired_segments(self) -> List[AuditLogSegment]:
+        """保存期間を過ぎたエントリのみを含むセグメント"""
+        cutoff_date = self.clock() - timedelta(days=self.log_retention_days)
+        return [segment for segment in self.segments.values()
+                if segment.count and segment.max_timestamp < cutoff_date]
+    
+    def count_expired_events(self) -> int:
+        return sum(segment.count for segment in self._expired_segments())
+    
     def cleanup_old_logs(self) -> int:
-        """?"""
-        cutoff_date = datetime.now() - timedelta(days=self.log_retention_days)
-        
-        old_logs = [log for log in self.audit_logs if log.timestamp < cutoff_date]
-        self.audit_logs = [log for log in self.audit_logs if log.timestamp >= cutoff_date]
+        """保存期間を過ぎたログの削除（セグメント単位）"""
+        expired = self._expired_segments()
+        cleaned_count = 0
+        for segment in expired:
+            cleaned_count += segment.count
+            segment.drop()
+            del self.segments[segment.day]
+        
+        # チェーンの起点を最古の保持セグメントに移す
+        if expired:
+            remaining = next(iter(self.segments.values()), None)
+            self.chain_anchor = remaining.anchor_hash if remaining is not None else self._last_hash
         
-        cleaned_count = len(old_logs)
         if cleaned_count > 0:
-            self.logger.info(f"Cleaned up {cleaned_count} old audit logs")
+            self.logger.info(f"Cleaned up {cleaned_count} old audit logs in {len(expired)} segments")
         
         return cleaned_count
     
+    def verify_integrity(self) -> Dict[str, Any]:
+        """保持中の全エントリのハッシュチェーンを検証"""
+        expected_previous = self.chain_anchor
+        verified = 0
+        
+        for segment in self.segments.values():
+            if segment.anchor_hash != expected_previous:
+                return {"valid": False, "verified_events": verified, "broken_segment": segment.day.isoformat(),
+                        "reason": "segment_anchor_mismatch"}
+            for line in segment.iter_lines():
+                record = json.loads(line)
+                if record["previous_hash"] != expected_previous or _chain_hash(record) != record["entry_hash"]:
+                    return {"valid": False, "verified_events": verified, "broken_log_id": record["log_id"],
+                            "reason": "hash_mismatch"}
+                expected_previous = record["entry_hash"]
+                verified += 1
+        
+        return {
+            "valid": expected_previous == self._last_hash,
+            "verified_events": verified,
+            "chain_anchor": self.chain_anchor,
+            "chain_head": self._last_hash
+        }
+    
+    def iter_audit_log_export(self, start_date: datetime = None, end_date: datetime = None,
+                              chunk_size: int = 1000) -> Iterator[str]:
+        """
+        NDJSON エクスポートを chunk_size 行ずつ返す
+        
+        各行は保存時の正規化JSON（previous_hash / entry_hash を含む）で、
+        受け取り側でハッシュチェーンを再検証できる。
+        """
+        buffer = []
+        for segment, covered in self._segments_in_range(start_date, end_date):
+            for line in segment.iter_lines():
+                if not covered:
+                    timestamp = datetime.fromisoformat(json.loads(line)["timestamp"])
+                    if not _in_range(timestamp, start_date, end_date):
+                        continue
+                buffer.append(line)
+                if len(buffer) >= chunk_size:
+                    yield "\n".join(buffer) + "\n"
+                    buffer = []
+        if buffer:
+            yield "\n".join(buffer) + "\n"
+    
     def export_audit_logs(self, format: str = "json", start_date: datetime = None,
                          end_date: datetime = None) -> str:
         """?"""
-        logs = self.audit_logs
-        
-        if start_date:
-            logs = [log for log in logs if log.timestamp >= start_date]
-        
-        if end_date:
-            logs = [log for log in logs if log.timestamp <= end_date]
+        if format == "ndjson":
+            return "".join(self.iter_audit_log_export(start_date, end_date))
         
         if format == "json":
-            return json.dumps([
-                {
-                    "log_id": log.log_id,
-                    "event_type": log.event_type.value,
-                    "user_id": log.user_id,
-                    "actor_id": log.actor_id,
-                    "timestamp": log.timestamp.isoformat(),
-                    "data_categories": log.data_categories,
-                    "action_description": log.action_description,
-                    "ip_address": log.ip_address,
-                    "success": log.success,
-                    "metadata": log.metadata
-                }
-                for log in logs
-            ], ensure_ascii=False, indent=2)
+            fields = ("log_id", "event_type", "user_id", "actor_id", "timestamp", "data_categories",
+                      "action_description", "ip_address", "success", "metadata")
+            records = (
+                json.dumps({key: record[key] for key in fields}, ensure_ascii=False, indent=2)
+                for chunk in self.iter_audit_log_export(start_date, end_date)
+                for record in map(json.loads, chunk.splitlines())
+            )
+            return "[" + ",\n".join(records) + "]"
         
         return ""
 
@@ -529,15 +861,13 @@ class ComplianceMonitoringSystem:
         """デフォルト"""
         violations = []
         
-        # ?
-        cutoff_date = datetime.now() - timedelta(days=2555)  # 7?
-        old_logs = [log for log in self.audit_system.audit_logs 
-                   if log.timestamp < cutoff_date]
+        # 保存期間を過ぎたセグメント内の件数
+        old_log_count = self.audit_system.count_expired_events()
         
-        if old_logs:
+        if old_log_count:
             violations.append({
-                "description": f"{len(old_logs)}?",
-                "affected_records": len(old_logs),
+                "description": f"{old_log_count}?",
+                "affected_records": old_log_count,
                 "recommendation": "?"
             })
         
@@ -554,8 +884,9 @@ class ComplianceMonitoringSystem:
         violations = []
         
         # ?
-        consent_logs = [log for log in self.audit_system.audit_logs 
-                       if log.event_type in [AuditEventType.CONSENT_GRANTED, AuditEventType.CONSENT_WITHDRAWN]]
+        consent_log_count = self.audit_system.count_events(
+            [AuditEventType.CONSENT_GRANTED, AuditEventType.CONSENT_WITHDRAWN]
+        )
         
         # ?
         expired_consents = 0  # 実装
@@ -580,10 +911,7 @@ class ComplianceMonitoringSystem:
         violations = []
         
         # ?
-        access_logs = [log for log in self.audit_system.audit_logs 
-                      if log.event_type == AuditEventType.DATA_ACCESS and not log.success]
-        
-        failed_access_count = len(access_logs)
+        failed_access_count = self.audit_system.count_events([AuditEventType.DATA_ACCESS], failed_only=True)
         
         if failed_access_count > 10:  # ?
             violations.append({
@@ -605,8 +933,7 @@ class ComplianceMonitoringSystem:
         violations = []
         
         # ?
-        rights_logs = [log for log in self.audit_system.audit_logs 
-                      if log.event_type == AuditEventType.RIGHTS_REQUEST]
+        rights_request_count = self.audit_system.count_events([AuditEventType.RIGHTS_REQUEST])
         
         # 30?
         overdue_requests = 0  # 実装
@@ -631,8 +958,7 @@ class ComplianceMonitoringSystem:
         violations = []
         
         # ?
-        incident_logs = [log for log in self.audit_system.audit_logs 
-                        if log.event_type == AuditEventType.SECURITY_INCIDENT]
+        incident_count = self.audit_system.count_events([AuditEventType.SECURITY_INCIDENT])
         
         # 72?
         unnotified_breaches = 0  # 実装
@@ -657,8 +983,7 @@ class ComplianceMonitoringSystem:
         violations = []
         
         # プレビュー
-        privacy_logs = [log for log in self.audit_system.audit_logs 
-                       if log.event_type == AuditEventType.PRIVACY_SETTING_CHANGE]
+        privacy_change_count = self.audit_system.count_events([AuditEventType.PRIVACY_SETTING_CHANGE])
         
         # デフォルト
         non_compliant_settings = 0  # 実装
@@ -10,16 +10,33 @@ GDPR?20?
 
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, BinaryIO, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Any, BinaryIO, Union
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
+from xml.sax.saxutils import quoteattr
 import json
 import csv
+import os
+import tempfile
+import textwrap
+import threading
 import xml.etree.ElementTree as ET
 import zipfile
-import io
 import hashlib
+import logging
 import uuid
 
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# カテゴリのデータソース: user_id を受け取りレコードを逐次返す
+DataSource = Callable[[str], Iterable[Dict]]
 
 class ExportFormat(Enum):
     """エラー"""
@@ -40,6 +57,15 @@ class DataPortabilityScope(Enum):
     CUSTOM = "custom"
 
 
+class ExportJobStatus(Enum):
+    """エクスポートジョブの状態"""
+    PENDING = "pending"
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 @dataclass
 class PortabilityRequest:
     """?"""
@@ -58,6 +84,11 @@ class PortabilityRequest:
     file_path: Optional[str] = None
     file_size: Optional[int] = None
     checksum: Optional[str] = None
+    status: ExportJobStatus = ExportJobStatus.PENDING
+    records_exported: int = 0
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
 
 
 @dataclass
@@ -70,18 +101,92 @@ class DataSchema:
     format_specific_rules: Dict[str, Dict] = field(default_factory=dict)
 
 
+class _HashingWriter:
+    """
+    書き込みと同時にSHA-256とバイト数を計算する出力ストリーム
+
+    seek を持たないため zipfile はデータディスクリプタ形式で書き込み、
+    書き終えた位置へ戻らない。チェックサムは書き出しと同じ1パスで確定する。
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self._raw = raw
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self._raw.write(data)
+        self._sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self):
+        self._raw.flush()
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
+class _TextSink:
+    """文字列を一定量ためてから UTF-8 で下位ストリームへ書き出す"""
+
+    def __init__(self, stream, buffer_size: int = 64 * 1024):
+        self._stream = stream
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._buffer_size = buffer_size
+
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            self._stream.write("".join(self._buffer).encode("utf-8"))
+            self._buffer.clear()
+            self._buffered = 0
+
+
 class DataPortabilityEngine:
     """デフォルト"""
     
-    def __init__(self):
+    def __init__(self, export_dir: Optional[str] = None, max_concurrent_exports: Optional[int] = None,
+                 max_exports_per_user: int = 3, rate_limit_window: timedelta = timedelta(hours=24),
+                 max_active_exports_per_user: int = 1,
+                 on_job_finished: Optional[Callable[[PortabilityRequest, Dict], None]] = None):
         self.portability_requests: Dict[str, PortabilityRequest] = {}
         self.data_schemas = self._initialize_data_schemas()
-        self.export_handlers = {
-            ExportFormat.JSON: self._export_json,
-            ExportFormat.CSV: self._export_csv,
-            ExportFormat.XML: self._export_xml,
-            ExportFormat.YAML: self._export_yaml
+        # CSV はカテゴリごとに ZIP エントリを分けるため _write_csv_archive で扱う
+        self.export_writers = {
+            ExportFormat.JSON: self._write_json,
+            ExportFormat.XML: self._write_xml,
+            ExportFormat.YAML: self._write_yaml
         }
+        self.data_sources: Dict[str, DataSource] = {}
+        self.export_dir = export_dir or os.getenv("DATA_EXPORT_DIR") or tempfile.gettempdir()
+
+        # ジョブキュー（同時実行数とユーザーごとの投入回数を制限）
+        self.max_concurrent_exports = max_concurrent_exports or int(os.getenv("DATA_EXPORT_MAX_WORKERS", "2"))
+        self.max_exports_per_user = max_exports_per_user
+        self.max_active_exports_per_user = max_active_exports_per_user
+        self.rate_limit_window = rate_limit_window
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Future] = {}
+        self._submissions: Dict[str, deque] = {}
+        self._active_exports: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # ジョブ完了・失敗時にワーカースレッドから呼ばれる（監査ログ記録など）
+        self.on_job_finished = on_job_finished
+    
+    def register_data_source(self, category: str, source: DataSource):
+        """カテゴリのデータソースを登録（レコードを逐次返すイテラブルを想定）"""
+        self.data_sources[category] = source
     
     def _initialize_data_schemas(self) -> Dict[str, DataSchema]:
         """デフォルト"""
@@ -188,8 +293,53 @@ class DataPortabilityEngine:
         self.portability_requests[request_id] = request
         return request_id
     
+    def submit_export_job(self, user_id: str, scope: DataPortabilityScope, format: ExportFormat,
+                          custom_categories: List[str] = None, include_metadata: bool = True,
+                          compress_output: bool = True, direct_transfer: str = None) -> Dict:
+        """エクスポートをジョブとしてキューに投入（ユーザーごとのレート制限付き）"""
+        now = datetime.now()
+        with self._lock:
+            if self._active_exports.get(user_id, 0) >= self.max_active_exports_per_user:
+                return {"error": "Export already in progress", "retry_after_seconds": None}
+            
+            history = self._submissions.setdefault(user_id, deque())
+            while history and now - history[0] >= self.rate_limit_window:
+                history.popleft()
+            if len(history) >= self.max_exports_per_user:
+                retry_after = self.rate_limit_window - (now - history[0])
+                return {"error": "Rate limit exceeded",
+                        "retry_after_seconds": int(retry_after.total_seconds()) + 1}
+            
+            request_id = self.create_portability_request(
+                user_id, scope, format, custom_categories, include_metadata,
+                compress_output, direct_transfer
+            )
+            request = self.portability_requests[request_id]
+            request.status = ExportJobStatus.QUEUED
+            history.append(now)
+            self._active_exports[user_id] = self._active_exports.get(user_id, 0) + 1
+            self._jobs[request_id] = self._get_executor().submit(self._execute_job, request)
+        
+        return {"success": True, "request_id": request_id, "status": ExportJobStatus.QUEUED.value}
+    
+    def wait_for_job(self, request_id: str, timeout: Optional[float] = None) -> Dict:
+        """ジョブの完了を待って状態を返す（タイムアウト時は実行中の状態を返す）"""
+        job = self._jobs.get(request_id)
+        if job is not None:
+            try:
+                job.result(timeout=timeout)
+            except FuturesTimeoutError:
+                pass
+        return self.get_portability_status(request_id)
+    
+    def shutdown(self, wait: bool = True):
+        """ワーカーを停止"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+    
     def process_portability_request(self, request_id: str) -> Dict:
-        """?"""
+        """エクスポートをその場で実行（ジョブキューを経由しない同期版）"""
         if request_id not in self.portability_requests:
             return {"error": "Request not found"}
         
@@ -198,57 +348,14 @@ class DataPortabilityEngine:
         if request.processed:
             return {"error": "Request already processed"}
         
-        try:
-            # デフォルト
-            data_to_export = self._collect_portable_data(request.user_id, request.scope, request.custom_categories)
-            
-            # メイン
-            if request.include_metadata:
-                data_to_export = self._add_metadata(data_to_export, request)
-            
-            # ?
-            export_handler = self.export_handlers.get(request.format)
-            if not export_handler:
-                return {"error": f"Unsupported format: {request.format.value}"}
-            
-            exported_data = export_handler(data_to_export, request.user_id)
-            
-            # ?
-            if request.compress_output:
-                exported_data = self._compress_data(exported_data, request.format)
-            
-            # ?
-            file_path = self._save_export_file(request_id, exported_data)
-            file_size = len(exported_data) if isinstance(exported_data, (str, bytes)) else 0
-            checksum = self._calculate_checksum(exported_data)
-            
-            # ?
-            request.processed = True
-            request.file_path = file_path
-            request.file_size = file_size
-            request.checksum = checksum
-            
-            # ?
-            transfer_result = None
-            if request.direct_transfer:
-                transfer_result = self._perform_direct_transfer(request, exported_data)
-            
-            return {
-                "success": True,
-                "request_id": request_id,
-                "file_path": file_path,
-                "file_size": file_size,
-                "checksum": checksum,
-                "format": request.format.value,
-                "expires_at": request.expires_at.isoformat(),
-                "direct_transfer": transfer_result
-            }
+        if request.status in (ExportJobStatus.QUEUED, ExportJobStatus.RUNNING):
+            return {"error": "Request already in progress"}
         
-        except Exception as e:
-            return {"error": f"Processing failed: {str(e)}"}
+        return self._run_export(request)
     
-    def download_export(self, request_id: str, user_id: str) -> Optional[bytes]:
-        """エラー"""
+    def stream_export(self, request_id: str, user_id: str,
+                      chunk_size: int = 1024 * 1024) -> Optional[Iterator[bytes]]:
+        """完成したエクスポートファイルをチャンク単位で返す"""
         if request_id not in self.portability_requests:
             return None
         
@@ -263,18 +370,23 @@ class DataPortabilityEngine:
         if datetime.now() > request.expires_at:
             return None
         
-        # ?
-        request.download_count += 1
-        
-        # ?
         try:
-            with open(request.file_path, 'rb') as f:
-                return f.read()
+            handle = open(request.file_path, 'rb')
         except FileNotFoundError:
             return None
+        
+        request.download_count += 1
+        return self._iter_file_chunks(handle, chunk_size)
+    
+    def download_export(self, request_id: str, user_id: str) -> Optional[bytes]:
+        """エクスポートファイル全体を返す（大きなファイルは stream_export を使う）"""
+        chunks = self.stream_export(request_id, user_id)
+        if chunks is None:
+            return None
+        return b"".join(chunks)
     
     def get_portability_status(self, request_id: str) -> Dict:
-        """?"""
+        """リクエストとジョブの状態"""
         if request_id not in self.portability_requests:
             return {"error": "Request not found"}
         
@@ -285,8 +397,13 @@ class DataPortabilityEngine:
             "user_id": request.user_id,
             "scope": request.scope.value,
             "format": request.format.value,
+            "status": request.status.value,
             "processed": request.processed,
+            "records_exported": request.records_exported,
+            "error": request.error,
             "created_at": request.created_at.isoformat(),
+            "started_at": request.started_at.isoformat() if request.started_at else None,
+            "completed_at": request.completed_at.isoformat() if request.completed_at else None,
             "expires_at": request.expires_at.isoformat(),
             "file_size": request.file_size,
             "download_count": request.download_count,
@@ -339,11 +456,119 @@ class DataPortabilityEngine:
             }
         }
     
-    def _collect_portable_data(self, user_id: str, scope: DataPortabilityScope, 
-                             custom_categories: List[str]) -> Dict:
-        """?"""
-        data = {}
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_exports,
+                                                thread_name_prefix="data-export")
+        return self._executor
+    
+    def _execute_job(self, request: PortabilityRequest) -> Dict:
+        """ワーカースレッドでのジョブ実行"""
+        try:
+            try:
+                result = self._run_export(request)
+            except Exception as e:
+                request.status = ExportJobStatus.FAILED
+                request.error = str(e)
+                result = {"error": f"Processing failed: {str(e)}"}
+            
+            if self.on_job_finished is not None:
+                try:
+                    self.on_job_finished(request, result)
+                except Exception as e:
+                    logger.error(f"Export job callback failed for {request.request_id}: {e}")
+            return result
+        finally:
+            with self._lock:
+                self._active_exports[request.user_id] -= 1
+                if not self._active_exports[request.user_id]:
+                    del self._active_exports[request.user_id]
+                self._jobs.pop(request.request_id, None)
+    
+    def _run_export(self, request: PortabilityRequest) -> Dict:
+        """エクスポートファイルを書き出し、サイズとチェックサムを記録"""
+        if request.format != ExportFormat.CSV and request.format not in self.export_writers:
+            request.status = ExportJobStatus.FAILED
+            request.error = f"Unsupported format: {request.format.value}"
+            return {"error": request.error}
         
+        request.status = ExportJobStatus.RUNNING
+        request.started_at = datetime.now()
+        request.records_exported = 0
+        
+        extension = "zip" if request.compress_output or request.format == ExportFormat.CSV else request.format.value
+        file_path = os.path.join(self.export_dir, f"export_{request.request_id}.{extension}")
+        partial_path = file_path + ".part"
+        
+        try:
+            with open(partial_path, 'wb') as raw:
+                output = _HashingWriter(raw)
+                self._write_export(request, output)
+            os.replace(partial_path, file_path)
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            request.status = ExportJobStatus.FAILED
+            request.error = str(e)
+            return {"error": f"Processing failed: {str(e)}"}
+        
+        request.processed = True
+        request.file_path = file_path
+        request.file_size = output.size
+        request.checksum = output.hexdigest()
+        request.status = ExportJobStatus.COMPLETED
+        request.completed_at = datetime.now()
+        
+        transfer_result = None
+        if request.direct_transfer:
+            transfer_result = self._perform_direct_transfer(request, file_path)
+        
+        return {
+            "success": True,
+            "request_id": request.request_id,
+            "file_path": file_path,
+            "file_size": request.file_size,
+            "checksum": request.checksum,
+            "format": request.format.value,
+            "records_exported": request.records_exported,
+            "expires_at": request.expires_at.isoformat(),
+            "direct_transfer": transfer_result
+        }
+    
+    def _write_export(self, request: PortabilityRequest, output: _HashingWriter):
+        """各カテゴリをソースから直列化し、ZIPストリーム（または生ファイル）へ書き出す"""
+        categories = self._portable_categories(request.scope, request.custom_categories)
+        
+        if request.format == ExportFormat.CSV:
+            compression = zipfile.ZIP_DEFLATED if request.compress_output else zipfile.ZIP_STORED
+            with zipfile.ZipFile(output, 'w', compression) as archive:
+                self._write_csv_archive(archive, request, categories)
+            return
+        
+        write = self.export_writers[request.format]
+        if not request.compress_output:
+            sink = _TextSink(output)
+            write(sink, request, categories)
+            sink.flush()
+            return
+        
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f"personal_data_export.{request.format.value}", 'w', force_zip64=True) as entry:
+                sink = _TextSink(entry)
+                write(sink, request, categories)
+                sink.flush()
+    
+    @staticmethod
+    def _iter_file_chunks(handle: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+        with handle:
+            while True:
+                chunk = handle.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+    
+    def _portable_categories(self, scope: DataPortabilityScope, custom_categories: List[str]) -> List[str]:
+        """スコープに含まれるポータブルなカテゴリ"""
         if scope == DataPortabilityScope.ALL_DATA:
             categories = list(self.data_schemas.keys())
         elif scope == DataPortabilityScope.PROFILE_ONLY:
@@ -359,11 +584,21 @@ class DataPortabilityEngine:
         else:
             categories = []
         
-        for category in categories:
-            if category in self.data_schemas and self.data_schemas[category].portable:
-                data[category] = self._get_category_data(user_id, category)
-        
-        return data
+        return [
+            category for category in categories
+            if category in self.data_schemas and self.data_schemas[category].portable
+        ]
+    
+    def _iter_category_records(self, request: PortabilityRequest, category: str,
+                               counts: Dict[str, int]) -> Iterator[Dict]:
+        """カテゴリのレコードを1件ずつ返し、件数と進捗を数える"""
+        source = self.data_sources.get(category)
+        records = source(request.user_id) if source else self._get_category_data(request.user_id, category)
+        counts[category] = 0
+        for record in records:
+            counts[category] += 1
+            request.records_exported += 1
+            yield record
     
     def _get_category_data(self, user_id: str, category: str) -> List[Dict]:
         """カスタム"""
@@ -399,25 +634,24 @@ class DataPortabilityEngine:
         
         return sample_data.get(category, [])
     
-    def _add_metadata(self, data: Dict, request: PortabilityRequest) -> Dict:
-        """メイン"""
-        metadata = {
+    def _build_metadata(self, request: PortabilityRequest, counts: Dict[str, int]) -> Dict:
+        """エクスポートのメタデータ（件数は書き出し後に確定する）"""
+        return {
             "export_info": {
                 "request_id": request.request_id,
                 "user_id": request.user_id,
                 "export_date": datetime.now().isoformat(),
                 "scope": request.scope.value,
                 "format": request.format.value,
-                "data_categories": list(data.keys()),
-                "total_records": sum(len(records) if isinstance(records, list) else 1 
-                                   for records in data.values())
+                "data_categories": list(counts.keys()),
+                "total_records": sum(counts.values())
             },
             "schema_info": {
                 category: {
                     "fields": self.data_schemas[category].fields,
                     "relationships": self.data_schemas[category].relationships
                 }
-                for category in data.keys()
+                for category in counts.keys()
                 if category in self.data_schemas
             },
             "legal_info": {
@@ -427,92 +661,113 @@ class DataPortabilityEngine:
                 "contact": "privacy@therapeutic-app.com"
             }
         }
-        
-        return {
-            "_metadata": metadata,
-            "data": data
-        }
     
-    def _export_json(self, data: Dict, user_id: str) -> str:
-        """JSON?"""
-        return json.dumps(data, ensure_ascii=False, indent=2, default=str)
+    def _write_json(self, sink: _TextSink, request: PortabilityRequest, categories: List[str]):
+        """JSON を1レコード1行で書き出す（メタデータは件数確定後に末尾へ）"""
+        counts: Dict[str, int] = {}
+        sink.write('{"data": {' if request.include_metadata else '{')
+        
+        for index, category in enumerate(categories):
+            sink.write(("," if index else "") + "\n" + json.dumps(category) + ": [")
+            for position, record in enumerate(self._iter_category_records(request, category, counts)):
+                sink.write(("," if position else "") + "\n  " + json.dumps(record, ensure_ascii=False, default=str))
+            sink.write("\n]")
+        
+        if request.include_metadata:
+            metadata = self._build_metadata(request, counts)
+            sink.write('},\n"_metadata": ' + json.dumps(metadata, ensure_ascii=False, indent=2, default=str))
+        sink.write("}\n")
     
-    def _export_csv(self, data: Dict, user_id: str) -> bytes:
-        """CSV?"""
-        zip_buffer = io.BytesIO()
+    def _write_csv_archive(self, archive: zipfile.ZipFile, request: PortabilityRequest, categories: List[str]):
+        """カテゴリごとに CSV エントリを書き出す（max_rows_per_file を超えたら次のファイルへ）"""
+        counts: Dict[str, int] = {}
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for category, records in data.items():
-                if category.startswith('_'):  # メイン
-                    continue
-                
-                if not isinstance(records, list):
-                    records = [records]
-                
-                csv_buffer = io.StringIO()
-                
-                if records:
-                    # ヘルパー
-                    fieldnames = list(records[0].keys())
-                    writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames)
+        for category in categories:
+            max_rows = self.data_schemas[category].format_specific_rules.get("csv", {}).get("max_rows_per_file")
+            entry, sink, writer = None, None, None
+            part, rows = 0, 0
+            
+            for record in self._iter_category_records(request, category, counts):
+                if writer is None or (max_rows and rows >= max_rows):
+                    if entry is not None:
+                        sink.flush()
+                        entry.close()
+                    part += 1
+                    name = f"{category}.csv" if part == 1 else f"{category}_{part}.csv"
+                    entry = archive.open(name, 'w', force_zip64=True)
+                    sink = _TextSink(entry)
+                    # ヘッダーは各ファイルの先頭レコードから
+                    writer = csv.DictWriter(sink, fieldnames=list(record.keys()), extrasaction="ignore")
                     writer.writeheader()
-                    
-                    # デフォルト
-                    for record in records:
-                        # JSON ?
-                        processed_record = {}
-                        for key, value in record.items():
-                            if isinstance(value, (dict, list)):
-                                processed_record[key] = json.dumps(value, ensure_ascii=False)
-                            else:
-                                processed_record[key] = value
-                        writer.writerow(processed_record)
+                    rows = 0
                 
-                zip_file.writestr(f"{category}.csv", csv_buffer.getvalue().encode('utf-8'))
+                # ネストした値は JSON 文字列に
+                writer.writerow({
+                    key: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+                    for key, value in record.items()
+                })
+                rows += 1
+            
+            if entry is None:
+                archive.writestr(f"{category}.csv", b"")
+            else:
+                sink.flush()
+                entry.close()
         
-        zip_buffer.seek(0)
-        return zip_buffer.read()
+        if request.include_metadata:
+            metadata = self._build_metadata(request, counts)
+            archive.writestr("_metadata.json", json.dumps(metadata, ensure_ascii=False, indent=2, default=str))
     
-    def _export_xml(self, data: Dict, user_id: str) -> str:
-        """XML?"""
-        root = ET.Element("personal_data_export")
-        root.set("user_id", user_id)
-        root.set("export_date", datetime.now().isoformat())
+    def _write_xml(self, sink: _TextSink, request: PortabilityRequest, categories: List[str]):
+        """XML をレコード要素ごとに直列化して書き出す"""
+        counts: Dict[str, int] = {}
+        sink.write(f"<personal_data_export user_id={quoteattr(request.user_id)} "
+                   f"export_date={quoteattr(datetime.now().isoformat())}>")
         
-        for category, records in data.items():
-            if category.startswith('_'):  # メイン
-                continue
-            
-            category_element = ET.SubElement(root, category)
-            
-            if not isinstance(records, list):
-                records = [records]
-            
-            for record in records:
-                record_element = ET.SubElement(category_element, "record")
-                
+        for category in categories:
+            sink.write(f"<{category}>")
+            for record in self._iter_category_records(request, category, counts):
+                record_element = ET.Element("record")
                 for key, value in record.items():
                     field_element = ET.SubElement(record_element, key)
                     if isinstance(value, (dict, list)):
                         field_element.text = json.dumps(value, ensure_ascii=False)
                     else:
                         field_element.text = str(value)
+                sink.write(ET.tostring(record_element, encoding='unicode', method='xml'))
+            sink.write(f"</{category}>")
+        
+        if request.include_metadata:
+            metadata_element = ET.Element("metadata")
+            self._add_dict_to_xml(metadata_element, self._build_metadata(request, counts))
+            sink.write(ET.tostring(metadata_element, encoding='unicode', method='xml'))
+        sink.write("</personal_data_export>")
+    
+    def _write_yaml(self, sink: _TextSink, request: PortabilityRequest, categories: List[str]):
+        """YAML をレコード単位で書き出す（yaml が無い環境では JSON で代替）"""
+        if not YAML_AVAILABLE:
+            self._write_json(sink, request, categories)
+            return
         
-        # メイン
-        if "_metadata" in data:
-            metadata_element = ET.SubElement(root, "metadata")
-            self._add_dict_to_xml(metadata_element, data["_metadata"])
+        counts: Dict[str, int] = {}
+        indent = "  " if request.include_metadata else ""
+        if request.include_metadata:
+            sink.write("data:\n" if categories else "data: {}\n")
         
-        return ET.tostring(root, encoding='unicode', method='xml')
-    
-    def _export_yaml(self, data: Dict, user_id: str) -> str:
-        """YAML?"""
-        try:
-            import yaml
-            return yaml.dump(data, default_flow_style=False, allow_unicode=True)
-        except ImportError:
-            # yaml?JSONで
-            return self._export_json(data, user_id)
+        for category in categories:
+            empty = True
+            for record in self._iter_category_records(request, category, counts):
+                if empty:
+                    sink.write(f"{indent}{category}:\n")
+                    empty = False
+                chunk = yaml.dump([record], default_flow_style=False, allow_unicode=True)
+                sink.write(textwrap.indent(chunk, indent) if indent else chunk)
+            if empty:
+                sink.write(f"{indent}{category}: []\n")
+        
+        if request.include_metadata:
+            metadata = self._build_metadata(request, counts)
+            sink.write(yaml.dump({"_metadata": metadata}, default_flow_style=False, allow_unicode=True))
     
     def _add_dict_to_xml(self, parent: ET.Element, data: Dict):
         """?XML?"""
@@ -530,50 +785,15 @@ class DataPortabilityEngine:
             else:
                 element.text = str(value)
     
-    def _compress_data(self, data: Union[str, bytes], format: ExportFormat) -> bytes:
-        """デフォルト"""
-        if isinstance(data, str):
-            data = data.encode('utf-8')
-        
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            filename = f"personal_data_export.{format.value}"
-            zip_file.writestr(filename, data)
-        
-        zip_buffer.seek(0)
-        return zip_buffer.read()
-    
-    def _save_export_file(self, request_id: str, data: Union[str, bytes]) -> str:
-        """エラー"""
-        # 実装
-        file_path = f"/tmp/export_{request_id}.zip"
-        
-        if isinstance(data, str):
-            data = data.encode('utf-8')
-        
-        with open(file_path, 'wb') as f:
-            f.write(data)
-        
-        return file_path
-    
-    def _calculate_checksum(self, data: Union[str, bytes]) -> str:
-        """?"""
-        if isinstance(data, str):
-            data = data.encode('utf-8')
-        
-        return hashlib.sha256(data).hexdigest()
-    
-    def _perform_direct_transfer(self, request: PortabilityRequest, data: Union[str, bytes]) -> Dict:
-        """?"""
-        # 実装APIを
+    def _perform_direct_transfer(self, request: PortabilityRequest, file_path: str) -> Dict:
+        """他の管理者への直接転送（書き出し済みファイルを送る）"""
+        # 転送先 API との連携は未実装
         return {
             "success": False,
             "message": "Direct transfer not implemented",
             "destination": request.direct_transfer
         }
 
-
 class DataPortabilityValidator:
     """デフォルト"""
     
@@ -49,7 +49,7 @@ class GDPRComplianceSystem:
         self.privacy_by_design = PrivacyByDesignEngine()
         self.consent_system = ConsentManagementSystem()
         self.rights_engine = DataSubjectRightsEngine()
-        self.portability_engine = DataPortabilityEngine()
+        self.portability_engine = DataPortabilityEngine(on_job_finished=self._audit_export_job)
         self.audit_system = AuditLoggingSystem()
         self.compliance_system = ComplianceMonitoringSystem(self.audit_system)
         self.dpia_assistant = DPIAAssistant()
@@ -190,7 +190,7 @@ class GDPRComplianceSystem:
     
     def export_personal_data(self, user_id: str, format: str = "json", 
                            scope: str = "all_data") -> Dict[str, Any]:
-        """?"""
+        """個人データエクスポートをジョブとして受け付け、ジョブIDと状態を返す"""
         try:
             # ?
             try:
@@ -203,25 +203,20 @@ class GDPRComplianceSystem:
                     "message": "無"
                 }
             
-            # ?
-            request_id = self.portability_engine.create_portability_request(
-                user_id, export_scope, export_format
-            )
-            
-            # ?
-            result = self.portability_engine.process_portability_request(request_id)
-            
-            if result.get("success"):
-                # ?
-                self.audit_system.log_data_export(
-                    user_id=user_id,
-                    export_format=format,
-                    data_categories=[scope],
-                    export_size=result.get("file_size", 0),
-                    checksum=result.get("checksum", "")
-                )
+            # 完了・失敗は _audit_export_job で監査ログに記録
+            job = self.portability_engine.submit_export_job(user_id, export_scope, export_format)
+            if not job.get("success"):
+                return {
+                    "success": False,
+                    "error": job["error"],
+                    "retry_after_seconds": job.get("retry_after_seconds")
+                }
             
-            return result
+            return {
+                "success": True,
+                "request_id": job["request_id"],
+                "status": job["status"]
+            }
         
         except Exception as e:
             return {
@@ -230,6 +225,35 @@ class GDPRComplianceSystem:
                 "message": "デフォルト"
             }
     
+    def get_export_status(self, user_id: str, request_id: str) -> Dict[str, Any]:
+        """エクスポートジョブの状態（本人のジョブのみ）"""
+        status = self.portability_engine.get_portability_status(request_id)
+        if status.get("user_id") != user_id:
+            return {
+                "success": False,
+                "error": "Request not found"
+            }
+        
+        return {"success": True, **status}
+    
+    def stream_personal_data_export(self, user_id: str, request_id: str,
+                                    chunk_size: int = 1024 * 1024):
+        """完了したエクスポートファイルのチャンク単位ダウンロード（未完了・期限切れ・他人のジョブは None）"""
+        return self.portability_engine.stream_export(request_id, user_id, chunk_size)
+    
+    def _audit_export_job(self, request, result: Dict[str, Any]):
+        """エクスポートジョブの完了・失敗を監査ログに記録（ワーカースレッドから呼ばれる）"""
+        self.audit_system.log_data_export(
+            user_id=request.user_id,
+            export_format=request.format.value,
+            data_categories=[request.scope.value],
+            export_size=request.file_size or 0,
+            checksum=request.checksum or "",
+            request_id=request.request_id,
+            success=bool(result.get("success")),
+            error_message="" if result.get("success") else (request.error or result.get("error", ""))
+        )
+    
     def get_privacy_dashboard(self, user_id: str) -> Dict[str, Any]:
         """ユーザー"""
         try:
@@ -323,6 +347,11 @@ class GDPRComplianceSystem:
                 "message": "?"
             }
     
+    def stream_audit_logs(self, start_date: datetime = None, end_date: datetime = None,
+                          chunk_size: int = 1000):
+        """監査ログのNDJSONストリーミングエクスポート（チャンク単位のジェネレータ）"""
+        return self.audit_system.iter_audit_log_export(start_date, end_date, chunk_size)
+    
     def assess_dpia_necessity(self, processing_description: Dict[str, Any]) -> Dict[str, Any]:
         """DPIA?"""
         try:
@@ -393,7 +422,7 @@ class GDPRComplianceSystem:
                     "compliance_system": "healthy"
                 },
                 "metrics": {
-                    "total_audit_logs": len(self.audit_system.audit_logs),
+                    "total_audit_logs": self.audit_system.total_events,
                     "active_violations": len([v for v in self.compliance_system.violations if not v.resolved]),
                     "system_uptime": "N/A"  # 実装
                 },
@@ -449,6 +478,10 @@ def main():
         test_user_id, "json", "all_data"
     )
     print(json.dumps(export_result, ensure_ascii=False, indent=2))
+    if export_result["success"]:
+        gdpr_system.portability_engine.wait_for_job(export_result["request_id"], timeout=30)
+        export_status = gdpr_system.get_export_status(test_user_id, export_result["request_id"])
+        print(json.dumps(export_status, ensure_ascii=False, indent=2))
     
     # コア
     print(f"\nコア...")
@@ -72,8 +72,8 @@ def test_gdpr_system():
         
         if export_result["success"]:
             print("? デフォルト")
-            print(f"  - ?: {export_result.get('file_size', 'N/A')} bytes")
-            print(f"  - ?: {export_result.get('checksum', 'N/A')[:16]}...")
+            print(f"  - ジョブID: {export_result['request_id']}")
+            print(f"  - 状態: {export_result['status']}")
         else:
             print("? デフォルト")
         
@@ -0,0 +1,224 @@
+"""
+監査ログのセグメントストア テスト
+日単位セグメント・ユーザー索引・カウンタ・セグメント単位の整理・ハッシュチェーン・NDJSONエクスポート
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from audit_logging import AuditEventType, AuditLoggingSystem, ComplianceMonitoringSystem
+
+
+class SteppingClock:
+    """呼び出しごとに一定時間進む時計"""
+
+    def __init__(self, start: datetime, step: timedelta):
+        self.now = start
+        self.step = step
+
+    def __call__(self) -> datetime:
+        current = self.now
+        self.now += self.step
+        return current
+
+
+def populate(audit_system: AuditLoggingSystem, events: int = 300):
+    event_types = [AuditEventType.DATA_ACCESS, AuditEventType.DATA_EXPORT, AuditEventType.RIGHTS_REQUEST]
+    for i in range(events):
+        audit_system._create_audit_log(
+            event_type=event_types[i % 3],
+            user_id=f"user_{i % 7}",
+            actor_id=f"actor_{i % 4}",
+            data_categories=["therapeutic_data", "user_profile"][: 1 + i % 2],
+            action_description=f"event {i}",
+            data_volume=i,
+            success=i % 5 != 0
+        )
+
+
+def reference_summary(logs):
+    summary = {"total_events": len(logs), "unique_users": len({log.user_id for log in logs}),
+               "event_types": {}, "data_volume_total": sum(log.data_volume for log in logs)}
+    for log in logs:
+        summary["event_types"][log.event_type.value] = summary["event_types"].get(log.event_type.value, 0) + 1
+    summary["success_rate"] = sum(log.success for log in logs) / len(logs) if logs else 0.0
+    return summary
+
+
+class TestAuditLogSegments(unittest.TestCase):
+    """インメモリのセグメントストア"""
+
+    def setUp(self):
+        self.start = datetime(2024, 1, 1, 0, 0)
+        self.clock = SteppingClock(self.start, timedelta(minutes=30))
+        self.audit_system = AuditLoggingSystem(storage_dir="", clock=self.clock)
+        populate(self.audit_system)
+
+    def test_events_partitioned_by_day(self):
+        self.assertEqual(len(self.audit_system.segments), 7)  # 300件 × 30分 = 6.25日
+        self.assertEqual(self.audit_system.total_events, 300)
+        for day, segment in self.audit_system.segments.items():
+            self.assertTrue(all(log.timestamp.date() == day for log in segment.iter_entries()))
+
+    def test_user_queries_match_full_scan(self):
+        all_logs = self.audit_system.audit_logs
+        start_date = self.start + timedelta(days=1, hours=5)
+        end_date = self.start + timedelta(days=3, hours=2)
+
+        for user_id in ("user_0", "user_3"):
+            expected = sorted(
+                (log for log in all_logs if log.user_id == user_id
+                 and start_date <= log.timestamp <= end_date
+                 and log.event_type == AuditEventType.DATA_EXPORT),
+                key=lambda log: log.timestamp, reverse=True
+            )
+            actual = self.audit_system.get_user_audit_logs(
+                user_id, start_date=start_date, end_date=end_date,
+                event_types=[AuditEventType.DATA_EXPORT]
+            )
+            self.assertEqual([log.log_id for log in actual], [log.log_id for log in expected])
+
+        self.assertEqual(self.audit_system.get_user_audit_logs("unknown_user"), [])
+
+    def test_summary_matches_full_scan(self):
+        all_logs = self.audit_system.audit_logs
+        start_date = self.start + timedelta(days=2, hours=7)
+
+        for window in ({}, {"start_date": start_date}, {"end_date": start_date}):
+            logs = [log for log in all_logs
+                    if ("start_date" not in window or log.timestamp >= window["start_date"])
+                    and ("end_date" not in window or log.timestamp <= window["end_date"])]
+            summary = self.audit_system.get_audit_summary(**window)
+            for key, value in reference_summary(logs).items():
+                self.assertEqual(summary[key], value, key)
+
+        self.assertEqual(self.audit_system.count_events([AuditEventType.DATA_ACCESS], failed_only=True),
+                         sum(1 for log in all_logs
+                             if log.event_type == AuditEventType.DATA_ACCESS and not log.success))
+
+    def test_cleanup_drops_whole_segments_and_keeps_chain_valid(self):
+        self.audit_system.log_retention_days = 3
+        self.clock.now = self.start + timedelta(days=7, hours=12)
+        oldest_retained = self.start.date() + timedelta(days=4)
+
+        cleaned = self.audit_system.cleanup_old_logs()
+
+        self.assertEqual(cleaned, 4 * 48)
+        self.assertEqual(min(self.audit_system.segments), oldest_retained)
+        self.assertEqual(self.audit_system.total_events, 300 - 4 * 48)
+        self.assertEqual(self.audit_system.count_expired_events(), 0)
+        self.assertTrue(self.audit_system.verify_integrity()["valid"])
+
+        populate(self.audit_system, events=10)
+        self.assertTrue(self.audit_system.verify_integrity()["valid"])
+
+    def test_retention_check_counts_expired_segments(self):
+        self.audit_system.log_retention_days = 3
+        self.clock.now = self.start + timedelta(days=7, hours=12)
+        compliance_system = ComplianceMonitoringSystem(self.audit_system)
+
+        result = compliance_system.check_data_retention_compliance(
+            compliance_system.compliance_rules["data_retention_check"])
+
+        self.assertEqual(result["violations"][0]["affected_records"], 4 * 48)
+
+    def test_tampering_detected(self):
+        self.assertTrue(self.audit_system.verify_integrity()["valid"])
+
+        segment = self.audit_system.segments[self.start.date() + timedelta(days=2)]
+        record = json.loads(segment._lines[5])
+        record["data_volume"] = 999999
+        segment._lines[5] = json.dumps(record, ensure_ascii=False, sort_keys=True)
+
+        integrity = self.audit_system.verify_integrity()
+        self.assertFalse(integrity["valid"])
+        self.assertEqual(integrity["broken_log_id"], record["log_id"])
+
+    def test_ndjson_export_streams_in_chunks(self):
+        chunks = list(self.audit_system.iter_audit_log_export(chunk_size=64))
+        lines = [line for chunk in chunks for line in chunk.splitlines()]
+
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(len(lines), 300)
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([r["sequence"] for r in records], list(range(1, 301)))
+        self.assertEqual(records[1]["previous_hash"], records[0]["entry_hash"])
+
+        start_date = self.start + timedelta(days=1, hours=1)
+        filtered = "".join(self.audit_system.iter_audit_log_export(start_date=start_date))
+        self.assertTrue(all(datetime.fromisoformat(json.loads(line)["timestamp"]) >= start_date
+                            for line in filtered.splitlines()))
+        self.assertEqual(len(filtered.splitlines()), 300 - 50)
+
+        exported = json.loads(self.audit_system.export_audit_logs(format="json"))
+        self.assertEqual(len(exported), 300)
+        self.assertIn("log_id", exported[0])
+
+
+class TestFileBackedSegments(unittest.TestCase):
+    """JSONLファイルへの追記と再読み込み"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.start = datetime(2024, 1, 1, 0, 0)
+        self.clock = SteppingClock(self.start, timedelta(minutes=30))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reload_restores_indexes_and_chain(self):
+        audit_system = AuditLoggingSystem(storage_dir=self.directory.name, clock=self.clock)
+        populate(audit_system, events=120)
+        expected = [log.log_id for log in audit_system.get_user_audit_logs("user_2")]
+        for segment in audit_system.segments.values():
+            segment.seal()
+
+        reloaded = AuditLoggingSystem(storage_dir=self.directory.name, clock=self.clock)
+
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         [f"audit-2024-01-0{day}.jsonl" for day in range(1, 4)])
+        self.assertEqual(reloaded.total_events, 120)
+        self.assertEqual([log.log_id for log in reloaded.get_user_audit_logs("user_2")], expected)
+        self.assertEqual(reloaded.get_audit_summary(), audit_system.get_audit_summary())
+
+        populate(reloaded, events=5)
+        self.assertEqual(reloaded.audit_logs[-1].sequence, 125)
+        self.assertTrue(reloaded.verify_integrity()["valid"])
+
+    def test_incomplete_trailing_record_truncated(self):
+        audit_system = AuditLoggingSystem(storage_dir=self.directory.name, clock=self.clock)
+        populate(audit_system, events=10)
+        segment = next(iter(audit_system.segments.values()))
+        segment.seal()
+        with open(segment.path, "ab") as handle:
+            handle.write(b'{"log_id": "partial')
+
+        reloaded = AuditLoggingSystem(storage_dir=self.directory.name, clock=self.clock)
+
+        self.assertEqual(reloaded.total_events, 10)
+        self.assertTrue(reloaded.verify_integrity()["valid"])
+        populate(reloaded, events=1)
+        self.assertTrue(reloaded.verify_integrity()["valid"])
+
+    def test_cleanup_removes_segment_files(self):
+        audit_system = AuditLoggingSystem(storage_dir=self.directory.name, clock=self.clock)
+        populate(audit_system, events=120)
+        audit_system.log_retention_days = 1
+        self.clock.now = self.start + timedelta(days=2, hours=23)
+
+        cleaned = audit_system.cleanup_old_logs()
+
+        self.assertEqual(cleaned, 48)
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ["audit-2024-01-02.jsonl", "audit-2024-01-03.jsonl"])
+        self.assertTrue(audit_system.verify_integrity()["valid"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -142,24 +142,21 @@ class TestComplianceMonitoringIntegration(unittest.TestCase):
     
     def test_data_retention_compliance_check(self):
         """デフォルト"""
-        # ?
-        old_log_entry = self.audit_system._create_audit_log(
+        # 8年前の日付のセグメントに記録されたログ
+        audit_system = AuditLoggingSystem(clock=lambda: datetime.now() - timedelta(days=3000))
+        audit_system._create_audit_log(
             event_type=AuditEventType.DATA_ACCESS,
             user_id=self.test_user_id,
             actor_id="system",
             data_categories=["old_data"],
             action_description="?"
         )
-        
-        # ログ
-        for log in self.audit_system.audit_logs:
-            if log.log_id == old_log_entry:
-                log.timestamp = datetime.now() - timedelta(days=3000)  # 8?
-                break
+        audit_system.clock = datetime.now
+        compliance_system = ComplianceMonitoringSystem(audit_system)
         
         # デフォルト
         rule_id = "data_retention_check"
-        result = self.compliance_system.run_compliance_check([rule_id])
+        result = compliance_system.run_compliance_check([rule_id])
         
         self.assertIn(rule_id, result["rule_results"])
         rule_result = result["rule_results"][rule_id]
@@ -324,31 +321,27 @@ class TestComplianceMonitoringIntegration(unittest.TestCase):
     
     def test_log_cleanup_functionality(self):
         """ログ"""
-        # ?
-        initial_log_count = len(self.audit_system.audit_logs)
-        
-        # ?
-        old_log_entry = self.audit_system._create_audit_log(
+        # 8年前の日付のセグメントと当日のセグメント
+        audit_system = AuditLoggingSystem(clock=lambda: datetime.now() - timedelta(days=3000))
+        audit_system._create_audit_log(
             event_type=AuditEventType.DATA_ACCESS,
             user_id=self.test_user_id,
             actor_id="system",
             data_categories=["test_data"],
             action_description="?"
         )
-        
-        # ログ
-        for log in self.audit_system.audit_logs:
-            if log.log_id == old_log_entry:
-                log.timestamp = datetime.now() - timedelta(days=3000)  # 8?
-                break
+        audit_system.clock = datetime.now
+        audit_system.log_data_access(self.test_user_id, "system", ["test_data"], "当日のアクセス")
+        initial_log_count = audit_system.total_events
         
         # ?
-        cleaned_count = self.audit_system.cleanup_old_logs()
+        cleaned_count = audit_system.cleanup_old_logs()
         
         # ?
         self.assertGreater(cleaned_count, 0)
-        final_log_count = len(self.audit_system.audit_logs)
-        self.assertLess(final_log_count, initial_log_count + 1)  # +1は
+        final_log_count = audit_system.total_events
+        self.assertLess(final_log_count, initial_log_count)
+        self.assertTrue(audit_system.verify_integrity()["valid"])
     
     def test_security_incident_monitoring(self):
         """?"""
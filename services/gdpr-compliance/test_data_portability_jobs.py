@@ -0,0 +1,248 @@
+"""
+データポータビリティ エクスポートジョブ テスト
+ストリーミング書き出し・1パスのチェックサム・ジョブキュー・レート制限・メモリ上限
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+import zipfile
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from audit_logging import AuditEventType, AuditLoggingSystem
+from data_portability import DataPortabilityEngine, DataPortabilityScope, ExportFormat
+
+
+def interaction_source(records: int):
+    def source(user_id: str):
+        for i in range(records):
+            yield {
+                "interaction_id": f"{user_id}-{i}",
+                "interaction_type": "task_completed",
+                "timestamp": "2024-01-01T10:00:00Z",
+                "context": {"task_id": f"task_{i % 50}"},
+                "response": {"xp": i % 40}
+            }
+    return source
+
+
+class TestStreamingExport(unittest.TestCase):
+    """ストリーミング書き出し"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = DataPortabilityEngine(export_dir=self.directory.name)
+
+    def tearDown(self):
+        self.engine.shutdown()
+        self.directory.cleanup()
+
+    def export(self, export_format: ExportFormat, **options):
+        request_id = self.engine.create_portability_request(
+            "user_1", DataPortabilityScope.CUSTOM, export_format,
+            custom_categories=["user_profile", "interaction_history"], **options
+        )
+        return self.engine.process_portability_request(request_id)
+
+    def test_checksum_matches_written_file(self):
+        self.engine.register_data_source("interaction_history", interaction_source(500))
+
+        for export_format in (ExportFormat.JSON, ExportFormat.CSV, ExportFormat.XML, ExportFormat.YAML):
+            result = self.export(export_format)
+            with open(result["file_path"], "rb") as f:
+                content = f.read()
+
+            self.assertEqual(result["checksum"], hashlib.sha256(content).hexdigest())
+            self.assertEqual(result["file_size"], len(content))
+            self.assertEqual(result["records_exported"], 501)
+            self.assertIsNone(zipfile.ZipFile(io.BytesIO(content)).testzip())
+
+    def test_json_export_contents(self):
+        self.engine.register_data_source("interaction_history", interaction_source(20))
+
+        result = self.export(ExportFormat.JSON)
+        with zipfile.ZipFile(result["file_path"]) as archive:
+            exported = json.loads(archive.read("personal_data_export.json"))
+
+        self.assertEqual(len(exported["data"]["interaction_history"]), 20)
+        self.assertEqual(exported["data"]["user_profile"][0]["user_id"], "user_1")
+        self.assertEqual(exported["_metadata"]["export_info"]["total_records"], 21)
+
+        raw = self.export(ExportFormat.JSON, include_metadata=False, compress_output=False)
+        with open(raw["file_path"], encoding="utf-8") as f:
+            self.assertEqual(list(json.load(f)), ["user_profile", "interaction_history"])
+
+    def test_csv_splits_at_max_rows_per_file(self):
+        self.engine.data_schemas["interaction_history"].format_specific_rules["csv"]["max_rows_per_file"] = 100
+        self.engine.register_data_source("interaction_history", interaction_source(250))
+
+        result = self.export(ExportFormat.CSV)
+        with zipfile.ZipFile(result["file_path"]) as archive:
+            names = archive.namelist()
+            rows = [archive.read(name).decode("utf-8").splitlines() for name in names
+                    if name.startswith("interaction_history")]
+
+        self.assertEqual(names, ["user_profile.csv", "interaction_history.csv", "interaction_history_2.csv",
+                                 "interaction_history_3.csv", "_metadata.json"])
+        self.assertEqual([len(lines) - 1 for lines in rows], [100, 100, 50])
+
+    def test_source_error_marks_request_failed(self):
+        def broken_source(user_id):
+            yield {"interaction_id": "1"}
+            raise IOError("source unavailable")
+
+        self.engine.register_data_source("interaction_history", broken_source)
+        result = self.export(ExportFormat.JSON)
+        status = self.engine.get_portability_status(next(iter(self.engine.portability_requests)))
+
+        self.assertIn("source unavailable", result["error"])
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_peak_memory_independent_of_history_size(self):
+        def peak_for(records: int) -> int:
+            self.engine.register_data_source("interaction_history", interaction_source(records))
+            tracemalloc.start()
+            result = self.export(ExportFormat.JSON)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.assertEqual(result["records_exported"], records + 1)
+            return peak
+
+        small = peak_for(1000)
+        large = peak_for(50000)
+
+        self.assertLess(large, 2 * 1024 * 1024)
+        self.assertLess(large - small, 256 * 1024)
+
+
+class TestExportJobs(unittest.TestCase):
+    """ジョブキューとレート制限"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = DataPortabilityEngine(export_dir=self.directory.name, max_concurrent_exports=2)
+
+    def tearDown(self):
+        self.engine.shutdown()
+        self.directory.cleanup()
+
+    def test_submit_poll_and_download(self):
+        self.engine.register_data_source("interaction_history", interaction_source(1000))
+
+        submitted = self.engine.submit_export_job("user_1", DataPortabilityScope.USER_GENERATED, ExportFormat.CSV)
+        self.assertEqual(submitted["status"], "queued")
+
+        status = self.engine.wait_for_job(submitted["request_id"], timeout=10)
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual(status["records_exported"], 1000)
+
+        chunks = list(self.engine.stream_export(submitted["request_id"], "user_1", chunk_size=4096))
+        content = b"".join(chunks)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(hashlib.sha256(content).hexdigest(), status["checksum"])
+        self.assertEqual(self.engine.download_export(submitted["request_id"], "user_1"), content)
+        self.assertIsNone(self.engine.stream_export(submitted["request_id"], "other_user"))
+
+    def test_worker_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        running = {"now": 0, "max": 0}
+
+        def slow_source(user_id):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+            yield {"interaction_id": user_id}
+
+        self.engine.register_data_source("interaction_history", slow_source)
+        request_ids = [
+            self.engine.submit_export_job(f"user_{i}", DataPortabilityScope.USER_GENERATED,
+                                          ExportFormat.JSON)["request_id"]
+            for i in range(6)
+        ]
+
+        statuses = [self.engine.wait_for_job(request_id, timeout=10) for request_id in request_ids]
+
+        self.assertTrue(all(status["status"] == "completed" for status in statuses))
+        self.assertEqual(running["max"], 2)
+
+    def test_per_user_rate_limit(self):
+        engine = DataPortabilityEngine(export_dir=self.directory.name, max_exports_per_user=2,
+                                       rate_limit_window=timedelta(hours=1))
+        self.addCleanup(engine.shutdown)
+        release = threading.Event()
+
+        def blocking_source(user_id):
+            release.wait(10)
+            return [{"interaction_id": user_id}]
+
+        engine.register_data_source("interaction_history", blocking_source)
+        first = engine.submit_export_job("user_1", DataPortabilityScope.USER_GENERATED, ExportFormat.JSON)
+
+        # 実行中のジョブがある間は同じユーザーの投入を拒否
+        in_progress = engine.submit_export_job("user_1", DataPortabilityScope.USER_GENERATED, ExportFormat.JSON)
+        self.assertEqual(in_progress["error"], "Export already in progress")
+        self.assertTrue(engine.submit_export_job("user_2", DataPortabilityScope.USER_GENERATED,
+                                                 ExportFormat.JSON)["success"])
+
+        release.set()
+        engine.wait_for_job(first["request_id"], timeout=10)
+        second = engine.submit_export_job("user_1", DataPortabilityScope.USER_GENERATED, ExportFormat.JSON)
+        engine.wait_for_job(second["request_id"], timeout=10)
+
+        limited = engine.submit_export_job("user_1", DataPortabilityScope.USER_GENERATED, ExportFormat.JSON)
+        self.assertEqual(limited["error"], "Rate limit exceeded")
+        self.assertTrue(0 < limited["retry_after_seconds"] <= 3600)
+
+    def test_completion_and_failure_are_audit_logged(self):
+        audit_system = AuditLoggingSystem(storage_dir="")
+        finished = []
+
+        def audit_export_job(request, result):
+            finished.append(request.request_id)
+            audit_system.log_data_export(
+                user_id=request.user_id, export_format=request.format.value,
+                data_categories=[request.scope.value], export_size=request.file_size or 0,
+                checksum=request.checksum or "", request_id=request.request_id,
+                success=bool(result.get("success")), error_message=request.error or ""
+            )
+
+        engine = DataPortabilityEngine(export_dir=self.directory.name, on_job_finished=audit_export_job)
+        self.addCleanup(engine.shutdown)
+
+        def source(user_id):
+            if user_id == "broken_user":
+                raise IOError("source unavailable")
+            return [{"interaction_id": user_id}]
+
+        engine.register_data_source("interaction_history", source)
+        ok = engine.submit_export_job("user_1", DataPortabilityScope.USER_GENERATED, ExportFormat.JSON)
+        failed = engine.submit_export_job("broken_user", DataPortabilityScope.USER_GENERATED, ExportFormat.JSON)
+        engine.wait_for_job(ok["request_id"], timeout=10)
+        engine.wait_for_job(failed["request_id"], timeout=10)
+
+        self.assertCountEqual(finished, [ok["request_id"], failed["request_id"]])
+        entries = {entry.metadata["request_id"]: entry for entry in audit_system.audit_logs
+                   if entry.event_type == AuditEventType.DATA_EXPORT}
+        self.assertTrue(entries[ok["request_id"]].success)
+        self.assertEqual(entries[ok["request_id"]].metadata["checksum"],
+                         engine.get_portability_status(ok["request_id"])["checksum"])
+        self.assertFalse(entries[failed["request_id"]].success)
+        self.assertIn("source unavailable", entries[failed["request_id"]].error_message)
+        self.assertTrue(audit_system.verify_integrity()["valid"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Nightly Reflection Reminder Benchmark
+
+users 人分のストリークを読み込み、今夜のリマインダー（2日以上振り返っていない
+ユーザー向けの Flex メッセージ JSON）を全件作るまでの時間を比較する。
+従来方式は全ユーザーの get_streak_status を見て generate_reminder_message を
+json.dumps する
+
+Usage: python benchmark_nightly_reminders.py [users] [active_ratio]
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import GrowthNoteSystem
+from reflection_continuity_system import ReflectionContinuitySystem, ReflectionStreak
+
+
+def build_system(users, active_ratio):
+    """active_ratio の割合は昨日か今日に振り返り、残りは2〜60日前が最後"""
+    rng = random.Random(3)
+    today = date.today()
+    continuity_system = ReflectionContinuitySystem(GrowthNoteSystem())
+    for i in range(users):
+        days_ago = rng.randint(0, 1) if rng.random() < active_ratio else rng.randint(2, 60)
+        longest = rng.randint(0, 40)
+        continuity_system.add_streak(ReflectionStreak(
+            user_id=f"user_{i}",
+            current_streak=min(longest, rng.randint(0, 10)),
+            longest_streak=longest,
+            total_reflections=longest + rng.randint(0, 200),
+            last_reflection_date=today - timedelta(days=days_ago)
+        ))
+    return continuity_system
+
+
+def full_scan(continuity_system):
+    for user_id in continuity_system.user_streaks:
+        status = continuity_system.get_streak_status(user_id)
+        if status["needs_reminder"]:
+            message = continuity_system.generate_reminder_message(user_id, status["missed_days_in_row"])
+            yield user_id, json.dumps(message, ensure_ascii=False)
+
+
+def run(name, reminders):
+    started = time.perf_counter()
+    sent = 0
+    for _ in reminders:
+        sent += 1
+    elapsed = time.perf_counter() - started
+    print(f"{name:<16} {elapsed:8.2f} s  {sent:>10,} reminders  ({sent / elapsed:>10,.0f} reminders/s)")
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    active_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.7
+    continuity_system = build_system(users, active_ratio)
+    print(f"users={users:,} active_ratio={active_ratio}")
+    run("full scan", full_scan(continuity_system))
+    run("date index", continuity_system.iter_nightly_reminders())
@@ -5,8 +5,10 @@
 """
 
 import json
+import random
 from datetime import datetime, timedelta, date
-from typing import Dict, List, Optional, Tuple
+from types import SimpleNamespace
+from typing import AbstractSet, Dict, Iterator, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 from main import GrowthNoteSystem, ReflectionAnalysis
@@ -26,6 +28,45 @@ class ReflectionStreak:
     missed_days_in_row: int = 0
     streak_milestones: List[int] = field(default_factory=lambda: [])
 
+class ReflectionDateIndex:
+    """
+    最終振り返り日ごとのユーザー集合
+
+    N日振り返っていないユーザーは today - N 日のバケットそのものなので、
+    夜のリマインダー処理で全ユーザーを見る必要がない。日付の変更は
+    ReflectionContinuitySystem.set_last_reflection_date から move で反映する
+    """
+
+    _EMPTY: AbstractSet[str] = frozenset()
+
+    def __init__(self):
+        self.users_by_date: Dict[date, Set[str]] = {}
+        self.date_by_user: Dict[str, date] = {}  # 索引に載っている日付（移動元のバケット）
+
+    def move(self, user_id: str, new_date: Optional[date]):
+        """user_id を new_date のバケットへ移す（None なら索引から外す）"""
+        old_date = self.date_by_user.get(user_id)
+        if old_date == new_date:
+            return
+        if old_date is not None:
+            bucket = self.users_by_date.get(old_date)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self.users_by_date[old_date]
+            del self.date_by_user[user_id]
+        if new_date is not None:
+            self.users_by_date.setdefault(new_date, set()).add(user_id)
+            self.date_by_user[user_id] = new_date
+
+    def users_on(self, day: date) -> AbstractSet[str]:
+        """day が最終振り返り日のユーザー（読み取り専用）"""
+        return self.users_by_date.get(day, self._EMPTY)
+
+    def dates_until(self, last_day: date) -> List[date]:
+        """last_day 以前のバケットの日付（新しい順）"""
+        return sorted((day for day in self.users_by_date if day <= last_day), reverse=True)
+
 @dataclass
 class StoryPersonalizationData:
     user_id: str
@@ -36,10 +77,18 @@ class StoryPersonalizationData:
     reflection_insights: List[Dict]
     last_updated: datetime
 
+# リマインダー本文の末尾（_streak_band の帯ごと）
+REMINDER_FOOTNOTES = {
+    "first": "\n\n?",
+    "recent": "\n\n?{longest_streak}?",
+    "lapsed": "\n\n{missed_days}?{total_reflections}?",
+}
+
 class ReflectionContinuitySystem:
     def __init__(self, growth_note_system: GrowthNoteSystem):
         self.growth_note_system = growth_note_system
         self.user_streaks: Dict[str, ReflectionStreak] = {}
+        self.reflection_index = ReflectionDateIndex()
         self.story_personalization: Dict[str, StoryPersonalizationData] = {}
         self.milestone_rewards = {
             3: {"xp": 50, "message": "3?"},
@@ -71,13 +120,14 @@ class ReflectionContinuitySystem:
                 "?"
             ]
         }
+        self._reminder_templates = self._render_reminder_templates()
 
     def update_reflection_streak(self, user_id: str, reflection_completed: bool = True) -> Dict:
         """?"""
         today = date.today()
         
         if user_id not in self.user_streaks:
-            self.user_streaks[user_id] = ReflectionStreak(user_id=user_id)
+            self.add_streak(ReflectionStreak(user_id=user_id))
         
         streak = self.user_streaks[user_id]
         
@@ -97,7 +147,7 @@ class ReflectionContinuitySystem:
                 streak.current_streak = 1
                 streak.missed_days_in_row = 0
             
-            streak.last_reflection_date = today
+            self.set_last_reflection_date(user_id, today)
             streak.total_reflections += 1
             
             # ?
@@ -130,6 +180,21 @@ class ReflectionContinuitySystem:
                 "needs_reminder": streak.missed_days_in_row >= 2
             }
 
+    def add_streak(self, streak: ReflectionStreak):
+        """ストリークを登録して最終振り返り日の索引に載せる（一括読み込み用）"""
+        self.user_streaks[streak.user_id] = streak
+        self.reflection_index.move(streak.user_id, streak.last_reflection_date)
+
+    def set_last_reflection_date(self, user_id: str, day: Optional[date]):
+        """最終振り返り日を更新して索引のバケットを移す（日付の変更は必ずここを通す）"""
+        self.user_streaks[user_id].last_reflection_date = day
+        self.reflection_index.move(user_id, day)
+
+    def users_missed_days(self, missed_days: int, today: Optional[date] = None) -> AbstractSet[str]:
+        """最後の振り返りからちょうど missed_days 日たったユーザー"""
+        today = today or date.today()
+        return self.reflection_index.users_on(today - timedelta(days=missed_days))
+
     def _check_milestone(self, streak: ReflectionStreak) -> Optional[Dict]:
         """?"""
         if streak.current_streak in self.milestone_rewards:
@@ -146,23 +211,73 @@ class ReflectionContinuitySystem:
     def generate_reminder_message(self, user_id: str, missed_days: int) -> Dict:
         """リスト"""
         # リスト
-        if missed_days <= 3:
-            reminder_type = ReminderType.GENTLE
-        elif missed_days <= 7:
-            reminder_type = ReminderType.ENCOURAGING
-        else:
-            reminder_type = ReminderType.MOTIVATIONAL
+        reminder_type = self._reminder_type(missed_days)
         
         # ユーザー
         streak = self.user_streaks.get(user_id, ReflectionStreak(user_id=user_id))
         
         # メイン
-        import random
         base_message = random.choice(self.reminder_messages[reminder_type])
         
         # ?
         personalized_message = self._personalize_reminder(base_message, streak, missed_days)
         
+        return self._build_reminder_flex(reminder_type, personalized_message, streak)
+
+    def iter_nightly_reminders(self, today: Optional[date] = None, min_missed_days: int = 2,
+                               max_missed_days: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """
+        今夜のリマインダーを (user_id, Flexメッセージの JSON) で順に返す
+
+        対象は最終振り返り日の索引から min_missed_days 日以上（max_missed_days 以下）
+        振り返っていないユーザーだけで、スキップ日数の少ない順に出す。
+        本文は種類・帯ごとに前もって JSON にしたテンプレートへ数値を埋めるだけ
+        """
+        today = today or date.today()
+        for day in self.reflection_index.dates_until(today - timedelta(days=min_missed_days)):
+            missed_days = (today - day).days
+            if max_missed_days is not None and missed_days > max_missed_days:
+                break
+            for user_id in list(self.reflection_index.users_on(day)):
+                yield user_id, self.render_reminder_json(self.user_streaks[user_id], missed_days)
+
+    def render_reminder_json(self, streak: ReflectionStreak, missed_days: int) -> str:
+        """generate_reminder_message と同じ内容を JSON 文字列で返す"""
+        templates = self._reminder_templates[(self._reminder_type(missed_days), self._streak_band(streak, missed_days))]
+        return random.choice(templates) % {
+            "current_streak": streak.current_streak,
+            "longest_streak": streak.longest_streak,
+            "total_reflections": streak.total_reflections,
+            "missed_days": missed_days,
+        }
+
+    def _render_reminder_templates(self) -> Dict[Tuple[ReminderType, str], List[str]]:
+        """種類・帯・基本メッセージごとに、数値だけを %(name)d で残した JSON を作る"""
+        fields = ("current_streak", "longest_streak", "total_reflections", "missed_days")
+        markers = {name: f"@@{name}@@" for name in fields}
+        placeholder_streak = SimpleNamespace(**{name: markers[name] for name in fields[:3]})
+        templates = {}
+        for reminder_type, messages in self.reminder_messages.items():
+            for band, footnote in REMINDER_FOOTNOTES.items():
+                rendered = []
+                for base_message in messages:
+                    flex = self._build_reminder_flex(
+                        reminder_type, base_message + footnote.format(**markers), placeholder_streak)
+                    template = json.dumps(flex, ensure_ascii=False).replace("%", "%%")
+                    for name, marker in markers.items():
+                        template = template.replace(marker, f"%({name})d")
+                    rendered.append(template)
+                templates[(reminder_type, band)] = rendered
+        return templates
+
+    def _reminder_type(self, missed_days: int) -> ReminderType:
+        if missed_days <= 3:
+            return ReminderType.GENTLE
+        elif missed_days <= 7:
+            return ReminderType.ENCOURAGING
+        return ReminderType.MOTIVATIONAL
+
+    def _build_reminder_flex(self, reminder_type: ReminderType, personalized_message: str, streak) -> Dict:
         return {
             "type": "flex",
             "altText": "?",
@@ -268,13 +383,18 @@ class ReflectionContinuitySystem:
 
     def _personalize_reminder(self, base_message: str, streak: ReflectionStreak, missed_days: int) -> str:
         """リスト"""
+        footnote = REMINDER_FOOTNOTES[self._streak_band(streak, missed_days)]
+        return base_message + footnote.format(
+            longest_streak=streak.longest_streak,
+            missed_days=missed_days,
+            total_reflections=streak.total_reflections
+        )
+
+    def _streak_band(self, streak: ReflectionStreak, missed_days: int) -> str:
+        """first: 記録なし、recent: 2日以内のスキップ、lapsed: それ以上"""
         if streak.longest_streak > 0:
-            if missed_days <= 2:
-                return f"{base_message}\n\n?{streak.longest_streak}?"
-            else:
-                return f"{base_message}\n\n{missed_days}?{streak.total_reflections}?"
-        else:
-            return f"{base_message}\n\n?"
+            return "recent" if missed_days <= 2 else "lapsed"
+        return "first"
 
     def _get_reminder_emoji(self, reminder_type: ReminderType) -> str:
         """リスト"""
@@ -442,12 +562,12 @@ def demo_continuity_system():
     
     # 2?
     streak = continuity_system.user_streaks[user_id]
-    streak.last_reflection_date = date.today() - timedelta(days=1)
+    continuity_system.set_last_reflection_date(user_id, date.today() - timedelta(days=1))
     result2 = continuity_system.update_reflection_streak(user_id, True)
     print(f"2?: {result2}")
     
     # 3?
-    streak.last_reflection_date = date.today() - timedelta(days=1)
+    continuity_system.set_last_reflection_date(user_id, date.today() - timedelta(days=1))
     streak.current_streak = 2
     result3 = continuity_system.update_reflection_streak(user_id, True)
     print(f"3?: {result3}")
@@ -0,0 +1,98 @@
+"""
+最終振り返り日の索引と夜のリマインダー一括生成のテスト
+"""
+
+import copy
+import json
+import random
+from dataclasses import replace
+from datetime import date, timedelta
+
+from reflection_continuity_system import ReflectionContinuitySystem, ReflectionStreak
+from main import GrowthNoteSystem
+
+
+def make_streak(user_id, days_ago, today, current=0, longest=0, total=0):
+    return ReflectionStreak(
+        user_id=user_id,
+        current_streak=current,
+        longest_streak=longest,
+        total_reflections=total,
+        last_reflection_date=None if days_ago is None else today - timedelta(days=days_ago)
+    )
+
+
+class TestReflectionDateIndex:
+
+    def setup_method(self):
+        self.continuity_system = ReflectionContinuitySystem(GrowthNoteSystem())
+        self.today = date.today()
+
+    def test_index_follows_updates_and_set_last_reflection_date(self):
+        self.continuity_system.update_reflection_streak("user1", True)
+        assert self.continuity_system.users_missed_days(0) == {"user1"}
+
+        self.continuity_system.set_last_reflection_date("user1", self.today - timedelta(days=3))
+        assert self.continuity_system.users_missed_days(0) == set()
+        assert self.continuity_system.users_missed_days(3) == {"user1"}
+
+        self.continuity_system.update_reflection_streak("user1", True)
+        assert self.continuity_system.users_missed_days(3) == set()
+        assert self.continuity_system.users_missed_days(0) == {"user1"}
+        assert list(self.continuity_system.reflection_index.users_by_date) == [self.today]
+
+    def test_add_streak_replaces_previous_entry(self):
+        self.continuity_system.add_streak(make_streak("user2", 4, self.today))
+        self.continuity_system.add_streak(make_streak("user2", 6, self.today))
+
+        assert self.continuity_system.users_missed_days(4) == set()
+        assert self.continuity_system.users_missed_days(6) == {"user2"}
+
+    def test_copies_do_not_write_to_the_index(self):
+        self.continuity_system.add_streak(make_streak("user3", 2, self.today))
+        streak = self.continuity_system.user_streaks["user3"]
+
+        copied = copy.copy(streak)
+        copied.last_reflection_date = self.today
+        replace(streak, last_reflection_date=self.today - timedelta(days=5))
+
+        assert self.continuity_system.users_missed_days(0) == set()
+        assert self.continuity_system.users_missed_days(5) == set()
+        assert self.continuity_system.users_missed_days(2) == {"user3"}
+        assert streak.last_reflection_date == self.today - timedelta(days=2)
+
+
+class TestNightlyReminders:
+
+    def setup_method(self):
+        self.continuity_system = ReflectionContinuitySystem(GrowthNoteSystem())
+        self.today = date(2024, 5, 20)
+        for i, days_ago in enumerate([0, 1, 2, 3, 5, 9, 30, None]):
+            self.continuity_system.add_streak(
+                make_streak(f"user{i}", days_ago, self.today, current=i % 3, longest=i % 4, total=i * 5))
+
+    def test_only_users_who_missed_reflections_are_emitted(self):
+        reminders = list(self.continuity_system.iter_nightly_reminders(today=self.today))
+        assert [user_id for user_id, _ in reminders] == ["user2", "user3", "user4", "user5", "user6"]
+
+        limited = self.continuity_system.iter_nightly_reminders(today=self.today, min_missed_days=3,
+                                                                max_missed_days=9)
+        assert [user_id for user_id, _ in limited] == ["user3", "user4", "user5"]
+
+    def test_rendered_json_matches_generate_reminder_message(self):
+        for user_id, streak in self.continuity_system.user_streaks.items():
+            for missed_days in [1, 2, 3, 4, 7, 8, 15]:
+                for seed in range(4):
+                    random.seed(seed)
+                    rendered = json.loads(self.continuity_system.render_reminder_json(streak, missed_days))
+                    random.seed(seed)
+                    assert rendered == self.continuity_system.generate_reminder_message(user_id, missed_days)
+
+    def test_stream_tolerates_reflections_completed_while_sending(self):
+        self.continuity_system.add_streak(make_streak("late_user", 2, self.today))
+        sent = []
+        for user_id, payload in self.continuity_system.iter_nightly_reminders(today=self.today, max_missed_days=2):
+            sent.append(user_id)
+            self.continuity_system.set_last_reflection_date(user_id, self.today)
+        assert sorted(sent) == ["late_user", "user2"]
+        assert self.continuity_system.users_missed_days(2, today=self.today) == set()
@@ -0,0 +1,187 @@
+"""
+ケアポイント台帳
+
+追記専用の取引ログに、口座ごとの取引オフセット索引と、追記と同じ
+ロック内で更新する残高（materialised balance）を持たせる。
+一定件数ごとに残高のチェックポイントを取り、チェックポイントからの
+再生で残高が台帳と一致することを検証できる。
+"""
+
+import bisect
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class CarePointTransaction(BaseModel):
+    transaction_id: str
+    from_entity: str  # 送り元の企業ID or システム
+    to_user: str      # ユーザーID
+    points: int
+    transaction_type: str  # "purchase", "transfer", "bonus"
+    created_at: datetime
+    metadata: Optional[Dict[str, Any]] = None
+
+
+# 送り元の残高を減らさない取引（外部からの入金）
+CREDIT_ONLY_TYPES = frozenset({"purchase", "bonus"})
+
+
+class InsufficientBalanceError(Exception):
+    """送り元の残高不足"""
+
+    def __init__(self, entity_id: str, balance: int, requested: int):
+        super().__init__(f"Insufficient balance for {entity_id}: {balance} < {requested}")
+        self.entity_id = entity_id
+        self.balance = balance
+        self.requested = requested
+
+
+@dataclass(frozen=True)
+class LedgerCheckpoint:
+    offset: int  # この件数までの取引を反映した残高
+    balances: Mapping[str, int]
+    created_at: datetime
+
+
+def apply_transaction(balances: Dict[str, int], transaction: CarePointTransaction):
+    """取引1件を残高に反映"""
+    if transaction.transaction_type not in CREDIT_ONLY_TYPES:
+        balances[transaction.from_entity] = balances.get(transaction.from_entity, 0) - transaction.points
+    balances[transaction.to_user] = balances.get(transaction.to_user, 0) + transaction.points
+
+
+class CarePointLedger:
+    """
+    追記専用のケアポイント台帳
+
+    取引の位置（オフセット）は追記順で固定され、口座ごとの索引は
+    オフセットの昇順リストになる。履歴はカーソル（最後に返した取引の
+    オフセット）から二分探索で辿るため、台帳全体の件数に依存しない。
+    """
+
+    def __init__(self, checkpoint_interval: int = 1000, max_checkpoints: int = 24):
+        self.checkpoint_interval = checkpoint_interval
+        self._entries: List[CarePointTransaction] = []
+        self._account_index: Dict[str, List[int]] = {}
+        self._balances: Dict[str, int] = {}
+        self.checkpoints: "deque[LedgerCheckpoint]" = deque(maxlen=max_checkpoints)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def balances(self) -> Mapping[str, int]:
+        return MappingProxyType(self._balances)
+
+    def balance(self, entity_id: str) -> int:
+        return self._balances.get(entity_id, 0)
+
+    def append(self, transaction: CarePointTransaction, require_funds: bool = True) -> int:
+        """取引を追記し、残高と索引を同じロック内で更新（追記位置を返す）"""
+        with self._lock:
+            if require_funds and transaction.transaction_type not in CREDIT_ONLY_TYPES:
+                balance = self._balances.get(transaction.from_entity, 0)
+                if balance < transaction.points:
+                    raise InsufficientBalanceError(transaction.from_entity, balance, transaction.points)
+
+            offset = len(self._entries)
+            self._entries.append(transaction)
+            apply_transaction(self._balances, transaction)
+            for entity_id in {transaction.from_entity, transaction.to_user}:
+                self._account_index.setdefault(entity_id, []).append(offset)
+
+            if (offset + 1) % self.checkpoint_interval == 0:
+                self._take_checkpoint()
+            return offset
+
+    def checkpoint(self) -> LedgerCheckpoint:
+        with self._lock:
+            return self._take_checkpoint()
+
+    def _take_checkpoint(self) -> LedgerCheckpoint:
+        checkpoint = LedgerCheckpoint(
+            offset=len(self._entries),
+            balances=MappingProxyType(dict(self._balances)),
+            created_at=datetime.utcnow()
+        )
+        self.checkpoints.append(checkpoint)
+        return checkpoint
+
+    def history(self, entity_id: str, limit: int = 50,
+                cursor: Optional[str] = None) -> Tuple[List[CarePointTransaction], Optional[str]]:
+        """口座の取引を新しい順に返す（次ページのカーソル付き）"""
+        with self._lock:
+            offsets = self._account_index.get(entity_id, [])
+            end = len(offsets) if cursor is None else bisect.bisect_left(offsets, int(cursor))
+            start = max(0, end - limit)
+            page = [self._entries[offset] for offset in reversed(offsets[start:end])]
+            next_cursor = str(offsets[start]) if start > 0 else None
+        return page, next_cursor
+
+    def transaction_count(self, entity_id: str) -> int:
+        return len(self._account_index.get(entity_id, []))
+
+    def verify(self, full: bool = False) -> Dict[str, Any]:
+        """
+        残高を台帳の再生結果と照合
+
+        既定では最新のチェックポイント以降だけを再生する。full=True では
+        先頭から再生し、保持しているチェックポイントとも照合する。
+        """
+        with self._lock:
+            entry_count = len(self._entries)
+            balances = dict(self._balances)
+            checkpoints = list(self.checkpoints)
+
+        if full or not checkpoints:
+            start_offset, replayed = 0, {}
+        else:
+            start_offset, replayed = checkpoints[-1].offset, dict(checkpoints[-1].balances)
+        pending = {checkpoint.offset: checkpoint for checkpoint in checkpoints if checkpoint.offset > start_offset}
+
+        for offset in range(start_offset, entry_count):
+            apply_transaction(replayed, self._entries[offset])
+            checkpoint = pending.get(offset + 1)
+            if checkpoint is not None and _nonzero(replayed) != _nonzero(checkpoint.balances):
+                return self._verification(False, start_offset, offset + 1 - start_offset,
+                                          _mismatched(replayed, checkpoint.balances), checkpoint.offset)
+
+        mismatched = _mismatched(replayed, balances)
+        return self._verification(not mismatched, start_offset, entry_count - start_offset, mismatched, None)
+
+    @staticmethod
+    def _verification(valid: bool, start_offset: int, replayed: int,
+                      mismatched: List[str], failed_checkpoint: Optional[int]) -> Dict[str, Any]:
+        return {
+            "valid": valid,
+            "replayed_from": start_offset,
+            "entries_replayed": replayed,
+            "mismatched_accounts": mismatched,
+            "failed_checkpoint": failed_checkpoint
+        }
+
+
+def _nonzero(balances: Mapping[str, int]) -> Dict[str, int]:
+    return {entity_id: value for entity_id, value in balances.items() if value}
+
+
+def _mismatched(expected: Mapping[str, int], actual: Mapping[str, int]) -> List[str]:
+    return sorted(
+        entity_id for entity_id in set(expected) | set(actual)
+        if expected.get(entity_id, 0) != actual.get(entity_id, 0)
+    )
+
+
+__all__ = [
+    'CarePointTransaction',
+    'CarePointLedger',
+    'InsufficientBalanceError',
+    'LedgerCheckpoint',
+]
@@ -7,12 +7,14 @@
 import stripe
 from fastapi import HTTPException
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 import uuid
 import logging
 
+from care_points_ledger import CarePointLedger, CarePointTransaction, InsufficientBalanceError
+
 logger = logging.getLogger(__name__)
 
 # Stripe設定
@@ -23,15 +25,6 @@ class DiscountType(Enum):
     CORPORATE_BULK = "corporate_bulk"
     SEASONAL = "seasonal"
 
-class CarePointTransaction(BaseModel):
-    transaction_id: str
-    from_entity: str  # ?ID or システム
-    to_user: str      # ユーザーID
-    points: int
-    transaction_type: str  # "purchase", "transfer", "bonus"
-    created_at: datetime
-    metadata: Optional[Dict[str, Any]] = None
-
 class CorporatePurchase(BaseModel):
     corporate_id: str
     purchase_amount: int  # ?
@@ -58,8 +51,8 @@ class CarePointsSystem:
             50000: 0.10,   # 50,000?10%?
             100000: 0.15   # 100,000?15%?
         }
-        self.care_point_balances = {}  # 実装Firestoreを
-        self.transactions = []         # 実装Firestoreを
+        # 追記専用の台帳（残高は台帳への追記と同時に更新される）
+        self.ledger = CarePointLedger()
         self.medical_documents = {}    # 実装Firestoreを
     
     def calculate_corporate_discount(self, amount: int) -> float:
@@ -125,11 +118,16 @@ class CarePointsSystem:
                 created_at=datetime.utcnow()
             )
             
-            # ?
-            if corporate_id not in self.care_point_balances:
-                self.care_point_balances[corporate_id] = 0
-            
-            self.care_point_balances[corporate_id] += points_purchased
+            # 購入分を台帳に入金として記録
+            self.ledger.append(CarePointTransaction(
+                transaction_id=str(uuid.uuid4()),
+                from_entity="stripe",
+                to_user=corporate_id,
+                points=points_purchased,
+                transaction_type="purchase",
+                created_at=purchase.created_at,
+                metadata={"payment_intent_id": payment_intent_id, "amount_paid": discounted_amount}
+            ))
             
             logger.info(f"Corporate purchase completed: {corporate_id}, {points_purchased} points")
             return purchase
@@ -145,22 +143,6 @@ class CarePointsSystem:
                            points: int, metadata: Optional[Dict[str, Any]] = None) -> CarePointTransaction:
         """?"""
         try:
-            # ?
-            corporate_balance = self.care_point_balances.get(from_corporate_id, 0)
-            if corporate_balance < points:
-                raise HTTPException(
-                    status_code=400,
-                    detail="?"
-                )
-            
-            # ?
-            self.care_point_balances[from_corporate_id] -= points
-            
-            if to_user_id not in self.care_point_balances:
-                self.care_point_balances[to_user_id] = 0
-            self.care_point_balances[to_user_id] += points
-            
-            # ?
             transaction = CarePointTransaction(
                 transaction_id=str(uuid.uuid4()),
                 from_entity=from_corporate_id,
@@ -171,7 +153,14 @@ class CarePointsSystem:
                 metadata=metadata
             )
             
-            self.transactions.append(transaction)
+            # 残高確認と引き落としは台帳のロック内で行う
+            try:
+                self.ledger.append(transaction)
+            except InsufficientBalanceError:
+                raise HTTPException(
+                    status_code=400,
+                    detail="?"
+                )
             
             logger.info(f"Care points transferred: {from_corporate_id} -> {to_user_id}, {points} points")
             return transaction
@@ -262,19 +251,36 @@ class CarePointsSystem:
     
     def get_care_point_balance(self, entity_id: str) -> int:
         """?"""
-        return self.care_point_balances.get(entity_id, 0)
+        return self.ledger.balance(entity_id)
+    
+    def grant_bonus_points(self, entity_id: str, points: int,
+                           metadata: Optional[Dict[str, Any]] = None) -> CarePointTransaction:
+        """システムからのボーナス付与"""
+        transaction = CarePointTransaction(
+            transaction_id=str(uuid.uuid4()),
+            from_entity="system",
+            to_user=entity_id,
+            points=points,
+            transaction_type="bonus",
+            created_at=datetime.utcnow(),
+            metadata=metadata
+        )
+        self.ledger.append(transaction)
+        return transaction
     
     def get_transaction_history(self, entity_id: str, limit: int = 50) -> List[CarePointTransaction]:
         """?"""
-        entity_transactions = [
-            t for t in self.transactions 
-            if t.from_entity == entity_id or t.to_user == entity_id
-        ]
-        
-        # ?
-        entity_transactions.sort(key=lambda x: x.created_at, reverse=True)
-        
-        return entity_transactions[:limit]
+        transactions, _ = self.ledger.history(entity_id, limit)
+        return transactions
+    
+    def get_transaction_page(self, entity_id: str, limit: int = 50,
+                             cursor: Optional[str] = None) -> Tuple[List[CarePointTransaction], Optional[str]]:
+        """取引履歴を新しい順にカーソルでページング"""
+        return self.ledger.history(entity_id, limit, cursor)
+    
+    def verify_balances(self, full: bool = False) -> Dict[str, Any]:
+        """残高をチェックポイントからの台帳再生と照合"""
+        return self.ledger.verify(full)
     
     def create_stripe_coupon_for_adhd(self, user_id: str) -> Dict[str, Any]:
         """ADHD?Stripe?"""
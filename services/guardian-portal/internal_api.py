@@ -0,0 +1,84 @@
+"""
+Guardian Portal - 内部API（サービス間呼び出し）
+
+task-management・mood-tracking・core-game などのサービスだけが呼ぶエンドポイント。
+Guardian の JWT ではなく、共有シークレット（GUARDIAN_INTERNAL_TOKEN）を
+X-Internal-Token ヘッダーで受け取って認証する。シークレットが未設定なら全て拒否する
+"""
+
+import hmac
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+
+from report_generator import report_service
+
+INTERNAL_TOKEN_ENV = "GUARDIAN_INTERNAL_TOKEN"
+
+
+class ActivityEvent(BaseModel):
+    event_type: str  # task_completed, task_missed, mood_logged, xp_gained
+    user_id: str
+    occurred_at: Optional[datetime] = None
+    task_type: Optional[str] = None
+    xp: int = 0
+    mood_score: Optional[float] = None
+
+
+async def verify_internal_service(x_internal_token: Optional[str] = Header(None)):
+    """サービス間シークレットの検証（ヘッダーなしは401、不一致・未設定は403）"""
+    if not x_internal_token:
+        raise HTTPException(status_code=401, detail="Internal token required")
+    expected = os.getenv(INTERNAL_TOKEN_ENV, "")
+    if not expected or not hmac.compare_digest(x_internal_token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
+
+
+router = APIRouter(prefix="/internal", dependencies=[Depends(verify_internal_service)])
+
+
+@router.post("/activity-events")
+async def ingest_activity_events(events: List[ActivityEvent]):
+    """タスク完了・気分・XPのイベントを週次レポートの日次ロールアップに取り込む"""
+    rejected = []
+    for index, event in enumerate(events):
+        if not event.user_id:
+            rejected.append({"index": index, "error": "Invalid user_id"})
+            continue
+        try:
+            report_service.record_event(
+                event.event_type, event.user_id, event.occurred_at,
+                task_type=event.task_type, xp=event.xp, mood_score=event.mood_score
+            )
+        except ValueError as e:
+            rejected.append({"index": index, "error": str(e)})
+
+    return {
+        "success": not rejected,
+        "accepted": len(events) - len(rejected),
+        "rejected": rejected
+    }
+
+
+@router.put("/guardians/{guardian_id}/users/{user_id}")
+async def link_guardian_user(guardian_id: str, user_id: str):
+    """Guardian と担当ユーザーの紐付け（週次レポートの事前生成対象になる）"""
+    report_service.link_user(guardian_id, user_id)
+    return {"success": True, "guardian_id": guardian_id, "user_id": user_id}
+
+
+@router.delete("/guardians/{guardian_id}/users/{user_id}")
+async def unlink_guardian_user(guardian_id: str, user_id: str):
+    """Guardian と担当ユーザーの紐付け解除"""
+    if not report_service.unlink_user(guardian_id, user_id):
+        raise HTTPException(status_code=404, detail="Link not found")
+    return {"success": True, "guardian_id": guardian_id, "user_id": user_id}
+
+
+@router.post("/reports/prerender")
+async def prerender_weekly_reports():
+    """日曜夜のバッチから呼ぶ。サービス内のロールアップで全Guardian分の週次レポートを事前生成"""
+    return await report_service.prerender_sunday_reports()
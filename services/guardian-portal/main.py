@@ -120,8 +120,19 @@ class GuardianRBAC:
             "task-edit": ["view_reports", "view_progress", "edit_tasks", "assign_tasks"],
             "chat-send": ["view_reports", "view_progress", "edit_tasks", "assign_tasks", "send_messages", "emergency_contact"]
         }
+        self.compile_permission_masks()
+    
+    def compile_permission_masks(self):
+        """権限レベルを権限ビットマスクにコンパイル"""
+        names = dict.fromkeys(name for level in self.permissions.values() for name in level)
+        self.permission_bits: Dict[str, int] = {name: 1 << index for index, name in enumerate(names)}
+        self.level_masks: Dict[str, int] = {
+            level: sum(self.permission_bits[name] for name in set(names_in_level))
+            for level, names_in_level in self.permissions.items()
+        }
+        self._guardian_masks: Dict[str, int] = {}
     
-    def get_guardian_permissions(self, guardian_id: str) -> List[str]:
+    def get_permission_level(self, guardian_id: str) -> str:
         """Guardian?Firestoreか"""
         # デフォルト
         guardian_permissions = {
@@ -131,12 +142,36 @@ class GuardianRBAC:
         }
         
         permission_level = guardian_permissions.get(guardian_id, "view-only")
-        return self.permissions.get(permission_level, self.permissions["view-only"])
+        return permission_level if permission_level in self.permissions else "view-only"
+    
+    def get_guardian_permissions(self, guardian_id: str) -> List[str]:
+        """Guardian?Firestoreか"""
+        return self.permissions[self.get_permission_level(guardian_id)]
+    
+    def get_guardian_mask(self, guardian_id: str) -> int:
+        """Guardian の権限マスク（権限レベル変更時は invalidate_guardian で破棄）"""
+        mask = self._guardian_masks.get(guardian_id)
+        if mask is None:
+            mask = self._guardian_masks[guardian_id] = self.level_masks[self.get_permission_level(guardian_id)]
+        return mask
+    
+    def invalidate_guardian(self, guardian_id: Optional[str] = None):
+        if guardian_id is None:
+            self._guardian_masks.clear()
+        else:
+            self._guardian_masks.pop(guardian_id, None)
     
     def check_permission(self, guardian_id: str, required_permission: str) -> bool:
         """?"""
-        guardian_permissions = self.get_guardian_permissions(guardian_id)
-        return required_permission in guardian_permissions
+        return bool(self.get_guardian_mask(guardian_id) & self.permission_bits.get(required_permission, 0))
+    
+    def check_permissions(self, guardian_id: str, required_permissions: List[str]) -> Dict[str, bool]:
+        """複数権限の一括チェック（ダッシュボードのウィジェット判定用）"""
+        mask = self.get_guardian_mask(guardian_id)
+        return {
+            permission: bool(mask & self.permission_bits.get(permission, 0))
+            for permission in required_permissions
+        }
 
 # デフォルト
 class GuardianProfile(BaseModel):
@@ -177,6 +212,10 @@ guardian_rbac = GuardianRBAC()
 # レベル
 from report_generator import report_service
 
+# 内部API（サービス間、共有シークレットで認証）
+from internal_api import router as internal_router
+app.include_router(internal_router)
+
 # ?
 from care_points_system import (
     care_points_system, 
@@ -581,6 +620,7 @@ async def get_care_point_balance(
 async def get_transaction_history(
     entity_id: str,
     limit: int = 50,
+    cursor: Optional[str] = None,
     guardian: Dict[str, Any] = Depends(get_current_guardian)
 ):
     """?"""
@@ -589,7 +629,10 @@ async def get_transaction_history(
     if not guardian_rbac.check_permission(guardian_id, "view_reports"):
         raise HTTPException(status_code=403, detail="?")
     
-    transactions = care_points_system.get_transaction_history(entity_id, limit)
+    try:
+        transactions, next_cursor = care_points_system.get_transaction_page(entity_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
     return {
         "entity_id": entity_id,
@@ -605,7 +648,8 @@ async def get_transaction_history(
             }
             for t in transactions
         ],
-        "total_count": len(transactions)
+        "total_count": len(transactions),
+        "next_cursor": next_cursor
     }
 
 @app.post("/care-points/adhd/verify-document")
@@ -11,14 +11,233 @@ Guardian?
 class DummyPDFGenerator:
     def __init__(self):
         pass
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Callable, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import asyncio
 import io
 import json
+import logging
 import tempfile
 import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# 他サービスから届くアクティビティイベントの種類
+EVENT_TASK_COMPLETED = "task_completed"
+EVENT_TASK_MISSED = "task_missed"
+EVENT_MOOD_LOGGED = "mood_logged"
+EVENT_XP_GAINED = "xp_gained"
+
+
+@dataclass
+class DailyRollup:
+    """ユーザー1日分の集計（イベント到着時に更新）"""
+    day: date
+    tasks_by_type: Dict[str, int] = field(default_factory=dict)
+    tasks_missed: int = 0
+    xp_gained: int = 0
+    mood_count: int = 0
+    mood_sum: float = 0.0
+    mood_sum_sq: float = 0.0
+    # この日で終わる連続達成日数（タスク完了が無い日は0）
+    streak: int = 0
+    # 更新のたびに増える（キャッシュ済みレポートの鮮度判定用）
+    revision: int = 0
+
+    @property
+    def tasks_completed(self) -> int:
+        return sum(self.tasks_by_type.values())
+
+
+class DailyRollupStore:
+    """
+    ユーザーごとの日次ロールアップ
+
+    タスク・気分・XPのイベントを到着時に日次集計へ加算し、
+    週次レポートは7日分のロールアップをマージして作る。
+    """
+
+    def __init__(self, retention_days: int = 120):
+        self.retention_days = retention_days
+        self._rollups: Dict[str, Dict[date, DailyRollup]] = {}
+
+    def _rollup_for(self, user_id: str, day: date) -> DailyRollup:
+        days = self._rollups.setdefault(user_id, {})
+        rollup = days.get(day)
+        if rollup is None:
+            rollup = days[day] = DailyRollup(day=day)
+            # 新しい日が増えたときに保持期間外の日を捨てる
+            oldest = day - timedelta(days=self.retention_days)
+            for stale in [d for d in days if d < oldest]:
+                del days[stale]
+        return rollup
+
+    def _update_streaks(self, user_id: str, day: date):
+        """day 以降の連続達成日数を更新（過去日のイベント到着にも対応）"""
+        days = self._rollups[user_id]
+        previous = days.get(day - timedelta(days=1))
+        streak = previous.streak if previous else 0
+        while day in days and days[day].tasks_completed:
+            streak += 1
+            if days[day].streak == streak:
+                break
+            days[day].streak = streak
+            days[day].revision += 1
+            day += timedelta(days=1)
+
+    def record_task_completed(self, user_id: str, task_type: str, xp: int = 0,
+                              at: Optional[datetime] = None):
+        at = at or datetime.now()
+        rollup = self._rollup_for(user_id, at.date())
+        rollup.tasks_by_type[task_type] = rollup.tasks_by_type.get(task_type, 0) + 1
+        rollup.xp_gained += xp
+        rollup.revision += 1
+        if rollup.tasks_completed == 1:
+            self._update_streaks(user_id, rollup.day)
+
+    def record_task_missed(self, user_id: str, at: Optional[datetime] = None):
+        at = at or datetime.now()
+        rollup = self._rollup_for(user_id, at.date())
+        rollup.tasks_missed += 1
+        rollup.revision += 1
+
+    def record_mood(self, user_id: str, score: float, at: Optional[datetime] = None):
+        at = at or datetime.now()
+        rollup = self._rollup_for(user_id, at.date())
+        rollup.mood_count += 1
+        rollup.mood_sum += score
+        rollup.mood_sum_sq += score * score
+        rollup.revision += 1
+
+    def record_xp(self, user_id: str, xp: int, at: Optional[datetime] = None):
+        """タスク以外（ストーリー等）で得たXP"""
+        at = at or datetime.now()
+        rollup = self._rollup_for(user_id, at.date())
+        rollup.xp_gained += xp
+        rollup.revision += 1
+
+    def has_data(self, user_id: str) -> bool:
+        return bool(self._rollups.get(user_id))
+
+    def _days(self, user_id: str, start: date, days: int) -> List[DailyRollup]:
+        user_days = self._rollups.get(user_id, {})
+        return [user_days[day] for day in (start + timedelta(days=i) for i in range(days)) if day in user_days]
+
+    def revision(self, user_id: str, start: date, days: int) -> int:
+        """期間内ロールアップの更新番号の合計（いずれかが更新されると変わる）"""
+        return sum(rollup.revision for rollup in self._days(user_id, start, days))
+
+    def merge_week(self, user_id: str, week_start: date) -> Dict[str, Any]:
+        """7日分のロールアップをマージした週次集計"""
+        rollups = self._days(user_id, week_start, 7)
+        tasks_by_type: Dict[str, int] = {}
+        mood_count, mood_sum, mood_sum_sq = 0, 0.0, 0.0
+        for rollup in rollups:
+            for task_type, count in rollup.tasks_by_type.items():
+                tasks_by_type[task_type] = tasks_by_type.get(task_type, 0) + count
+            mood_count += rollup.mood_count
+            mood_sum += rollup.mood_sum
+            mood_sum_sq += rollup.mood_sum_sq
+
+        completed = sum(tasks_by_type.values())
+        missed = sum(rollup.tasks_missed for rollup in rollups)
+        mood_average = mood_sum / mood_count if mood_count else 0.0
+        last_day = week_start + timedelta(days=6)
+
+        return {
+            "task_breakdown": tasks_by_type,
+            "total_tasks_completed": completed,
+            "total_xp_earned": sum(rollup.xp_gained for rollup in rollups),
+            "mood_average": mood_average,
+            "mood_variance": max(0.0, mood_sum_sq / mood_count - mood_average ** 2) if mood_count else 0.0,
+            "adherence_rate": completed / (completed + missed) if completed + missed else 0.0,
+            "active_days": sum(1 for rollup in rollups if rollup.tasks_completed),
+            "current_streak": next((rollup.streak for rollup in rollups if rollup.day == last_day), 0),
+            "longest_streak": max((rollup.streak for rollup in rollups), default=0)
+        }
+
+
+class ReportCache:
+    """件数・バイト数・TTLで上限を決めたレポートのLRUキャッシュ"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 8 * 24 * 3600, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # key -> (expires_at, revision, content)
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, bytes]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple, revision: int = 0) -> Optional[bytes]:
+        """キャッシュ済みレポート（期限切れ・元データ更新済みなら None）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, cached_revision, content = entry
+        if self._clock() >= expires_at or cached_revision != revision:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return content
+
+    def put(self, key: Tuple, content: bytes, revision: int = 0):
+        if key in self._entries:
+            self._remove(key)
+        if len(content) > self.max_bytes:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, revision, content)
+        self.total_bytes += len(content)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple):
+        _, _, content = self._entries.pop(key)
+        self.total_bytes -= len(content)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple) -> bool:
+        return key in self._entries
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+
+def last_completed_week_start(today: Optional[date] = None) -> date:
+    """直近の日曜日で終わる週の月曜日（日曜日当日はその週）"""
+    today = today or date.today()
+    sunday = today - timedelta(days=(today.weekday() + 1) % 7)
+    return sunday - timedelta(days=6)
+
 
 class WeeklyReportGenerator:
+    # テンプレートを変えたら上げる（キャッシュキーに含まれる）
+    TEMPLATE_VERSION = 1
+    PDF_HEADER = b'%PDF-1.4\n'
+    
     def __init__(self):
         # ?
         self.styles = {}
@@ -33,6 +252,10 @@ class WeeklyReportGenerator:
     def generate_weekly_report(self, user_data: Dict[str, Any], 
                              guardian_data: Dict[str, Any]) -> bytes:
         """?"""
+        return self.assemble_report(self.render_user_body(user_data), guardian_data)
+    
+    def render_user_body(self, user_data: Dict[str, Any]) -> bytes:
+        """Guardian に依存しない本文（ユーザー・週ごとにキャッシュできる部分）"""
         # ?PDFコア
         report_content = f"""
 ? - {user_data['name']}
@@ -46,17 +269,21 @@ class WeeklyReportGenerator:
 
 === ? ===
 {chr(10).join(user_data.get('recommendations', []))}
-
+"""
+        return report_content.encode('utf-8')
+    
+    def render_guardian_section(self, guardian_data: Dict[str, Any]) -> bytes:
+        """Guardian ごとの末尾セクション"""
+        guardian_content = f"""
 === Guardian? ===
 Guardian: {guardian_data.get('name', 'Unknown')}
 ?: {guardian_data.get('relationship', 'Unknown')}
 """
-        
-        # ?PDFヘルパー
-        pdf_header = b'%PDF-1.4\n'
-        pdf_content = report_content.encode('utf-8')
-        
-        return pdf_header + pdf_content
+        return guardian_content.encode('utf-8')
+    
+    def assemble_report(self, user_body: bytes, guardian_data: Dict[str, Any]) -> bytes:
+        """本文と Guardian セクションを PDF として連結"""
+        return self.PDF_HEADER + user_body + self.render_guardian_section(guardian_data)
     
     def create_summary_section(self, data: Dict[str, Any]) -> List:
         """?"""
@@ -111,30 +338,109 @@ Guardian: {guardian_data.get('name', 'Unknown')}
 
 # レベル
 class ReportService:
-    def __init__(self):
+    def __init__(self, rollups: Optional[DailyRollupStore] = None, cache: Optional[ReportCache] = None):
         self.generator = WeeklyReportGenerator()
-        self.reports_cache = {}  # 実装Redisを
+        self.rollups = rollups or DailyRollupStore()
+        # (user_id, week_start, template_version) -> Guardian に依存しない本文
+        self.reports_cache = cache or ReportCache()
+        # guardian_id -> 担当ユーザー（登録順を保つ集合として dict を使う）
+        self.guardian_users: Dict[str, Dict[str, None]] = {}
+    
+    def record_event(self, event_type: str, user_id: str, at: Optional[datetime] = None,
+                     task_type: Optional[str] = None, xp: int = 0, mood_score: Optional[float] = None):
+        """タスク完了・未達・気分・XPのイベントを日次ロールアップに加算"""
+        if event_type == EVENT_TASK_COMPLETED:
+            self.rollups.record_task_completed(user_id, task_type or "other", xp, at)
+        elif event_type == EVENT_TASK_MISSED:
+            self.rollups.record_task_missed(user_id, at)
+        elif event_type == EVENT_MOOD_LOGGED:
+            if mood_score is None:
+                raise ValueError("mood_score is required for mood_logged")
+            self.rollups.record_mood(user_id, mood_score, at)
+        elif event_type == EVENT_XP_GAINED:
+            self.rollups.record_xp(user_id, xp, at)
+        else:
+            raise ValueError(f"Unknown event type: {event_type}")
+    
+    def link_user(self, guardian_id: str, user_id: str):
+        """Guardian に担当ユーザーを紐付ける"""
+        self.guardian_users.setdefault(guardian_id, {})[user_id] = None
+    
+    def unlink_user(self, guardian_id: str, user_id: str) -> bool:
+        users = self.guardian_users.get(guardian_id)
+        if users is None or user_id not in users:
+            return False
+        del users[user_id]
+        if not users:
+            del self.guardian_users[guardian_id]
+        return True
     
     async def generate_weekly_report(self, user_id: str, guardian_id: str, 
                                    week_start: datetime) -> bytes:
         """?"""
-        # ユーザーFirestoreか
-        user_data = await self.get_user_weekly_data(user_id, week_start)
+        week = week_start.date() if isinstance(week_start, datetime) else week_start
+        user_body = await self.get_user_report_body(user_id, week)
         guardian_data = await self.get_guardian_data(guardian_id)
         
-        # PDFレベル
-        pdf_content = self.generator.generate_weekly_report(user_data, guardian_data)
+        return self.generator.assemble_report(user_body, guardian_data)
+    
+    async def get_user_report_body(self, user_id: str, week_start: date) -> bytes:
+        """本文をキャッシュから返す（無いか、前週を含む元データが更新されていれば再生成）"""
+        cache_key = (user_id, week_start, self.generator.TEMPLATE_VERSION)
+        revision = self.rollups.revision(user_id, week_start - timedelta(days=7), 14)
         
-        # ?
-        cache_key = f"{user_id}_{guardian_id}_{week_start.strftime('%Y%m%d')}"
-        self.reports_cache[cache_key] = pdf_content
+        user_body = self.reports_cache.get(cache_key, revision)
+        if user_body is None:
+            user_data = await self.get_user_weekly_data(user_id, week_start)
+            user_body = self.generator.render_user_body(user_data)
+            self.reports_cache.put(cache_key, user_body, revision)
+        
+        return user_body
+    
+    async def prerender_weekly_reports(self, guardian_users: Dict[str, List[str]], week_start: date,
+                                       max_workers: int = 8) -> Dict[str, Any]:
+        """全 Guardian の担当ユーザーの週次レポートをワーカープールで事前生成"""
+        queue: asyncio.Queue = asyncio.Queue()
+        user_ids = list(dict.fromkeys(user_id for users in guardian_users.values() for user_id in users))
+        for user_id in user_ids:
+            queue.put_nowait(user_id)
+        
+        rendered = 0
+        failed: List[str] = []
+        
+        async def worker():
+            nonlocal rendered
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                try:
+                    await self.get_user_report_body(user_id, week_start)
+                    rendered += 1
+                except Exception as e:
+                    logger.error(f"Weekly report prerender failed for {user_id}: {e}")
+                    failed.append(user_id)
         
-        return pdf_content
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(max_workers, len(user_ids)))))
+        
+        return {
+            "week_start": week_start.isoformat(),
+            "guardians": len(guardian_users),
+            "users": len(user_ids),
+            "rendered": rendered,
+            "failed": failed,
+            "duration_seconds": time.perf_counter() - started
+        }
+    
+    async def prerender_sunday_reports(self, today: Optional[date] = None,
+                                       max_workers: int = 8) -> Dict[str, Any]:
+        """日曜日の週次レポートの一括生成（月曜朝のダッシュボードをキャッシュから返すため）"""
+        guardian_users = await self.get_guardian_users()
+        return await self.prerender_weekly_reports(guardian_users, last_completed_week_start(today), max_workers)
     
     async def get_user_weekly_data(self, user_id: str, week_start: datetime) -> Dict[str, Any]:
         """ユーザー"""
         # デフォルト
-        return {
+        user_data = {
             'name': '?',
             'user_id': user_id,
             'week_start': week_start.strftime('%Y?%m?%d?'),
@@ -185,6 +491,21 @@ class ReportService:
                 "?"
             ]
         }
+        
+        # ロールアップがあれば7日分（と前週）のマージ結果で上書き
+        if self.rollups.has_data(user_id):
+            week = week_start.date() if isinstance(week_start, datetime) else week_start
+            current = self.rollups.merge_week(user_id, week)
+            previous = self.rollups.merge_week(user_id, week - timedelta(days=7))
+            user_data.update(current)
+            user_data.update({
+                'prev_week_tasks': previous['total_tasks_completed'],
+                'prev_week_xp': previous['total_xp_earned'],
+                'prev_week_mood': previous['mood_average'],
+                'prev_week_adherence': previous['adherence_rate']
+            })
+        
+        return user_data
     
     async def get_guardian_data(self, guardian_id: str) -> Dict[str, Any]:
         """Guardian デフォルト"""
@@ -194,6 +515,10 @@ class ReportService:
             'relationship': 'parent',
             'emergency_contact': True
         }
+    
+    async def get_guardian_users(self) -> Dict[str, List[str]]:
+        """Guardian ごとの担当ユーザー（link_user で登録されたもの）"""
+        return {guardian_id: list(users) for guardian_id, users in self.guardian_users.items()}
 
 # ?
-report_service = ReportService()
\ No newline at end of file
+report_service = ReportService()
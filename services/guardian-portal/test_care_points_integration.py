@@ -12,6 +12,7 @@ import uuid
 # ?
 from main import app, guardian_auth, guardian_rbac
 from care_points_system import care_points_system, DiscountType
+from care_points_ledger import CarePointLedger
 
 client = TestClient(app)
 
@@ -21,8 +22,7 @@ class TestCarePointsSystem:
     def setup_method(self):
         """?"""
         # ?
-        care_points_system.care_point_balances.clear()
-        care_points_system.transactions.clear()
+        care_points_system.ledger = CarePointLedger()
         care_points_system.medical_documents.clear()
     
     def test_corporate_discount_calculation(self):
@@ -84,7 +84,7 @@ class TestCarePointsSystem:
         points = 500
         
         # ?
-        care_points_system.care_point_balances[corporate_id] = 1000
+        care_points_system.grant_bonus_points(corporate_id, 1000)
         
         transaction = care_points_system.transfer_care_points(
             corporate_id, user_id, points
@@ -109,7 +109,7 @@ class TestCarePointsSystem:
         points = 1000
         
         # ?
-        care_points_system.care_point_balances[corporate_id] = 500
+        care_points_system.grant_bonus_points(corporate_id, 500)
         
         with pytest.raises(Exception) as exc_info:
             care_points_system.transfer_care_points(corporate_id, user_id, points)
@@ -215,8 +215,7 @@ class TestCarePointsAPI:
         self.headers = {"Authorization": f"Bearer {self.token}"}
         
         # ?
-        care_points_system.care_point_balances.clear()
-        care_points_system.transactions.clear()
+        care_points_system.ledger = CarePointLedger()
         care_points_system.medical_documents.clear()
     
     def test_corporate_purchase_initiation(self):
@@ -253,7 +252,7 @@ class TestCarePointsAPI:
     def test_care_points_transfer_api(self):
         """?API?"""
         # ?
-        care_points_system.care_point_balances["corp_001"] = 1000
+        care_points_system.grant_bonus_points("corp_001", 1000)
         
         response = client.post(
             "/care-points/transfer",
@@ -276,7 +275,7 @@ class TestCarePointsAPI:
     def test_care_point_balance_retrieval(self):
         """?"""
         # ?
-        care_points_system.care_point_balances["corp_001"] = 1500
+        care_points_system.grant_bonus_points("corp_001", 1500)
         
         response = client.get(
             "/care-points/balance/corp_001",
@@ -291,7 +290,7 @@ class TestCarePointsAPI:
     def test_transaction_history_retrieval(self):
         """?"""
         # ?
-        care_points_system.care_point_balances["corp_001"] = 1000
+        care_points_system.grant_bonus_points("corp_001", 1000)
         care_points_system.transfer_care_points("corp_001", "user_001", 300)
         care_points_system.transfer_care_points("corp_001", "user_002", 200)
         
@@ -303,8 +302,8 @@ class TestCarePointsAPI:
         assert response.status_code == 200
         data = response.json()
         assert data["entity_id"] == "corp_001"
-        assert len(data["transactions"]) == 2
-        assert data["total_count"] == 2
+        assert len(data["transactions"]) == 3  # ボーナス付与 + 配布2件
+        assert data["total_count"] == 3
     
     def test_adhd_document_verification_api(self):
         """ADHD?API?"""
@@ -422,8 +421,7 @@ class TestIntegrationScenarios:
         )
         self.headers = {"Authorization": f"Bearer {self.token}"}
         
-        care_points_system.care_point_balances.clear()
-        care_points_system.transactions.clear()
+        care_points_system.ledger = CarePointLedger()
         care_points_system.medical_documents.clear()
     
     def test_complete_care_points_workflow(self):
@@ -470,7 +468,7 @@ class TestIntegrationScenarios:
             headers=self.headers
         )
         assert history_response.status_code == 200
-        assert len(history_response.json()["transactions"]) == 1
+        assert len(history_response.json()["transactions"]) == 2  # 購入 + 配布
     
     def test_adhd_discount_complete_workflow(self):
         """ADHD?"""
@@ -0,0 +1,141 @@
+"""
+ケアポイント台帳のテスト
+口座索引・カーソルページング・残高とチェックポイントの照合・同時付与の負荷テスト
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from care_points_ledger import CarePointLedger, CarePointTransaction, InsufficientBalanceError
+
+
+def make_transaction(from_entity: str, to_user: str, points: int,
+                     transaction_type: str = "transfer") -> CarePointTransaction:
+    return CarePointTransaction(
+        transaction_id=str(uuid.uuid4()),
+        from_entity=from_entity,
+        to_user=to_user,
+        points=points,
+        transaction_type=transaction_type,
+        created_at=datetime.utcnow()
+    )
+
+
+def fund(ledger: CarePointLedger, entity_id: str, points: int):
+    ledger.append(make_transaction("system", entity_id, points, "bonus"))
+
+
+class TestLedger:
+    """追記・残高・索引"""
+
+    def test_balances_follow_appends(self):
+        ledger = CarePointLedger()
+        fund(ledger, "corp_001", 1000)
+        ledger.append(make_transaction("corp_001", "user_001", 300))
+        ledger.append(make_transaction("corp_001", "user_002", 200))
+
+        assert ledger.balance("corp_001") == 500
+        assert ledger.balance("user_001") == 300
+        assert ledger.balance("system") == 0  # 入金元の残高は減らない
+
+        with pytest.raises(InsufficientBalanceError):
+            ledger.append(make_transaction("corp_001", "user_001", 501))
+        assert len(ledger) == 3
+        assert ledger.balance("corp_001") == 500
+
+    def test_cursor_pagination_newest_first(self):
+        ledger = CarePointLedger()
+        fund(ledger, "corp_001", 10000)
+        for i in range(25):
+            ledger.append(make_transaction("corp_001", f"user_{i % 3}", i + 1))
+
+        pages, cursor = [], None
+        while True:
+            page, cursor = ledger.history("user_1", limit=3, cursor=cursor)
+            pages.append([t.points for t in page])
+            if cursor is None:
+                break
+
+        assert [points for page in pages for points in page] == [23, 20, 17, 14, 11, 8, 5, 2]
+        assert [len(page) for page in pages] == [3, 3, 2]
+        assert ledger.history("unknown")[0] == []
+        assert ledger.transaction_count("corp_001") == 26
+
+    def test_verify_against_checkpoints(self):
+        ledger = CarePointLedger(checkpoint_interval=10)
+        fund(ledger, "corp_001", 1000)
+        for i in range(34):
+            ledger.append(make_transaction("corp_001", f"user_{i % 4}", 5))
+
+        assert [checkpoint.offset for checkpoint in ledger.checkpoints] == [10, 20, 30]
+        incremental = ledger.verify()
+        assert incremental["valid"]
+        assert incremental["replayed_from"] == 30
+        assert incremental["entries_replayed"] == 5
+        assert ledger.verify(full=True)["valid"]
+
+        # 台帳を通さない残高変更は検出される
+        ledger._balances["user_2"] += 5
+        result = ledger.verify()
+        assert not result["valid"]
+        assert result["mismatched_accounts"] == ["user_2"]
+
+
+class TestLedgerStress:
+    """同時付与と履歴レイテンシ"""
+
+    def test_concurrent_awards_lose_no_updates(self):
+        ledger = CarePointLedger(checkpoint_interval=500)
+        fund(ledger, "corp_001", 50000)
+        threads_count, awards_per_thread = 16, 500
+        start = threading.Barrier(threads_count)
+        rejected = []
+
+        def award(worker: int):
+            start.wait()
+            for i in range(awards_per_thread):
+                fund(ledger, f"user_{worker % 4}", 1)
+                try:
+                    ledger.append(make_transaction("corp_001", f"user_{i % 8}", 7))
+                except InsufficientBalanceError:
+                    rejected.append(worker)
+
+        workers = [threading.Thread(target=award, args=(worker,)) for worker in range(threads_count)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        transfers = threads_count * awards_per_thread - len(rejected)
+        assert transfers == 50000 // 7
+        assert ledger.balance("corp_001") == 50000 - 7 * transfers
+        assert sum(ledger.balance(f"user_{i}") for i in range(8)) == threads_count * awards_per_thread + 7 * transfers
+        assert len(ledger) == 1 + threads_count * awards_per_thread + transfers
+        assert ledger.verify(full=True)["valid"]
+
+    def test_history_p99_independent_of_ledger_size(self):
+        def p99_history_latency(total_entries: int) -> float:
+            ledger = CarePointLedger()
+            fund(ledger, "corp_001", 10 ** 9)
+            for i in range(total_entries):
+                # 対象ユーザーの取引は常に200件、残りは他の口座
+                to_user = "user_target" if i % (total_entries // 200) == 0 else f"user_{i % 5000}"
+                ledger.append(make_transaction("corp_001", to_user, 1))
+
+            samples = []
+            for _ in range(300):
+                started = time.perf_counter()
+                _, cursor = ledger.history("user_target", limit=20)
+                ledger.history("user_target", limit=20, cursor=cursor)
+                samples.append(time.perf_counter() - started)
+            samples.sort()
+            return samples[int(len(samples) * 0.99)]
+
+        small = p99_history_latency(2000)
+        large = p99_history_latency(200000)
+
+        assert large < max(5 * small, 0.002)
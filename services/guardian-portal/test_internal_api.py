@@ -0,0 +1,82 @@
+"""
+内部API（サービス間）の認証とイベント取り込みのテスト
+"""
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import internal_api
+from report_generator import ReportService
+
+TOKEN = "internal-secret"
+
+app = FastAPI()
+app.include_router(internal_api.router)
+
+EVENTS = [{"event_type": "mood_logged", "user_id": "user_1", "mood_score": 4}]
+ROUTES = [
+    ("post", "/internal/activity-events", EVENTS),
+    ("put", "/internal/guardians/guardian_a/users/user_1", None),
+    ("delete", "/internal/guardians/guardian_a/users/user_1", None),
+    ("post", "/internal/reports/prerender", None),
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_service(monkeypatch):
+    service = ReportService()
+    monkeypatch.setattr(internal_api, "report_service", service)
+    monkeypatch.setenv(internal_api.INTERNAL_TOKEN_ENV, TOKEN)
+    return service
+
+
+async def call(method, path, body, headers=None):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.request(method, path, json=body, headers=headers or {})
+
+
+class TestInternalAuth:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("method,path,body", ROUTES)
+    async def test_missing_token_is_401(self, method, path, body, fresh_service):
+        assert (await call(method, path, body)).status_code == 401
+        assert not fresh_service.rollups.has_data("user_1")
+        assert fresh_service.guardian_users == {}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("method,path,body", ROUTES)
+    async def test_wrong_token_is_403(self, method, path, body, fresh_service):
+        assert (await call(method, path, body, {"X-Internal-Token": "guess"})).status_code == 403
+        assert not fresh_service.rollups.has_data("user_1")
+        assert fresh_service.guardian_users == {}
+
+    @pytest.mark.asyncio
+    async def test_unconfigured_secret_rejects_everything(self, monkeypatch):
+        monkeypatch.delenv(internal_api.INTERNAL_TOKEN_ENV)
+        response = await call("put", "/internal/guardians/guardian_a/users/user_1", None, {"X-Internal-Token": ""})
+        assert response.status_code == 401
+        response = await call("put", "/internal/guardians/guardian_a/users/user_1", None, {"X-Internal-Token": "x"})
+        assert response.status_code == 403
+
+
+class TestInternalRoutes:
+
+    @pytest.mark.asyncio
+    async def test_events_and_links_with_valid_token(self, fresh_service):
+        headers = {"X-Internal-Token": TOKEN}
+        response = await call("post", "/internal/activity-events", EVENTS + [
+            {"event_type": "unknown", "user_id": "user_1"},
+            {"event_type": "xp_gained", "user_id": "", "xp": 5}
+        ], headers)
+        assert response.status_code == 200
+        assert response.json()["accepted"] == 1
+        assert [r["index"] for r in response.json()["rejected"]] == [1, 2]
+        assert fresh_service.rollups.has_data("user_1")
+
+        assert (await call("put", "/internal/guardians/guardian_a/users/user_1", None, headers)).status_code == 200
+        assert fresh_service.guardian_users == {"guardian_a": {"user_1": None}}
+        assert (await call("delete", "/internal/guardians/guardian_a/users/user_1", None, headers)).status_code == 200
+        assert (await call("delete", "/internal/guardians/guardian_a/users/user_1", None, headers)).status_code == 404
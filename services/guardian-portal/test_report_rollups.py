@@ -0,0 +1,190 @@
+"""
+週次レポートの日次ロールアップ・レポートキャッシュ・一括事前生成のテスト
+"""
+
+import pytest
+from datetime import date, datetime, timedelta
+
+from report_generator import (
+    DailyRollupStore, ReportCache, ReportService, WeeklyReportGenerator, last_completed_week_start
+)
+
+WEEK_START = date(2024, 1, 15)  # 月曜日
+
+
+def at(day_offset: int, hour: int = 10) -> datetime:
+    return datetime.combine(WEEK_START, datetime.min.time()) + timedelta(days=day_offset, hours=hour)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDailyRollups:
+    """イベント到着時の日次集計と週次マージ"""
+
+    def test_week_merges_seven_rollups(self):
+        rollups = DailyRollupStore()
+        moods = [3, 4, 5, 2, 4, 3, 4]
+        for day, mood in enumerate(moods):
+            rollups.record_mood("user_1", mood, at(day))
+            rollups.record_task_completed("user_1", "routine", xp=20, at=at(day))
+            if day % 2 == 0:
+                rollups.record_task_completed("user_1", "skill_up", xp=50, at=at(day, 15))
+            else:
+                rollups.record_task_missed("user_1", at=at(day, 20))
+        rollups.record_task_completed("user_1", "routine", xp=999, at=at(7))  # 翌週
+
+        week = rollups.merge_week("user_1", WEEK_START)
+
+        mean = sum(moods) / 7
+        assert week["task_breakdown"] == {"routine": 7, "skill_up": 4}
+        assert week["total_tasks_completed"] == 11
+        assert week["total_xp_earned"] == 7 * 20 + 4 * 50
+        assert week["mood_average"] == pytest.approx(mean)
+        assert week["mood_variance"] == pytest.approx(sum((m - mean) ** 2 for m in moods) / 7)
+        assert week["adherence_rate"] == pytest.approx(11 / 14)
+        assert week["current_streak"] == 7
+        assert week["active_days"] == 7
+
+    def test_streak_breaks_and_backfill_reconnects(self):
+        rollups = DailyRollupStore()
+        for day in (0, 1, 3, 4, 5):
+            rollups.record_task_completed("user_1", "routine", at=at(day))
+
+        assert rollups.merge_week("user_1", WEEK_START)["current_streak"] == 0
+        assert rollups.merge_week("user_1", WEEK_START)["longest_streak"] == 3
+
+        # 遅れて届いた3日目のイベントで連続日数がつながる
+        rollups.record_task_completed("user_1", "routine", at=at(2))
+        rollups.record_task_completed("user_1", "routine", at=at(6))
+        week = rollups.merge_week("user_1", WEEK_START)
+        assert week["current_streak"] == 7
+        assert week["longest_streak"] == 7
+
+    def test_old_days_pruned_after_retention(self):
+        rollups = DailyRollupStore(retention_days=14)
+        rollups.record_mood("user_1", 3, at(0))
+        rollups.record_mood("user_1", 4, at(30))
+
+        assert rollups.merge_week("user_1", WEEK_START)["mood_average"] == 0.0
+        assert rollups.revision("user_1", WEEK_START, 7) == 0
+
+
+class TestReportCache:
+    """件数・バイト数・TTLの上限"""
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        cache = ReportCache(max_entries=3, max_bytes=100)
+        for i in range(3):
+            cache.put(("user", i, 1), b"x" * 30)
+        cache.get(("user", 0, 1))
+        cache.put(("user", 3, 1), b"x" * 30)
+
+        assert ("user", 1, 1) not in cache
+        assert ("user", 0, 1) in cache
+
+        cache.put(("user", 4, 1), b"x" * 60)
+        assert cache.total_bytes <= 100
+        assert len(cache) == 2
+
+    def test_ttl_and_revision_invalidate(self):
+        clock = FakeClock()
+        cache = ReportCache(ttl_seconds=60, clock=clock)
+        cache.put(("user", "week", 1), b"report", revision=5)
+
+        assert cache.get(("user", "week", 1), revision=5) == b"report"
+        assert cache.get(("user", "week", 1), revision=6) is None
+
+        cache.put(("user", "week", 1), b"report", revision=6)
+        clock.now = 61
+        assert cache.get(("user", "week", 1), revision=6) is None
+        assert cache.total_bytes == 0
+
+
+class TestReportService:
+    """キャッシュ経由のレポート生成と一括事前生成"""
+
+    @pytest.mark.asyncio
+    async def test_report_uses_rollups_and_cache(self):
+        service = ReportService()
+        for day in range(7):
+            service.rollups.record_task_completed("user_1", "routine", xp=10, at=at(day))
+            service.rollups.record_mood("user_1", 4, at(day))
+
+        first = await service.generate_weekly_report("user_1", "guardian_001", datetime(2024, 1, 15))
+        second = await service.generate_weekly_report("user_1", "guardian_002", datetime(2024, 1, 15))
+
+        assert first.startswith(b"%PDF")
+        assert "XP: 70".encode("utf-8") in first
+        assert first.split(b"=== Guardian")[0] == second.split(b"=== Guardian")[0]
+        assert service.reports_cache.hits == 1
+
+        # 週内のイベントでキャッシュが無効になる
+        service.rollups.record_task_completed("user_1", "social", xp=5, at=at(3))
+        third = await service.generate_weekly_report("user_1", "guardian_001", datetime(2024, 1, 15))
+        assert "XP: 75".encode("utf-8") in third
+
+        # 翌週のイベントでは無効にならない
+        service.rollups.record_mood("user_1", 2, at(14))
+        await service.generate_weekly_report("user_1", "guardian_001", datetime(2024, 1, 15))
+        assert service.reports_cache.hits == 2
+
+    @pytest.mark.asyncio
+    async def test_prerender_fills_cache_for_every_guardian(self):
+        service = ReportService()
+        guardian_users = {f"guardian_{g}": [f"user_{g * 3 + u}" for u in range(3)] for g in range(10)}
+        guardian_users["guardian_shared"] = ["user_0", "user_1"]
+
+        result = await service.prerender_weekly_reports(guardian_users, WEEK_START, max_workers=4)
+
+        assert result["users"] == 30
+        assert result["rendered"] == 30
+        assert result["failed"] == []
+        for users in guardian_users.values():
+            for user_id in users:
+                assert (user_id, WEEK_START, WeeklyReportGenerator.TEMPLATE_VERSION) in service.reports_cache
+
+        await service.generate_weekly_report("user_4", "guardian_1", datetime(2024, 1, 15))
+        assert service.reports_cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_ingested_events_feed_reports_for_linked_guardians(self):
+        service = ReportService()
+        assert await service.get_guardian_users() == {}
+
+        service.link_user("guardian_a", "user_1")
+        service.link_user("guardian_b", "user_1")
+        service.link_user("guardian_b", "user_2")
+        assert service.unlink_user("guardian_b", "user_2")
+        assert not service.unlink_user("guardian_b", "user_2")
+        assert await service.get_guardian_users() == {"guardian_a": ["user_1"], "guardian_b": ["user_1"]}
+
+        service.record_event("task_completed", "user_1", at(0), task_type="routine", xp=20)
+        service.record_event("task_missed", "user_1", at(1))
+        service.record_event("mood_logged", "user_1", at(1), mood_score=4)
+        service.record_event("xp_gained", "user_1", at(2), xp=15)
+        with pytest.raises(ValueError):
+            service.record_event("mood_logged", "user_1", at(2))
+        with pytest.raises(ValueError):
+            service.record_event("unknown", "user_1", at(2))
+
+        result = await service.prerender_sunday_reports(today=date(2024, 1, 21))
+        assert result["users"] == 1 and result["rendered"] == 1
+
+        report = await service.generate_weekly_report("user_1", "guardian_a", datetime(2024, 1, 15))
+        assert "XP: 35".encode("utf-8") in report
+        assert service.reports_cache.hits == 1
+        week = service.rollups.merge_week("user_1", WEEK_START)
+        assert week["total_tasks_completed"] == 1
+        assert week["adherence_rate"] == 0.5
+        assert week["mood_average"] == 4
+
+    def test_last_completed_week_start(self):
+        assert last_completed_week_start(date(2024, 1, 21)) == WEEK_START  # 日曜日
+        assert last_completed_week_start(date(2024, 1, 22)) == WEEK_START  # 月曜日
+        assert last_completed_week_start(date(2024, 1, 27)) == WEEK_START  # 土曜日
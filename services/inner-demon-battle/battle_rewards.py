@@ -302,11 +302,7 @@ class BattleRewardSystem:
             return items
         
         # アプリ
-        base_item_count = 1
-        if performance_multiplier > 1.5:
-            base_item_count = 3
-        elif performance_multiplier > 1.2:
-            base_item_count = 2
+        base_item_count = self._battle_item_count(performance_multiplier)
         
         for _ in range(base_item_count):
             # レベル
@@ -324,6 +320,14 @@ class BattleRewardSystem:
         
         return items
     
+    def _battle_item_count(self, performance_multiplier: float) -> int:
+        """勝利時に抽選するアイテム数"""
+        if performance_multiplier > 1.5:
+            return 3
+        if performance_multiplier > 1.2:
+            return 2
+        return 1
+    
     def _generate_consolation_items(self, demon_type: str) -> List[BattleItem]:
         """?"""
         item_pool = self.item_pool.get(demon_type, [])
@@ -335,6 +339,21 @@ class BattleRewardSystem:
     
     def _determine_item_rarity(self, performance_multiplier: float) -> ItemRarity:
         """アプリ"""
+        normalized_rates = self._item_rarity_rates(performance_multiplier)
+        
+        # ?
+        rand = random.random()
+        cumulative = 0
+        
+        for rarity, rate in normalized_rates.items():
+            cumulative += rate
+            if rand <= cumulative:
+                return rarity
+        
+        return ItemRarity.COMMON
+    
+    def _item_rarity_rates(self, performance_multiplier: float) -> Dict[ItemRarity, float]:
+        """成績で補正して合計1に正規化したレア度ごとの確率（rarity_rates の順）"""
         # ?
         adjusted_rates = self.rarity_rates.copy()
         
@@ -349,18 +368,7 @@ class BattleRewardSystem:
         
         # ?
         total_rate = sum(adjusted_rates.values())
-        normalized_rates = {k: v/total_rate for k, v in adjusted_rates.items()}
-        
-        # ?
-        rand = random.random()
-        cumulative = 0
-        
-        for rarity, rate in normalized_rates.items():
-            cumulative += rate
-            if rand <= cumulative:
-                return rarity
-        
-        return ItemRarity.COMMON
+        return {k: v/total_rate for k, v in adjusted_rates.items()}
     
     def _generate_cbt_reflection(self, demon_type: str, battle_performance: Dict[str, Any]) -> str:
         """CBT?"""
@@ -0,0 +1,265 @@
+"""
+内なる悪魔バトルのバランス・シミュレーター（オフライン用）
+
+バトルを1件ずつオブジェクトで進める代わりに、同じ魔物とのバトルを
+配列でまとめて進めるモンテカルロ・シミュレーション。
+ダメージ計算は InnerDemonBattle の弱点判定（WeaknessMatcher）を、
+勝敗判定は continue_battle と同じ規則（HP 0 で勝利、MAX_BATTLE_TURNS を越えたら敗北）を使う。
+報酬は (ターン数, 与ダメージ, 弱点ヒット数) の組ごとに BattleRewardSystem の
+倍率・アイテム数・レア度の計算を呼ぶので、報酬側の調整もそのまま反映される
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from battle_rewards import BattleRewardSystem, ItemRarity
+from main import DAMAGE_VARIANCE, MAX_BATTLE_TURNS, DemonType, InnerDemonBattle
+
+IN_PROGRESS, VICTORY, DEFEAT = 0, 1, 2
+
+
+class BattleBalanceSimulator:
+    """魔物ごとの勝率・ターン数・報酬の分布を見積もる"""
+
+    def __init__(self, battle_system: Optional[InnerDemonBattle] = None,
+                 chunk_size: int = 250_000):
+        self.battle_system = battle_system or InnerDemonBattle()
+        self.reward_system: BattleRewardSystem = self.battle_system.reward_system
+        self.chunk_size = chunk_size
+
+    def simulate(self, demon_type: DemonType, battles: int, action_pool: Sequence[str],
+                 action_weights: Optional[Sequence[float]] = None,
+                 actions_per_turn: Tuple[int, int] = (1, 3),
+                 variance: Tuple[float, float] = DAMAGE_VARIANCE,
+                 seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        battles 件のバトルを進めて集計する
+
+        毎ターン actions_per_turn の範囲（両端を含む）の数だけ action_pool から
+        action_weights の重みで行動を選ぶ。1ターン目は initiate_battle、
+        2ターン目以降は continue_battle に渡す行動に当たる
+        """
+        if not action_pool:
+            raise ValueError("action_pool must not be empty")
+        min_actions, max_actions = actions_per_turn
+        if min_actions < 0 or max_actions < min_actions:
+            raise ValueError(f"invalid actions_per_turn: {actions_per_turn}")
+
+        rng = np.random.default_rng(seed)
+        demon_data = self.battle_system.demon_types[demon_type]
+        matcher = self.battle_system.weakness_matchers[demon_type]
+        action_damage = np.array([matcher.base_damage(a) for a in action_pool], dtype=np.int64)
+        action_hits = np.array([a in matcher.weakness_set for a in action_pool], dtype=np.int64)
+        probabilities = None
+        if action_weights is not None:
+            probabilities = np.asarray(action_weights, dtype=np.float64)
+            probabilities = probabilities / probabilities.sum()
+
+        totals = _Totals(demon_type.value, self.reward_system)
+        started = time.perf_counter()
+        remaining = battles
+        while remaining > 0:
+            size = min(self.chunk_size, remaining)
+            turns, dealt, hits, outcome = self._run_battles(
+                size, demon_data["max_hp"], action_damage, action_hits, probabilities,
+                min_actions, max_actions, variance, rng)
+            self._collect_rewards(totals, demon_type.value, demon_data["max_hp"],
+                                  turns, dealt, hits, outcome, rng)
+            remaining -= size
+
+        summary = totals.summary(battles)
+        summary["elapsed_seconds"] = time.perf_counter() - started
+        return summary
+
+    def _run_battles(self, size, max_hp, action_damage, action_hits, probabilities,
+                     min_actions, max_actions, variance, rng):
+        hp = np.full(size, max_hp, dtype=np.int64)
+        dealt = np.zeros(size, dtype=np.int64)
+        hits = np.zeros(size, dtype=np.int64)
+        turns = np.zeros(size, dtype=np.int64)
+        outcome = np.full(size, IN_PROGRESS, dtype=np.int8)
+        active = np.arange(size)
+        slots = np.arange(max_actions)
+
+        for turn in range(1, MAX_BATTLE_TURNS + 2):
+            count = active.size
+            if count == 0:
+                break
+            chosen = rng.choice(len(action_damage), size=(count, max_actions), p=probabilities)
+            used = slots < rng.integers(min_actions, max_actions + 1, size=count)[:, None]
+            base = (action_damage[chosen] * used).sum(axis=1)
+            # int(damage * variance) と同じ切り捨て
+            damage = (base * rng.uniform(variance[0], variance[1], size=count)).astype(np.int64)
+
+            hp[active] = np.maximum(0, hp[active] - damage)
+            dealt[active] += damage
+            hits[active] += (action_hits[chosen] * used).sum(axis=1)
+            turns[active] = turn
+
+            won = hp[active] <= 0
+            outcome[active[won]] = VICTORY
+            active = active[~won]
+            if turn > MAX_BATTLE_TURNS:
+                outcome[active] = DEFEAT
+                active = active[:0]
+        return turns, dealt, hits, outcome
+
+    def _collect_rewards(self, totals, demon_key, max_hp, turns, dealt, hits, outcome, rng):
+        base_rewards = self.reward_system._get_base_rewards(demon_key)
+        won = outcome == VICTORY
+        lost = outcome == DEFEAT
+        totals.add_turns(turns[won], turns[lost])
+
+        # 敗北: 基本報酬の1/4とコモン1つ
+        defeats = int(lost.sum())
+        if defeats:
+            totals.add_currency(np.full(defeats, base_rewards["coins"] // 4, dtype=np.int64),
+                                np.full(defeats, base_rewards["xp"] // 4, dtype=np.int64))
+            totals.add_items(self._common_items(demon_key), defeats, rng)
+
+        if not won.any():
+            return
+        # 勝利: 倍率は (ターン数, 与ダメージ, 弱点ヒット数) の組ごとに1回だけ計算する
+        w_turns, w_dealt, w_hits = turns[won], dealt[won], hits[won]
+        dealt_span = int(w_dealt.max()) + 1
+        hits_span = int(w_hits.max()) + 1
+        keys = (w_turns * dealt_span + w_dealt) * hits_span + w_hits
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        multipliers = np.empty(unique_keys.size, dtype=np.float64)
+        for i, key in enumerate(unique_keys.tolist()):
+            key, hit_count = divmod(key, hits_span)
+            turn_count, damage = divmod(key, dealt_span)
+            multipliers[i] = self.reward_system._calculate_performance_multiplier({
+                "turns_taken": turn_count,
+                "damage_efficiency": damage / max_hp,
+                "weakness_hits": hit_count,
+            })
+        unique_coins = (base_rewards["coins"] * multipliers).astype(np.int64)
+        unique_xp = (base_rewards["xp"] * multipliers).astype(np.int64)
+        totals.add_currency(unique_coins[inverse], unique_xp[inverse])
+
+        item_pool = self.reward_system.item_pool.get(demon_key, [])
+        if not item_pool:
+            return
+        battle_multipliers = multipliers[inverse]
+        for multiplier in np.unique(multipliers).tolist():
+            item_draws = self.reward_system._battle_item_count(multiplier) * int(
+                (battle_multipliers == multiplier).sum())
+            self._draw_battle_items(totals, item_pool, multiplier, item_draws, rng)
+
+    def _draw_battle_items(self, totals, item_pool, multiplier, draws, rng):
+        """_determine_item_rarity と同じ累積確率でレア度を引き、レア度ごとにアイテムを選ぶ"""
+        rates = self.reward_system._item_rarity_rates(multiplier)
+        rarities = list(rates) + [ItemRarity.COMMON]
+        cumulative = []
+        running = 0
+        for rate in rates.values():
+            running += rate
+            cumulative.append(running)
+        # rand <= cumulative となる最初のレア度（どれにも入らなければコモン）
+        rarity_index = np.searchsorted(np.array(cumulative), rng.random(draws), side="left")
+        rarity_counts = np.bincount(rarity_index, minlength=len(rarities))
+        common_items = self._common_items_from(item_pool)
+        for rarity, count in zip(rarities, rarity_counts.tolist()):
+            if count:
+                candidates = [item for item in item_pool if item.rarity == rarity] or common_items
+                totals.add_items(candidates, count, rng)
+
+    def _common_items(self, demon_key):
+        return self._common_items_from(self.reward_system.item_pool.get(demon_key, []))
+
+    @staticmethod
+    def _common_items_from(item_pool):
+        return [item for item in item_pool if item.rarity == ItemRarity.COMMON]
+
+
+class _Totals:
+    """チャンクをまたいで集計する（コイン・XPは値ごとの件数で持つ）"""
+
+    def __init__(self, demon_key: str, reward_system: BattleRewardSystem):
+        self.demon_key = demon_key
+        self.victory_turns = np.zeros(MAX_BATTLE_TURNS + 2, dtype=np.int64)
+        self.defeat_turns = np.zeros(MAX_BATTLE_TURNS + 2, dtype=np.int64)
+        self.coins = np.zeros(1, dtype=np.int64)
+        self.xp = np.zeros(1, dtype=np.int64)
+        self.item_drops: Dict[str, int] = {}
+        self.rarity_drops: Dict[str, int] = {rarity.value: 0 for rarity in reward_system.rarity_rates}
+
+    def add_turns(self, victory_turns, defeat_turns):
+        self.victory_turns += np.bincount(victory_turns, minlength=self.victory_turns.size)
+        self.defeat_turns += np.bincount(defeat_turns, minlength=self.defeat_turns.size)
+
+    def add_currency(self, coins, xp):
+        self.coins = _merge_counts(self.coins, np.bincount(coins))
+        self.xp = _merge_counts(self.xp, np.bincount(xp))
+
+    def add_items(self, candidates, count, rng):
+        if not candidates or not count:
+            return
+        picks = np.bincount(rng.integers(0, len(candidates), size=count), minlength=len(candidates))
+        for item, picked in zip(candidates, picks.tolist()):
+            if picked:
+                self.item_drops[item.id] = self.item_drops.get(item.id, 0) + picked
+                self.rarity_drops[item.rarity.value] = self.rarity_drops.get(item.rarity.value, 0) + picked
+
+    def summary(self, battles: int) -> Dict[str, Any]:
+        victories = int(self.victory_turns.sum())
+        turn_values = np.arange(self.victory_turns.size)
+        return {
+            "demon_type": self.demon_key,
+            "battles": battles,
+            "victories": victories,
+            "defeats": int(self.defeat_turns.sum()),
+            "win_rate": victories / battles if battles else 0.0,
+            "average_turns_to_victory": (
+                float((turn_values * self.victory_turns).sum() / victories) if victories else None
+            ),
+            "victory_turns": {turn: int(n) for turn, n in enumerate(self.victory_turns.tolist()) if n},
+            "coins": _distribution(self.coins),
+            "xp": _distribution(self.xp),
+            "item_drops": dict(sorted(self.item_drops.items())),
+            "rarity_drops": self.rarity_drops,
+        }
+
+
+def _merge_counts(total, counts):
+    if counts.size > total.size:
+        total, counts = counts, total
+    total = total.copy()
+    total[:counts.size] += counts
+    return total
+
+
+def _distribution(counts) -> Dict[str, Any]:
+    """値ごとの件数から平均・分位点を求める"""
+    n = int(counts.sum())
+    if n == 0:
+        return {"mean": 0.0, "p10": 0, "p50": 0, "p90": 0, "max": 0}
+    values = np.arange(counts.size)
+    cumulative = np.cumsum(counts)
+
+    def percentile(q):
+        return int(np.searchsorted(cumulative, q * n, side="left"))
+
+    return {
+        "mean": float((values * counts).sum() / n),
+        "p10": percentile(0.1),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "max": int(np.flatnonzero(counts)[-1]),
+    }
+
+
+def simulate_all_demons(battles: int, action_pool: List[str], seed: Optional[int] = None,
+                        **options) -> Dict[str, Dict[str, Any]]:
+    """全種類の魔物について同じ行動方針でシミュレーションする"""
+    simulator = BattleBalanceSimulator()
+    return {
+        demon_type.value: simulator.simulate(
+            demon_type, battles, action_pool,
+            seed=None if seed is None else seed + i, **options)
+        for i, demon_type in enumerate(DemonType)
+    }
@@ -0,0 +1,91 @@
+"""
+バトル状態のストア
+
+放置されたバトルを一定時間（idle_ttl_seconds）で破棄し、保持するバトル数の
+上限（max_battles）を越えたら最も長く操作されていないバトルから破棄する。
+最後に操作した順の OrderedDict で持つので、破棄は先頭から見るだけでよい
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+class BattleSessionStore:
+    """user_id -> battle_state（アイドルTTL・件数上限つき）"""
+
+    def __init__(self, idle_ttl_seconds: float = 1800, max_battles: int = 100_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_battles = max_battles
+        self._clock = clock
+        self._battles: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.evicted_idle = 0
+        self.evicted_over_budget = 0
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """バトル状態を返し、最終操作時刻を更新する（期限切れならNone）"""
+        self.evict_expired()
+        entry = self._battles.get(user_id)
+        if entry is None:
+            return None
+        self._battles[user_id] = (self._clock(), entry[1])
+        self._battles.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user_id: str, battle_state: Dict[str, Any]) -> None:
+        self.evict_expired()
+        self._battles[user_id] = (self._clock(), battle_state)
+        self._battles.move_to_end(user_id)
+        while len(self._battles) > self.max_battles:
+            self._battles.popitem(last=False)
+            self.evicted_over_budget += 1
+
+    def pop(self, user_id: str, *default):
+        entry = self._battles.pop(user_id, None)
+        if entry is None:
+            if default:
+                return default[0]
+            raise KeyError(user_id)
+        return entry[1]
+
+    def evict_expired(self) -> int:
+        """最終操作から idle_ttl_seconds を過ぎたバトルを破棄する"""
+        deadline = self._clock() - self.idle_ttl_seconds
+        evicted = 0
+        while self._battles:
+            user_id, (last_active, _) = next(iter(self._battles.items()))
+            if last_active > deadline:
+                break
+            del self._battles[user_id]
+            evicted += 1
+        self.evicted_idle += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        self.evict_expired()
+        return {
+            "active_battles": len(self._battles),
+            "max_battles": self.max_battles,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "evicted_idle": self.evicted_idle,
+            "evicted_over_budget": self.evicted_over_budget,
+        }
+
+    def __getitem__(self, user_id: str) -> Dict[str, Any]:
+        return self._battles[user_id][1]
+
+    def __setitem__(self, user_id: str, battle_state: Dict[str, Any]) -> None:
+        self.put(user_id, battle_state)
+
+    def __contains__(self, user_id: object) -> bool:
+        self.evict_expired()
+        return user_id in self._battles
+
+    def __len__(self) -> int:
+        self.evict_expired()
+        return len(self._battles)
+
+    def __iter__(self) -> Iterator[str]:
+        self.evict_expired()
+        return iter(list(self._battles))
@@ -0,0 +1,73 @@
+"""
+Inner Demon Battle Simulation Benchmark
+
+魔物ごとに battles 件のバトルを、InnerDemonBattle で1件ずつ進めた場合
+（object_battles 件で計測）と BattleBalanceSimulator でまとめて進めた場合の
+処理数を比較する。あわせて、放置されたバトルがストアから破棄されることを確かめる
+
+Usage: python benchmark_battle_simulation.py [battles] [object_battles] [abandoned_users]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from battle_simulator import BattleBalanceSimulator
+from battle_store import BattleSessionStore
+from main import DemonType, InnerDemonBattle
+
+ACTION_POOL = [
+    "routine_task_completion", "pomodoro_usage", "small_step_action", "breathing_exercise",
+    "mindfulness_practice", "social_connection", "creative_expression", "physical_activity",
+    "small_social_task", "group_participation", "routine", "social", "scrolling", "napping",
+]
+
+
+def object_battles(demon_type, battles):
+    battle_system = InnerDemonBattle()
+    rng = random.Random(1)
+    victories = 0
+    started = time.perf_counter()
+    for _ in range(battles):
+        result = battle_system.initiate_battle("player", demon_type, rng.choices(ACTION_POOL, k=rng.randint(1, 3)))
+        while result["result"] == "ongoing":
+            result = battle_system.continue_battle("player", rng.choices(ACTION_POOL, k=rng.randint(1, 3)))
+        victories += result["result"] == "victory"
+    return battles / (time.perf_counter() - started), victories / battles
+
+
+def abandoned_battles(users):
+    """users 人がバトルを始めたまま放置したときに残るバトル数と使用メモリ"""
+    clock = [0.0]
+    battle_system = InnerDemonBattle()
+    battle_system.active_battles = BattleSessionStore(idle_ttl_seconds=1800, clock=lambda: clock[0])
+    tracemalloc.start()
+    for i in range(users):
+        clock[0] = i * 3600 / users  # 1時間かけて始まる
+        battle_system.initiate_battle(f"user_{i}", DemonType.DEPRESSION_VOID, ["scrolling"])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(battle_system.active_battles), peak
+
+
+if __name__ == "__main__":
+    battles = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    objects = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    abandoned_users = int(sys.argv[3]) if len(sys.argv) > 3 else 50_000
+
+    simulator = BattleBalanceSimulator()
+    print(f"{'demon':<24} {'object battles/s':>17} {'vectorised battles/s':>21} {'win rate':>9}")
+    for demon_type in DemonType:
+        object_rate, object_win_rate = object_battles(demon_type, objects)
+        summary = simulator.simulate(demon_type, battles, ACTION_POOL, seed=2)
+        vector_rate = battles / summary["elapsed_seconds"]
+        print(f"{demon_type.value:<24} {object_rate:>17,.0f} {vector_rate:>21,.0f} "
+              f"{summary['win_rate']:>8.1%} (object {object_win_rate:.1%})")
+
+    remaining, peak = abandoned_battles(abandoned_users)
+    print(f"abandoned battles: {abandoned_users:,} started, {remaining:,} kept after 30 min idle TTL, "
+          f"peak {peak / 1e6:,.1f} MB")
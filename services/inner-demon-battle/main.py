@@ -3,13 +3,22 @@
 治療
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any
 from dataclasses import dataclass, asdict
 from enum import Enum
+import os
 import random
+import re
 import json
 from datetime import datetime, timedelta
 from battle_rewards import BattleRewardSystem, BattleRewards
+from battle_store import BattleSessionStore
+
+DIRECT_WEAKNESS_DAMAGE = 25   # 弱点そのものの行動
+PARTIAL_WEAKNESS_DAMAGE = 15  # 弱点と部分一致する行動
+BASE_ACTION_DAMAGE = 5        # それ以外の行動
+DAMAGE_VARIANCE = (0.8, 1.2)  # ダメージの振れ幅（±20%）
+MAX_BATTLE_TURNS = 10         # これを越えると敗北
 
 class DemonType(Enum):
     """?"""
@@ -34,6 +43,52 @@ class DemonStats:
     therapeutic_theme: str
     description: str
 
+class WeaknessMatcher:
+    """
+    弱点リストを前計算した判定器
+
+    完全一致は集合で、部分一致（行動が弱点を含む）は弱点の選択を1つにまとめた
+    正規表現で、逆向き（弱点が行動を含む）は区切り文字で連結した弱点の文字列で判定する。
+    行動ごとの基本ダメージは覚えておく
+    """
+    
+    _SEPARATOR = "\x00"
+    _MEMO_LIMIT = 4096
+    
+    def __init__(self, weaknesses: Iterable[str]):
+        self.weaknesses = list(weaknesses)
+        self.weakness_set = frozenset(self.weaknesses)
+        self._pattern = re.compile(
+            "|".join(re.escape(w) for w in sorted(self.weakness_set, key=len, reverse=True))
+        ) if self.weaknesses else None
+        self._joined = self._SEPARATOR.join(self.weaknesses)
+        self._base_damage: Dict[str, int] = {}
+    
+    def base_damage(self, action: str) -> int:
+        """ダメージの振れ幅をかける前の値"""
+        damage = self._base_damage.get(action)
+        if damage is None:
+            if action in self.weakness_set:
+                damage = DIRECT_WEAKNESS_DAMAGE
+            elif self.is_partial_match(action):
+                damage = PARTIAL_WEAKNESS_DAMAGE
+            else:
+                damage = BASE_ACTION_DAMAGE
+            if len(self._base_damage) < self._MEMO_LIMIT:
+                self._base_damage[action] = damage
+        return damage
+    
+    def is_partial_match(self, action: str) -> bool:
+        """行動が弱点の一部か、弱点を含むか"""
+        if self._pattern is None:
+            return False
+        if self._SEPARATOR in action:
+            if any(action in weakness for weakness in self.weaknesses):
+                return True
+        elif action in self._joined:
+            return True
+        return self._pattern.search(action) is not None
+
 @dataclass
 class BattleReward:
     """バリデーション"""
@@ -47,7 +102,17 @@ class InnerDemonBattle:
     
     def __init__(self):
         self.demon_types = self._initialize_demon_types()
-        self.active_battles = {}  # user_id -> battle_state
+        self.weakness_matchers = {
+            demon_type: WeaknessMatcher(data["weaknesses"]) for demon_type, data in self.demon_types.items()
+        }
+        self._matchers_by_weaknesses = {
+            tuple(matcher.weaknesses): matcher for matcher in self.weakness_matchers.values()
+        }
+        # user_id -> battle_state（放置されたバトルは破棄する）
+        self.active_battles = BattleSessionStore(
+            idle_ttl_seconds=float(os.getenv("INNER_DEMON_BATTLE_IDLE_TTL_SECONDS", "1800")),
+            max_battles=int(os.getenv("INNER_DEMON_BATTLE_MAX_ACTIVE", "100000"))
+        )
         self.reward_system = BattleRewardSystem()
     
     def _initialize_demon_types(self) -> Dict[DemonType, Dict[str, Any]]:
@@ -170,10 +235,10 @@ class InnerDemonBattle:
     
     def continue_battle(self, user_id: str, new_actions: List[str]) -> Dict[str, Any]:
         """バリデーション"""
-        if user_id not in self.active_battles:
+        battle_state = self.active_battles.get(user_id)
+        if battle_state is None:
             return {"error": "アプリ"}
         
-        battle_state = self.active_battles[user_id]
         demon_stats = battle_state["demon_stats"]
         demon_data = self.demon_types[battle_state["demon_type"]]
         
@@ -189,29 +254,32 @@ class InnerDemonBattle:
         # バリデーション
         if demon_stats.current_hp <= 0:
             return self._handle_victory(user_id, demon_data)
-        elif battle_state["turn_count"] > 10:  # ?10タスク
+        elif battle_state["turn_count"] > MAX_BATTLE_TURNS:  # ?10タスク
             return self._handle_defeat(user_id, demon_data)
         else:
             return self._handle_ongoing_battle(user_id, demon_stats, damage)
     
     def _calculate_damage(self, actions: List[str], weaknesses: List[str]) -> int:
         """アプリ"""
+        matcher = self._get_weakness_matcher(weaknesses)
         damage = 0
         for action in actions:
-            if action in weaknesses:
-                # ?
-                damage += 25
-            elif any(action in weakness or weakness in action for weakness in weaknesses):
-                # ?
-                damage += 15
-            else:
-                # ?
-                damage += 5
+            damage += matcher.base_damage(action)
         
         # ?20%?
-        variance = random.uniform(0.8, 1.2)
+        variance = random.uniform(*DAMAGE_VARIANCE)
         return int(damage * variance)
     
+    def _get_weakness_matcher(self, weaknesses: List[str]) -> WeaknessMatcher:
+        """魔物の弱点なら前計算済みの判定器、それ以外はその場で作る"""
+        key = tuple(weaknesses)
+        matcher = self._matchers_by_weaknesses.get(key)
+        if matcher is None:
+            matcher = WeaknessMatcher(weaknesses)
+            if len(self._matchers_by_weaknesses) < 256:
+                self._matchers_by_weaknesses[key] = matcher
+        return matcher
+    
     def _handle_victory(self, user_id: str, demon_data: Dict[str, Any]) -> Dict[str, Any]:
         """?"""
         battle_state = self.active_battles.pop(user_id)
@@ -426,18 +494,19 @@ class InnerDemonBattle:
     
     def _count_weakness_hits(self, user_actions: List[str], weaknesses: List[str]) -> int:
         """?"""
+        weakness_set = self._get_weakness_matcher(weaknesses).weakness_set
         hits = 0
         for action in user_actions:
-            if action in weaknesses:
+            if action in weakness_set:
                 hits += 1
         return hits
     
     def get_battle_status(self, user_id: str) -> Optional[Dict[str, Any]]:
         """バリデーション"""
-        if user_id not in self.active_battles:
+        battle_state = self.active_battles.get(user_id)
+        if battle_state is None:
             return None
         
-        battle_state = self.active_battles[user_id]
         demon_stats = battle_state["demon_stats"]
         
         return {
@@ -0,0 +1,184 @@
+"""
+バトル状態のストア・弱点判定器・バランスシミュレーターのテスト
+"""
+
+import random
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from battle_rewards import ItemRarity
+from battle_simulator import BattleBalanceSimulator
+from battle_store import BattleSessionStore
+from main import InnerDemonBattle, DemonType, WeaknessMatcher
+
+ACTION_POOL = [
+    "routine_task_completion", "pomodoro_usage", "breathing_exercise", "social_connection",
+    "creative_expression", "small_social_task", "physical_activity", "routine", "social",
+    "morning_routine_walk", "scrolling", "napping",
+]
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBattleSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = BattleSessionStore(idle_ttl_seconds=60, max_battles=3, clock=self.clock)
+
+    def test_idle_battles_expire(self):
+        self.store["user_a"] = {"turn_count": 1}
+        self.store["user_b"] = {"turn_count": 1}
+        self.clock.now = 40
+        self.assertIsNotNone(self.store.get("user_a"))  # 操作したので期限が延びる
+
+        self.clock.now = 70
+        self.assertIn("user_a", self.store)
+        self.assertNotIn("user_b", self.store)
+        self.assertEqual(self.store.evicted_idle, 1)
+
+    def test_least_recently_used_battle_is_evicted_over_budget(self):
+        for user_id in ["user_a", "user_b", "user_c"]:
+            self.store[user_id] = {}
+        self.store.get("user_a")
+        self.store["user_d"] = {}
+
+        self.assertEqual(sorted(self.store), ["user_a", "user_c", "user_d"])
+        self.assertEqual(self.store.stats()["evicted_over_budget"], 1)
+
+    def test_pop(self):
+        self.store["user_a"] = {"turn_count": 2}
+        self.assertEqual(self.store.pop("user_a"), {"turn_count": 2})
+        self.assertIsNone(self.store.pop("user_a", None))
+        with self.assertRaises(KeyError):
+            self.store.pop("user_a")
+
+    def test_abandoned_battle_cannot_be_continued(self):
+        battle_system = InnerDemonBattle()
+        battle_system.active_battles = BattleSessionStore(idle_ttl_seconds=60, clock=self.clock)
+        battle_system.initiate_battle("user_a", DemonType.DEPRESSION_VOID, ["scrolling"])
+        self.assertIsNotNone(battle_system.get_battle_status("user_a"))
+
+        self.clock.now = 61
+        self.assertIn("error", battle_system.continue_battle("user_a", ["social_connection"]))
+        self.assertEqual(len(battle_system.active_battles), 0)
+
+
+class TestWeaknessMatcher(unittest.TestCase):
+
+    @staticmethod
+    def legacy_base_damage(action, weaknesses):
+        if action in weaknesses:
+            return 25
+        if any(action in weakness or weakness in action for weakness in weaknesses):
+            return 15
+        return 5
+
+    def test_matches_nested_scan(self):
+        battle_system = InnerDemonBattle()
+        actions = ACTION_POOL + ["", "task", "routine_task_completion_done", "a.b", "\x00", "usage"]
+        weakness_lists = [data["weaknesses"] for data in battle_system.demon_types.values()]
+        weakness_lists += [["a.b", "c*d"], ["", "focus"], []]
+        for weaknesses in weakness_lists:
+            matcher = WeaknessMatcher(weaknesses)
+            for action in actions:
+                self.assertEqual(matcher.base_damage(action), self.legacy_base_damage(action, weaknesses),
+                                 (action, weaknesses))
+
+    @patch('random.uniform', return_value=1.0)
+    def test_damage_uses_precomputed_matchers(self, _):
+        battle_system = InnerDemonBattle()
+        weaknesses = battle_system.demon_types[DemonType.PROCRASTINATION_DRAGON]["weaknesses"]
+        self.assertEqual(battle_system._calculate_damage(["pomodoro_usage", "routine", "napping"], weaknesses), 45)
+        self.assertEqual(battle_system._calculate_damage(["focus_mode"], ["focus"]), 15)
+
+
+class TestBattleBalanceSimulator(unittest.TestCase):
+
+    def setUp(self):
+        self.battle_system = InnerDemonBattle()
+        self.simulator = BattleBalanceSimulator(self.battle_system, chunk_size=64)
+
+    def play(self, demon_type, turn_actions):
+        """オブジェクトで1バトル進めた結果"""
+        result = self.battle_system.initiate_battle("player", demon_type, turn_actions[0])
+        turn = 1
+        while result["result"] == "ongoing":
+            turn += 1
+            result = self.battle_system.continue_battle("player", turn_actions[turn - 1])
+        return result
+
+    @patch('random.uniform', return_value=1.0)
+    def test_fixed_policy_matches_object_battle(self, _):
+        cases = [
+            (DemonType.PROCRASTINATION_DRAGON, ["pomodoro_usage"], 2),
+            (DemonType.ANXIETY_SHADOW, ["breathing_exercise", "social"], 1),
+            (DemonType.DEPRESSION_VOID, ["routine"], 3),
+            (DemonType.DEPRESSION_VOID, ["napping"], 1),
+            (DemonType.SOCIAL_FEAR_GOBLIN, ["small_social_task", "napping"], 3),
+        ]
+        for demon_type, pool, per_turn in cases:
+            expected = self.play(demon_type, [[pool[0]] * per_turn] * 11)
+            summary = self.simulator.simulate(demon_type, 200, [pool[0]], actions_per_turn=(per_turn, per_turn),
+                                              variance=(1.0, 1.0), seed=1)
+            with self.subTest(demon_type=demon_type, action=pool[0], per_turn=per_turn):
+                if expected["result"] == "victory":
+                    self.assertEqual(summary["victories"], 200)
+                    self.assertEqual(summary["victory_turns"], {expected["turns_taken"]: 200})
+                    rewards = expected["rewards"]
+                else:
+                    self.assertEqual(summary["defeats"], 200)
+                    rewards = expected["consolation_reward"]
+                self.assertEqual(summary["coins"]["mean"], rewards["coins"])
+                self.assertEqual(summary["xp"]["mean"], rewards["xp"])
+                self.assertEqual(sum(summary["item_drops"].values()), 200 * len(rewards["items"]))
+
+    def test_random_policy_matches_object_battles_statistically(self):
+        # 勝率が五分前後になる弱い行動方針で比べる
+        demon_type = DemonType.DEPRESSION_VOID
+        pool = ["social", "scrolling", "napping", "routine", "napping"]
+        rng = random.Random(5)
+        random.seed(6)
+        battles = 3000
+        victories = coins = 0
+        for _ in range(battles):
+            result = self.play(demon_type, [rng.choices(pool, k=rng.randint(1, 3)) for _ in range(11)])
+            if result["result"] == "victory":
+                victories += 1
+                coins += result["rewards"]["coins"]
+            else:
+                coins += result["consolation_reward"]["coins"]
+
+        simulator = BattleBalanceSimulator(self.battle_system)
+        summary = simulator.simulate(demon_type, 200_000, pool, seed=7)
+        self.assertGreater(victories / battles, 0.3)
+        self.assertLess(victories / battles, 0.9)
+        self.assertAlmostEqual(summary["win_rate"], victories / battles, delta=0.03)
+        self.assertAlmostEqual(summary["coins"]["mean"], coins / battles, delta=0.03 * coins / battles)
+
+    def test_item_drops_follow_rarity_table(self):
+        summary = self.simulator.simulate(DemonType.PROCRASTINATION_DRAGON, 20_000, ["pomodoro_usage"],
+                                          actions_per_turn=(3, 3), variance=(1.0, 1.0), seed=3)
+        # 2ターン・効率1.5・弱点6回で倍率2.0 → 3個ずつ
+        self.assertEqual(summary["victory_turns"], {2: 20_000})
+        self.assertEqual(sum(summary["rarity_drops"].values()), 60_000)
+        rates = self.battle_system.reward_system._item_rarity_rates(2.0)
+        # EPIC のアイテムはないのでコモンに振り替わる
+        self.assertEqual(summary["rarity_drops"]["epic"], 0)
+        legendary_rate = summary["rarity_drops"]["legendary"] / 60_000
+        self.assertAlmostEqual(legendary_rate, rates[ItemRarity.LEGENDARY], delta=0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,7 @@
 
 from enum import Enum
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Set, Tuple
 from datetime import datetime, timedelta
 import json
 
@@ -35,6 +35,61 @@ class UnlockCondition:
     check_function: Optional[Callable] = None
 
 
+@dataclass
+class UserUnlockState:
+    """ユーザーごとの直近のステータスと条件ごとの判定結果"""
+    user_data: Dict[str, Any]
+    values: Dict[str, Any]                                       # "job_levels.warrior" -> 10
+    condition_results: Dict[JobType, List[Tuple[bool, Dict[str, Any]]]] = field(default_factory=dict)
+    met_counts: Dict[JobType, int] = field(default_factory=dict)
+    failed_progress: Dict[JobType, List[float]] = field(default_factory=dict)   # 達成済みの条件は0
+    milestone_scores: Dict[JobType, List[float]] = field(default_factory=dict)  # 達成済みの条件は-1
+    job_status: Dict[JobType, Dict[str, Any]] = field(default_factory=dict)
+    summary: Optional[Dict[str, Any]] = None
+
+
+# 判定に使う user_data のセクション
+CONDITION_SECTIONS = {
+    UnlockConditionType.JOB_LEVEL: "job_levels",
+    UnlockConditionType.STAT_VALUE: "stats",
+    UnlockConditionType.TASK_COMPLETION: "task_completions",
+    UnlockConditionType.STORY_BRANCH: "story_branches",
+    UnlockConditionType.ACHIEVEMENT: "achievements",
+    UnlockConditionType.TIME_BASED: "time_based",
+    UnlockConditionType.COMBINATION: "combination_conditions",
+}
+
+ANY_STAT = "*"  # カスタム判定など、どのキーが変わっても判定し直す条件
+
+
+def condition_stat_keys(condition: UnlockCondition) -> List[str]:
+    """条件が参照するステータスキー（"job_levels.warrior" など）"""
+    if condition.check_function:
+        return [ANY_STAT]
+    section = CONDITION_SECTIONS.get(condition.condition_type)
+    if condition.condition_type == UnlockConditionType.JOB_LEVEL:
+        return [f"{section}.{condition.key.replace('_level', '')}"]
+    if condition.condition_type == UnlockConditionType.COMBINATION:
+        if not isinstance(condition.required_value, dict):
+            return [ANY_STAT]
+        return [f"{section}.{sub_key}" for sub_key in condition.required_value]
+    if section is None:
+        return [ANY_STAT]
+    return [f"{section}.{condition.key}"]
+
+
+def flatten_user_data(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """{"job_levels": {"warrior": 10}} -> {"job_levels.warrior": 10}"""
+    values = {}
+    for section, section_values in user_data.items():
+        if isinstance(section_values, dict):
+            for key, value in section_values.items():
+                values[f"{section}.{key}"] = value
+        else:
+            values[section] = section_values
+    return values
+
+
 @dataclass
 class StoryIntegration:
     """ストーリー"""
@@ -52,6 +107,18 @@ class AdvancedJobSystem:
         self.advanced_unlock_conditions = self._initialize_advanced_conditions()
         self.story_integrations = self._initialize_story_integrations()
         self.achievement_tracker = AchievementTracker()
+        self.condition_index: Dict[str, List[Tuple[JobType, int]]] = {}
+        self.user_unlock_states: Dict[str, UserUnlockState] = {}
+        self.rebuild_condition_index()
+    
+    def rebuild_condition_index(self):
+        """ステータスキー -> (上級職, 条件の位置) の逆引きを作り直す（条件を変えたら呼ぶ）"""
+        self.condition_index = {}
+        for job_type, conditions in self.advanced_unlock_conditions.items():
+            for position, condition in enumerate(conditions):
+                for stat_key in condition_stat_keys(condition):
+                    self.condition_index.setdefault(stat_key, []).append((job_type, position))
+        self.user_unlock_states.clear()
     
     def _initialize_advanced_conditions(self) -> Dict[JobType, List[UnlockCondition]]:
         """?"""
@@ -215,13 +282,26 @@ class AdvancedJobSystem:
         }
     
     def check_advanced_unlock_conditions(self, job_type: JobType, 
-                                       user_data: Dict[str, Any]) -> Dict[str, Any]:
+                                       user_data: Dict[str, Any],
+                                       uid: Optional[str] = None) -> Dict[str, Any]:
         """?"""
         
         if job_type not in self.advanced_unlock_conditions:
             return {"unlocked": False, "error": "Invalid advanced job type"}
         
+        if uid is not None:
+            # 前回から変わったステータスに関係する条件だけを判定し直す
+            state = self.sync_user_data(uid, user_data)
+            return self._get_job_status(state, job_type)
+        
         conditions = self.advanced_unlock_conditions[job_type]
+        evaluated = [self._check_single_condition(condition, user_data) for condition in conditions]
+        return self._build_unlock_status(job_type, evaluated)
+    
+    def _build_unlock_status(self, job_type: JobType,
+                             evaluated: List[Tuple[bool, Dict[str, Any]]]) -> Dict[str, Any]:
+        """条件ごとの判定結果から解放状況をまとめる"""
+        
         results = {
             "unlocked": True,
             "conditions_met": [],
@@ -229,17 +309,9 @@ class AdvancedJobSystem:
             "progress": {}
         }
         
-        for condition in conditions:
-            met, progress = self._check_single_condition(condition, user_data)
+        for condition, (met, progress) in zip(self.advanced_unlock_conditions[job_type], evaluated):
             
-            condition_result = {
-                "type": condition.condition_type.value,
-                "key": condition.key,
-                "required": condition.required_value,
-                "current": progress.get("current_value"),
-                "description": condition.description,
-                "met": met
-            }
+            condition_result = self._condition_result(condition, met, progress)
             
             if met:
                 results["conditions_met"].append(condition_result)
@@ -251,6 +323,122 @@ class AdvancedJobSystem:
         
         return results
     
+    def _condition_result(self, condition: UnlockCondition, met: bool,
+                          progress: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "type": condition.condition_type.value,
+            "key": condition.key,
+            "required": condition.required_value,
+            "current": progress.get("current_value"),
+            "description": condition.description,
+            "met": met
+        }
+    
+    def apply_stat_changes(self, uid: str, changes: Dict[str, Any]) -> Set[JobType]:
+        """
+        変わったステータスだけを受け取って反映する
+
+        changes のキーは "job_levels.warrior" のように「セクション.キー」で渡す。
+        判定し直した条件を持つ上級職を返す
+        """
+        state = self.user_unlock_states.get(uid)
+        if state is None:
+            state = self._create_unlock_state(uid, {})
+        
+        changed_keys = set()
+        for stat_key, value in changes.items():
+            if stat_key in state.values and state.values[stat_key] == value:
+                continue
+            section, _, key = stat_key.partition(".")
+            if key:
+                state.user_data.setdefault(section, {})[key] = value
+            else:
+                state.user_data[section] = value
+            state.values[stat_key] = value
+            changed_keys.add(stat_key)
+        
+        return self._reevaluate(state, changed_keys)
+    
+    def sync_user_data(self, uid: str, user_data: Dict[str, Any]) -> UserUnlockState:
+        """user_data 全体を受け取り、前回と値が違うキーの条件だけを判定し直す"""
+        state = self.user_unlock_states.get(uid)
+        if state is None:
+            return self._create_unlock_state(uid, user_data)
+        
+        values = flatten_user_data(user_data)
+        previous = state.values
+        changed_keys = {stat_key for stat_key in previous.keys() | values.keys()
+                        if stat_key not in previous or stat_key not in values
+                        or previous[stat_key] != values[stat_key]}
+        if changed_keys:
+            state.user_data = {section: dict(section_values) if isinstance(section_values, dict) else section_values
+                               for section, section_values in user_data.items()}
+            state.values = values
+            self._reevaluate(state, changed_keys)
+        return state
+    
+    def _create_unlock_state(self, uid: str, user_data: Dict[str, Any]) -> UserUnlockState:
+        """初回はすべての条件を判定する"""
+        state = UserUnlockState(
+            user_data={section: dict(section_values) if isinstance(section_values, dict) else section_values
+                       for section, section_values in user_data.items()},
+            values=flatten_user_data(user_data)
+        )
+        for job_type, conditions in self.advanced_unlock_conditions.items():
+            state.condition_results[job_type] = [None] * len(conditions)
+            state.met_counts[job_type] = 0
+            state.failed_progress[job_type] = [0.0] * len(conditions)
+            state.milestone_scores[job_type] = [-1.0] * len(conditions)
+            for position, condition in enumerate(conditions):
+                self._record_result(state, job_type, position,
+                                    self._check_single_condition(condition, state.user_data))
+        self.user_unlock_states[uid] = state
+        return state
+    
+    def _record_result(self, state: UserUnlockState, job_type: JobType, position: int,
+                       result: Tuple[bool, Dict[str, Any]]):
+        """条件の判定結果を保存し、達成数・進捗率の集計を差し替える"""
+        previous = state.condition_results[job_type][position]
+        if previous is not None and previous[0]:
+            state.met_counts[job_type] -= 1
+        met, progress = result
+        state.condition_results[job_type][position] = result
+        if met:
+            state.met_counts[job_type] += 1
+            state.failed_progress[job_type][position] = 0.0
+            state.milestone_scores[job_type][position] = -1.0
+        else:
+            percentage = progress.get("progress_percentage", 0)
+            state.failed_progress[job_type][position] = percentage
+            state.milestone_scores[job_type][position] = percentage
+    
+    def _reevaluate(self, state: UserUnlockState, changed_keys: Set[str]) -> Set[JobType]:
+        affected: Set[Tuple[JobType, int]] = set()
+        if changed_keys:
+            affected.update(self.condition_index.get(ANY_STAT, ()))
+        for stat_key in changed_keys:
+            affected.update(self.condition_index.get(stat_key, ()))
+        
+        affected_jobs = set()
+        for job_type, position in affected:
+            condition = self.advanced_unlock_conditions[job_type][position]
+            self._record_result(state, job_type, position, self._check_single_condition(condition, state.user_data))
+            affected_jobs.add(job_type)
+        
+        for job_type in affected_jobs:
+            state.job_status.pop(job_type, None)
+        if affected_jobs:
+            state.summary = None
+        return affected_jobs
+    
+    def _get_job_status(self, state: UserUnlockState, job_type: JobType) -> Dict[str, Any]:
+        """キャッシュした解放状況（判定し直した上級職だけ組み立て直す）"""
+        status = state.job_status.get(job_type)
+        if status is None:
+            status = self._build_unlock_status(job_type, state.condition_results[job_type])
+            state.job_status[job_type] = status
+        return status
+    
     def _check_single_condition(self, condition: UnlockCondition, 
                                user_data: Dict[str, Any]) -> tuple[bool, Dict[str, Any]]:
         """?"""
@@ -356,23 +544,72 @@ class AdvancedJobSystem:
         
         return False, {"error": "Unknown condition type"}
     
-    def get_unlock_progress_summary(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    def get_unlock_progress_summary(self, user_data: Dict[str, Any],
+                                    uid: Optional[str] = None) -> Dict[str, Any]:
         """?"""
         
+        if uid is not None:
+            state = self.sync_user_data(uid, user_data)
+            if state.summary is None:
+                state.summary = self._build_progress_summary(
+                    lambda job_type: self._cached_progress(state, job_type)
+                )
+            return state.summary
+        
+        return self._build_progress_summary(
+            lambda job_type: self._progress_from_status(
+                self.check_advanced_unlock_conditions(job_type, user_data)
+            )
+        )
+    
+    def _progress_from_status(self, unlock_status: Dict[str, Any]) -> tuple:
+        """(解放済み, 達成数, 条件数, 全体の進捗率, 次の目標)"""
+        conditions_met = len(unlock_status["conditions_met"])
+        return (
+            unlock_status["unlocked"],
+            conditions_met,
+            conditions_met + len(unlock_status["conditions_failed"]),
+            self._calculate_overall_progress(unlock_status),
+            self._get_next_milestone(unlock_status)
+        )
+    
+    def _cached_progress(self, state: UserUnlockState, job_type: JobType) -> tuple:
+        """
+        _progress_from_status と同じ値を集計から求める
+
+        条件の key は上級職ごとに重ならない前提（解放状況の progress は key ごとに持つため）
+        """
+        conditions_total = len(state.milestone_scores[job_type])
+        conditions_met = state.met_counts[job_type]
+        if conditions_total == 0:
+            return True, 0, 0, 0.0, None
+        
+        overall_progress = sum(state.failed_progress[job_type], conditions_met * 100.0) / conditions_total
+        next_milestone = None
+        if conditions_met < conditions_total:
+            scores = state.milestone_scores[job_type]
+            position = max(range(conditions_total), key=scores.__getitem__)
+            met, progress = state.condition_results[job_type][position]
+            next_milestone = self._condition_result(
+                self.advanced_unlock_conditions[job_type][position], met, progress
+            )
+        return conditions_met == conditions_total, conditions_met, conditions_total, overall_progress, next_milestone
+    
+    def _build_progress_summary(self, progress_of: Callable[[JobType], tuple]) -> Dict[str, Any]:
         summary = {}
         
         for job_type in [JobType.PALADIN, JobType.ARCHMAGE, JobType.SHADOW_MASTER]:
             job_info = self.base_job_system.get_job(job_type)
-            unlock_status = self.check_advanced_unlock_conditions(job_type, user_data)
+            unlocked, conditions_met, conditions_total, overall_progress, next_milestone = progress_of(job_type)
             story_integration = self.story_integrations.get(job_type)
             
             summary[job_type.value] = {
                 "name": job_info.name,
-                "unlocked": unlock_status["unlocked"],
-                "conditions_met": len(unlock_status["conditions_met"]),
-                "conditions_total": len(unlock_status["conditions_met"]) + len(unlock_status["conditions_failed"]),
-                "overall_progress": self._calculate_overall_progress(unlock_status),
-                "next_milestone": self._get_next_milestone(unlock_status),
+                "unlocked": unlocked,
+                "conditions_met": conditions_met,
+                "conditions_total": conditions_total,
+                "overall_progress": overall_progress,
+                "next_milestone": next_milestone,
                 "story_integration": {
                     "job_unlock_story_node": story_integration.job_unlock_story_node,
                     "character_development_arc": story_integration.character_development_arc
@@ -574,14 +811,19 @@ class AdvancedJobManager(JobManager):
     def get_advanced_unlock_status(self, uid: str, user_stats: Dict[str, Any]) -> Dict[str, Any]:
         """?"""
         
-        return self.advanced_system.get_unlock_progress_summary(user_stats)
+        return self.advanced_system.get_unlock_progress_summary(user_stats, uid=uid)
+    
+    def update_user_stats(self, uid: str, changes: Dict[str, Any]) -> Set[JobType]:
+        """変わったステータスだけを反映する（キーは "job_levels.warrior" の形式）"""
+        
+        return self.advanced_system.apply_stat_changes(uid, changes)
     
     def attempt_advanced_job_change(self, uid: str, target_job: JobType, 
                                   user_stats: Dict[str, Any]) -> Dict[str, Any]:
         """?"""
         
         # ?
-        unlock_status = self.advanced_system.check_advanced_unlock_conditions(target_job, user_stats)
+        unlock_status = self.advanced_system.check_advanced_unlock_conditions(target_job, user_stats, uid=uid)
         
         if not unlock_status["unlocked"]:
             return {
@@ -615,7 +857,7 @@ class AdvancedJobManager(JobManager):
         milestones = []
         
         for job_type in [JobType.PALADIN, JobType.ARCHMAGE, JobType.SHADOW_MASTER]:
-            unlock_status = self.advanced_system.check_advanced_unlock_conditions(job_type, user_stats)
+            unlock_status = self.advanced_system.check_advanced_unlock_conditions(job_type, user_stats, uid=uid)
             
             if not unlock_status["unlocked"]:
                 next_milestone = self.advanced_system._get_next_milestone(unlock_status)
@@ -0,0 +1,84 @@
+"""
+Advanced Job Unlock Index Benchmark
+
+上級職の解放条件を condition_factor 倍にして、users 人のユーザーが1回に1〜3項目ずつ
+ステータスを更新し、そのたびに解放状況のサマリーを取得したときの処理数を比較する。
+従来方式は取得のたびに全上級職の全条件を判定し直す
+
+Usage: python benchmark_unlock_index.py [condition_factor] [users] [updates]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from advanced_job_system import AdvancedJobSystem, UnlockCondition, UnlockConditionType
+from main import JobSystem
+
+SECTIONS = {
+    UnlockConditionType.STAT_VALUE: "stats",
+    UnlockConditionType.TASK_COMPLETION: "task_completions",
+    UnlockConditionType.STORY_BRANCH: "story_branches",
+    UnlockConditionType.TIME_BASED: "time_based",
+}
+KEYS_PER_SECTION = 600  # 上級職ごとの条件の key は重ならないようにする
+
+
+def build_system(condition_factor):
+    system = AdvancedJobSystem(JobSystem())
+    rng = random.Random(13)
+    for job_type, conditions in system.advanced_unlock_conditions.items():
+        keys = rng.sample(range(KEYS_PER_SECTION), len(conditions) * (condition_factor - 1))
+        for key in keys:
+            conditions.append(UnlockCondition(
+                rng.choice(list(SECTIONS)), f"key_{key}", rng.randint(1, 500), ""
+            ))
+    system.rebuild_condition_index()
+    return system
+
+
+def workload(users, updates):
+    """(ユーザー, 変わった項目, その時点の user_data)"""
+    rng = random.Random(14)
+    user_data = {f"user_{i}": {section: {} for section in SECTIONS.values()} for i in range(users)}
+    for _ in range(updates):
+        uid = f"user_{rng.randrange(users)}"
+        changes = {}
+        for _ in range(rng.randint(1, 3)):
+            section = rng.choice(list(SECTIONS.values()))
+            key = f"key_{rng.randrange(KEYS_PER_SECTION)}"
+            value = user_data[uid][section].get(key, 0) + rng.randint(1, 10)
+            user_data[uid][section][key] = value
+            changes[f"{section}.{key}"] = value
+        yield uid, changes, {section: dict(values) for section, values in user_data[uid].items()}
+
+
+def run(name, apply, condition_factor, users, updates):
+    system = build_system(condition_factor)
+    operations = list(workload(users, updates))
+    started = time.perf_counter()
+    for uid, changes, user_data in operations:
+        apply(system, uid, changes, user_data)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<16} {updates / elapsed:>10,.0f} updates/s  ({elapsed:6.2f} s)")
+
+
+def changed_keys(system, uid, changes, user_data):
+    system.apply_stat_changes(uid, changes)
+    system.get_unlock_progress_summary(user_data, uid=uid)
+
+
+if __name__ == "__main__":
+    condition_factor = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    updates = int(sys.argv[3]) if len(sys.argv) > 3 else 5_000
+    conditions = sum(len(c) for c in build_system(condition_factor).advanced_unlock_conditions.values())
+    print(f"conditions={conditions:,} users={users:,} updates={updates:,}")
+    run("full re-check", lambda system, uid, changes, user_data: system.get_unlock_progress_summary(user_data),
+        condition_factor, users, updates)
+    run("snapshot diff", lambda system, uid, changes, user_data: system.get_unlock_progress_summary(user_data, uid=uid),
+        condition_factor, users, updates)
+    run("changed keys", changed_keys, condition_factor, users, updates)
@@ -0,0 +1,127 @@
+"""
+上級職の解放条件の逆引き索引のテスト
+
+uid を渡したときの差分判定・キャッシュが、毎回すべての条件を判定し直した
+結果と一致すること、変わったステータスの条件だけを判定し直すことを確かめる
+"""
+
+import random
+
+import pytest
+from advanced_job_system import (
+    ANY_STAT, AdvancedJobManager, AdvancedJobSystem, UnlockCondition, UnlockConditionType,
+    condition_stat_keys
+)
+from main import JobSystem, JobType
+
+ADVANCED_JOBS = [JobType.PALADIN, JobType.ARCHMAGE, JobType.SHADOW_MASTER]
+
+STAT_RANGES = {
+    "job_levels.warrior": 15, "job_levels.priest": 8, "job_levels.mage": 20, "job_levels.ninja": 15,
+    "stats.wisdom": 25, "stats.resilience": 30,
+    "task_completions.social_tasks": 60, "task_completions.creative_tasks": 120,
+    "task_completions.stress_overcome": 40,
+    "story_branches.helped_others_count": 12, "story_branches.innovative_solutions": 18,
+    "story_branches.shadow_path_choices": 25,
+    "time_based.continuous_learning_days": 40,
+    "combination_conditions.environment_changes_adapted": 60,
+    "combination_conditions.crisis_overcome": 12,
+}
+ACHIEVEMENTS = ["achievements.community_leader", "achievements.master_innovator", "achievements.stress_master"]
+
+
+def random_changes(rng):
+    changes = {}
+    for stat_key in rng.sample(list(STAT_RANGES), rng.randint(1, 3)):
+        changes[stat_key] = rng.randint(0, STAT_RANGES[stat_key])
+    if rng.random() < 0.2:
+        changes[rng.choice(ACHIEVEMENTS)] = rng.random() < 0.7
+    return changes
+
+
+def nested(values):
+    user_data = {}
+    for stat_key, value in values.items():
+        section, key = stat_key.split(".", 1)
+        user_data.setdefault(section, {})[key] = value
+    return user_data
+
+
+class TestIndexedUnlockEvaluation:
+
+    def setup_method(self):
+        self.advanced_system = AdvancedJobSystem(JobSystem())
+
+    def test_cached_status_matches_full_evaluation(self):
+        rng = random.Random(21)
+        values = {}
+        for _ in range(300):
+            values.update(random_changes(rng))
+            user_data = nested(values)
+
+            for job_type in ADVANCED_JOBS:
+                assert self.advanced_system.check_advanced_unlock_conditions(job_type, user_data, uid="user_a") == \
+                    self.advanced_system.check_advanced_unlock_conditions(job_type, user_data)
+            assert self.advanced_system.get_unlock_progress_summary(user_data, uid="user_a") == \
+                self.advanced_system.get_unlock_progress_summary(user_data)
+
+    def test_stat_changes_match_full_snapshot(self):
+        rng = random.Random(22)
+        values = {}
+        for _ in range(200):
+            changes = random_changes(rng)
+            values.update(changes)
+            self.advanced_system.apply_stat_changes("user_b", changes)
+
+            assert self.advanced_system.get_unlock_progress_summary(nested(values), uid="user_b") == \
+                self.advanced_system.get_unlock_progress_summary(nested(values))
+
+    def test_only_dependent_conditions_are_reevaluated(self, monkeypatch):
+        self.advanced_system.get_unlock_progress_summary({}, uid="user_c")
+        checked = []
+        original = self.advanced_system._check_single_condition
+        monkeypatch.setattr(self.advanced_system, "_check_single_condition",
+                            lambda condition, user_data: checked.append(condition.key) or original(condition, user_data))
+
+        affected = self.advanced_system.apply_stat_changes("user_c", {"job_levels.mage": 15})
+        assert affected == {JobType.ARCHMAGE}
+        assert checked == ["mage_level"]
+
+        checked.clear()
+        assert self.advanced_system.apply_stat_changes("user_c", {"job_levels.mage": 15}) == set()
+        assert checked == []
+
+        summary = self.advanced_system.get_unlock_progress_summary({"job_levels": {"mage": 15}}, uid="user_c")
+        assert checked == []
+        assert summary["archmage"]["conditions_met"] == 1
+
+    def test_custom_conditions_are_reevaluated_on_any_change(self):
+        custom = UnlockCondition(UnlockConditionType.COMBINATION, "custom", None, "",
+                                 check_function=lambda user_data: user_data.get("stats", {}).get("focus", 0) >= 3)
+        assert condition_stat_keys(custom) == [ANY_STAT]
+        self.advanced_system.advanced_unlock_conditions[JobType.PALADIN].append(custom)
+        self.advanced_system.rebuild_condition_index()
+
+        status = self.advanced_system.check_advanced_unlock_conditions(JobType.PALADIN, {}, uid="user_d")
+        assert len(status["conditions_failed"]) == 6
+        status = self.advanced_system.check_advanced_unlock_conditions(
+            JobType.PALADIN, {"stats": {"focus": 3}}, uid="user_d")
+        assert len(status["conditions_failed"]) == 5
+
+
+class TestManagerUsesCachedState:
+
+    def test_update_user_stats_feeds_job_change(self):
+        manager = AdvancedJobManager()
+        manager.initialize_user_job("user_e", JobType.WARRIOR)
+        user_stats = {
+            "job_levels": {"warrior": 10, "priest": 5},
+            "task_completions": {"social_tasks": 49},
+            "story_branches": {"helped_others_count": 10},
+            "achievements": {"community_leader": True},
+        }
+
+        assert manager.attempt_advanced_job_change("user_e", JobType.PALADIN, user_stats)["success"] is False
+        assert manager.update_user_stats("user_e", {"task_completions.social_tasks": 50}) == {JobType.PALADIN}
+        user_stats["task_completions"]["social_tasks"] = 50
+        assert manager.attempt_advanced_job_change("user_e", JobType.PALADIN, user_stats)["success"] is True
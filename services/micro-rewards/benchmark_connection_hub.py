@@ -0,0 +1,144 @@
+"""
+Micro Rewards Dispatch / Fan-out Benchmark
+
+1. アクション判定: 全テンプレートを走査する方式と action_type 索引の方式の actions/s
+2. 通知の一斉送信: sockets 本の模擬クライアント接続（うち slow_ratio は受信が遅い端末）に
+   対して、接続ごとに json.dumps して順に await する従来方式と ConnectionHub.broadcast の
+   呼び出し時間・全件配送までの時間を比較する
+
+実ソケットの代わりにプロセス内の模擬クライアントを使うので、OSのファイル記述子の
+上限を気にせず5万接続を再現できる
+
+Usage: python benchmark_connection_hub.py [sockets] [actions] [slow_ratio]
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from connection_hub import ConnectionHub
+from main import MicroRewardsEngine, compile_trigger_condition, UserAction, UserEngagementState
+
+ACTION_TYPES = ["login", "task_start", "task_complete", "progress_check", "daily_check"]
+SLOW_SEND_SECONDS = 0.05
+
+
+class SimulatedClient:
+    """受信したフレーム数を数えるだけの模擬クライアント。遅い端末は送信ごとに待つ"""
+
+    __slots__ = ("slow", "received")
+
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.received = 0
+
+    async def send_text(self, text: str):
+        if self.slow:
+            await asyncio.sleep(SLOW_SEND_SECONDS)
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_actions(count: int):
+    random.seed(7)
+    return [
+        UserAction(
+            user_id=f"user_{i % 1000}",
+            action_type=random.choice(ACTION_TYPES),
+            timestamp=datetime.now(),
+            context={"duration_seconds": random.randint(30, 600), "tap_count": random.randint(1, 6)}
+        )
+        for i in range(count)
+    ]
+
+
+def bench_dispatch(actions):
+    engine = MicroRewardsEngine()
+    state = UserEngagementState(
+        user_id="user_0", last_login=datetime.now(), consecutive_days=5, daily_actions=1,
+        total_actions=1, last_reward_time=datetime.now(), recovery_boost_active=True,
+        recovery_boost_multiplier=1.2, engagement_streak=0, missed_days=0
+    )
+    # 索引なし: 判定関数はコンパイル済みのまま、全テンプレートを毎回走査する
+    compiled = [(template, *compile_trigger_condition(template.trigger_condition))
+                for template in engine.reward_templates]
+
+    started = time.perf_counter()
+    for action in actions:
+        [template for template, action_type, predicate in compiled
+         if action_type == action.action_type and (predicate is None or predicate(action, state))]
+    full_scan = len(actions) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for action in actions:
+        [template for template, predicate in engine.rewards_by_action.get(action.action_type, ())
+         if predicate is None or predicate(action, state)]
+    indexed = len(actions) / (time.perf_counter() - started)
+
+    print(f"dispatch  full_scan={full_scan:>10,.0f} actions/s  indexed={indexed:>10,.0f} actions/s")
+
+
+async def bench_sequential(sockets: int, slow_ratio: float):
+    clients = [SimulatedClient(i < sockets * slow_ratio) for i in range(sockets)]
+    notification = {"type": "announcement", "message": "今日のふりかえりの時間です", "sent_at": datetime.now().isoformat()}
+
+    started = time.perf_counter()
+    for client in clients:
+        await client.send_text(json.dumps(notification))
+    elapsed = time.perf_counter() - started
+    print(f"sequential send+dumps per socket: call={elapsed * 1000:>10.1f} ms  delivered={elapsed * 1000:>10.1f} ms")
+
+
+async def bench_hub(sockets: int, slow_ratio: float):
+    hub = ConnectionHub(max_queue=32, heartbeat_interval=3600)
+    clients = []
+    for i in range(sockets):
+        client = SimulatedClient(i < sockets * slow_ratio)
+        clients.append(client)
+        hub.register(f"user_{i // 2}", client)  # 1ユーザー2端末
+    notification = {"type": "announcement", "message": "今日のふりかえりの時間です", "sent_at": datetime.now()}
+
+    started = time.perf_counter()
+    queued = hub.broadcast(notification)
+    call = time.perf_counter() - started
+    fast_done = None
+    while any(client.received == 0 for client in clients):
+        if fast_done is None and all(client.received for client in clients if not client.slow):
+            fast_done = time.perf_counter() - started
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - started
+    fast_done = fast_done if fast_done is not None else delivered
+    print(f"hub broadcast (serialize once):   call={call * 1000:>10.1f} ms  delivered={delivered * 1000:>10.1f} ms  "
+          f"fast_clients={fast_done * 1000:.1f} ms  queued={queued:,}")
+
+    # 連続送信で遅い端末の送信キューがあふれたときの挙動
+    for seq in range(100):
+        hub.broadcast({"type": "progress", "seq": seq}, coalesce_key="progress" if seq % 2 else None)
+        await asyncio.sleep(0)
+    await asyncio.sleep(SLOW_SEND_SECONDS * 40)
+    stats = hub.get_stats()
+    print(f"hub burst of 100 messages: dropped={stats['dropped']:,} coalesced={stats['coalesced']:,} "
+          f"connections={stats['connections']:,}")
+    await hub.close()
+
+
+async def main(sockets: int, actions: int, slow_ratio: float):
+    print(f"sockets={sockets:,} actions={actions:,} slow_ratio={slow_ratio} slow_send={SLOW_SEND_SECONDS * 1000:.0f}ms")
+    bench_dispatch(make_actions(actions))
+    await bench_sequential(sockets, slow_ratio)
+    await bench_hub(sockets, slow_ratio)
+
+
+if __name__ == "__main__":
+    sockets = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    actions = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    slow_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    asyncio.run(main(sockets, actions, slow_ratio))
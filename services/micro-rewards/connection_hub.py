@@ -0,0 +1,271 @@
+"""
+WebSocket Connection Hub
+
+ユーザーごとに複数の接続（端末）を保持し、接続ごとの上限つき送信キュー・
+全接続で1本のハートビート・遅い受信側への破棄/集約ポリシー・
+1回だけシリアライズするブロードキャストを提供する
+
+生存判定: クライアントからの応答は必須ではない。送信が完了するか、クライアントから
+何か受信するたびに生存を記録し、idle_timeout のあいだどちらもない接続
+（送信が詰まったまま進まない接続）だけを 1001 で閉じる。ハートビートを
+受け取るだけのクライアントは、送信が通る限り切断されない
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 送信キューが満杯のときの扱い
+OVERFLOW_DROP_OLDEST = "drop_oldest"    # 最も古い未送信メッセージを捨てる
+OVERFLOW_DROP_NEWEST = "drop_newest"    # 新しいメッセージを捨てる
+OVERFLOW_DISCONNECT = "disconnect"      # 遅い受信側を切断する
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_DISCONNECT)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def serialize_message(message: Dict[str, Any]) -> str:
+    """通知をテキストフレームに変換する（列挙型と日時はそのまま渡せる）"""
+    return json.dumps(message, ensure_ascii=False, default=_json_default)
+
+
+class HubConnection:
+    """1本のWebSocket接続と、その送信キュー"""
+
+    __slots__ = ("connection_id", "user_id", "websocket", "queue", "coalesced",
+                 "last_seen", "sending", "closed", "sent", "dropped")
+
+    def __init__(self, connection_id: int, user_id: str, websocket: Any, now: float):
+        self.connection_id = connection_id
+        self.user_id = user_id
+        self.websocket = websocket
+        # [coalesce_key, text] の列。集約対象はキーから同じ要素を引いて中身を差し替える
+        self.queue: deque = deque()
+        self.coalesced: Dict[str, List[Optional[str]]] = {}
+        self.last_seen = now
+        self.sending = False
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+
+class ConnectionHub:
+    """
+    WebSocket接続のハブ
+
+    送信はキューに積むだけで待たない。接続ごとの送信タスクはキューに
+    メッセージがあるあいだだけ動き、空になると終了するので、待機中の
+    接続はタスクを持たない。coalesce_key 付きのメッセージは同じキーの
+    未送信メッセージを最新の内容で置き換える（進捗表示やハートビート）。
+    """
+
+    def __init__(self, max_queue: int = 32, overflow_policy: str = OVERFLOW_DROP_OLDEST,
+                 heartbeat_interval: float = 30.0, idle_timeout: float = 90.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._ids = itertools.count(1)
+        self._users: Dict[str, Dict[int, HubConnection]] = {}
+        self._sending: Set[asyncio.Task] = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._heartbeat_text = serialize_message({"type": "heartbeat"})
+        self.connections = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected_slow = 0
+        self.send_errors = 0
+
+    # 接続の登録と解除
+
+    def register(self, user_id: str, websocket: Any) -> HubConnection:
+        """受け付け済みのWebSocketを登録する（同じユーザーの他の端末はそのまま残る）"""
+        connection = HubConnection(next(self._ids), user_id, websocket, self._clock())
+        self._users.setdefault(user_id, {})[connection.connection_id] = connection
+        self.connections += 1
+        self._ensure_heartbeat()
+        return connection
+
+    def unregister(self, connection: HubConnection) -> None:
+        if connection.closed:
+            return
+        connection.closed = True
+        connection.queue.clear()
+        connection.coalesced.clear()
+        user_connections = self._users.get(connection.user_id)
+        if user_connections is not None and user_connections.pop(connection.connection_id, None) is not None:
+            self.connections -= 1
+            if not user_connections:
+                del self._users[connection.user_id]
+
+    def touch(self, connection: HubConnection) -> None:
+        """受信があった接続を生存扱いにする（送信の完了も _drain で同じく記録する）"""
+        connection.last_seen = self._clock()
+
+    def user_connections(self, user_id: str) -> List[HubConnection]:
+        return list(self._users.get(user_id, {}).values())
+
+    def __len__(self) -> int:
+        return self.connections
+
+    # 送信
+
+    def send_to_user(self, user_id: str, message: Dict[str, Any],
+                     coalesce_key: Optional[str] = None) -> int:
+        """ユーザーの全接続に送る。シリアライズは1回だけ。積んだ接続数を返す"""
+        user_connections = self._users.get(user_id)
+        if not user_connections:
+            return 0
+        text = serialize_message(message)
+        return sum(self._enqueue(connection, text, coalesce_key)
+                   for connection in list(user_connections.values()))
+
+    def broadcast(self, message: Dict[str, Any], user_ids: Optional[Iterable[str]] = None,
+                  coalesce_key: Optional[str] = None) -> int:
+        """全接続（または指定ユーザーの接続）に同じテキストを積む"""
+        text = serialize_message(message)
+        if user_ids is None:
+            groups = list(self._users.values())
+        else:
+            groups = [self._users[user_id] for user_id in user_ids if user_id in self._users]
+        queued = 0
+        for user_connections in groups:
+            for connection in list(user_connections.values()):
+                queued += self._enqueue(connection, text, coalesce_key)
+        return queued
+
+    def _enqueue(self, connection: HubConnection, text: str, coalesce_key: Optional[str]) -> int:
+        if connection.closed:
+            return 0
+        if coalesce_key is not None:
+            pending = connection.coalesced.get(coalesce_key)
+            if pending is not None:
+                pending[1] = text
+                self.coalesced += 1
+                return 1
+
+        if len(connection.queue) >= self.max_queue:
+            if self.overflow_policy == OVERFLOW_DISCONNECT:
+                self.disconnected_slow += 1
+                self._close_later(connection, code=1013)
+                return 0
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                connection.dropped += 1
+                self.dropped += 1
+                return 0
+            oldest = connection.queue.popleft()
+            if oldest[0] is not None and connection.coalesced.get(oldest[0]) is oldest:
+                del connection.coalesced[oldest[0]]
+            connection.dropped += 1
+            self.dropped += 1
+
+        entry = [coalesce_key, text]
+        connection.queue.append(entry)
+        if coalesce_key is not None:
+            connection.coalesced[coalesce_key] = entry
+        if not connection.sending:
+            connection.sending = True
+            task = asyncio.get_running_loop().create_task(self._drain(connection))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+        return 1
+
+    async def _drain(self, connection: HubConnection) -> None:
+        try:
+            while connection.queue and not connection.closed:
+                coalesce_key, text = connection.queue.popleft()
+                if coalesce_key is not None:
+                    connection.coalesced.pop(coalesce_key, None)
+                await connection.websocket.send_text(text)
+                connection.sent += 1
+                connection.last_seen = self._clock()
+        except Exception as e:
+            self.send_errors += 1
+            logger.info(f"WebSocket send failed for user {connection.user_id}: {e}")
+            self.unregister(connection)
+        finally:
+            connection.sending = False
+
+    def _close_later(self, connection: HubConnection, code: int) -> None:
+        self.unregister(connection)
+        task = asyncio.get_running_loop().create_task(self._close(connection, code))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _close(self, connection: HubConnection, code: int) -> None:
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass
+
+    # ハートビート
+
+    def _ensure_heartbeat(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._heartbeat_task is None or self._heartbeat_task.done() or self._heartbeat_task.get_loop() is not loop:
+            self._heartbeat_task = loop.create_task(self._heartbeat())
+
+    async def _heartbeat(self) -> None:
+        # 接続がなくなると終了し、次の register で起動し直す
+        while self.connections:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.heartbeat()
+
+    def heartbeat(self) -> int:
+        """
+        全接続にハートビートを積み、idle_timeout のあいだ送信も受信も完了していない
+        接続を閉じる。閉じた数を返す
+        """
+        expired_before = self._clock() - self.idle_timeout
+        expired = 0
+        for user_connections in list(self._users.values()):
+            for connection in list(user_connections.values()):
+                if connection.last_seen < expired_before:
+                    self._close_later(connection, code=1001)
+                    expired += 1
+                else:
+                    self._enqueue(connection, self._heartbeat_text, "heartbeat")
+        return expired
+
+    async def close(self) -> None:
+        """全接続を閉じてタスクを止める"""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        for user_connections in list(self._users.values()):
+            for connection in list(user_connections.values()):
+                self._close_later(connection, code=1001)
+        await asyncio.gather(*list(self._sending), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._users),
+            "connections": self.connections,
+            "sending": len(self._sending),
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "disconnected_slow": self.disconnected_slow,
+            "send_errors": self.send_errors,
+        }
@@ -9,10 +9,11 @@ Micro Rewards Service - ?3?
 
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 import logging
+import operator
 import uuid
 import asyncio
 import json
@@ -21,6 +22,9 @@ import json
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../shared'))
+sys.path.append(os.path.dirname(__file__))
+
+from connection_hub import ConnectionHub
 
 app = FastAPI(title="Micro Rewards Service", version="1.0.0")
 logger = logging.getLogger(__name__)
@@ -72,11 +76,57 @@ class UserEngagementState(BaseModel):
     engagement_streak: int
     missed_days: int
 
+# trigger_condition -> (対象のaction_type, しきい値条件)
+# しきい値条件は (参照先 "context"|"state", キー, 比較, しきい値, 値がないときの既定値)
+TRIGGER_RULES: Dict[str, Tuple[str, Optional[Tuple[str, str, str, Any, Any]]]] = {
+    "login": ("login", None),
+    "task_start": ("task_start", None),
+    "task_complete": ("task_complete", None),
+    "progress_check": ("progress_check", None),
+    "streak_milestone": ("login", ("state", "consecutive_days", "multiple_of", 5, 0)),
+    "recovery_login": ("login", ("state", "recovery_boost_active", "is", True, False)),
+    "speed_complete": ("task_complete", ("context", "duration_seconds", "<=", 180, 0)),  # 3分以内
+    "tap_efficiency": ("task_complete", ("context", "tap_count", "<=", 3, 0)),  # 3タップ以内
+}
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "is": operator.is_,
+    "multiple_of": lambda value, threshold: value % threshold == 0,
+}
+
+RewardPredicate = Callable[["UserAction", "UserEngagementState"], bool]
+
+
+def compile_trigger_condition(trigger_condition: str) -> Tuple[Optional[str], Optional[RewardPredicate]]:
+    """trigger_condition を (action_type, 判定関数) に変換する。判定関数がNoneなら常に該当"""
+    rule = TRIGGER_RULES.get(trigger_condition)
+    if rule is None:
+        return None, None
+    action_type, threshold = rule
+    if threshold is None:
+        return action_type, None
+    source, key, comparator_name, limit, default = threshold
+    comparator = _COMPARATORS[comparator_name]
+    if source == "context":
+        return action_type, lambda action, user_state: comparator(action.context.get(key, default), limit)
+    return action_type, lambda action, user_state: comparator(getattr(user_state, key, default), limit)
+
+
 class MicroRewardsEngine:
     def __init__(self):
         self.reward_templates = self._initialize_reward_templates()
         self.user_states = {}  # 実装Redisを
-        self.websocket_connections = {}  # リスト
+        self.connection_hub = ConnectionHub(
+            max_queue=int(os.getenv("MICRO_REWARDS_WS_QUEUE", "32")),
+            overflow_policy=os.getenv("MICRO_REWARDS_WS_OVERFLOW", "drop_oldest"),
+            heartbeat_interval=float(os.getenv("MICRO_REWARDS_WS_HEARTBEAT_SECONDS", "30"))
+        )
+        # action_type -> [(テンプレート, 判定関数)]（テンプレートの定義順を保つ）
+        self.rewards_by_action: Dict[str, List[Tuple[MicroReward, Optional[RewardPredicate]]]] = {}
+        self._build_trigger_index()
         
         # ADHD?
         self.max_response_time_ms = 1200  # 1.2?
@@ -200,6 +250,16 @@ class MicroRewardsEngine:
             )
         ]
     
+    def _build_trigger_index(self):
+        """テンプレートを action_type ごとに索引し、しきい値条件を判定関数にしておく"""
+        self.rewards_by_action = {}
+        for template in self.reward_templates:
+            action_type, predicate = compile_trigger_condition(template.trigger_condition)
+            if action_type is None:
+                logger.warning(f"Unknown trigger condition for reward {template.reward_id}: {template.trigger_condition}")
+                continue
+            self.rewards_by_action.setdefault(action_type, []).append((template, predicate))
+    
     async def process_user_action(self, action: UserAction) -> RewardResponse:
         """ユーザー"""
         start_time = datetime.now()
@@ -312,12 +372,12 @@ class MicroRewardsEngine:
     
     async def _determine_applicable_rewards(self, action: UserAction, user_state: UserEngagementState) -> List[MicroReward]:
         """?"""
-        applicable_rewards = []
-        
-        # 基本
-        for template in self.reward_templates:
-            if self._matches_trigger_condition(template, action, user_state):
-                applicable_rewards.append(template)
+        # 基本: このaction_typeの候補だけを判定する
+        applicable_rewards = [
+            template
+            for template, predicate in self.rewards_by_action.get(action.action_type, ())
+            if predicate is None or predicate(action, user_state)
+        ]
         
         # 1?
         if user_state.daily_actions > self.max_daily_rewards:
@@ -326,31 +386,11 @@ class MicroRewardsEngine:
         return applicable_rewards
     
     def _matches_trigger_condition(self, template: MicroReward, action: UserAction, user_state: UserEngagementState) -> bool:
-        """?"""
-        condition = template.trigger_condition
-        
-        if condition == "login" and action.action_type == "login":
-            return True
-        elif condition == "task_start" and action.action_type == "task_start":
-            return True
-        elif condition == "task_complete" and action.action_type == "task_complete":
-            return True
-        elif condition == "progress_check" and action.action_type == "progress_check":
-            return True
-        elif condition == "streak_milestone" and action.action_type == "login" and user_state.consecutive_days % 5 == 0:
-            return True
-        elif condition == "recovery_login" and action.action_type == "login" and user_state.recovery_boost_active:
-            return True
-        elif condition == "speed_complete" and action.action_type == "task_complete":
-            # 3?
-            task_duration = action.context.get("duration_seconds", 0)
-            return task_duration <= 180  # 3? = 180?
-        elif condition == "tap_efficiency" and action.action_type == "task_complete":
-            # 3タスク
-            tap_count = action.context.get("tap_count", 0)
-            return tap_count <= 3
-        
-        return False
+        """1つのテンプレートがこのアクションで発火するか（索引と同じ判定）"""
+        action_type, predicate = compile_trigger_condition(template.trigger_condition)
+        if action_type != action.action_type:
+            return False
+        return predicate is None or predicate(action, user_state)
     
     def _apply_recovery_boost(self, rewards: List[MicroReward], user_state: UserEngagementState) -> List[MicroReward]:
         """リスト"""
@@ -403,18 +443,19 @@ class MicroRewardsEngine:
             return f"? {base_hint}"
     
     async def _send_realtime_notification(self, user_id: str, rewards: List[MicroReward]):
-        """リスト"""
-        if user_id in self.websocket_connections:
-            try:
-                websocket = self.websocket_connections[user_id]
-                notification = {
-                    "type": "micro_reward",
-                    "rewards": [reward.dict() for reward in rewards],
-                    "timestamp": datetime.now().isoformat()
-                }
-                await websocket.send_text(json.dumps(notification))
-            except Exception as e:
-                logger.error(f"WebSocket notification failed for user {user_id}: {e}")
+        """ユーザーの全端末の送信キューに積む（送信は待たない）"""
+        try:
+            self.connection_hub.send_to_user(user_id, {
+                "type": "micro_reward",
+                "rewards": [reward.dict() for reward in rewards],
+                "timestamp": datetime.now().isoformat()
+            })
+        except Exception as e:
+            logger.error(f"WebSocket notification failed for user {user_id}: {e}")
+    
+    def broadcast_notification(self, notification: Dict[str, Any], user_ids: Optional[List[str]] = None) -> int:
+        """全接続（または指定ユーザー）へ同じ通知を送る。シリアライズは1回だけ"""
+        return self.connection_hub.broadcast(notification, user_ids=user_ids)
     
     async def get_user_engagement_stats(self, user_id: str) -> Dict[str, Any]:
         """ユーザー"""
@@ -464,18 +505,43 @@ async def get_reward_templates():
 
 @app.websocket("/micro-rewards/{user_id}/realtime")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """リストWebSocket"""
+    """
+    リアルタイム通知のWebSocket
+
+    同じユーザーの複数端末をそれぞれ登録する。ハートビート {"type": "heartbeat"} は
+    ハブの1本のタスクが全接続に送る。クライアントは応答しなくてよく、送信の完了で
+    生存を記録する。クライアントから届いたフレームもテキスト・バイナリを問わず
+    生存として記録するが、中身は見ない
+    """
     await websocket.accept()
-    micro_rewards_engine.websocket_connections[user_id] = websocket
+    hub = micro_rewards_engine.connection_hub
+    connection = hub.register(user_id, websocket)
     
     try:
         while True:
-            # ?ping
-            await asyncio.sleep(30)
-            await websocket.ping()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            hub.touch(connection)
     except WebSocketDisconnect:
-        if user_id in micro_rewards_engine.websocket_connections:
-            del micro_rewards_engine.websocket_connections[user_id]
+        pass
+    finally:
+        hub.unregister(connection)
+
+@app.post("/micro-rewards/broadcast")
+async def broadcast_notification(notification: Dict[str, Any], user_ids: Optional[List[str]] = None):
+    """接続中の全端末（または指定ユーザー）へ通知を送る"""
+    queued = micro_rewards_engine.broadcast_notification(notification, user_ids=user_ids)
+    return {"success": True, "queued_connections": queued}
+
+@app.get("/micro-rewards/realtime/stats")
+async def get_realtime_stats():
+    """WebSocket接続と送信キューの状況"""
+    return micro_rewards_engine.connection_hub.get_stats()
+
+@app.on_event("shutdown")
+async def close_realtime_connections():
+    await micro_rewards_engine.connection_hub.close()
 
 # 3タスク3?
 @app.post("/micro-rewards/quick-action")
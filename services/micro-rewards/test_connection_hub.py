@@ -0,0 +1,283 @@
+"""
+Connection Hub / Trigger Index Tests
+
+- 同じユーザーの複数端末にそれぞれ通知が届く
+- 遅い受信側は送信キューの上限で破棄・集約・切断される
+- ブロードキャストはシリアライズ1回で全接続に届く
+- action_type索引による判定が全テンプレート判定と一致する
+"""
+
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import connection_hub as hub_module
+import main
+from connection_hub import (ConnectionHub, OVERFLOW_DISCONNECT, OVERFLOW_DROP_NEWEST,
+                            OVERFLOW_DROP_OLDEST)
+from main import MicroRewardsEngine, UserAction, UserEngagementState
+
+
+class FakeWebSocket:
+    """送信を記録するだけのWebSocket。gate を閉じると送信が止まる（遅い受信側）"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestConnectionHub:
+
+    @pytest.mark.asyncio
+    async def test_every_device_of_a_user_receives_notifications(self):
+        hub = ConnectionHub()
+        phone, tablet, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        hub.register("user_a", phone)
+        hub.register("user_a", tablet)
+        hub.register("user_b", other)
+
+        assert hub.send_to_user("user_a", {"type": "micro_reward", "xp": 5}) == 2
+        await settle()
+
+        assert phone.sent == [{"type": "micro_reward", "xp": 5}]
+        assert tablet.sent == [{"type": "micro_reward", "xp": 5}]
+        assert other.sent == []
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_unregister_keeps_other_devices(self):
+        hub = ConnectionHub()
+        phone, tablet = FakeWebSocket(), FakeWebSocket()
+        phone_connection = hub.register("user_a", phone)
+        hub.register("user_a", tablet)
+
+        hub.unregister(phone_connection)
+        hub.send_to_user("user_a", {"type": "ping"})
+        await settle()
+
+        assert phone.sent == [] and tablet.sent == [{"type": "ping"}]
+        assert hub.get_stats()["connections"] == 1
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_drop_oldest(self):
+        hub = ConnectionHub(max_queue=3, overflow_policy=OVERFLOW_DROP_OLDEST)
+        slow = FakeWebSocket()
+        slow.gate.clear()
+        hub.register("user_a", slow)
+
+        hub.send_to_user("user_a", {"seq": 0})
+        await settle()  # 0番を送信中にする
+        for i in range(1, 6):
+            hub.send_to_user("user_a", {"seq": i})
+        slow.gate.set()
+        await settle()
+
+        # 0番は送信中で止まっていた。キューに残るのは新しい3件
+        assert [message["seq"] for message in slow.sent] == [0, 3, 4, 5]
+        assert hub.get_stats()["dropped"] == 2
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_drop_newest(self):
+        hub = ConnectionHub(max_queue=2, overflow_policy=OVERFLOW_DROP_NEWEST)
+        slow = FakeWebSocket()
+        slow.gate.clear()
+        hub.register("user_a", slow)
+
+        hub.send_to_user("user_a", {"seq": 0})
+        await settle()  # 0番を送信中にする
+        for i in range(1, 5):
+            hub.send_to_user("user_a", {"seq": i})
+        slow.gate.set()
+        await settle()
+
+        assert [message["seq"] for message in slow.sent] == [0, 1, 2]
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_slow_consumer_disconnect(self):
+        hub = ConnectionHub(max_queue=1, overflow_policy=OVERFLOW_DISCONNECT)
+        slow, fast = FakeWebSocket(), FakeWebSocket()
+        slow.gate.clear()
+        hub.register("user_a", slow)
+        hub.register("user_a", fast)
+
+        hub.send_to_user("user_a", {"seq": 0})
+        await settle()
+        for i in (1, 2):
+            hub.send_to_user("user_a", {"seq": i})
+            await settle()  # 速い端末はすぐ送り終える
+
+        assert slow.closed_with == 1013
+        assert [message["seq"] for message in fast.sent] == [0, 1, 2]
+        assert hub.get_stats()["disconnected_slow"] == 1
+        slow.gate.set()
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_coalesced_messages_keep_only_the_latest(self):
+        hub = ConnectionHub()
+        slow = FakeWebSocket()
+        slow.gate.clear()
+        hub.register("user_a", slow)
+
+        hub.send_to_user("user_a", {"type": "reward", "xp": 5})
+        await settle()
+        for progress in (10, 20, 30):
+            hub.send_to_user("user_a", {"type": "progress", "value": progress}, coalesce_key="progress")
+        slow.gate.set()
+        await settle()
+
+        assert slow.sent == [{"type": "reward", "xp": 5}, {"type": "progress", "value": 30}]
+        assert hub.get_stats()["coalesced"] == 2
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_serializes_once(self, monkeypatch):
+        hub = ConnectionHub()
+        calls = []
+        original = hub_module.serialize_message
+        monkeypatch.setattr(hub_module, "serialize_message",
+                            lambda message: calls.append(message) or original(message))
+        sockets = [FakeWebSocket() for _ in range(20)]
+        for i, websocket in enumerate(sockets):
+            hub.register(f"user_{i % 7}", websocket)
+
+        assert hub.broadcast({"type": "announcement", "at": datetime(2025, 1, 1)}) == 20
+        await settle()
+
+        assert len(calls) == 1
+        assert all(websocket.sent == [{"type": "announcement", "at": "2025-01-01T00:00:00"}]
+                   for websocket in sockets)
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_closes_idle_connections(self):
+        now = [0.0]
+        hub = ConnectionHub(heartbeat_interval=3600, idle_timeout=90, clock=lambda: now[0])
+        idle, active = FakeWebSocket(), FakeWebSocket()
+        hub.register("user_a", idle)
+        active_connection = hub.register("user_b", active)
+
+        now[0] = 100.0
+        hub.touch(active_connection)
+        assert hub.heartbeat() == 1
+        await settle()
+
+        assert idle.closed_with == 1001
+        assert active.sent == [{"type": "heartbeat"}]
+        assert hub.get_stats()["connections"] == 1
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_listen_only_clients_stay_connected_while_sends_complete(self):
+        now = [0.0]
+        hub = ConnectionHub(heartbeat_interval=3600, idle_timeout=90, clock=lambda: now[0])
+        listener, stalled = FakeWebSocket(), FakeWebSocket()
+        hub.register("user_a", listener)
+        hub.register("user_b", stalled)
+        stalled.gate.clear()
+
+        # クライアントは一度も応答しないが、ハートビートの送信は届き続ける
+        for tick in range(1, 6):
+            now[0] = tick * 30.0
+            hub.heartbeat()
+            await settle()
+
+        assert listener.closed_with is None
+        assert len(listener.sent) == 5
+        assert stalled.closed_with == 1001  # 送信が詰まったまま idle_timeout を過ぎた
+        assert hub.get_stats()["connections"] == 1
+        stalled.gate.set()
+        await hub.close()
+
+    @pytest.mark.asyncio
+    async def test_endpoint_touches_on_any_frame_and_unregisters_on_disconnect(self, monkeypatch):
+        now = [0.0]
+        hub = ConnectionHub(heartbeat_interval=3600, idle_timeout=90, clock=lambda: now[0])
+        monkeypatch.setattr(main.micro_rewards_engine, "connection_hub", hub)
+        frames = [
+            {"type": "websocket.receive", "bytes": b"\x00\x01"},
+            {"type": "websocket.receive", "text": "ping"},
+            {"type": "websocket.disconnect", "code": 1000},
+        ]
+        last_seen = []
+
+        class ScriptedWebSocket(FakeWebSocket):
+            async def accept(self):
+                pass
+
+            async def receive(self):
+                (connection,) = hub.user_connections("user_a")
+                last_seen.append(connection.last_seen)
+                now[0] += 10.0
+                return frames.pop(0)
+
+        await main.websocket_endpoint(ScriptedWebSocket(), "user_a")
+
+        assert last_seen == [0.0, 10.0, 20.0]  # バイナリフレームでも生存を記録する
+        assert hub.get_stats()["connections"] == 0
+        await hub.close()
+
+
+class TestTriggerIndex:
+
+    def make_state(self, **overrides):
+        state = dict(
+            user_id="user_a", last_login=datetime.now(), consecutive_days=5, daily_actions=1,
+            total_actions=1, last_reward_time=datetime.now(), recovery_boost_active=True,
+            recovery_boost_multiplier=1.2, engagement_streak=0, missed_days=0
+        )
+        state.update(overrides)
+        return UserEngagementState(**state)
+
+    def test_index_only_holds_candidates_for_each_action(self):
+        engine = MicroRewardsEngine()
+        login_rewards = [template.reward_id for template, _ in engine.rewards_by_action["login"]]
+
+        assert login_rewards == ["instant_login", "streak_bonus", "recovery_boost"]
+        assert sum(len(candidates) for candidates in engine.rewards_by_action.values()) == len(engine.reward_templates)
+
+    @pytest.mark.parametrize("action_type,context,state,expected", [
+        ("login", {}, {}, ["instant_login", "streak_bonus", "recovery_boost"]),
+        ("login", {}, {"consecutive_days": 4, "recovery_boost_active": False}, ["instant_login"]),
+        ("task_complete", {"duration_seconds": 120, "tap_count": 3}, {},
+         ["task_complete_celebration", "speed_bonus", "efficiency_bonus"]),
+        ("task_complete", {"duration_seconds": 181, "tap_count": 4}, {}, ["task_complete_celebration"]),
+        ("task_complete", {}, {}, ["task_complete_celebration", "speed_bonus", "efficiency_bonus"]),
+        ("task_start", {}, {}, ["task_start_boost"]),
+        ("progress_check", {}, {}, ["progress_pulse"]),
+        ("daily_check", {}, {}, []),
+    ])
+    @pytest.mark.asyncio
+    async def test_indexed_dispatch_keeps_trigger_semantics(self, action_type, context, state, expected):
+        engine = MicroRewardsEngine()
+        user_state = self.make_state(**state)
+        action = UserAction(user_id="user_a", action_type=action_type, timestamp=datetime.now(), context=context)
+
+        rewards = await engine._determine_applicable_rewards(action, user_state)
+
+        assert [template.reward_id for template in rewards] == expected
+        assert [template.reward_id for template in engine.reward_templates
+                if engine._matches_trigger_condition(template, action, user_state)] == expected
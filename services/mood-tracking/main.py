@@ -8,7 +8,7 @@ Requirements: 5.4
 """
 
 from fastapi import FastAPI, HTTPException, Depends, Body, Path, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
@@ -639,34 +639,22 @@ async def export_mood_data(
                 detail="Start date must be before end date"
             )
         
-        exported_data = mood_tracking_system.export_mood_data(uid, start_date_obj, end_date_obj)
-        
         if format.lower() == "csv":
-            # CSV?
-            import io
-            import csv
-            from fastapi.responses import StreamingResponse
-            
-            if not exported_data:
+            # CSVは行チャンクごとに逐次送信（全体をメモリに組み立てない）
+            if mood_tracking_system.count_mood_entries(uid, start_date_obj, end_date_obj) == 0:
                 raise HTTPException(
                     status_code=404,
                     detail="No mood data found for the specified period"
                 )
             
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=exported_data[0].keys())
-            writer.writeheader()
-            writer.writerows(exported_data)
-            
-            output.seek(0)
-            
             return StreamingResponse(
-                io.BytesIO(output.getvalue().encode('utf-8')),
+                mood_tracking_system.iter_mood_export_csv(uid, start_date_obj, end_date_obj),
                 media_type="text/csv",
                 headers={"Content-Disposition": f"attachment; filename=mood_data_{uid}_{start_date}_{end_date}.csv"}
             )
         else:
             # JSON?
+            exported_data = mood_tracking_system.export_mood_data(uid, start_date_obj, end_date_obj)
             return {
                 "uid": uid,
                 "start_date": start_date,
@@ -0,0 +1,117 @@
+"""
+Community Goal / Guild Leaderboard Benchmark
+
+1つのコミュニティ目標に contributors 人が貢献したときの処理速度と、ギルドの
+XP加算とランキング上位10件の取得を混ぜたときの処理速度を計測する。
+従来方式（参加者リストの線形探索・毎回の全ギルドソート）は legacy_contributors 人まで
+計測する（参加者数に比例して1回あたりが遅くなるため）
+
+Usage: python benchmark_community_goal.py [contributors] [threads] [legacy_contributors] [guilds]
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from services.seasonal_events.main import CommunityGoalSystem, GuildSystem
+
+LEADERBOARD_OPERATIONS = 100_000
+
+
+def legacy_contribute(goal, user_uid, contribution):
+    """参加者をリストで持つ従来方式"""
+    if user_uid not in goal.legacy_users:
+        goal.legacy_users.append(user_uid)
+    goal.legacy_value += contribution
+
+
+def new_goal(target_value):
+    goal_system = CommunityGoalSystem()
+    goal_system._distribute_community_rewards = lambda goal: None
+    goal = goal_system.create_community_goal(
+        title="benchmark", description="", target_value=target_value,
+        duration_days=30, reward_per_participant={"xp": 10}
+    )
+    return goal_system, goal
+
+
+def bench_legacy(contributors):
+    _, goal = new_goal(contributors)
+    goal.legacy_users, goal.legacy_value = [], 0
+    started = time.perf_counter()
+    checkpoint = started
+    for i in range(contributors):
+        legacy_contribute(goal, f"user_{i}", 1)
+        if (i + 1) % (contributors // 4) == 0:
+            now = time.perf_counter()
+            print(f"  legacy  {i + 1:>9,} contributors  last quarter {(now - checkpoint) / (contributors // 4) * 1e6:8.1f} us/op")
+            checkpoint = now
+    elapsed = time.perf_counter() - started
+    print(f"legacy   {contributors:>9,} contributors  {elapsed:8.2f} s  {contributors / elapsed:>10,.0f} ops/s")
+
+
+def bench_sharded(contributors, threads):
+    goal_system, goal = new_goal(contributors)
+    per_thread = contributors // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(offset):
+        barrier.wait()
+        for i in range(offset, offset + per_thread):
+            goal_system.contribute_to_goal(goal.goal_id, f"user_{i}", 1)
+
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for thread in workers:
+        thread.start()
+    started = time.perf_counter()
+    barrier.wait()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = per_thread * threads
+    assert goal_system.get_goal_value(goal.goal_id) == total and len(goal.participating_users) == total
+    assert goal.is_completed
+    print(f"sharded  {total:>9,} contributors  {elapsed:8.2f} s  {total / elapsed:>10,.0f} ops/s  "
+          f"threads={threads}  bitmap={len(goal.participating_users._bits) / 1024:,.0f} KB")
+
+    # 既存参加者による2回目の貢献（判定はビット列の参照だけ）
+    started = time.perf_counter()
+    for i in range(0, total, 10):
+        goal_system.contribute_to_goal(goal.goal_id, f"user_{i}", 1)
+    elapsed = time.perf_counter() - started
+    print(f"sharded  repeat contributions        {(elapsed / (total // 10)) * 1e6:8.2f} us/op")
+
+
+def bench_leaderboard(guilds):
+    for name, read_top in (
+        ("full sort", lambda system: sorted([g for g in system.guilds.values() if g.is_active],
+                                            key=lambda g: g.total_xp, reverse=True)[:10]),
+        ("indexed", lambda system: system.get_guild_leaderboard(10)),
+    ):
+        rng = random.Random(8)
+        guild_system = GuildSystem()
+        guild_ids = [guild_system.create_guild(f"leader_{i}", f"guild_{i}", "", "adhd_peer").guild_id
+                     for i in range(guilds)]
+        started = time.perf_counter()
+        for step in range(LEADERBOARD_OPERATIONS):
+            if step % 10 == 0:
+                read_top(guild_system)
+            else:
+                guild_system.add_guild_xp(rng.choice(guild_ids), rng.randint(1, 50) * 10)
+        elapsed = time.perf_counter() - started
+        print(f"leaderboard {name:<10} guilds={guilds:,}  {LEADERBOARD_OPERATIONS / elapsed:>10,.0f} ops/s "
+              f"(9 xp updates : 1 top-10 read)")
+
+
+if __name__ == "__main__":
+    contributors = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    legacy_contributors = int(sys.argv[3]) if len(sys.argv) > 3 else 40_000
+    guilds = int(sys.argv[4]) if len(sys.argv) > 4 else 10_000
+    bench_legacy(legacy_contributors)
+    bench_sharded(contributors, threads)
+    bench_leaderboard(guilds)
@@ -0,0 +1,103 @@
+"""
+Prestige Progress Index Benchmark
+
+コスメティックカタログを catalog_factor 倍にして、users 人のユーザーが
+1回に1〜3項目ずつ進捗を更新したときの更新処理数を比較する。
+従来方式は更新のたびに全マイルストーン・全ストーリー・全カタログを判定し直す
+
+Usage: python benchmark_progress_index.py [catalog_factor] [users] [updates]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from services.seasonal_events.prestige_system import (
+    CosmeticItem, CosmeticType, LongTermEngagementSystem, TherapeuticMilestone
+)
+
+PROGRESS_KEYS = [
+    "tasks_completed", "consecutive_days", "habit_streak", "social_interactions",
+    "mood_stability_days", "self_efficacy_score", "peer_support_given", "mentorship_sessions",
+    "life_integration_score", "reflection_entries", "routine_tasks", "social_tasks",
+    "guild_participation", "setbacks_overcome", "guild_members_supported", "spring_event_completed",
+]
+
+
+def legacy_update(system, user_uid, progress_data):
+    """すべてを判定し直す従来の update_user_progress"""
+    if user_uid not in system.user_profiles:
+        system.create_prestige_profile(user_uid)
+    profile = system.user_profiles[user_uid]
+    for milestone in TherapeuticMilestone:
+        if (milestone not in profile.achieved_milestones and
+                system.prestige_system.check_milestone_achievement(milestone, progress_data)):
+            system.prestige_system.award_milestone(profile, milestone)
+    for branch in system.story_system.get_available_branches(profile.achieved_milestones):
+        if (branch.branch_id not in profile.unlocked_story_branches and
+                system.story_system.check_branch_unlock(branch.branch_id, progress_data)):
+            profile.unlocked_story_branches.append(branch.branch_id)
+    achievements = system._convert_progress_to_achievements(progress_data, profile)
+    for item_id in system.cosmetic_system.cosmetic_catalog:
+        if (item_id not in profile.cosmetic_collection and
+                system.cosmetic_system.check_unlock_condition(item_id, achievements)):
+            profile.cosmetic_collection[item_id] = system.cosmetic_system.unlock_cosmetic(item_id, user_uid)
+    profile.legacy_achievements = system.prestige_system.get_legacy_achievements(profile)
+
+
+def build_system(catalog_factor):
+    system = LongTermEngagementSystem()
+    rng = random.Random(11)
+    base_size = len(system.cosmetic_system.cosmetic_catalog)
+    for i in range(base_size * (catalog_factor - 1)):
+        key = rng.choice(PROGRESS_KEYS)
+        system.cosmetic_system.add_cosmetic(
+            CosmeticItem(
+                item_id=f"generated_{i}", name=f"generated_{i}", description="",
+                cosmetic_type=rng.choice(list(CosmeticType)), rarity="common",
+                unlock_condition=f"reach_{key}_{i}", therapeutic_meaning="", visual_data={}
+            ),
+            requirement=(key, rng.randint(1, 5000))
+        )
+    return system
+
+
+def workload(users, updates):
+    """(ユーザー, 変わった項目, その時点の全項目)"""
+    rng = random.Random(12)
+    progress = {f"user_{i}": {} for i in range(users)}
+    for _ in range(updates):
+        user_uid = f"user_{rng.randrange(users)}"
+        changes = {}
+        for key in rng.sample(PROGRESS_KEYS, rng.randint(1, 3)):
+            changes[key] = progress[user_uid].get(key, 0) + rng.randint(1, 5)
+        progress[user_uid].update(changes)
+        yield user_uid, changes, dict(progress[user_uid])
+
+
+def run(name, apply, catalog_factor, users, updates):
+    system = build_system(catalog_factor)
+    operations = list(workload(users, updates))
+    started = time.perf_counter()
+    for user_uid, changes, snapshot in operations:
+        apply(system, user_uid, changes, snapshot)
+    elapsed = time.perf_counter() - started
+    unlocked = sum(len(profile.cosmetic_collection) for profile in system.user_profiles.values())
+    print(f"{name:<16} {updates / elapsed:>10,.0f} updates/s  ({elapsed:6.2f} s, {unlocked:,} cosmetics unlocked)")
+
+
+if __name__ == "__main__":
+    catalog_factor = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    updates = int(sys.argv[3]) if len(sys.argv) > 3 else 50_000
+    catalog_size = len(build_system(catalog_factor).cosmetic_system.cosmetic_catalog)
+    print(f"catalog={catalog_size:,} items users={users:,} updates={updates:,}")
+    run("full re-check", lambda system, uid, changes, snapshot: legacy_update(system, uid, snapshot),
+        catalog_factor, users, updates)
+    run("snapshot diff", lambda system, uid, changes, snapshot: system.update_user_progress(uid, snapshot),
+        catalog_factor, users, updates)
+    run("changed keys", lambda system, uid, changes, snapshot: system.apply_progress_changes(uid, changes),
+        catalog_factor, users, updates)
@@ -0,0 +1,155 @@
+"""
+コミュニティ目標とギルドランキングの索引
+
+- UserIdInterner: ユーザーIDを連番に変換する（目標をまたいで共有）
+- ParticipantBitmap: 連番のビット列で参加者を持つ。判定はO(1)、100万人で約125KB
+- ShardedCounter: 貢献値をユーザーごとのシャードに分けて加算し、読むときに合算する
+- GuildLeaderboard: (total_xp降順, 作成順) で並べたギルドの索引。上位N件はスライスで取れる
+"""
+
+import bisect
+import itertools
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class UserIdInterner:
+    """ユーザーID <-> 連番"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._uids: List[str] = []
+        self._lock = threading.Lock()
+
+    def intern(self, user_uid: str) -> int:
+        user_id = self._ids.get(user_uid)
+        if user_id is not None:
+            return user_id
+        with self._lock:
+            user_id = self._ids.get(user_uid)
+            if user_id is None:
+                user_id = len(self._uids)
+                self._uids.append(user_uid)
+                self._ids[user_uid] = user_id
+            return user_id
+
+    def lookup(self, user_uid: str) -> Optional[int]:
+        return self._ids.get(user_uid)
+
+    def uid(self, user_id: int) -> str:
+        return self._uids[user_id]
+
+    def __len__(self) -> int:
+        return len(self._uids)
+
+
+class ParticipantBitmap:
+    """
+    参加者のビット列
+
+    すでに参加しているかの判定はロックなしで行い、新しい参加者の
+    ビットを立てるときだけロックを取る（同じバイトの書き込みが重ならないように）
+    """
+
+    def __init__(self, interner: UserIdInterner):
+        self._interner = interner
+        self._bits = bytearray()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add(self, user_uid: str) -> bool:
+        """新しい参加者ならTrue"""
+        user_id = self._interner.intern(user_uid)
+        if self._has(user_id):
+            return False
+        with self._lock:
+            if self._has(user_id):
+                return False
+            byte = user_id >> 3
+            if byte >= len(self._bits):
+                self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits))))
+            self._bits[byte] |= 1 << (user_id & 7)
+            self._count += 1
+            return True
+
+    def _has(self, user_id: int) -> bool:
+        byte = user_id >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (user_id & 7)))
+
+    def __contains__(self, user_uid: object) -> bool:
+        user_id = self._interner.lookup(user_uid) if isinstance(user_uid, str) else None
+        return user_id is not None and self._has(user_id)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """参加者のIDを連番順に返す"""
+        for byte_index, byte in enumerate(self._bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    yield self._interner.uid((byte_index << 3) | bit)
+
+    def __repr__(self) -> str:
+        return f"ParticipantBitmap({self._count} participants)"
+
+
+class ShardedCounter:
+    """
+    シャードに分けた加算カウンタ
+
+    同じ目標への同時の貢献が1つのロックに集中しないよう、ユーザーIDで
+    シャードを選んで加算する。値は全シャードの合計
+    """
+
+    def __init__(self, shards: int = 16):
+        self._values = [0] * shards
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def add(self, key: str, amount: int) -> None:
+        shard = zlib.crc32(key.encode("utf-8")) % len(self._values)
+        with self._locks[shard]:
+            self._values[shard] += amount
+
+    @property
+    def value(self) -> int:
+        return sum(self._values)
+
+
+class GuildLeaderboard:
+    """
+    アクティブなギルドを (total_xp降順, 作成順) で並べた索引
+
+    XPが変わったギルドだけ二分探索で外して入れ直す。同じXPは作成順に並ぶので、
+    全ギルドを安定ソートした結果と同じ並びになる
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, int, str]] = []
+        self._key_by_guild: Dict[str, Tuple[int, int, str]] = {}
+        self._sequence = itertools.count()
+        self._created_order: Dict[str, int] = {}
+
+    def update(self, guild_id: str, total_xp: int) -> None:
+        self.remove(guild_id)
+        order = self._created_order.get(guild_id)
+        if order is None:
+            order = self._created_order[guild_id] = next(self._sequence)
+        key = (-total_xp, order, guild_id)
+        bisect.insort(self._keys, key)
+        self._key_by_guild[guild_id] = key
+
+    def remove(self, guild_id: str) -> None:
+        key = self._key_by_guild.pop(guild_id, None)
+        if key is not None:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def top(self, limit: Optional[int] = None) -> List[str]:
+        keys = self._keys if limit is None else self._keys[:limit]
+        return [guild_id for _, _, guild_id in keys]
+
+    def __len__(self) -> int:
+        return len(self._keys)
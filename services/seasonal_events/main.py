@@ -9,11 +9,18 @@
 
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from enum import Enum
+import copy
 import json
+import threading
 import uuid
 
+try:
+    from .community_index import GuildLeaderboard, ParticipantBitmap, ShardedCounter, UserIdInterner
+except ImportError:
+    from community_index import GuildLeaderboard, ParticipantBitmap, ShardedCounter, UserIdInterner
+
 class EventType(Enum):
     SEASONAL = "seasonal"
     LIMITED_TIME = "limited_time"
@@ -67,7 +74,7 @@ class CommunityGoal:
     start_date: datetime
     end_date: datetime
     reward_per_participant: Dict[str, int]
-    participating_users: List[str]
+    participating_users: ParticipantBitmap
     current_value: int = 0
     is_completed: bool = False
 
@@ -172,6 +179,7 @@ class GuildSystem:
     def __init__(self):
         self.guilds: Dict[str, Guild] = {}
         self.user_guild_mapping: Dict[str, str] = {}  # uid -> guild_id
+        self.leaderboard = GuildLeaderboard()  # アクティブなギルドのXP順
     
     def create_guild(self, leader_uid: str, name: str, description: str, 
                     therapeutic_focus: str) -> Guild:
@@ -190,6 +198,7 @@ class GuildSystem:
         
         self.guilds[guild_id] = guild
         self.user_guild_mapping[leader_uid] = guild_id
+        self.leaderboard.update(guild_id, guild.total_xp)
         
         return guild
     
@@ -228,6 +237,7 @@ class GuildSystem:
                 guild.leader_uid = guild.members[0]
             elif not guild.members:
                 guild.is_active = False
+                self.leaderboard.remove(guild_id)
             
             return True
         
@@ -250,17 +260,22 @@ class GuildSystem:
             # ?1000 XP?
             new_level = (guild.total_xp // 1000) + 1
             guild.guild_level = new_level
+            
+            if guild.is_active:
+                self.leaderboard.update(guild_id, guild.total_xp)
     
-    def get_guild_leaderboard(self) -> List[Guild]:
-        """?"""
-        active_guilds = [g for g in self.guilds.values() if g.is_active]
-        return sorted(active_guilds, key=lambda g: g.total_xp, reverse=True)
+    def get_guild_leaderboard(self, limit: Optional[int] = None) -> List[Guild]:
+        """アクティブなギルドをXPの多い順に返す（limit指定時は上位limit件）"""
+        return [self.guilds[guild_id] for guild_id in self.leaderboard.top(limit)]
 
 class CommunityGoalSystem:
     """コア"""
     
     def __init__(self):
         self.community_goals: Dict[str, CommunityGoal] = {}
+        self.user_ids = UserIdInterner()  # 参加者ビット列で共有する連番
+        self.goal_counters: Dict[str, ShardedCounter] = {}
+        self._completion_lock = threading.Lock()
     
     def create_community_goal(self, title: str, description: str, 
                             target_value: int, duration_days: int,
@@ -276,10 +291,11 @@ class CommunityGoalSystem:
             start_date=datetime.now(),
             end_date=datetime.now() + timedelta(days=duration_days),
             reward_per_participant=reward_per_participant,
-            participating_users=[]
+            participating_users=ParticipantBitmap(self.user_ids)
         )
         
         self.community_goals[goal_id] = goal
+        self.goal_counters[goal_id] = ShardedCounter()
         return goal
     
     def contribute_to_goal(self, goal_id: str, user_uid: str, contribution: int) -> bool:
@@ -292,18 +308,36 @@ class CommunityGoalSystem:
         if datetime.now() > goal.end_date:
             return False
         
-        if user_uid not in goal.participating_users:
-            goal.participating_users.append(user_uid)
+        goal.participating_users.add(user_uid)
         
-        goal.current_value += contribution
+        counter = self.goal_counters[goal_id]
+        counter.add(user_uid, contribution)
+        total = counter.value
+        goal.current_value = total
         
-        # ?
-        if goal.current_value >= goal.target_value and not goal.is_completed:
-            goal.is_completed = True
+        # 達成の判定と報酬の配布は、同時に目標値を越えても1回だけ行う
+        if total >= goal.target_value and not goal.is_completed:
+            with self._completion_lock:
+                if goal.is_completed:
+                    return True
+                goal.is_completed = True
             self._distribute_community_rewards(goal)
         
         return True
     
+    def get_goal_value(self, goal_id: str) -> int:
+        """シャードを合算した現在の貢献値（goal.current_value も更新する）"""
+        goal = self.community_goals[goal_id]
+        goal.current_value = self.goal_counters[goal_id].value
+        return goal.current_value
+    
+    def goal_to_dict(self, goal: CommunityGoal) -> Dict:
+        """asdict() と同じ形の辞書（参加者はIDのリスト）"""
+        self.get_goal_value(goal.goal_id)
+        return {f.name: list(goal.participating_users) if f.name == "participating_users"
+                else copy.deepcopy(getattr(goal, f.name))
+                for f in fields(goal)}
+    
     def _distribute_community_rewards(self, goal: CommunityGoal):
         """コア"""
         # 実装
@@ -334,8 +368,8 @@ class EngagementSystem:
         return {
             "user_guild": asdict(user_guild) if user_guild else None,
             "active_events": [asdict(event) for event in active_events],
-            "community_goals": [asdict(goal) for goal in active_goals],
-            "guild_leaderboard": [asdict(guild) for guild in self.guild_system.get_guild_leaderboard()[:10]]
+            "community_goals": [self.community_goals.goal_to_dict(goal) for goal in active_goals],
+            "guild_leaderboard": [asdict(guild) for guild in self.guild_system.get_guild_leaderboard(10)]
         }
     
     def process_user_action(self, user_uid: str, action_type: str, value: int = 1):
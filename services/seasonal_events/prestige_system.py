@@ -8,9 +8,10 @@
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from dataclasses import dataclass, asdict, field
 from enum import Enum
+import bisect
 import json
 import uuid
 
@@ -69,6 +70,64 @@ class CosmeticItem:
     is_unlocked: bool = False
     unlock_date: Optional[datetime] = None
 
+# コスメティックの解放条件（実績名 -> (進捗キー, 必要値)）
+# "milestone:<値>" は達成済みマイルストーンなら1、"prestige_points" は累計プレステージポイント
+ACHIEVEMENT_REQUIREMENTS: Dict[str, Tuple[str, int]] = {
+    "complete_first_task": ("tasks_completed", 1),
+    "complete_first_week": ("consecutive_days", 7),
+    "maintain_21_day_streak": ("habit_streak", 21),
+    "complete_spring_event": ("spring_event_completed", 1),
+    "complete_reflection_milestone": ("reflection_entries", 50),
+    "overcome_setback_5_times": ("setbacks_overcome", 5),
+    "provide_peer_support_50_times": ("peer_support_given", 50),
+    "support_100_guild_members": ("guild_members_supported", 100),
+    "achieve_habit_formation": ("milestone:habit_formation", 1),
+    "reach_prestige_master": ("prestige_points", 35000),
+}
+
+def milestone_key(milestone: "TherapeuticMilestone") -> str:
+    """達成済みマイルストーンを表す進捗キー"""
+    return f"milestone:{milestone.value}"
+
+class ThresholdIndex:
+    """
+    進捗キー -> (必要値, 対象) の逆引き索引
+
+    キーごとに必要値の昇順で持ち、値が old から new に増えたときに
+    新しく越えた対象だけを二分探索で取り出す
+    """
+    
+    def __init__(self):
+        self._thresholds: Dict[str, List[int]] = {}
+        self._targets: Dict[str, List] = {}
+    
+    def add(self, key: str, threshold: int, target) -> None:
+        thresholds = self._thresholds.setdefault(key, [])
+        position = bisect.bisect_right(thresholds, threshold)
+        thresholds.insert(position, threshold)
+        self._targets.setdefault(key, []).insert(position, target)
+    
+    def crossed(self, key: str, old_value: float, new_value: float) -> List:
+        """old_value < 必要値 <= new_value の対象"""
+        thresholds = self._thresholds.get(key)
+        if not thresholds or new_value <= old_value:
+            return []
+        start = bisect.bisect_right(thresholds, old_value)
+        end = bisect.bisect_right(thresholds, new_value)
+        return self._targets[key][start:end]
+    
+    def keys(self) -> Iterable[str]:
+        return self._thresholds.keys()
+
+@dataclass
+class UserProgressState:
+    """ユーザーごとの直近の進捗と、キーごとのこれまでの最大値"""
+    progress: Dict[str, int] = field(default_factory=dict)
+    high_water: Dict[str, float] = field(default_factory=dict)
+    evaluated: bool = False
+    # 判定済みのカタログ件数（これより後に追加されたアイテムは high_water と突き合わせる）
+    catalog_seen: int = 0
+
 @dataclass
 class PrestigeProfile:
     """プレビュー"""
@@ -90,6 +149,11 @@ class StoryBranchSystem:
     def __init__(self):
         self.story_branches: Dict[str, StoryBranch] = {}
         self.milestone_branches = self._initialize_milestone_branches()
+        self.branches_by_key: Dict[str, List[str]] = {}  # 進捗キー -> 条件に含むストーリー
+        self.branch_order = {branch_id: i for i, branch_id in enumerate(self.story_branches)}
+        for branch in self.story_branches.values():
+            for condition in branch.unlock_conditions:
+                self.branches_by_key.setdefault(condition, []).append(branch.branch_id)
     
     def _initialize_milestone_branches(self) -> Dict[TherapeuticMilestone, List[str]]:
         """治療"""
@@ -196,6 +260,13 @@ class CosmeticSystem:
     
     def __init__(self):
         self.cosmetic_catalog: Dict[str, CosmeticItem] = {}
+        self.achievement_requirements: Dict[str, Tuple[str, int]] = dict(ACHIEVEMENT_REQUIREMENTS)
+        self.items_by_condition: Dict[str, List[str]] = {}  # 実績名 -> コスメティック
+        self.item_order: Dict[str, int] = {}  # カタログへの登録順
+        self.item_log: List[str] = []  # 登録順のアイテムID（後から追加された分の判定用）
+        self.achievement_index = ThresholdIndex()
+        for achievement, (key, required_value) in self.achievement_requirements.items():
+            self.achievement_index.add(key, required_value, achievement)
         self._initialize_cosmetic_catalog()
     
     def _initialize_cosmetic_catalog(self):
@@ -320,7 +391,18 @@ class CosmeticSystem:
         # カスタム
         all_items = avatars + backgrounds + titles + badges
         for item in all_items:
-            self.cosmetic_catalog[item.item_id] = item
+            self.add_cosmetic(item)
+    
+    def add_cosmetic(self, item: CosmeticItem, requirement: Optional[Tuple[str, int]] = None):
+        """カタログに追加する（新しい実績名なら requirement に (進捗キー, 必要値) を渡す）"""
+        if requirement and item.unlock_condition not in self.achievement_requirements:
+            self.achievement_requirements[item.unlock_condition] = requirement
+            self.achievement_index.add(requirement[0], requirement[1], item.unlock_condition)
+        if item.item_id not in self.cosmetic_catalog:
+            self.item_order[item.item_id] = len(self.item_order)
+            self.item_log.append(item.item_id)
+            self.items_by_condition.setdefault(item.unlock_condition, []).append(item.item_id)
+        self.cosmetic_catalog[item.item_id] = item
     
     def check_unlock_condition(self, item_id: str, user_achievements: Dict[str, bool]) -> bool:
         """コア"""
@@ -380,6 +462,21 @@ class PrestigeSystem:
             TherapeuticMilestone.MENTORSHIP: 2000,
             TherapeuticMilestone.LIFE_INTEGRATION: 3000
         }
+        
+        # マイルストーン -> (進捗キー, 必要値)
+        self.milestone_requirements = {
+            TherapeuticMilestone.FIRST_STEP: ("tasks_completed", 1),
+            TherapeuticMilestone.HABIT_FORMATION: ("habit_streak", 21),
+            TherapeuticMilestone.SOCIAL_RECONNECTION: ("social_interactions", 50),
+            TherapeuticMilestone.EMOTIONAL_STABILITY: ("mood_stability_days", 30),
+            TherapeuticMilestone.SELF_EFFICACY: ("self_efficacy_score", 80),
+            TherapeuticMilestone.PEER_SUPPORT: ("peer_support_given", 25),
+            TherapeuticMilestone.MENTORSHIP: ("mentorship_sessions", 10),
+            TherapeuticMilestone.LIFE_INTEGRATION: ("life_integration_score", 90)
+        }
+        self.milestone_index = ThresholdIndex()
+        for milestone, (key, required_value) in self.milestone_requirements.items():
+            self.milestone_index.add(key, required_value, milestone)
     
     def calculate_prestige_level(self, total_points: int) -> PrestigeLevel:
         """プレビュー"""
@@ -391,19 +488,11 @@ class PrestigeSystem:
     def check_milestone_achievement(self, milestone: TherapeuticMilestone, 
                                   user_data: Dict[str, int]) -> bool:
         """治療"""
-        milestone_conditions = {
-            TherapeuticMilestone.FIRST_STEP: lambda d: d.get("tasks_completed", 0) >= 1,
-            TherapeuticMilestone.HABIT_FORMATION: lambda d: d.get("habit_streak", 0) >= 21,
-            TherapeuticMilestone.SOCIAL_RECONNECTION: lambda d: d.get("social_interactions", 0) >= 50,
-            TherapeuticMilestone.EMOTIONAL_STABILITY: lambda d: d.get("mood_stability_days", 0) >= 30,
-            TherapeuticMilestone.SELF_EFFICACY: lambda d: d.get("self_efficacy_score", 0) >= 80,
-            TherapeuticMilestone.PEER_SUPPORT: lambda d: d.get("peer_support_given", 0) >= 25,
-            TherapeuticMilestone.MENTORSHIP: lambda d: d.get("mentorship_sessions", 0) >= 10,
-            TherapeuticMilestone.LIFE_INTEGRATION: lambda d: d.get("life_integration_score", 0) >= 90
-        }
-        
-        condition_func = milestone_conditions.get(milestone)
-        return condition_func(user_data) if condition_func else False
+        requirement = self.milestone_requirements.get(milestone)
+        if requirement is None:
+            return False
+        key, required_value = requirement
+        return user_data.get(key, 0) >= required_value
     
     def award_milestone(self, profile: PrestigeProfile, milestone: TherapeuticMilestone) -> int:
         """?"""
@@ -455,6 +544,8 @@ class LongTermEngagementSystem:
         self.cosmetic_system = CosmeticSystem()
         self.prestige_system = PrestigeSystem()
         self.user_profiles: Dict[str, PrestigeProfile] = {}
+        self.progress_states: Dict[str, UserProgressState] = {}
+        self.milestone_order = {milestone: i for i, milestone in enumerate(TherapeuticMilestone)}
     
     def create_prestige_profile(self, user_uid: str) -> PrestigeProfile:
         """プレビュー"""
@@ -472,13 +563,41 @@ class LongTermEngagementSystem:
         )
         
         self.user_profiles[user_uid] = profile
+        self.progress_states[user_uid] = UserProgressState()
         return profile
     
     def update_user_progress(self, user_uid: str, progress_data: Dict[str, int]) -> Dict[str, any]:
         """ユーザー"""
+        state = self._get_progress_state(user_uid)
+        previous = state.progress
+        state.progress = dict(progress_data)
+        changed_keys = {key for key in previous.keys() | progress_data.keys()
+                        if previous.get(key, 0) != progress_data.get(key, 0)}
+        return self._apply_progress(user_uid, state, changed_keys)
+    
+    def apply_progress_changes(self, user_uid: str, changes: Dict[str, int]) -> Dict[str, any]:
+        """変わった項目だけを受け取り、前回の進捗に重ねて反映する"""
+        state = self._get_progress_state(user_uid)
+        changed_keys = {key for key, value in changes.items() if state.progress.get(key, 0) != value}
+        state.progress.update(changes)
+        return self._apply_progress(user_uid, state, changed_keys)
+    
+    def _get_progress_state(self, user_uid: str) -> UserProgressState:
         if user_uid not in self.user_profiles:
             self.create_prestige_profile(user_uid)
-        
+        return self.progress_states.setdefault(user_uid, UserProgressState())
+    
+    def _apply_progress(self, user_uid: str, state: UserProgressState,
+                        changed_keys: Set[str]) -> Dict[str, any]:
+        """
+        変わった進捗キーから逆引きして、マイルストーン・ストーリー・コスメティックを判定する
+
+        マイルストーンとコスメティックは一度満たせば解放されたままなので、キーごとの
+        これまでの最大値を越えた必要値だけを見る。前回の判定より後にカタログへ
+        追加されたコスメティックは、すでに越えた必要値でも解放されるよう最大値と
+        直接比べる。ストーリーは複数の条件を同時に満たす必要があるため、条件の
+        キーが変わったものを今回の進捗で判定し直す
+        """
         profile = self.user_profiles[user_uid]
         updates = {
             "milestones_achieved": [],
@@ -486,41 +605,68 @@ class LongTermEngagementSystem:
             "cosmetics_unlocked": [],
             "prestige_level_up": False
         }
-        
-        # ?
-        for milestone in TherapeuticMilestone:
-            if (milestone not in profile.achieved_milestones and 
-                self.prestige_system.check_milestone_achievement(milestone, progress_data)):
-                
+        progress = state.progress
+        high_water = state.high_water
+        milestone_index = self.prestige_system.milestone_index
+        achievement_index = self.cosmetic_system.achievement_index
+        
+        affected_branches: Set[str] = set()
+        if not state.evaluated:
+            # 初回は索引にあるすべてのキーとストーリーを判定する
+            changed_keys = changed_keys | set(milestone_index.keys()) | set(achievement_index.keys())
+            affected_branches.update(self.story_system.story_branches)
+            state.evaluated = True
+            state.catalog_seen = len(self.cosmetic_system.item_log)
+        
+        reached_milestones = []
+        reached_achievements = []
+        for key in changed_keys:
+            affected_branches.update(self.story_system.branches_by_key.get(key, ()))
+            old_value = high_water.get(key, float("-inf"))
+            value = progress.get(key, 0)
+            if value > old_value:
+                reached_milestones.extend(milestone_index.crossed(key, old_value, value))
+                reached_achievements.extend(achievement_index.crossed(key, old_value, value))
+                high_water[key] = value
+        
+        # マイルストーン
+        old_level = profile.prestige_level
+        for milestone in sorted(reached_milestones, key=self.milestone_order.get):
+            if milestone not in profile.achieved_milestones:
                 points_awarded = self.prestige_system.award_milestone(profile, milestone)
                 updates["milestones_achieved"].append({
                     "milestone": milestone.value,
                     "points": points_awarded
                 })
+        updates["prestige_level_up"] = profile.prestige_level != old_level
+        
+        # マイルストーン・プレステージポイントから決まる条件
+        for key, value in self._derived_progress(profile).items():
+            old_value = high_water.get(key, float("-inf"))
+            if value > old_value:
+                reached_achievements.extend(achievement_index.crossed(key, old_value, value))
+                high_water[key] = value
+                if key.startswith("milestone:") and value >= 1:
+                    milestone = TherapeuticMilestone(key.split(":", 1)[1])
+                    affected_branches.update(self.story_system.milestone_branches.get(milestone, ()))
+        
+        # ストーリー
+        for branch_id in sorted(affected_branches, key=self.story_system.branch_order.get):
+            branch = self.story_system.story_branches[branch_id]
+            if (branch.required_milestone in profile.achieved_milestones and
+                branch_id not in profile.unlocked_story_branches and
+                self.story_system.check_branch_unlock(branch_id, progress)):
                 
-                # プレビュー
-                old_level = profile.prestige_level
-                new_level = self.prestige_system.calculate_prestige_level(profile.total_prestige_points)
-                if new_level != old_level:
-                    profile.prestige_level = new_level
-                    updates["prestige_level_up"] = True
-        
-        # ?
-        available_branches = self.story_system.get_available_branches(profile.achieved_milestones)
-        for branch in available_branches:
-            if (branch.branch_id not in profile.unlocked_story_branches and
-                self.story_system.check_branch_unlock(branch.branch_id, progress_data)):
-                
-                self.story_system.unlock_branch(branch.branch_id, user_uid)
-                profile.unlocked_story_branches.append(branch.branch_id)
-                updates["branches_unlocked"].append(branch.branch_id)
+                self.story_system.unlock_branch(branch_id, user_uid)
+                profile.unlocked_story_branches.append(branch_id)
+                updates["branches_unlocked"].append(branch_id)
         
         # コア
-        user_achievements = self._convert_progress_to_achievements(progress_data, profile)
-        for item_id, item in self.cosmetic_system.cosmetic_catalog.items():
-            if (item_id not in profile.cosmetic_collection and
-                self.cosmetic_system.check_unlock_condition(item_id, user_achievements)):
-                
+        item_ids = [item_id for achievement in reached_achievements
+                    for item_id in self.cosmetic_system.items_by_condition.get(achievement, ())]
+        item_ids.extend(self._late_items_reached(state))
+        for item_id in sorted(item_ids, key=self.cosmetic_system.item_order.get):
+            if item_id not in profile.cosmetic_collection:
                 unlocked_item = self.cosmetic_system.unlock_cosmetic(item_id, user_uid)
                 if unlocked_item:
                     profile.cosmetic_collection[item_id] = unlocked_item
@@ -532,26 +678,35 @@ class LongTermEngagementSystem:
         
         return updates
     
+    def _late_items_reached(self, state: UserProgressState) -> List[str]:
+        """前回の判定より後にカタログへ追加され、これまでの最大値で条件を満たすアイテム"""
+        cosmetic_system = self.cosmetic_system
+        late_items = cosmetic_system.item_log[state.catalog_seen:]
+        state.catalog_seen = len(cosmetic_system.item_log)
+        reached = []
+        for item_id in late_items:
+            item = cosmetic_system.cosmetic_catalog[item_id]
+            requirement = cosmetic_system.achievement_requirements.get(item.unlock_condition)
+            if requirement and state.high_water.get(requirement[0], float("-inf")) >= requirement[1]:
+                reached.append(item_id)
+        return reached
+    
+    def _derived_progress(self, profile: PrestigeProfile) -> Dict[str, int]:
+        """プロフィールから決まる進捗キー（達成済みマイルストーン・プレステージポイント）"""
+        derived = {milestone_key(milestone): int(milestone in profile.achieved_milestones)
+                   for milestone in TherapeuticMilestone}
+        derived["prestige_points"] = profile.total_prestige_points
+        return derived
+    
     def _convert_progress_to_achievements(self, progress_data: Dict[str, int], 
                                         profile: PrestigeProfile) -> Dict[str, bool]:
         """?"""
-        achievements = {}
-        
-        # 基本
-        achievements["complete_first_task"] = progress_data.get("tasks_completed", 0) >= 1
-        achievements["complete_first_week"] = progress_data.get("consecutive_days", 0) >= 7
-        achievements["maintain_21_day_streak"] = progress_data.get("habit_streak", 0) >= 21
-        achievements["complete_spring_event"] = progress_data.get("spring_event_completed", 0) >= 1
-        achievements["complete_reflection_milestone"] = progress_data.get("reflection_entries", 0) >= 50
-        achievements["overcome_setback_5_times"] = progress_data.get("setbacks_overcome", 0) >= 5
-        achievements["provide_peer_support_50_times"] = progress_data.get("peer_support_given", 0) >= 50
-        achievements["support_100_guild_members"] = progress_data.get("guild_members_supported", 0) >= 100
-        
-        # プレビュー
-        achievements["achieve_habit_formation"] = TherapeuticMilestone.HABIT_FORMATION in profile.achieved_milestones
-        achievements["reach_prestige_master"] = profile.prestige_level.value in ["master", "grandmaster", "legend"]
-        
-        return achievements
+        values = dict(progress_data)
+        values.update(self._derived_progress(profile))
+        return {
+            achievement: values.get(key, 0) >= required_value
+            for achievement, (key, required_value) in self.cosmetic_system.achievement_requirements.items()
+        }
     
     def get_user_engagement_summary(self, user_uid: str) -> Dict[str, any]:
         """ユーザー"""
@@ -0,0 +1,114 @@
+"""
+コミュニティ目標・ギルドランキングの索引のテスト
+
+複数スレッドからの貢献で合計値と参加者数がずれず、達成時の報酬配布が
+1回だけであること、差分更新するランキングが全ギルドをソートした結果と
+一致することを確かめる
+"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+import threading
+from dataclasses import fields
+
+from services.seasonal_events.community_index import ParticipantBitmap, UserIdInterner
+from services.seasonal_events.main import (
+    CommunityGoal, CommunityGoalSystem, EngagementSystem, GuildSystem
+)
+
+
+def sorted_leaderboard(guild_system):
+    """索引を使わない従来の並び"""
+    active_guilds = [g for g in guild_system.guilds.values() if g.is_active]
+    return sorted(active_guilds, key=lambda g: g.total_xp, reverse=True)
+
+
+class TestCommunityGoalContention:
+
+    def test_concurrent_contributions_complete_exactly_once(self, monkeypatch):
+        goal_system = CommunityGoalSystem()
+        goal = goal_system.create_community_goal(
+            title="みんなで5000タスク", description="", target_value=5000,
+            duration_days=7, reward_per_participant={"xp": 10}
+        )
+        distributed = []
+        monkeypatch.setattr(goal_system, "_distribute_community_rewards", distributed.append)
+        barrier = threading.Barrier(8)
+
+        def contribute(worker):
+            barrier.wait()
+            for i in range(2000):
+                # 同じユーザーが何度も貢献し、スレッドをまたいで同じユーザーも出てくる
+                goal_system.contribute_to_goal(goal.goal_id, f"user_{(worker * 700 + i) % 3000}", 1)
+
+        threads = [threading.Thread(target=contribute, args=(w,)) for w in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert goal_system.get_goal_value(goal.goal_id) == 16000
+        assert goal.current_value == 16000
+        assert len(goal.participating_users) == 3000
+        assert sorted(goal.participating_users) == sorted(f"user_{i}" for i in range(3000))
+        assert distributed == [goal]
+        assert goal.is_completed is True
+
+    def test_engagement_data_lists_participants_like_asdict(self):
+        engagement = EngagementSystem()
+        goal = engagement.community_goals.create_community_goal(
+            title="?", description="?", target_value=100, duration_days=7,
+            reward_per_participant={"xp": 50}
+        )
+        for user in ["user_b", "user_a", "user_b"]:
+            engagement.community_goals.contribute_to_goal(goal.goal_id, user, 5)
+
+        data = engagement.get_user_engagement_data("user_a")["community_goals"][0]
+
+        assert list(data) == [f.name for f in fields(CommunityGoal)]
+        assert data["participating_users"] == ["user_b", "user_a"]
+        assert data["current_value"] == 15
+
+
+class TestParticipantBitmap:
+
+    def test_membership_and_iteration(self):
+        interner = UserIdInterner()
+        first, second = ParticipantBitmap(interner), ParticipantBitmap(interner)
+        for i in range(0, 1000, 3):
+            assert first.add(f"user_{i}") is True
+        assert first.add("user_3") is False
+        second.add("user_999")
+
+        assert len(first) == 334
+        assert "user_3" in first and "user_4" not in first
+        assert "unknown" not in first and 3 not in first
+        assert list(second) == ["user_999"]
+        assert list(first) == [f"user_{i}" for i in range(0, 1000, 3)]
+
+
+class TestIncrementalGuildLeaderboard:
+
+    def test_leaderboard_matches_full_sort(self):
+        rng = random.Random(5)
+        guild_system = GuildSystem()
+        guilds = [guild_system.create_guild(f"leader_{i}", f"ギルド{i}", "", "adhd_peer") for i in range(60)]
+
+        for step in range(3000):
+            guild = rng.choice(guilds)
+            if step % 150 == 0 and guild.is_active:
+                guild_system.leave_guild(guild.leader_uid)  # メンバーがいなくなり非アクティブ
+            else:
+                # 同じXPのギルドが多く出るように100単位で加算する
+                guild_system.add_guild_xp(guild.guild_id, rng.choice([0, 100, 200]))
+
+            if step % 100 == 0:
+                expected = [g.guild_id for g in sorted_leaderboard(guild_system)]
+                assert [g.guild_id for g in guild_system.get_guild_leaderboard()] == expected
+                assert [g.guild_id for g in guild_system.get_guild_leaderboard(10)] == expected[:10]
+
+        assert len(guild_system.get_guild_leaderboard()) < len(guilds)
@@ -0,0 +1,163 @@
+"""
+進捗キーの逆引き索引によるプレステージ判定のテスト
+
+変わったキーだけを判定する update_user_progress / apply_progress_changes が、
+すべてのマイルストーン・ストーリー・カタログを毎回判定し直す従来の方式と
+同じものを同じ順で解放することを確かめる
+"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import random
+
+from services.seasonal_events.prestige_system import (
+    CosmeticItem, CosmeticType, LongTermEngagementSystem, ThresholdIndex, TherapeuticMilestone
+)
+
+PROGRESS_KEYS = [
+    "tasks_completed", "consecutive_days", "habit_streak", "social_interactions",
+    "mood_stability_days", "self_efficacy_score", "peer_support_given", "mentorship_sessions",
+    "life_integration_score", "reflection_entries", "routine_tasks", "social_tasks",
+    "guild_participation", "setbacks_overcome", "guild_members_supported", "spring_event_completed",
+]
+
+
+def legacy_update(system, user_uid, progress_data):
+    """索引を使わずにすべてを判定し直す従来の方式"""
+    if user_uid not in system.user_profiles:
+        system.create_prestige_profile(user_uid)
+    profile = system.user_profiles[user_uid]
+    updates = {"milestones_achieved": [], "branches_unlocked": [], "cosmetics_unlocked": []}
+
+    for milestone in TherapeuticMilestone:
+        if (milestone not in profile.achieved_milestones and
+                system.prestige_system.check_milestone_achievement(milestone, progress_data)):
+            points = system.prestige_system.award_milestone(profile, milestone)
+            updates["milestones_achieved"].append({"milestone": milestone.value, "points": points})
+
+    for branch in system.story_system.get_available_branches(profile.achieved_milestones):
+        if (branch.branch_id not in profile.unlocked_story_branches and
+                system.story_system.check_branch_unlock(branch.branch_id, progress_data)):
+            profile.unlocked_story_branches.append(branch.branch_id)
+            updates["branches_unlocked"].append(branch.branch_id)
+
+    achievements = system._convert_progress_to_achievements(progress_data, profile)
+    for item_id in system.cosmetic_system.cosmetic_catalog:
+        if (item_id not in profile.cosmetic_collection and
+                system.cosmetic_system.check_unlock_condition(item_id, achievements)):
+            profile.cosmetic_collection[item_id] = system.cosmetic_system.unlock_cosmetic(item_id, user_uid)
+            updates["cosmetics_unlocked"].append(item_id)
+    return updates
+
+
+def enlarge_catalog(system, factor, rng):
+    """既存のキーに対する必要値がばらばらの実績・コスメティックを追加する"""
+    for i in range(factor):
+        key = rng.choice(PROGRESS_KEYS)
+        system.cosmetic_system.add_cosmetic(
+            CosmeticItem(
+                item_id=f"generated_{i}", name=f"generated_{i}", description="",
+                cosmetic_type=rng.choice(list(CosmeticType)), rarity="common",
+                unlock_condition=f"reach_{key}_{i}", therapeutic_meaning="", visual_data={}
+            ),
+            requirement=(key, rng.randint(0, 120))
+        )
+
+
+def random_walk(rng, steps):
+    """増えたり減ったり（連続記録の途切れ）しながら進む進捗"""
+    progress = {}
+    for _ in range(steps):
+        for key in rng.sample(PROGRESS_KEYS, rng.randint(1, 4)):
+            if rng.random() < 0.15:
+                progress[key] = 0
+            else:
+                progress[key] = progress.get(key, 0) + rng.randint(0, 15)
+        yield dict(progress)
+
+
+class TestIndexedProgressEvaluation:
+
+    @pytest.mark.parametrize("seed", [1, 2, 3])
+    def test_matches_full_reevaluation(self, seed):
+        rng = random.Random(seed)
+        indexed, legacy = LongTermEngagementSystem(), LongTermEngagementSystem()
+        enlarge_catalog(indexed, 300, random.Random(seed))
+        enlarge_catalog(legacy, 300, random.Random(seed))
+
+        for user_uid in ["user_a", "user_b"]:
+            for snapshot in random_walk(rng, 60):
+                expected = legacy_update(legacy, user_uid, snapshot)
+                updates = indexed.update_user_progress(user_uid, snapshot)
+
+                assert updates["milestones_achieved"] == expected["milestones_achieved"]
+                assert sorted(updates["branches_unlocked"]) == sorted(expected["branches_unlocked"])
+                assert updates["cosmetics_unlocked"] == expected["cosmetics_unlocked"]
+
+            profile, expected_profile = indexed.user_profiles[user_uid], legacy.user_profiles[user_uid]
+            assert profile.total_prestige_points == expected_profile.total_prestige_points
+            assert set(profile.cosmetic_collection) == set(expected_profile.cosmetic_collection)
+            assert len(profile.cosmetic_collection) > 0
+
+    def test_changes_only_matches_full_snapshot(self):
+        rng = random.Random(9)
+        snapshots, changes = LongTermEngagementSystem(), LongTermEngagementSystem()
+        previous = {}
+
+        for snapshot in random_walk(rng, 80):
+            delta = {key: value for key, value in snapshot.items() if previous.get(key) != value}
+            previous = snapshot
+            assert changes.apply_progress_changes("user_a", delta) == \
+                snapshots.update_user_progress("user_a", snapshot)
+
+    def test_prestige_level_up_is_reported(self):
+        system = LongTermEngagementSystem()
+
+        updates = system.update_user_progress("user_a", {
+            "tasks_completed": 5, "habit_streak": 30, "social_interactions": 60
+        })
+
+        assert updates["prestige_level_up"] is True
+        assert system.user_profiles["user_a"].prestige_level.value == "apprentice"
+        assert system.update_user_progress("user_a", {"tasks_completed": 6})["prestige_level_up"] is False
+
+    def test_cosmetic_added_after_threshold_unlocks_on_next_update(self):
+        system = LongTermEngagementSystem()
+        system.update_user_progress("user_a", {"tasks_completed": 5})
+
+        def late_item(item_id, unlock_condition):
+            return CosmeticItem(
+                item_id=item_id, name=item_id, description="", cosmetic_type=CosmeticType.FRAME,
+                rarity="common", unlock_condition=unlock_condition, therapeutic_meaning="", visual_data={}
+            )
+
+        system.cosmetic_system.add_cosmetic(late_item("late_first_task", "complete_first_task"))
+        system.cosmetic_system.add_cosmetic(late_item("late_ten_tasks", "reach_ten_tasks"),
+                                            requirement=("tasks_completed", 10))
+
+        updates = system.update_user_progress("user_a", {"tasks_completed": 6})
+        assert updates["cosmetics_unlocked"] == ["late_first_task"]
+        assert system.update_user_progress("user_a", {"tasks_completed": 7})["cosmetics_unlocked"] == []
+        assert system.update_user_progress("user_a", {"tasks_completed": 10})["cosmetics_unlocked"] == \
+            ["late_ten_tasks"]
+
+        # まだ判定していないユーザーは初回の全件判定で解放される
+        assert "late_first_task" in system.update_user_progress("user_b", {"tasks_completed": 1})["cosmetics_unlocked"]
+
+
+class TestThresholdIndex:
+
+    def test_crossed_returns_newly_reached_targets(self):
+        index = ThresholdIndex()
+        for threshold, target in [(10, "b"), (1, "a"), (10, "c"), (50, "d")]:
+            index.add("tasks_completed", threshold, target)
+
+        assert index.crossed("tasks_completed", float("-inf"), 0) == []
+        assert index.crossed("tasks_completed", 0, 10) == ["a", "b", "c"]
+        assert index.crossed("tasks_completed", 10, 49) == []
+        assert index.crossed("tasks_completed", 10, 80) == ["d"]
+        assert index.crossed("tasks_completed", 80, 5) == []
+        assert index.crossed("unknown", 0, 100) == []
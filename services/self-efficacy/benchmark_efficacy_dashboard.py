@@ -0,0 +1,105 @@
+"""
+Efficacy Dashboard Benchmark
+
+users 人に対して、読み取り read_ratio・ゲージ更新 (1 - read_ratio) の混在負荷を
+operations 回かけ、ダッシュボード取得（JSONにするところまで）の p50/p99 を比較する。
+従来方式は毎回8つのゲージから集計し直してシリアライズする
+
+Usage: python benchmark_efficacy_dashboard.py [users] [operations] [read_ratio]
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from main import DASHBOARD_FOCUSES, EfficacyUpdateRequest, SelfEfficacyEngine
+
+
+async def legacy_dashboard(engine, user_id):
+    """集計値を持たない従来方式（リクエストごとに計算してシリアライズ）"""
+    gauges = {}
+    total_efficacy = 0.0
+    total_consecutive_days = 0
+    for focus in DASHBOARD_FOCUSES:
+        gauge = await engine._get_or_create_gauge(user_id, focus)
+        gauges[focus] = gauge
+        total_efficacy += gauge.current_percentage
+        total_consecutive_days = max(total_consecutive_days, gauge.consecutive_days)
+    average_efficacy = total_efficacy / len(DASHBOARD_FOCUSES)
+    next_milestone = None
+    for milestone in engine.milestones:
+        if milestone.day > total_consecutive_days:
+            next_milestone = milestone
+            break
+    dashboard = {
+        "user_id": user_id,
+        "overall_efficacy_level": engine._calculate_efficacy_level(average_efficacy),
+        "average_efficacy_percentage": average_efficacy,
+        "max_consecutive_days": total_consecutive_days,
+        "therapeutic_gauges": gauges,
+        "next_milestone": next_milestone,
+        "total_passive_skills": sum(len(gauge.passive_skills) for gauge in gauges.values()),
+        "efficacy_trend": engine._calculate_efficacy_trend(gauges),
+        "motivational_message": engine._generate_motivational_message(average_efficacy, total_consecutive_days)
+    }
+    return json.dumps(jsonable_encoder(dashboard), ensure_ascii=False).encode("utf-8")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(name, read_dashboard, users, operations, read_ratio):
+    engine = SelfEfficacyEngine()
+    rng = random.Random(3)
+    user_ids = [f"user_{i}" for i in range(users)]
+    # 数日分の履歴を持たせておく
+    for user_id in user_ids:
+        for focus in DASHBOARD_FOCUSES[:3]:
+            for _ in range(5):
+                await engine.update_efficacy_gauge(EfficacyUpdateRequest(
+                    user_id=user_id, therapeutic_focus=focus, task_completed=True,
+                    task_difficulty=3, mood_rating=4, reflection_quality=3
+                ))
+
+    read_latencies, update_latencies = [], []
+    started = time.perf_counter()
+    for _ in range(operations):
+        user_id = rng.choice(user_ids)
+        if rng.random() < read_ratio:
+            begin = time.perf_counter()
+            await read_dashboard(engine, user_id)
+            read_latencies.append((time.perf_counter() - begin) * 1000)
+        else:
+            begin = time.perf_counter()
+            await engine.update_efficacy_gauge(EfficacyUpdateRequest(
+                user_id=user_id, therapeutic_focus=rng.choice(DASHBOARD_FOCUSES), task_completed=True,
+                task_difficulty=rng.randint(1, 5), mood_rating=rng.randint(1, 5)
+            ))
+            update_latencies.append((time.perf_counter() - begin) * 1000)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<12} dashboard p50={percentile(read_latencies, 0.5):7.3f} ms "
+          f"p99={percentile(read_latencies, 0.99):7.3f} ms  "
+          f"update p50={percentile(update_latencies, 0.5):7.3f} ms  {operations / elapsed:>8,.0f} ops/s")
+
+
+async def main(users, operations, read_ratio):
+    print(f"users={users:,} operations={operations:,} read_ratio={read_ratio}")
+    await run("recompute", legacy_dashboard, users, operations, read_ratio)
+    await run("aggregate", lambda engine, user_id: engine.get_serialized_dashboard(user_id),
+              users, operations, read_ratio)
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    read_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.95
+    asyncio.run(main(users, operations, read_ratio))
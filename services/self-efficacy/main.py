@@ -7,11 +7,14 @@ Self-Efficacy Gauge Service - 自動
 - ?
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from enum import Enum
+import bisect
+import json
 import logging
 import uuid
 import math
@@ -81,9 +84,66 @@ class EfficacyUpdateRequest(BaseModel):
     mood_rating: int  # 1-5
     reflection_quality: Optional[int] = None  # 1-5
 
+# ダッシュボードに並べる治療フォーカス
+DASHBOARD_FOCUSES = ["Self-Discipline", "Empathy", "Resilience", "Curiosity",
+                     "Communication", "Creativity", "Courage", "Wisdom"]
+
+class DashboardAggregate:
+    """
+    1ユーザーのダッシュボード集計値
+
+    ゲージ値の合計・連続日数の最大・パッシブスキル数・フォーカスごとの直近の
+    変化量を持ち、update_efficacy_gauge で更新したフォーカスの分だけ差分で
+    反映する。シリアライズ済みのダッシュボードは次の更新まで使い回す
+    """
+
+    __slots__ = ("gauges", "percentages", "consecutive_days", "percentage_sum",
+                 "max_consecutive_days", "passive_skill_count", "recent_changes", "serialized")
+
+    def __init__(self, gauges: Dict[str, EfficacyGauge]):
+        self.gauges = gauges
+        self.percentages = {focus: gauge.current_percentage for focus, gauge in gauges.items()}
+        self.consecutive_days = {focus: gauge.consecutive_days for focus, gauge in gauges.items()}
+        self.percentage_sum = sum(self.percentages.values())
+        self.max_consecutive_days = max(self.consecutive_days.values(), default=0)
+        self.passive_skill_count = sum(len(gauge.passive_skills) for gauge in gauges.values())
+        self.recent_changes: Dict[str, float] = {}
+        for focus, gauge in gauges.items():
+            self._record_history(focus, gauge)
+        self.serialized: Optional[bytes] = None
+
+    def apply(self, gauge: EfficacyGauge, newly_unlocked_skills: int) -> None:
+        """更新されたゲージ1つ分を反映し、シリアライズ済みの値を捨てる"""
+        focus = gauge.therapeutic_focus
+        self.percentage_sum += gauge.current_percentage - self.percentages[focus]
+        self.percentages[focus] = gauge.current_percentage
+
+        previous_days = self.consecutive_days[focus]
+        self.consecutive_days[focus] = gauge.consecutive_days
+        if gauge.consecutive_days >= self.max_consecutive_days:
+            self.max_consecutive_days = gauge.consecutive_days
+        elif previous_days == self.max_consecutive_days:
+            # 最大だったフォーカスが途切れたときだけ取り直す（フォーカス数ぶん）
+            self.max_consecutive_days = max(self.consecutive_days.values())
+
+        self.passive_skill_count += newly_unlocked_skills
+        self._record_history(focus, gauge)
+        self.serialized = None
+
+    def _record_history(self, focus: str, gauge: EfficacyGauge) -> None:
+        if len(gauge.efficacy_history) >= 2:
+            self.recent_changes[focus] = (gauge.efficacy_history[-1]["percentage"]
+                                          - gauge.efficacy_history[-2]["percentage"])
+
+    @property
+    def average_percentage(self) -> float:
+        return self.percentage_sum / len(self.gauges)
+
 class SelfEfficacyEngine:
     def __init__(self):
         self.milestones = self._initialize_milestones()
+        self.milestone_days = [milestone.day for milestone in self.milestones]  # 昇順
+        self.dashboards: Dict[str, DashboardAggregate] = {}
         self.passive_skills_pool = self._initialize_passive_skills()
         self.efficacy_formula_weights = {
             "consistency": 0.4,      # ?
@@ -292,6 +352,11 @@ class SelfEfficacyEngine:
             # ?
             newly_unlocked_skills = await self._check_passive_skill_unlocks(current_gauge)
             
+            # ダッシュボード集計
+            dashboard = self.dashboards.get(request.user_id)
+            if dashboard is not None and request.therapeutic_focus in dashboard.gauges:
+                dashboard.apply(current_gauge, len(newly_unlocked_skills))
+            
             return {
                 "success": True,
                 "gauge": current_gauge,
@@ -426,43 +491,54 @@ class SelfEfficacyEngine:
         
         return "?"
     
+    def next_milestone(self, consecutive_days: int) -> Optional[EfficacyMilestone]:
+        """consecutive_days より後の最初の?"""
+        index = bisect.bisect_right(self.milestone_days, consecutive_days)
+        return self.milestones[index] if index < len(self.milestones) else None
+    
+    async def _get_dashboard_aggregate(self, user_id: str) -> DashboardAggregate:
+        """集計値を返す。初回だけゲージを揃えて全体から計算する"""
+        dashboard = self.dashboards.get(user_id)
+        if dashboard is None:
+            gauges = {}
+            for focus in DASHBOARD_FOCUSES:
+                gauges[focus] = await self._get_or_create_gauge(user_id, focus)
+            dashboard = DashboardAggregate(gauges)
+            self.dashboards[user_id] = dashboard
+        return dashboard
+    
+    def invalidate_dashboard(self, user_id: str):
+        """ゲージを update_efficacy_gauge 以外で書き換えたときに集計を作り直させる"""
+        self.dashboards.pop(user_id, None)
+    
     async def get_efficacy_dashboard(self, user_id: str) -> Dict[str, Any]:
         """?"""
-        # ?
-        therapeutic_focuses = ["Self-Discipline", "Empathy", "Resilience", "Curiosity", 
-                             "Communication", "Creativity", "Courage", "Wisdom"]
-        
-        gauges = {}
-        total_efficacy = 0.0
-        total_consecutive_days = 0
-        
-        for focus in therapeutic_focuses:
-            gauge = await self._get_or_create_gauge(user_id, focus)
-            gauges[focus] = gauge
-            total_efficacy += gauge.current_percentage
-            total_consecutive_days = max(total_consecutive_days, gauge.consecutive_days)
-        
-        average_efficacy = total_efficacy / len(therapeutic_focuses)
-        
-        # ?
-        next_milestone = None
-        for milestone in self.milestones:
-            if milestone.day > total_consecutive_days:
-                next_milestone = milestone
-                break
+        dashboard = await self._get_dashboard_aggregate(user_id)
+        average_efficacy = dashboard.average_percentage
+        max_consecutive_days = dashboard.max_consecutive_days
         
         return {
             "user_id": user_id,
             "overall_efficacy_level": self._calculate_efficacy_level(average_efficacy),
             "average_efficacy_percentage": average_efficacy,
-            "max_consecutive_days": total_consecutive_days,
-            "therapeutic_gauges": gauges,
-            "next_milestone": next_milestone,
-            "total_passive_skills": sum(len(gauge.passive_skills) for gauge in gauges.values()),
-            "efficacy_trend": self._calculate_efficacy_trend(gauges),
-            "motivational_message": self._generate_motivational_message(average_efficacy, total_consecutive_days)
+            "max_consecutive_days": max_consecutive_days,
+            "therapeutic_gauges": dict(dashboard.gauges),
+            "next_milestone": self.next_milestone(max_consecutive_days),
+            "total_passive_skills": dashboard.passive_skill_count,
+            "efficacy_trend": self._trend_from_changes(
+                [dashboard.recent_changes[focus] for focus in DASHBOARD_FOCUSES if focus in dashboard.recent_changes]
+            ),
+            "motivational_message": self._generate_motivational_message(average_efficacy, max_consecutive_days)
         }
     
+    async def get_serialized_dashboard(self, user_id: str) -> bytes:
+        """JSONにしたダッシュボード。次のゲージ更新まで同じバイト列を返す"""
+        dashboard = await self._get_dashboard_aggregate(user_id)
+        if dashboard.serialized is None:
+            content = jsonable_encoder(await self.get_efficacy_dashboard(user_id))
+            dashboard.serialized = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        return dashboard.serialized
+    
     def _calculate_efficacy_trend(self, gauges: Dict[str, EfficacyGauge]) -> str:
         """?"""
         recent_changes = []
@@ -473,6 +549,9 @@ class SelfEfficacyEngine:
                 previous = gauge.efficacy_history[-2]["percentage"]
                 recent_changes.append(recent - previous)
         
+        return self._trend_from_changes(recent_changes)
+    
+    def _trend_from_changes(self, recent_changes: List[float]) -> str:
         if not recent_changes:
             return "stable"
         
@@ -512,8 +591,8 @@ async def update_efficacy_gauge(request: EfficacyUpdateRequest):
 
 @app.get("/efficacy/{user_id}/dashboard")
 async def get_efficacy_dashboard(user_id: str):
-    """?"""
-    return await efficacy_engine.get_efficacy_dashboard(user_id)
+    """?（シリアライズ済みの値を次のゲージ更新まで返す）"""
+    return Response(await efficacy_engine.get_serialized_dashboard(user_id), media_type="application/json")
 
 @app.get("/efficacy/{user_id}/{therapeutic_focus}")
 async def get_specific_gauge(user_id: str, therapeutic_focus: str):
@@ -523,8 +602,7 @@ async def get_specific_gauge(user_id: str, therapeutic_focus: str):
         "gauge": gauge,
         "available_skills": [skill for skill in efficacy_engine.passive_skills_pool 
                            if skill.therapeutic_focus == therapeutic_focus],
-        "next_milestone": next((m for m in efficacy_engine.milestones 
-                              if m.day > gauge.consecutive_days), None)
+        "next_milestone": efficacy_engine.next_milestone(gauge.consecutive_days)
     }
 
 @app.get("/efficacy/milestones")
@@ -0,0 +1,124 @@
+"""
+Efficacy Dashboard Aggregate Tests
+
+update_efficacy_gauge で差分更新するダッシュボード集計が、8つのゲージから
+計算し直した値と一致すること、シリアライズ済みの値が次の更新まで
+使い回されることを確かめる
+"""
+
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import main
+from main import DASHBOARD_FOCUSES, EfficacyUpdateRequest, SelfEfficacyEngine
+
+START = datetime(2025, 1, 1, 8, 0)
+
+
+class FakeDatetime(datetime):
+    current = START
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+def recomputed_dashboard(engine, user_id):
+    """集計を使わずに8つのゲージから計算し直す"""
+    gauges = [engine._test_gauges[f"{user_id}_{focus}"] for focus in DASHBOARD_FOCUSES]
+    average = sum(gauge.current_percentage for gauge in gauges) / len(gauges)
+    max_days = max(gauge.consecutive_days for gauge in gauges)
+    next_milestone = next((m for m in engine.milestones if m.day > max_days), None)
+    return {
+        "average_efficacy_percentage": average,
+        "max_consecutive_days": max_days,
+        "next_milestone": next_milestone.day if next_milestone else None,
+        "total_passive_skills": sum(len(gauge.passive_skills) for gauge in gauges),
+        "efficacy_trend": engine._calculate_efficacy_trend(dict(zip(DASHBOARD_FOCUSES, gauges))),
+    }
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(main, "datetime", FakeDatetime)
+    FakeDatetime.current = START
+    engine = SelfEfficacyEngine()
+    monkeypatch.setattr(main, "efficacy_engine", engine)
+    return engine
+
+
+class TestDashboardAggregate:
+
+    @pytest.mark.asyncio
+    async def test_incremental_aggregate_matches_recomputation(self, engine):
+        rng = random.Random(12)
+        users = ["user_a", "user_b", "user_c"]
+        for user_id in users:
+            await engine.get_efficacy_dashboard(user_id)  # 集計を先に作っておく
+
+        for step in range(1500):
+            # 日が進んだり飛んだりして連続日数が伸びたり途切れたりする
+            if step % 40 == 0:
+                FakeDatetime.current += timedelta(days=rng.choice([1, 1, 1, 3]))
+            user_id = rng.choice(users)
+            await engine.update_efficacy_gauge(EfficacyUpdateRequest(
+                user_id=user_id,
+                therapeutic_focus=rng.choice(DASHBOARD_FOCUSES[:2] if rng.random() < 0.7
+                                             else DASHBOARD_FOCUSES + ["Focus"]),
+                task_completed=rng.random() < 0.8,
+                task_difficulty=rng.randint(1, 5),
+                mood_rating=rng.randint(1, 5),
+                reflection_quality=rng.randint(1, 5)
+            ))
+
+            if step % 25 == 0:
+                for checked_user in users:
+                    dashboard = await engine.get_efficacy_dashboard(checked_user)
+                    expected = recomputed_dashboard(engine, checked_user)
+                    assert dashboard["average_efficacy_percentage"] == pytest.approx(
+                        expected["average_efficacy_percentage"], abs=1e-9)
+                    assert dashboard["max_consecutive_days"] == expected["max_consecutive_days"]
+                    assert (dashboard["next_milestone"].day if dashboard["next_milestone"] else None) \
+                        == expected["next_milestone"]
+                    assert dashboard["total_passive_skills"] == expected["total_passive_skills"]
+                    assert dashboard["efficacy_trend"] == expected["efficacy_trend"]
+
+        assert max(engine.dashboards[user].max_consecutive_days for user in users) >= 7
+
+    @pytest.mark.asyncio
+    async def test_serialized_dashboard_is_reused_until_update(self, engine):
+        first = await engine.get_serialized_dashboard("user_a")
+        assert await engine.get_serialized_dashboard("user_a") is first
+
+        await engine.update_efficacy_gauge(EfficacyUpdateRequest(
+            user_id="user_a", therapeutic_focus="Empathy", task_completed=True,
+            task_difficulty=3, mood_rating=4
+        ))
+        updated = await engine.get_serialized_dashboard("user_a")
+
+        assert updated is not first
+        data = json.loads(updated)
+        assert data["therapeutic_gauges"]["Empathy"]["current_percentage"] > 0
+        assert data["average_efficacy_percentage"] == json.loads(first)["average_efficacy_percentage"] + \
+            data["therapeutic_gauges"]["Empathy"]["current_percentage"] / len(DASHBOARD_FOCUSES)
+
+    @pytest.mark.asyncio
+    async def test_dashboard_endpoint_returns_cached_json(self, engine):
+        response = await main.get_efficacy_dashboard("api_user")
+
+        assert response.media_type == "application/json"
+        data = json.loads(response.body)
+        assert data["overall_efficacy_level"] == "novice"
+        assert len(data["therapeutic_gauges"]) == len(DASHBOARD_FOCUSES)
+
+    def test_next_milestone_bisect_matches_linear_scan(self, engine):
+        for days in range(0, 120):
+            expected = next((m for m in engine.milestones if m.day > days), None)
+            assert engine.next_milestone(days) is expected
@@ -47,6 +47,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def start_pomodoro_timers():
+    """再起動前に予約されたPomodoro自動完了タイマーを復元"""
+    await pomodoro_service.timers.start()
+
+
+@app.on_event("shutdown")
+async def stop_pomodoro_timers():
+    await pomodoro_service.timers.stop()
+
 # ?Firestoreを
 task_storage: Dict[str, Dict[str, Task]] = {}  # uid -> task_id -> Task
 
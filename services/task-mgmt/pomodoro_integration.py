@@ -9,8 +9,14 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 from pydantic import BaseModel, Field
-import asyncio
 import logging
+import sys
+import os
+
+# Add project root to path for shared imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from shared.utils.timer_wheel import Timer, TimerWheel
 
 logger = logging.getLogger(__name__)
 
@@ -75,7 +81,7 @@ class ADHDSupportMetrics(BaseModel):
 class PomodoroIntegrationService:
     """Pomodoro?"""
     
-    def __init__(self):
+    def __init__(self, timers: Optional[TimerWheel] = None):
         # ?Firestoreを
         self.pomodoro_sessions: Dict[str, PomodoroSession] = {}
         self.work_sessions: Dict[str, WorkSession] = {}  # uid -> WorkSession
@@ -86,6 +92,11 @@ class PomodoroIntegrationService:
         self.MANDATORY_BREAK_DURATION = 15  # ?
         self.SHORT_BREAK_DURATION = 5  # ?
         self.LONG_BREAK_DURATION = 15  # ?
+
+        # 自動完了タイマー（セッションごとのタスクではなく1本のループで駆動）
+        self.timers = timers or TimerWheel()
+        self.timers.register_handler("pomodoro.session_end", self._auto_complete_sessions)
+        self.timers.register_handler("pomodoro.break_end", self._auto_complete_breaks)
         
     def generate_session_id(self, uid: str) -> str:
         """?IDを"""
@@ -130,7 +141,10 @@ class PomodoroIntegrationService:
             await self._update_work_session(uid, session_id)
             
             # 自動
-            asyncio.create_task(self._auto_complete_session(session_id, duration))
+            self.timers.schedule(
+                f"session:{session_id}", "pomodoro.session_end",
+                delay=duration * 60, payload={"session_id": session_id}
+            )
             
             logger.info(f"Pomodoro session started: {session_id} for user {uid}")
             return session
@@ -169,6 +183,7 @@ class PomodoroIntegrationService:
             session.completed_at = datetime.utcnow()
             session.actual_duration = actual_duration or session.planned_duration
             session.notes = notes
+            self.timers.cancel(f"session:{session_id}")
             
             # ADHD支援
             await self._update_adhd_metrics(session.uid, session)
@@ -216,7 +231,10 @@ class PomodoroIntegrationService:
             session.break_duration = break_durations.get(break_type, self.SHORT_BREAK_DURATION)
             
             # 自動
-            asyncio.create_task(self._auto_complete_break(session_id, session.break_duration))
+            self.timers.schedule(
+                f"break:{session_id}", "pomodoro.break_end",
+                delay=session.break_duration * 60, payload={"session_id": session_id}
+            )
             
             logger.info(f"Break started for session: {session_id}, type: {break_type}")
             return session
@@ -246,6 +264,7 @@ class PomodoroIntegrationService:
             
             session.break_completed_at = datetime.utcnow()
             session.status = PomodoroSessionStatus.COMPLETED
+            self.timers.cancel(f"break:{session_id}")
             
             logger.info(f"Break completed for session: {session_id}")
             return session
@@ -272,6 +291,8 @@ class PomodoroIntegrationService:
             session = self.pomodoro_sessions[session_id]
             session.status = PomodoroSessionStatus.CANCELLED
             session.notes = f"Cancelled: {reason}" if reason else "Cancelled"
+            self.timers.cancel(f"session:{session_id}")
+            self.timers.cancel(f"break:{session_id}")
             
             logger.info(f"Session cancelled: {session_id}, reason: {reason}")
             return session
@@ -470,31 +491,29 @@ class PomodoroIntegrationService:
     
     # プレビュー
     
-    async def _auto_complete_session(self, session_id: str, duration_minutes: int):
-        """?"""
-        try:
-            await asyncio.sleep(duration_minutes * 60)  # ?
-            
-            if session_id in self.pomodoro_sessions:
-                session = self.pomodoro_sessions[session_id]
-                if session.status == PomodoroSessionStatus.ACTIVE:
-                    await self.complete_pomodoro_session(session_id)
-                    
-        except Exception as e:
-            logger.error(f"Auto-complete session failed: {str(e)}")
+    async def _auto_complete_sessions(self, timers: List[Timer]):
+        """時間切れのセッションをまとめて自動完了"""
+        for timer in timers:
+            session_id = timer.payload["session_id"]
+            session = self.pomodoro_sessions.get(session_id)
+            if session is None or session.status != PomodoroSessionStatus.ACTIVE:
+                continue
+            try:
+                await self.complete_pomodoro_session(session_id)
+            except Exception as e:
+                logger.error(f"Auto-complete session failed: {str(e)}")
     
-    async def _auto_complete_break(self, session_id: str, duration_minutes: int):
-        """?"""
-        try:
-            await asyncio.sleep(duration_minutes * 60)  # ?
-            
-            if session_id in self.pomodoro_sessions:
-                session = self.pomodoro_sessions[session_id]
-                if session.status == PomodoroSessionStatus.BREAK:
-                    await self.complete_break(session_id)
-                    
-        except Exception as e:
-            logger.error(f"Auto-complete break failed: {str(e)}")
+    async def _auto_complete_breaks(self, timers: List[Timer]):
+        """時間切れの休憩をまとめて自動完了"""
+        for timer in timers:
+            session_id = timer.payload["session_id"]
+            session = self.pomodoro_sessions.get(session_id)
+            if session is None or session.status != PomodoroSessionStatus.BREAK:
+                continue
+            try:
+                await self.complete_break(session_id)
+            except Exception as e:
+                logger.error(f"Auto-complete break failed: {str(e)}")
     
     async def _update_work_session(self, uid: str, session_id: str):
         """?"""
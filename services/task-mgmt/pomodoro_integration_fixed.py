@@ -9,8 +9,14 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 from pydantic import BaseModel, Field
-import asyncio
 import logging
+import sys
+import os
+
+# Add project root to path for shared imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from shared.utils.timer_wheel import SqliteTimerStore, Timer, TimerWheel
 
 logger = logging.getLogger(__name__)
 
@@ -75,7 +81,7 @@ class ADHDSupportMetrics(BaseModel):
 class PomodoroIntegrationService:
     """Pomodoro統合サービス"""
     
-    def __init__(self):
+    def __init__(self, timers: Optional[TimerWheel] = None):
         # 実際の実装ではFirestoreを使用
         self.pomodoro_sessions: Dict[str, PomodoroSession] = {}
         self.work_sessions: Dict[str, WorkSession] = {}  # uid -> WorkSession
@@ -86,6 +92,10 @@ class PomodoroIntegrationService:
         self.MANDATORY_BREAK_DURATION = 15  # 強制休憩時間（分）
         self.SHORT_BREAK_DURATION = 5  # 短い休憩時間（分）
         self.LONG_BREAK_DURATION = 15  # 長い休憩時間（分）
+
+        # 自動完了タイマー（セッションごとのタスクではなく1本のループで駆動）
+        self.timers = timers or TimerWheel()
+        self.timers.register_handler("pomodoro.session_end", self._auto_complete_sessions)
         
     def generate_session_id(self, uid: str) -> str:
         """セッションIDを生成"""
@@ -129,8 +139,11 @@ class PomodoroIntegrationService:
             # 作業セッション更新
             await self._update_work_session(uid, session_id)
             
-            # 自動完了タスク
-            asyncio.create_task(self._auto_complete_session(session_id, duration))
+            # 自動完了タイマー
+            self.timers.schedule(
+                f"session:{session_id}", "pomodoro.session_end",
+                delay=duration * 60, payload={"session_id": session_id}
+            )
             
             logger.info(f"Pomodoro session started: {session_id} for user {uid}")
             return session
@@ -240,21 +253,18 @@ class PomodoroIntegrationService:
         except Exception as e:
             logger.error(f"Failed to update work session: {str(e)}")
     
-    async def _auto_complete_session(self, session_id: str, duration_minutes: int):
-        """自動セッション完了"""
-        try:
-            await asyncio.sleep(duration_minutes * 60)  # 分を秒に変換
-            
-            if session_id in self.pomodoro_sessions:
-                session = self.pomodoro_sessions[session_id]
-                if session.status == PomodoroSessionStatus.ACTIVE:
-                    session.status = PomodoroSessionStatus.COMPLETED
-                    session.completed_at = datetime.utcnow()
-                    session.actual_duration = duration_minutes
-                    
-        except Exception as e:
-            logger.error(f"Auto-complete session failed: {str(e)}")
+    async def _auto_complete_sessions(self, timers: List[Timer]):
+        """時間切れのセッションをまとめて自動完了"""
+        for timer in timers:
+            session = self.pomodoro_sessions.get(timer.payload["session_id"])
+            if session is not None and session.status == PomodoroSessionStatus.ACTIVE:
+                session.status = PomodoroSessionStatus.COMPLETED
+                session.completed_at = datetime.utcnow()
+                session.actual_duration = session.planned_duration
 
 
-# グローバルサービスインスタンス
-pomodoro_service = PomodoroIntegrationService()
\ No newline at end of file
+# グローバルサービスインスタンス（POMODORO_TIMER_DB 指定時はタイマーを永続化）
+_timer_db = os.environ.get("POMODORO_TIMER_DB")
+pomodoro_service = PomodoroIntegrationService(
+    TimerWheel(store=SqliteTimerStore(_timer_db)) if _timer_db else None
+)
\ No newline at end of file
@@ -10,11 +10,14 @@ Requirements: 1.4, 5.5
 
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Optional, Any, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
 from enum import Enum
+from contextlib import asynccontextmanager
 import asyncio
+import functools
+import hashlib
 import json
 import uuid
 import sys
@@ -31,10 +34,12 @@ except ImportError:
 
 # Add shared modules to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from interfaces.core_types import (
     ChapterType, TaskType, TaskStatus, CrystalAttribute
 )
+from shared.utils.outbox import SqliteOutbox, OutboxDispatcher, OutboxMessage
 
 app = FastAPI(title="Task-Story Integration Service", version="1.0.0")
 
@@ -84,16 +89,88 @@ class TaskStorySync(BaseModel):
     sync_status: str = "pending"  # pending, synced, failed
     last_sync_attempt: Optional[datetime] = None
 
+# タスク完了同期の各ステップが入力として待つ前段ステップ（定義順がトポロジカル順）
+# 共鳴判定はXP反映後のレベル差を見るためXP計算の後、それ以外はタスク情報だけに依存する
+SYNC_STEP_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "task_info": (),
+    "story_progression": ("task_info",),
+    "mandala_update": ("task_info",),
+    "xp_calculation": ("task_info",),
+    "crystal_growth": ("task_info",),
+    "resonance_event": ("xp_calculation",),
+    "next_choices": ("task_info",),
+}
+
+# 外部サービスを呼ぶステップ（それ以外はローカル計算なので締め切りの配分対象外）
+REMOTE_SYNC_STEPS = frozenset({
+    "task_info", "story_progression", "mandala_update", "xp_calculation", "resonance_event"
+})
+
+
+def _remaining_remote_hops(step: str) -> int:
+    """stepを含め、依存グラフ上でstepの後に直列で続く外部呼び出しの最大段数"""
+    downstream = [
+        _remaining_remote_hops(dependent)
+        for dependent, dependencies in SYNC_STEP_DEPENDENCIES.items()
+        if step in dependencies
+    ]
+    return (1 if step in REMOTE_SYNC_STEPS else 0) + max(downstream, default=0)
+
+
 # Service Integration Layer
 class ServiceIntegration:
     """?"""
-    
+
     def __init__(self):
         self.task_service_url = os.getenv("TASK_SERVICE_URL", "http://localhost:8001")
         self.story_service_url = os.getenv("STORY_SERVICE_URL", "http://localhost:8006")
         self.mandala_service_url = os.getenv("MANDALA_SERVICE_URL", "http://localhost:8003")
         self.core_game_service_url = os.getenv("CORE_GAME_SERVICE_URL", "http://localhost:8002")
-    
+
+        # 同期全体の締め切りと、接続先サービスごとの同時接続数
+        self.sync_deadline_seconds = float(os.getenv("SYNC_DEADLINE_SECONDS", "8.0"))
+        self.per_target_connections = int(os.getenv("PER_TARGET_CONNECTIONS", "10"))
+        self.request_timeout = 10.0
+
+        # キープアライブで使い回す共有クライアント（イベントループごとに作り直す）
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._target_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """共有クライアントを返す（未作成・クローズ済み・別ループなら作り直す）"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                timeout=self.request_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.per_target_connections * 4,
+                    max_keepalive_connections=self.per_target_connections * 4,
+                    keepalive_expiry=30.0
+                )
+            )
+            self._client_loop = loop
+            self._target_limits = {}
+        return self._client
+
+    @asynccontextmanager
+    async def _pooled_client(self, base_url: str):
+        """接続先ごとの同時接続数を守って共有クライアントを貸し出す"""
+        client = self._get_client()
+        semaphore = self._target_limits.get(base_url)
+        if semaphore is None:
+            semaphore = self._target_limits[base_url] = asyncio.Semaphore(self.per_target_connections)
+        async with semaphore:
+            yield client
+
+    async def aclose(self):
+        """共有クライアントを閉じる"""
+        client, self._client = self._client, None
+        self._client_loop = None
+        self._target_limits = {}
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
     async def create_task_from_story_choice(
         self, 
         uid: str, 
@@ -117,7 +194,7 @@ class ServiceIntegration:
         # タスク
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.task_service_url) as client:
                     response = await client.post(
                         f"{self.task_service_url}/tasks/{uid}/create",
                         json=task_data,
@@ -156,7 +233,7 @@ class ServiceIntegration:
         if HTTPX_AVAILABLE:
             try:
                 # ?
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.task_service_url) as client:
                     get_response = await client.get(
                         f"{self.task_service_url}/tasks/{uid}/{choice_hook.real_task_id}",
                         headers={"Authorization": "Bearer mock_token"}
@@ -299,20 +376,10 @@ class ServiceIntegration:
     ) -> Dict[str, Any]:
         """ストーリーMandalaを"""
         
-        mandala_updates = []
+        mandala_updates = self._build_mandala_updates(reflection_data.story_choices, reflection_data.target_date)
         generated_tasks = []
         
         for choice_hook in reflection_data.story_choices:
-            # Mandala?
-            if choice_hook.mandala_impact:
-                mandala_updates.append({
-                    "choice_id": choice_hook.choice_id,
-                    "choice_text": choice_hook.choice_text,
-                    "impact": choice_hook.mandala_impact,
-                    "therapeutic_weight": choice_hook.therapeutic_weight,
-                    "target_date": reflection_data.target_date.isoformat()
-                })
-            
             # ?
             if choice_hook.real_task_id or choice_hook.task_template:
                 task_result = await self.create_task_from_story_choice(
@@ -326,7 +393,7 @@ class ServiceIntegration:
         mandala_result = {"success": False}
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.mandala_service_url) as client:
                     response = await client.post(
                         f"{self.mandala_service_url}/mandala/{reflection_data.uid}/reflect-story-choices",
                         json={
@@ -362,6 +429,105 @@ class ServiceIntegration:
             "reflection_completion_date": reflection_data.completion_date.isoformat()
         }
     
+    def _build_mandala_updates(
+        self,
+        story_choices: List[StoryChoiceHook],
+        target_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Mandalaに影響する選択肢だけを反映用の形にする"""
+        return [
+            {
+                "choice_id": choice_hook.choice_id,
+                "choice_text": choice_hook.choice_text,
+                "impact": choice_hook.mandala_impact,
+                "therapeutic_weight": choice_hook.therapeutic_weight,
+                "target_date": target_date.isoformat()
+            }
+            for choice_hook in story_choices
+            if choice_hook.mandala_impact
+        ]
+    
+    async def deliver_story_choice_tasks(
+        self,
+        uid: str,
+        story_choices: List[StoryChoiceHook],
+        idempotency_key: str,
+        delivered: Optional[Dict[str, Dict[str, Any]]] = None,
+        on_delivered: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        アウトボックスから選択肢のタスクを作成する
+
+        create_task_from_story_choice と違ってモデルにフォールバックせず、失敗は例外で
+        返して再試行に回す。task-management は Idempotency-Key を見ないため、作成済みの
+        選択肢は on_delivered で記録し、再試行時は delivered（choice_id -> 結果）にある
+        選択肢を送り直さない
+        """
+        delivered = delivered or {}
+        created_tasks = []
+        for index, choice_hook in enumerate(story_choices):
+            if not (choice_hook.real_task_id or choice_hook.task_template):
+                continue
+            if choice_hook.choice_id in delivered:
+                created_tasks.append(delivered[choice_hook.choice_id])
+                continue
+            
+            task = await self._deliver_choice_task(uid, choice_hook, f"{idempotency_key}:{index}")
+            if on_delivered is not None:
+                on_delivered(choice_hook.choice_id, task)
+            created_tasks.append(task)
+        return created_tasks
+    
+    async def _deliver_choice_task(self, uid: str, choice_hook: StoryChoiceHook,
+                                   idempotency_key: str) -> Dict[str, Any]:
+        """選択肢1件分のタスク更新または作成"""
+        if choice_hook.real_task_id:
+            existing_task_result = await self._update_existing_task(uid, choice_hook)
+            if existing_task_result["success"]:
+                return {"task_id": choice_hook.real_task_id, "updated": True}
+        
+        task_data = self._build_task_from_choice(choice_hook)
+        if not HTTPX_AVAILABLE:
+            return {"task_id": str(uuid.uuid4()), "mock": True}
+        async with self._pooled_client(self.task_service_url) as client:
+            response = await client.post(
+                f"{self.task_service_url}/tasks/{uid}/create",
+                json=task_data,
+                headers={"Authorization": "Bearer mock_token", "Idempotency-Key": idempotency_key}
+            )
+            response.raise_for_status()
+            return {"task_id": response.json().get("task_id")}
+    
+    async def deliver_mandala_reflection(
+        self,
+        reflection_data: MandalaReflectionData,
+        task_ids: List[str],
+        idempotency_key: str
+    ) -> Dict[str, Any]:
+        """アウトボックスからMandalaへ反映する（失敗は例外で返して再試行に回す）"""
+        mandala_updates = self._build_mandala_updates(reflection_data.story_choices, reflection_data.target_date)
+        if not HTTPX_AVAILABLE:
+            return {
+                "success": True,
+                "updated_cells": len(mandala_updates),
+                "mock": True,
+                "cells_affected": self._generate_mock_mandala_cells(mandala_updates)
+            }
+        async with self._pooled_client(self.mandala_service_url) as client:
+            response = await client.post(
+                f"{self.mandala_service_url}/mandala/{reflection_data.uid}/reflect-story-choices",
+                json={
+                    "target_date": reflection_data.target_date.isoformat(),
+                    "chapter_context": reflection_data.chapter_context.value,
+                    "story_updates": mandala_updates,
+                    "therapeutic_focus": reflection_data.therapeutic_focus,
+                    "generated_tasks": task_ids
+                },
+                headers={"Authorization": "Bearer mock_token", "Idempotency-Key": idempotency_key}
+            )
+            response.raise_for_status()
+            return response.json()
+    
     def _generate_mock_mandala_cells(self, mandala_updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """モデルMandala?"""
         cells_affected = []
@@ -399,48 +565,123 @@ class ServiceIntegration:
     
     async def sync_task_completion_with_story(
         self, 
-        completion_hook: TaskCompletionHook
+        completion_hook: TaskCompletionHook,
+        deadline_seconds: Optional[float] = None
     ) -> Dict[str, Any]:
-        """タスク"""
-        
+        """
+        タスク完了をストーリー・Mandala・XP・共鳴へ同期する
+
+        SYNC_STEP_DEPENDENCIES で前段が揃ったステップから並行に実行し、全体の締め切りの
+        残り時間を、そのステップから直列に続く外部呼び出しの段数で割って各呼び出しに配分する。
+        時間切れや失敗のステップは代替結果で埋め、step_status と partial で知らせる
+        """
+        if deadline_seconds is None:
+            deadline_seconds = self.sync_deadline_seconds
+        loop = asyncio.get_running_loop()
+        sync_started = loop.time()
+        deadline = sync_started + deadline_seconds
+        uid, task_id = completion_hook.uid, completion_hook.task_id
+
+        skipped_steps = set()
+        if not completion_hook.story_progression_trigger:
+            skipped_steps.add("story_progression")
+        if not completion_hook.mandala_update_trigger:
+            skipped_steps.add("mandala_update")
+
+        # ステップ名 -> (呼び出し, 時間切れ・失敗時の代替結果)。どちらも前段までの結果を受け取る
+        steps = {
+            "task_info": (
+                lambda results: self._get_task_info(uid, task_id),
+                lambda results: self._fallback_task_info(uid, task_id)
+            ),
+            "story_progression": (
+                lambda results: self._trigger_story_progression(completion_hook, results["task_info"]),
+                lambda results: self._generate_fallback_story(completion_hook, results["task_info"])
+            ),
+            "mandala_update": (
+                lambda results: self._trigger_mandala_update(completion_hook, results["task_info"]),
+                lambda results: self._generate_mock_mandala_update(completion_hook, results["task_info"])
+            ),
+            "xp_calculation": (
+                lambda results: self._trigger_xp_calculation(completion_hook, results["task_info"]),
+                lambda results: self._calculate_fallback_xp(completion_hook, results["task_info"])
+            ),
+            "crystal_growth": (
+                lambda results: self._trigger_crystal_growth(completion_hook, results["task_info"]),
+                lambda results: {"success": False, "growth_events": []}
+            ),
+            "resonance_event": (
+                lambda results: self._check_resonance_events(completion_hook, results["task_info"]),
+                lambda results: self._fallback_resonance_check()
+            ),
+            "next_choices": (
+                lambda results: self._generate_next_story_choices(completion_hook, results["task_info"]),
+                lambda results: {"success": False, "next_choices": []}
+            ),
+        }
+
+        results: Dict[str, Any] = {}
+        step_status: Dict[str, Dict[str, Any]] = {}
+        step_tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(name: str):
+            dependencies = [step_tasks[dependency] for dependency in SYNC_STEP_DEPENDENCIES[name]]
+            if dependencies:
+                await asyncio.gather(*dependencies)
+            if name in skipped_steps:
+                step_status[name] = {"status": "skipped"}
+                return
+
+            call, fallback = steps[name]
+            started = loop.time()
+            budget = None
+            if name in REMOTE_SYNC_STEPS:
+                budget = max(0.0, deadline - started) / _remaining_remote_hops(name)
+            try:
+                if budget is None:
+                    results[name] = await call(results)
+                elif budget <= 0:
+                    raise asyncio.TimeoutError()
+                else:
+                    results[name] = await asyncio.wait_for(call(results), timeout=budget)
+                status = "ok"
+            except asyncio.TimeoutError:
+                print(f"Sync step {name} timed out after {budget:.3f}s")
+                results[name] = fallback(results)
+                status = "timeout"
+            except Exception as e:
+                print(f"Sync step {name} failed: {e}")
+                results[name] = fallback(results)
+                status = "failed"
+
+            step_status[name] = {
+                "status": status,
+                "elapsed_ms": round((loop.time() - started) * 1000, 1),
+                "budget_ms": None if budget is None else round(budget * 1000, 1)
+            }
+
+        for name in SYNC_STEP_DEPENDENCIES:
+            step_tasks[name] = asyncio.create_task(run_step(name))
+        await asyncio.gather(*step_tasks.values())
+
+        # 従来と同じ順序で結果を並べる（共鳴は発生したときだけ）
         sync_results = []
-        
-        # タスク
-        task_info = await self._get_task_info(completion_hook.uid, completion_hook.task_id)
-        
-        # ストーリー
-        if completion_hook.story_progression_trigger:
-            story_result = await self._trigger_story_progression(completion_hook, task_info)
-            sync_results.append({"type": "story_progression", "result": story_result})
-        
-        # Mandala?
-        if completion_hook.mandala_update_trigger:
-            mandala_result = await self._trigger_mandala_update(completion_hook, task_info)
-            sync_results.append({"type": "mandala_update", "result": mandala_result})
-        
-        # XP計算
-        xp_result = await self._trigger_xp_calculation(completion_hook, task_info)
-        sync_results.append({"type": "xp_calculation", "result": xp_result})
-        
-        # ?
-        crystal_result = await self._trigger_crystal_growth(completion_hook, task_info)
-        sync_results.append({"type": "crystal_growth", "result": crystal_result})
-        
-        # 共有
-        resonance_result = await self._check_resonance_events(completion_hook, task_info)
-        if resonance_result["triggered"]:
-            sync_results.append({"type": "resonance_event", "result": resonance_result})
-        
-        # ?
-        next_choices_result = await self._generate_next_story_choices(completion_hook, task_info)
-        sync_results.append({"type": "next_choices", "result": next_choices_result})
-        
+        for name in SYNC_STEP_DEPENDENCIES:
+            if name == "task_info" or name not in results:
+                continue
+            if name == "resonance_event" and not results[name].get("triggered"):
+                continue
+            sync_results.append({"type": name, "result": results[name]})
+
         return {
             "success": True,
             "sync_results": sync_results,
-            "task_id": completion_hook.task_id,
-            "uid": completion_hook.uid,
-            "task_info": task_info,
+            "task_id": task_id,
+            "uid": uid,
+            "task_info": results["task_info"],
+            "step_status": step_status,
+            "partial": any(status["status"] in ("timeout", "failed") for status in step_status.values()),
+            "sync_elapsed_ms": round((loop.time() - sync_started) * 1000, 1),
             "sync_timestamp": datetime.utcnow().isoformat()
         }
     
@@ -448,7 +689,7 @@ class ServiceIntegration:
         """タスク"""
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.task_service_url) as client:
                     response = await client.get(
                         f"{self.task_service_url}/tasks/{uid}/{task_id}",
                         headers={"Authorization": "Bearer mock_token"}
@@ -460,6 +701,10 @@ class ServiceIntegration:
                 print(f"Failed to get task info: {e}")
         
         # ?
+        return self._fallback_task_info(uid, task_id)
+    
+    def _fallback_task_info(self, uid: str, task_id: str) -> Dict[str, Any]:
+        """タスク情報を取得できないときの既定値"""
         return {
             "task_id": task_id,
             "uid": uid,
@@ -500,7 +745,7 @@ class ServiceIntegration:
         
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.story_service_url) as client:
                     response = await client.post(
                         f"{self.story_service_url}/ai/story/v2/generate",
                         json=story_context,
@@ -600,7 +845,7 @@ class ServiceIntegration:
         
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.mandala_service_url) as client:
                     response = await client.post(
                         f"{self.mandala_service_url}/mandala/{completion_hook.uid}/task-completion",
                         json=mandala_update_data,
@@ -685,7 +930,7 @@ class ServiceIntegration:
         
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.core_game_service_url) as client:
                     response = await client.post(
                         f"{self.core_game_service_url}/xp/calculate",
                         json=xp_calculation_data,
@@ -785,7 +1030,7 @@ class ServiceIntegration:
         
         if HTTPX_AVAILABLE:
             try:
-                async with httpx.AsyncClient(timeout=10.0) as client:
+                async with self._pooled_client(self.core_game_service_url) as client:
                     response = await client.get(
                         f"{self.core_game_service_url}/resonance/{completion_hook.uid}/check",
                         headers={"Authorization": "Bearer mock_token"}
@@ -797,6 +1042,10 @@ class ServiceIntegration:
                 print(f"Resonance check failed: {e}")
         
         # ?: ?
+        return self._fallback_resonance_check()
+    
+    def _fallback_resonance_check(self) -> Dict[str, Any]:
+        """共鳴判定を取得できないときは発生なしとして扱う"""
         return {
             "triggered": False,
             "reason": "No significant level difference detected",
@@ -907,6 +1156,51 @@ class ServiceIntegration:
 # Initialize service integration
 service_integration = ServiceIntegration()
 
+# リアルタイムフックのアウトボックス（既定はサービスのデータディレクトリのファイルで、
+# 再起動後も未配送分を引き継ぐ）。インポート時にはファイルを作らず、起動時に開く
+TASK_CREATION_TARGET = "task_creation"
+MANDALA_REFLECTION_TARGET = "mandala_reflection"
+
+DATA_DIR = os.getenv("TASK_STORY_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+def _hook_outbox_path() -> str:
+    path = os.getenv("HOOK_OUTBOX_DB")
+    if path:
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, "hook_outbox.db")
+
+hook_outbox: Optional[SqliteOutbox] = None
+hook_dispatcher: Optional[OutboxDispatcher] = None
+
+def open_hook_outbox() -> OutboxDispatcher:
+    """アウトボックスを開き、配送ハンドラーを登録したディスパッチャーを用意する"""
+    global hook_outbox, hook_dispatcher
+    hook_outbox = SqliteOutbox(_hook_outbox_path())
+    hook_dispatcher = OutboxDispatcher(
+        hook_outbox,
+        batch_size=int(os.getenv("HOOK_OUTBOX_BATCH_SIZE", "100")),
+        workers_per_target=int(os.getenv("HOOK_OUTBOX_WORKERS", "2"))
+    )
+    hook_dispatcher.register_handler(TASK_CREATION_TARGET, deliver_task_creation_batch)
+    hook_dispatcher.register_handler(MANDALA_REFLECTION_TARGET, deliver_mandala_reflection_batch)
+    return hook_dispatcher
+
+@app.on_event("startup")
+async def start_hook_dispatcher():
+    """アウトボックスを開いて配送ワーカーを起動する"""
+    await open_hook_outbox().start()
+
+@app.on_event("shutdown")
+async def close_service_clients():
+    """配送ワーカーを止めてアウトボックスを閉じ、共有HTTPクライアントの接続を閉じる"""
+    global hook_outbox, hook_dispatcher
+    if hook_dispatcher is not None:
+        await hook_dispatcher.stop()
+        hook_outbox.close()
+        hook_outbox = hook_dispatcher = None
+    await service_integration.aclose()
+
 # Mock database for development
 class IntegrationDatabase:
     def __init__(self):
@@ -1066,44 +1360,133 @@ async def reflect_story_choices_to_mandala(
 @app.post("/integration/process-real-time-hooks")
 async def process_real_time_hooks(
     hook_data: Dict[str, Any],
-    current_user: dict = Depends(verify_jwt_token),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    current_user: dict = Depends(verify_jwt_token)
 ):
-    """リスト21:30ストーリー"""
+    """
+    21:30のリアルタイムフックを受け付ける
+
+    タスク作成とMandala反映はその場では行わず、アウトボックスに1件積んで即座に応答する。
+    同じ選択肢の再送は冪等キーで重複を捨てる
+    """
     
     uid = hook_data.get("uid")
     if not uid:
         raise HTTPException(status_code=400, detail="User ID required")
+    try:
+        chapter_context = ChapterType(hook_data.get("chapter_context", ChapterType.SELF_DISCIPLINE))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid chapter context")
     
-    # ?
     user_choices = integration_db.story_choice_hooks.get(uid, [])
+    queued_tasks = len([
+        choice_hook for choice_hook in user_choices
+        if choice_hook.real_task_id or choice_hook.task_template
+    ])
     
-    # ?
-    tomorrow_tasks = []
-    for choice_hook in user_choices:
-        if choice_hook.real_task_id or choice_hook.task_template:
-            task_result = await service_integration.create_task_from_story_choice(uid, choice_hook)
-            if task_result["success"]:
-                tomorrow_tasks.append(task_result)
-    
-    # Mandala?
+    message_id = None
     if user_choices:
-        background_tasks.add_task(
-            schedule_mandala_reflection,
+        idempotency_key = hook_data.get("idempotency_key") or "realtime-hooks:{}:{}".format(
             uid,
-            user_choices,
-            hook_data.get("chapter_context", ChapterType.SELF_DISCIPLINE)
+            hashlib.sha1("|".join(choice_hook.choice_id for choice_hook in user_choices).encode()).hexdigest()[:16]
+        )
+        message_id = hook_outbox.enqueue(
+            TASK_CREATION_TARGET,
+            uid,
+            {
+                "uid": uid,
+                "story_choices": [choice_hook.dict() for choice_hook in user_choices],
+                "chapter_context": chapter_context.value
+            },
+            idempotency_key
         )
+        hook_dispatcher.notify(TASK_CREATION_TARGET)
     
     return {
         "success": True,
+        "accepted": True,
+        "outbox_message_id": message_id,
+        "duplicate": bool(user_choices) and message_id is None,
         "processed_choices": len(user_choices),
-        "generated_tasks": len(tomorrow_tasks),
-        "tomorrow_tasks": tomorrow_tasks,
+        "queued_tasks": queued_tasks,
         "mandala_reflection_scheduled": len(user_choices) > 0,
         "processing_time": datetime.utcnow().isoformat()
     }
 
+@app.get("/integration/outbox/stats")
+async def get_outbox_stats(
+    current_user: dict = Depends(verify_jwt_token)
+):
+    """アウトボックスの滞留数と配送状況"""
+    return {
+        **hook_dispatcher.get_stats(),
+        "pending_task_creations": hook_outbox.pending_count(TASK_CREATION_TARGET),
+        "pending_mandala_reflections": hook_outbox.pending_count(MANDALA_REFLECTION_TARGET),
+        "dead_letters": hook_outbox.dead_letters(limit=20)
+    }
+
+# Outbox Delivery
+async def deliver_task_creation_batch(messages: List[OutboxMessage]) -> Dict[int, str]:
+    """
+    ユーザーごとのタスク作成を1バッチ分まとめて並行に送る
+
+    タスク作成の一括エンドポイントはないので、共有クライアント（接続先ごとの上限つき）で
+    並行に送る。成功したユーザーにはMandala反映を後続メッセージとして積む
+    """
+    results = await asyncio.gather(*[
+        service_integration.deliver_story_choice_tasks(
+            message.payload["uid"],
+            [StoryChoiceHook(**choice) for choice in message.payload["story_choices"]],
+            message.idempotency_key,
+            delivered=hook_outbox.get_progress(message.idempotency_key),
+            on_delivered=functools.partial(hook_outbox.record_progress, message.idempotency_key)
+        )
+        for message in messages
+    ], return_exceptions=True)
+    
+    errors = {}
+    follow_ups = []
+    for message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            errors[message.message_id] = f"{type(result).__name__}: {result}"
+            continue
+        follow_ups.append((
+            MANDALA_REFLECTION_TARGET,
+            message.ordering_key,
+            {**message.payload, "task_ids": [task["task_id"] for task in result]},
+            f"{message.idempotency_key}:mandala"
+        ))
+    # ackより先に積むので同じユーザーの次のメッセージとして順序が保たれ、再試行時は冪等キーで重複しない
+    hook_outbox.enqueue_many(follow_ups)
+    return errors
+
+async def deliver_mandala_reflection_batch(messages: List[OutboxMessage]) -> Dict[int, str]:
+    """ユーザーごとのMandala反映を1バッチ分まとめて並行に送る"""
+    reflections = [
+        MandalaReflectionData(
+            uid=message.payload["uid"],
+            story_choices=[StoryChoiceHook(**choice) for choice in message.payload["story_choices"]],
+            completion_date=datetime.utcnow(),
+            target_date=datetime.utcnow() + timedelta(days=1),
+            chapter_context=ChapterType(message.payload["chapter_context"]),
+            therapeutic_focus=[]
+        )
+        for message in messages
+    ]
+    results = await asyncio.gather(*[
+        service_integration.deliver_mandala_reflection(
+            reflection_data, message.payload.get("task_ids", []), message.idempotency_key
+        )
+        for message, reflection_data in zip(messages, reflections)
+    ], return_exceptions=True)
+    
+    errors = {}
+    for message, reflection_data, result in zip(messages, reflections, results):
+        if isinstance(result, Exception):
+            errors[message.message_id] = f"{type(result).__name__}: {result}"
+            continue
+        integration_db.mandala_reflections.setdefault(reflection_data.uid, []).append(reflection_data)
+    return errors
+
 # Background Tasks
 async def schedule_mandala_reflection(
     uid: str, 
@@ -206,7 +206,7 @@ def test_real_time_hooks():
         # 基本
         assert result["success"] is True
         assert result["processed_choices"] >= 1
-        assert "tomorrow_tasks" in result
+        assert result["accepted"] is True
         
         return True
         
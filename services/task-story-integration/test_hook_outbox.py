@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Real-time Hook Outbox Tests
+
+21:30のリアルタイムフックがアウトボックスに積まれて即座に応答し、ディスパッチャーが
+スタブサービスへタスク作成 → Mandala反映の順に冪等キー付きで配送・再試行することを検証する
+
+Requirements: 1.4, 5.5
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add shared modules to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+import main
+from main import StoryChoiceHook, integration_db, process_real_time_hooks
+from shared.utils.outbox import OutboxDispatcher, SqliteOutbox
+from test_sync_fanout import start_stubs, stop_stubs
+
+CURRENT_USER = {"uid": "test_user_123"}
+
+
+@pytest.fixture
+def fresh_outbox(monkeypatch, tmp_path):
+    """再試行を待たずに済む短いバックオフのアウトボックスに差し替える"""
+    outbox = SqliteOutbox(str(tmp_path / "hook_outbox.db"), base_backoff=0.0)
+    dispatcher = OutboxDispatcher(outbox, batch_size=10)
+    dispatcher.register_handler(main.TASK_CREATION_TARGET, main.deliver_task_creation_batch)
+    dispatcher.register_handler(main.MANDALA_REFLECTION_TARGET, main.deliver_mandala_reflection_batch)
+    monkeypatch.setattr(main, "hook_outbox", outbox)
+    monkeypatch.setattr(main, "hook_dispatcher", dispatcher)
+    monkeypatch.setattr(main, "service_integration", main.ServiceIntegration())
+    monkeypatch.setattr(integration_db, "story_choice_hooks", {})
+    monkeypatch.setattr(integration_db, "mandala_reflections", {})
+    yield outbox, dispatcher
+    outbox.close()
+
+
+def store_choices(uid: str):
+    integration_db.story_choice_hooks[uid] = [
+        StoryChoiceHook(
+            choice_id=f"{uid}_choice_1", choice_text="朝の散歩を続ける", habit_tag="morning_walk",
+            task_template={"task_type": "ROUTINE", "title": "朝の散歩", "difficulty": "EASY"},
+            mandala_impact={"attribute": "RESILIENCE"}
+        ),
+        StoryChoiceHook(choice_id=f"{uid}_choice_2", choice_text="ふりかえるだけ"),
+        StoryChoiceHook(
+            choice_id=f"{uid}_choice_3", choice_text="勇気を出して話しかける", habit_tag="courage_action",
+            task_template={"task_type": "SOCIAL", "title": "同僚に声をかける", "difficulty": "MEDIUM"}
+        ),
+    ]
+
+
+class TestRealTimeHookOutbox:
+
+    @pytest.mark.asyncio
+    async def test_hooks_are_acknowledged_then_delivered_in_order(self, fresh_outbox):
+        outbox, dispatcher = fresh_outbox
+        service, stubs = await start_stubs(service=main.service_integration)
+        try:
+            for i in range(3):
+                store_choices(f"user_{i}")
+            responses = [
+                await process_real_time_hooks({"uid": f"user_{i}", "chapter_context": "courage"}, CURRENT_USER)
+                for i in range(3)
+            ]
+            assert all(response["accepted"] and response["queued_tasks"] == 2 for response in responses)
+            assert stubs["task"].requests == []  # 応答時点では下流を呼ばない
+            assert outbox.pending_count(main.TASK_CREATION_TARGET) == 3
+
+            await dispatcher.drain()
+        finally:
+            await stop_stubs(service, stubs)
+
+        assert outbox.pending_count() == 0
+        assert len(stubs["task"].requests) == 6
+        assert len(stubs["mandala"].requests) == 3
+        # 各ユーザーのMandala反映は、そのユーザーのタスク作成がすべて終わってから送られる
+        for uid in ("user_0", "user_1", "user_2"):
+            tasks_done = max(end for path, _, end in stubs["task"].timeline if f"/{uid}/" in path)
+            (reflect_start,) = [start for path, start, _ in stubs["mandala"].timeline if f"/{uid}/" in path]
+            assert tasks_done <= reflect_start
+        assert sorted(integration_db.mandala_reflections) == ["user_0", "user_1", "user_2"]
+        assert len(set(stubs["task"].idempotency_keys)) == 6
+
+    @pytest.mark.asyncio
+    async def test_duplicate_post_is_ignored(self, fresh_outbox):
+        outbox, _ = fresh_outbox
+        store_choices("user_a")
+        first = await process_real_time_hooks({"uid": "user_a"}, CURRENT_USER)
+        second = await process_real_time_hooks({"uid": "user_a"}, CURRENT_USER)
+
+        assert first["outbox_message_id"] is not None and first["duplicate"] is False
+        assert second["outbox_message_id"] is None and second["duplicate"] is True
+        assert outbox.pending_count() == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_delivery_is_retried_with_the_same_idempotency_keys(self, fresh_outbox):
+        outbox, dispatcher = fresh_outbox
+        service, stubs = await start_stubs(service=main.service_integration)
+        try:
+            store_choices("user_a")
+            await process_real_time_hooks({"uid": "user_a"}, CURRENT_USER)
+            stubs["task"].fail_next = 1
+            await dispatcher.drain()  # 1件目で503、バックオフ0なので同じdrainで再試行される
+        finally:
+            await stop_stubs(service, stubs)
+
+        keys = stubs["task"].idempotency_keys
+        assert keys[0] == keys[1]  # 失敗した作成と再試行は同じキー
+        assert len(set(keys)) == 2
+        assert dispatcher.get_stats()["failed"] == 1
+        assert outbox.pending_count() == 0
+        assert len(stubs["mandala"].requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_skips_choices_already_created(self, fresh_outbox):
+        outbox, dispatcher = fresh_outbox
+        service, stubs = await start_stubs(service=main.service_integration)
+        try:
+            store_choices("user_a")
+            await process_real_time_hooks({"uid": "user_a"}, CURRENT_USER)
+            stubs["task"].fail_requests = {2}  # 1件目は作成済み、2件目で503
+            await dispatcher.drain()
+        finally:
+            await stop_stubs(service, stubs)
+
+        # 下流はキーを見ないので、作成済みの1件目は再試行で送り直さない
+        assert len(stubs["task"].requests) == 3
+        assert stubs["task"].idempotency_keys[1] == stubs["task"].idempotency_keys[2]
+        assert dispatcher.get_stats()["failed"] == 1
+        assert outbox.pending_count() == 0
+        (reflection,) = integration_db.mandala_reflections["user_a"]
+        assert reflection.story_choices[0].choice_id == "user_a_choice_1"
+
+    def test_progress_is_dropped_on_ack(self, tmp_path):
+        outbox = SqliteOutbox(str(tmp_path / "outbox.db"))
+        outbox.enqueue("t", "u1", {}, "key-1")
+        outbox.record_progress("key-1", "choice_1", {"task_id": "task_001"})
+        (message,) = outbox.claim("t", 10)
+
+        assert outbox.get_progress("key-1") == {"choice_1": {"task_id": "task_001"}}
+        outbox.ack([message])
+        assert outbox.get_progress("key-1") == {}
+        outbox.close()
+
+
+class TestHookOutboxLifecycle:
+
+    @pytest.mark.asyncio
+    async def test_outbox_is_opened_on_startup_not_on_import(self, monkeypatch, tmp_path):
+        path = tmp_path / "hook_outbox.db"
+        monkeypatch.setenv("HOOK_OUTBOX_DB", str(path))
+        monkeypatch.setattr(main, "service_integration", main.ServiceIntegration())
+        assert main.hook_outbox is None and main.hook_dispatcher is None
+
+        await main.start_hook_dispatcher()
+        try:
+            assert path.exists()
+            assert main.hook_outbox.path == str(path)
+            assert main.hook_dispatcher.get_stats()["pending"] == 0
+        finally:
+            await main.close_service_clients()
+        assert main.hook_outbox is None and main.hook_dispatcher is None
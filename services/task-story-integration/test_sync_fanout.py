@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Task Completion Sync Fan-out Tests
+
+遅延を注入するローカルのスタブHTTPサーバーに対して、依存関係に沿った並行実行・
+締め切りの配分と部分結果・キープアライブ接続の再利用・接続先ごとの同時接続数を検証する
+
+Requirements: 1.4, 5.5
+"""
+
+import asyncio
+import json
+import sys
+import os
+import time
+
+import pytest
+
+# Add shared modules to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'shared'))
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+
+from main import ServiceIntegration, TaskCompletionHook, SYNC_STEP_DEPENDENCIES
+
+
+class StubService:
+    """パスの一部に応じて遅延とJSON応答を返す、キープアライブ対応の最小HTTP/1.1サーバー"""
+
+    def __init__(self, responses, delay: float = 0.0):
+        self.responses = responses
+        self.delay = delay
+        self.fail_next = 0  # この件数だけ503を返す
+        self.fail_requests = set()  # 何件目（1始まり）のリクエストに503を返すか
+        self.connections = 0
+        self.requests = []
+        self.idempotency_keys = []
+        self.timeline = []  # (path, 受信時刻, 応答時刻)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._handlers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        self.server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                path = request_line.decode().split(" ")[1]
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                    elif name.lower() == "idempotency-key":
+                        self.idempotency_keys.append(value.strip())
+                if length:
+                    await reader.readexactly(length)
+
+                self.requests.append(path)
+                received = time.perf_counter()
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    await asyncio.sleep(self.delay)
+                finally:
+                    self.in_flight -= 1
+                self.timeline.append((path, received, time.perf_counter()))
+
+                status = b"200 OK"
+                body = json.dumps(next(
+                    response for fragment, response in self.responses.items() if fragment in path
+                )).encode()
+                if self.fail_next or len(self.requests) in self.fail_requests:
+                    self.fail_next = max(0, self.fail_next - 1)
+                    status, body = b"503 Service Unavailable", b"{}"
+                writer.write(
+                    b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(body) + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(handler)
+
+
+async def start_stubs(delays=None, per_target_connections: int = 10, service=None):
+    """4つの下流サービスのスタブを起動し、それに向けたServiceIntegrationを返す"""
+    delays = delays or {}
+    stubs = {
+        "task": StubService({"/tasks/": {
+            "task_id": "task_001", "task_type": "SKILL_UP", "title": "英単語を20個覚える",
+            "difficulty": "HARD", "primary_crystal_attribute": "CURIOSITY"
+        }}),
+        "story": StubService({"/ai/story/": {
+            "generated_content": "新しい章が始まる", "next_choices": [], "therapeutic_tags": ["growth"]
+        }}),
+        "mandala": StubService({
+            "/task-completion": {"success": True, "cells_updated": 1},
+            "/reflect-story-choices": {"success": True, "updated_cells": 1}
+        }),
+        "core_game": StubService({
+            "/xp/calculate": {"success": True, "xp_earned": 60},
+            "/resonance/": {"triggered": True, "event_type": "level_resonance"}
+        }),
+    }
+    service = service or ServiceIntegration()
+    service.per_target_connections = per_target_connections
+    for name, stub in stubs.items():
+        stub.delay = delays.get(name, 0.0)
+        await stub.start()
+        setattr(service, f"{name}_service_url", stub.url)
+    return service, stubs
+
+
+async def stop_stubs(service, stubs):
+    await service.aclose()
+    for stub in stubs.values():
+        await stub.stop()
+
+
+def completion_hook(**kwargs) -> TaskCompletionHook:
+    return TaskCompletionHook(task_id="task_001", uid="user_123", completion_data={"mood_score": 4}, **kwargs)
+
+
+class TestSyncFanout:
+    """依存関係に沿った並行実行"""
+
+    @pytest.mark.asyncio
+    async def test_independent_steps_run_concurrently(self):
+        """タスク情報の後の3系統は重なって実行され、共鳴判定だけがXP計算を待つ"""
+        service, stubs = await start_stubs(
+            {"task": 0.3, "story": 0.3, "mandala": 0.3, "core_game": 0.3}
+        )
+        try:
+            result = await service.sync_task_completion_with_story(completion_hook(), deadline_seconds=10.0)
+        finally:
+            await stop_stubs(service, stubs)
+
+        (_, _, task_done), = stubs["task"].timeline
+        (_, story_start, story_done), = stubs["story"].timeline
+        (_, mandala_start, mandala_done), = stubs["mandala"].timeline
+        (xp_path, xp_start, xp_done), (resonance_path, resonance_start, _) = stubs["core_game"].timeline
+        assert "/xp/calculate" in xp_path and "/resonance/" in resonance_path
+        # 逐次実行なら各呼び出しは前の応答の後に始まる
+        assert task_done <= min(story_start, mandala_start, xp_start)
+        assert max(story_start, mandala_start, xp_start) < min(story_done, mandala_done, xp_done)
+        assert resonance_start >= xp_done
+        assert result["partial"] is False
+        assert set(result["step_status"]) == set(SYNC_STEP_DEPENDENCIES)
+        assert all(status["status"] == "ok" for status in result["step_status"].values())
+        assert [item["type"] for item in result["sync_results"]] == [
+            "story_progression", "mandala_update", "xp_calculation",
+            "crystal_growth", "resonance_event", "next_choices"
+        ]
+        assert result["task_info"]["title"] == "英単語を20個覚える"
+        assert result["sync_results"][2]["result"]["xp_earned"] == 60
+
+    @pytest.mark.asyncio
+    async def test_slow_branch_times_out_with_partial_result(self):
+        """遅いストーリー生成だけが締め切りで打ち切られ、代替結果で埋まる"""
+        service, stubs = await start_stubs({"story": 5.0})
+        try:
+            started = time.perf_counter()
+            result = await service.sync_task_completion_with_story(completion_hook(), deadline_seconds=1.5)
+            elapsed = time.perf_counter() - started
+        finally:
+            await stop_stubs(service, stubs)
+
+        assert elapsed < 2.5
+        assert result["success"] is True
+        assert result["partial"] is True
+        story_status = result["step_status"]["story_progression"]
+        assert story_status["status"] == "timeout"
+        assert story_status["budget_ms"] <= 1500
+        story_result = result["sync_results"][0]
+        assert story_result["type"] == "story_progression"
+        assert story_result["result"]["fallback_used"] is True
+        for step in ("task_info", "mandala_update", "xp_calculation", "resonance_event"):
+            assert result["step_status"][step]["status"] == "ok"
+
+    @pytest.mark.asyncio
+    async def test_deadline_is_split_along_the_longest_chain(self):
+        """タスク情報の取得は後続2段を残して締め切りの1/3まで"""
+        service, stubs = await start_stubs({"task": 5.0})
+        try:
+            result = await service.sync_task_completion_with_story(completion_hook(), deadline_seconds=1.5)
+        finally:
+            await stop_stubs(service, stubs)
+
+        task_status = result["step_status"]["task_info"]
+        assert task_status["status"] == "timeout"
+        assert task_status["budget_ms"] == pytest.approx(500, abs=30)
+        assert result["task_info"]["mock"] is True
+        # 代替のタスク情報で後続は締め切り内に完了する
+        assert result["step_status"]["xp_calculation"]["status"] == "ok"
+        assert result["step_status"]["resonance_event"]["status"] == "ok"
+
+    @pytest.mark.asyncio
+    async def test_skipped_steps_are_not_called(self):
+        service, stubs = await start_stubs()
+        try:
+            result = await service.sync_task_completion_with_story(
+                completion_hook(story_progression_trigger=False, mandala_update_trigger=False)
+            )
+        finally:
+            await stop_stubs(service, stubs)
+
+        assert result["step_status"]["story_progression"] == {"status": "skipped"}
+        assert result["step_status"]["mandala_update"] == {"status": "skipped"}
+        assert result["partial"] is False
+        assert stubs["story"].requests == [] and stubs["mandala"].requests == []
+        assert "story_progression" not in [item["type"] for item in result["sync_results"]]
+
+
+class TestPooledClient:
+    """共有クライアントの接続再利用と接続先ごとの同時接続数"""
+
+    @pytest.mark.asyncio
+    async def test_keep_alive_connections_are_reused(self):
+        service, stubs = await start_stubs()
+        try:
+            for _ in range(3):
+                await service.sync_task_completion_with_story(completion_hook())
+        finally:
+            await stop_stubs(service, stubs)
+
+        assert len(stubs["task"].requests) == 3
+        assert stubs["task"].connections == 1
+        # XP計算と共鳴判定は直列なので同じ接続を使い回す
+        assert len(stubs["core_game"].requests) == 6
+        assert stubs["core_game"].connections == 1
+
+    @pytest.mark.asyncio
+    async def test_per_target_connection_limit(self):
+        service, stubs = await start_stubs({"task": 0.05}, per_target_connections=2)
+        try:
+            results = await asyncio.gather(*[
+                service._get_task_info("user_123", f"task_{i}") for i in range(8)
+            ])
+        finally:
+            await stop_stubs(service, stubs)
+
+        assert all("mock" not in result for result in results)
+        assert stubs["task"].max_in_flight == 2
+        assert stubs["task"].connections == 2
@@ -232,9 +232,10 @@ class TestTaskStoryIntegration:
         
         assert result["success"] is True
         assert result["processed_choices"] == 1
-        assert result["generated_tasks"] >= 1
+        assert result["accepted"] is True
+        assert result["queued_tasks"] >= 1
         assert result["mandala_reflection_scheduled"] is True
-        assert "tomorrow_tasks" in result
+        assert "outbox_message_id" in result
     
     def test_integration_status_retrieval(self):
         """?"""
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Therapeutic Safety - Moderation Pipeline Benchmark
+Compares one moderation request per text against the cached, batched pipeline,
+using a local mock /moderations server with a fixed per-request latency.
+
+Usage: python benchmark_moderation_pipeline.py [texts] [duplicate_ratio] [latency_ms]
+"""
+
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from main import ContentModerationEngine, SafetyAnalysisRequest
+from moderation_pipeline import ModerationAPIClient, ModerationPipeline, ModerationResultCache
+
+
+class MockModerationHandler(BaseHTTPRequestHandler):
+    latency_seconds = 0.05
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        time.sleep(self.latency_seconds)
+
+        results = []
+        for text in inputs:
+            flagged = "死" in text
+            results.append({
+                "flagged": flagged,
+                "categories": {"self-harm": flagged},
+                "category_scores": {"self-harm": 0.8 if flagged else 0.01}
+            })
+
+        payload = json.dumps({"results": results}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(latency_ms: float) -> ThreadingHTTPServer:
+    MockModerationHandler.latency_seconds = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockModerationHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_requests(count: int, duplicate_ratio: float):
+    rng = random.Random(42)
+    unique_count = max(1, int(count * (1 - duplicate_ratio)))
+    corpus = [f"今日の成長ノート #{i}: 小さな一歩を踏み出せた。" for i in range(unique_count)]
+    return [
+        SafetyAnalysisRequest(uid=f"user_{i}", content=rng.choice(corpus),
+                              content_type="growth_note", user_context={"recent_mood": 3})
+        for i in range(count)
+    ]
+
+
+async def run_per_text(engine, base_url: str, requests) -> float:
+    """Previous behaviour: one moderation round-trip per text, no cache"""
+    client = ModerationAPIClient(api_key="bench", base_url=base_url, max_concurrency=1)
+    start = time.perf_counter()
+    for request in requests:
+        openai_result = (await client.moderate_batch([request.content]))[0]
+        await engine.analyze_content_safety(request, openai_result)
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed
+
+
+async def run_pipeline(engine, base_url: str, requests, batch_size: int, concurrency: int):
+    client = ModerationAPIClient(api_key="bench", base_url=base_url, max_concurrency=concurrency)
+    pipeline = ModerationPipeline(engine, client=client, cache=ModerationResultCache(),
+                                  batch_size=batch_size)
+
+    async def items():
+        for index, request in enumerate(requests):
+            yield str(index), request
+
+    start = time.perf_counter()
+    first_result_at = None
+    completed = 0
+    async for _ in pipeline.stream(items()):
+        completed += 1
+        if first_result_at is None:
+            first_result_at = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    assert completed == len(requests)
+    return elapsed, first_result_at, pipeline.get_stats()
+
+
+async def main(count: int, duplicate_ratio: float, latency_ms: float):
+    server = start_mock_server(latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    engine = ContentModerationEngine()
+    requests = build_requests(count, duplicate_ratio)
+
+    print(f"texts={count} duplicate_ratio={duplicate_ratio:.0%} mock_latency={latency_ms:.0f}ms")
+
+    per_text = await run_per_text(engine, base_url, requests)
+    print(f"per-text requests : {per_text:8.2f}s  {count / per_text:10.1f} texts/s")
+
+    elapsed, first, stats = await run_pipeline(engine, base_url, requests, batch_size=32, concurrency=4)
+    print(f"batched pipeline  : {elapsed:8.2f}s  {count / elapsed:10.1f} texts/s  "
+          f"first result {first * 1000:.1f}ms  api requests {stats['api_requests_sent']}  "
+          f"cache hit rate {stats['cache']['hit_rate']:.0%}")
+    print(f"speedup           : {per_text / elapsed:8.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    duplicate_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    asyncio.run(main(count, duplicate_ratio, latency_ms))
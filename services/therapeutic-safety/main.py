@@ -8,18 +8,33 @@ import asyncio
 import json
 import logging
 import os
-import re
+import sys
 import time
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from moderation_pipeline import ModerationPipeline
+from shared.utils.safety_matcher import (
+    COGNITIVE_DISTORTION_PATTERNS,
+    SafetyScanResult,
+    get_safety_matcher,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared safety matcher rule kinds scored by ContentModerationEngine
+MODERATION_RULE_KINDS = ("self_harm", "therapeutic")
+
 class SafetyThreatLevel(Enum):
     LOW = "low"
     MEDIUM = "medium"
@@ -64,48 +79,10 @@ class ContentModerationEngine:
     """OpenAI Moderation API?"""
     
     def __init__(self):
-        self.self_harm_patterns = self._initialize_self_harm_patterns()
-        self.therapeutic_keywords = self._initialize_therapeutic_keywords()
         self.f1_target = 0.98
         self.confidence_threshold = 0.02
+        self.matcher = get_safety_matcher()
         
-    def _initialize_self_harm_patterns(self) -> List[Dict[str, Any]]:
-        """自動"""
-        return [
-            {
-                "pattern": r"(?:死|消|い)",
-                "weight": 0.9,
-                "category": "suicidal_ideation"
-            },
-            {
-                "pattern": r"(?:自動|リスト|自動)",
-                "weight": 0.85,
-                "category": "self_harm"
-            },
-            {
-                "pattern": r"(?:も|限|耐).*(?:死|消|終)",
-                "weight": 0.8,
-                "category": "despair_with_harm"
-            },
-            {
-                "pattern": r"(?:誰|み).*(?:嫌|憎|許)",
-                "weight": 0.6,
-                "category": "social_hostility"
-            },
-            {
-                "pattern": r"(?:価|意|無)",
-                "weight": 0.5,
-                "category": "worthlessness"
-            }
-        ]
-    
-    def _initialize_therapeutic_keywords(self) -> List[str]:
-        """治療"""
-        return [
-            "成", "希", "支援", "つ", "理", "共有",
-            "勇", "挑", "学", "発", "創", "表"
-        ]
-    
     async def _check_openai_moderation(self, content: str) -> Dict[str, Any]:
         """OpenAI Moderation APIで"""
         # Mock implementation for testing
@@ -116,22 +93,18 @@ class ContentModerationEngine:
             "category_scores": {"hate": 0.1, "violence": 0.05, "self-harm": 0.8 if flagged else 0.1}
         }
     
-    def _calculate_custom_risk_score(self, content: str) -> float:
+    def _calculate_custom_risk_score(self, content: str,
+                                     scan: Optional[SafetyScanResult] = None) -> float:
         """カスタム"""
-        risk_score = 0.0
+        if scan is None:
+            scan = self.matcher.scan(content, MODERATION_RULE_KINDS)
         
         # 自動
-        for pattern_info in self.self_harm_patterns:
-            pattern = pattern_info["pattern"]
-            weight = pattern_info["weight"]
-            
-            matches = re.findall(pattern, content, re.IGNORECASE)
-            if matches:
-                risk_score += weight * len(matches) * 0.1
+        risk_score = sum(hit.rule.weight * hit.count * 0.1
+                         for hit in scan.by_kind("self_harm"))
         
         # 治療
-        therapeutic_count = sum(1 for keyword in self.therapeutic_keywords 
-                              if keyword in content)
+        therapeutic_count = len(scan.by_kind("therapeutic"))
         risk_reduction = min(0.3, therapeutic_count * 0.05)
         risk_score = max(0.0, risk_score - risk_reduction)
         
@@ -142,7 +115,8 @@ class ContentModerationEngine:
         return min(1.0, risk_score)
     
     def _create_moderation_result(self, openai_result: Dict[str, Any], 
-                                custom_risk_score: float, content: str) -> ModerationResult:
+                                custom_risk_score: float, content: str,
+                                scan: Optional[SafetyScanResult] = None) -> ModerationResult:
         """モデル"""
         openai_flagged = openai_result.get("flagged", True)
         
@@ -162,7 +136,7 @@ class ContentModerationEngine:
                   threat_level in [SafetyThreatLevel.LOW, SafetyThreatLevel.MEDIUM])
         
         # 検証
-        detected_triggers = self._extract_detected_triggers(content, openai_result)
+        detected_triggers = self._extract_detected_triggers(content, openai_result, scan)
         
         # 信頼
         confidence_score = max(custom_risk_score, 
@@ -180,7 +154,8 @@ class ContentModerationEngine:
         )
     
     def _extract_detected_triggers(self, content: str, 
-                                 openai_result: Dict[str, Any]) -> List[str]:
+                                 openai_result: Dict[str, Any],
+                                 scan: Optional[SafetyScanResult] = None) -> List[str]:
         """検証"""
         triggers = []
         
@@ -191,9 +166,9 @@ class ContentModerationEngine:
                 triggers.append(f"openai_{category}")
         
         # カスタム
-        for pattern_info in self.self_harm_patterns:
-            if re.search(pattern_info["pattern"], content, re.IGNORECASE):
-                triggers.append(pattern_info["category"])
+        if scan is None:
+            scan = self.matcher.scan(content, MODERATION_RULE_KINDS)
+        triggers.extend(scan.categories("self_harm"))
         
         return triggers
     
@@ -264,38 +239,47 @@ class ContentModerationEngine:
             analysis_timestamp=datetime.utcnow()
         )
     
-    async def analyze_content_safety(self, request: SafetyAnalysisRequest) -> SafetyAnalysisResult:
+    def moderate_content(self, content: str, openai_result: Dict[str, Any]) -> ModerationResult:
+        """コンテンツのみに依存するモデレーション結果（キャッシュ可能）"""
+        # カスタム
+        scan = self.matcher.scan(content, MODERATION_RULE_KINDS)
+        custom_risk_score = self._calculate_custom_risk_score(content, scan)
+        
+        # 統合判定
+        return self._create_moderation_result(openai_result, custom_risk_score, content, scan)
+    
+    def build_analysis_result(self, request: SafetyAnalysisRequest,
+                              moderation_result: ModerationResult) -> SafetyAnalysisResult:
+        """ユーザー"""
+        # 介入推奨
+        recommended_interventions = self._determine_interventions(
+            moderation_result, request.user_context
+        )
+        
+        # エラー
+        escalation_required = self._check_escalation_needed(
+            moderation_result, request.user_context
+        )
+        
+        return SafetyAnalysisResult(
+            uid=request.uid,
+            content_safe=moderation_result.safe,
+            moderation_result=moderation_result,
+            recommended_interventions=recommended_interventions,
+            escalation_required=escalation_required,
+            analysis_timestamp=datetime.utcnow()
+        )
+    
+    async def analyze_content_safety(self, request: SafetyAnalysisRequest,
+                                     openai_result: Optional[Dict[str, Any]] = None) -> SafetyAnalysisResult:
         """コア"""
         try:
             # OpenAI Moderation API?
-            openai_result = await self._check_openai_moderation(request.content)
+            if openai_result is None:
+                openai_result = await self._check_openai_moderation(request.content)
             
-            # カスタム
-            custom_risk_score = self._calculate_custom_risk_score(request.content)
-            
-            # ?
-            moderation_result = self._create_moderation_result(
-                openai_result, custom_risk_score, request.content
-            )
-            
-            # ?
-            recommended_interventions = self._determine_interventions(
-                moderation_result, request.user_context
-            )
-            
-            # エラー
-            escalation_required = self._check_escalation_needed(
-                moderation_result, request.user_context
-            )
-            
-            return SafetyAnalysisResult(
-                uid=request.uid,
-                content_safe=moderation_result.safe,
-                moderation_result=moderation_result,
-                recommended_interventions=recommended_interventions,
-                escalation_required=escalation_required,
-                analysis_timestamp=datetime.utcnow()
-            )
+            moderation_result = self.moderate_content(request.content, openai_result)
+            return self.build_analysis_result(request, moderation_result)
             
         except Exception as e:
             logger.error(f"Safety analysis failed for user {request.uid}: {e}")
@@ -351,55 +335,13 @@ class CBTInterventionEngine:
         self.cognitive_distortions = self._initialize_cognitive_distortions()
         self.reframing_techniques = self._initialize_reframing_techniques()
         self.story_break_templates = self._initialize_story_break_templates()
+        self.matcher = get_safety_matcher()
         
     def _initialize_cognitive_distortions(self) -> Dict[str, Dict[str, Any]]:
         """?"""
         return {
-            "all_or_nothing": {
-                "name": "?",
-                "patterns": [
-                    r"(?:い|?|?|?|100%)",
-                    r"(?:?|す).*(?:だ|無|?)",
-                    r"(?:一般|?).*(?:な|で)"
-                ],
-                "weight": 0.7
-            },
-            "catastrophizing": {
-                "name": "?",
-                "patterns": [
-                    r"(?:?|?|終|?)",
-                    r"(?:も|?).*(?:だ|終|無)",
-                    r"(?:?|?).*(?:終|?)"
-                ],
-                "weight": 0.8
-            },
-            "personalization": {
-                "name": "?",
-                "patterns": [
-                    r"(?:?|?|自動).*(?:?|?|?)",
-                    r"(?:?|?|自動).*(?:?|?)",
-                    r"(?:?|?).*(?:い|い)"
-                ],
-                "weight": 0.6
-            },
-            "mind_reading": {
-                "name": "?",
-                "patterns": [
-                    r"(?:き|?).*(?:?|?)",
-                    r"(?:み|?).*(?:嫌|?)",
-                    r"(?:?).*(?:?|?)"
-                ],
-                "weight": 0.5
-            },
-            "emotional_reasoning": {
-                "name": "?",
-                "patterns": [
-                    r"(?:?|気分).*(?:だ|の).*(?:?|?)",
-                    r"(?:?|?).*(?:だ|の).*(?:?|だ)",
-                    r"(?:気分|?).*(?:?|?)"
-                ],
-                "weight": 0.6
-            }
+            distortion_type: {**info, "patterns": list(info["patterns"])}
+            for distortion_type, info in COGNITIVE_DISTORTION_PATTERNS.items()
         }
     
     def _initialize_reframing_techniques(self) -> Dict[str, Dict[str, Any]]:
@@ -501,15 +443,15 @@ class CBTInterventionEngine:
         """?"""
         detected_patterns = []
         
+        matches_by_type: Dict[str, List[str]] = {}
+        for hit in self.matcher.scan(content, kinds=("distortion",)).by_kind("distortion"):
+            matches_by_type.setdefault(hit.rule.category, []).extend(hit.matches)
+        
         for distortion_type, distortion_info in self.cognitive_distortions.items():
-            patterns = distortion_info["patterns"]
             weight = distortion_info["weight"]
             name = distortion_info["name"]
             
-            matches = []
-            for pattern in patterns:
-                pattern_matches = re.findall(pattern, content, re.IGNORECASE)
-                matches.extend(pattern_matches)
+            matches = matches_by_type.get(distortion_type, [])
             
             if matches:
                 confidence = min(1.0, len(matches) * weight * 0.2)
@@ -702,20 +644,40 @@ class TherapeuticSafetyService:
     def __init__(self):
         self.content_moderation = ContentModerationEngine()
         self.cbt_intervention = CBTInterventionEngine()
+        self.moderation_pipeline = ModerationPipeline(self.content_moderation)
     
-    async def comprehensive_safety_analysis(self, content: str, 
-                                          user_context: Dict[str, Any]) -> Dict[str, Any]:
-        """?CBT?"""
-        # 1. コア
-        safety_request = SafetyAnalysisRequest(
+    def _build_safety_request(self, content: str, user_context: Dict[str, Any]) -> SafetyAnalysisRequest:
+        return SafetyAnalysisRequest(
             uid=user_context.get("uid", "unknown"),
             content=content,
             content_type="user_input",
             user_context=user_context
         )
+    
+    async def comprehensive_safety_analysis(self, content: str, 
+                                          user_context: Dict[str, Any]) -> Dict[str, Any]:
+        """?CBT?"""
+        # 1. コア
+        safety_request = self._build_safety_request(content, user_context)
+        safety_result = await self.moderation_pipeline.analyze(safety_request)
         
-        safety_result = await self.content_moderation.analyze_content_safety(safety_request)
+        return self._compose_analysis(content, user_context, safety_result)
+    
+    async def comprehensive_safety_analysis_batch(
+        self, items: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Analyze many (content, user_context) pairs with cached, batched moderation"""
+        safety_requests = [self._build_safety_request(content, user_context)
+                           for content, user_context in items]
+        analyzed = await self.moderation_pipeline.analyze_many(safety_requests)
         
+        return [
+            self._compose_analysis(content, user_context, safety_result)
+            for (content, user_context), (safety_result, _) in zip(items, analyzed)
+        ]
+    
+    def _compose_analysis(self, content: str, user_context: Dict[str, Any],
+                          safety_result: SafetyAnalysisResult) -> Dict[str, Any]:
         # 2. CBT?
         cbt_result = self.cbt_intervention.create_cbt_intervention(content, user_context)
         
@@ -751,4 +713,82 @@ class TherapeuticSafetyService:
             return "continue_story"
 
 # Global therapeutic safety service
-therapeutic_safety = TherapeuticSafetyService()
\ No newline at end of file
+therapeutic_safety = TherapeuticSafetyService()
+
+app = FastAPI(title="Therapeutic Safety Service", version="1.0.0")
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "service": "therapeutic-safety"}
+
+def _serialize_bulk_result(bulk_result) -> Dict[str, Any]:
+    result = bulk_result.result
+    return {
+        "id": bulk_result.item_id,
+        "uid": result.uid,
+        "content_safe": result.content_safe,
+        "threat_level": result.moderation_result.threat_level.value,
+        "detected_triggers": result.moderation_result.detected_triggers,
+        "custom_risk_score": result.moderation_result.custom_risk_score,
+        "recommended_interventions": [i.value for i in result.recommended_interventions],
+        "escalation_required": result.escalation_required,
+        "cached": bulk_result.cached
+    }
+
+async def _iter_ndjson_requests(body: bytes, errors: List[Dict[str, str]]
+                                ) -> AsyncIterator[Tuple[str, SafetyAnalysisRequest]]:
+    """Lazily parse an NDJSON body into (id, SafetyAnalysisRequest) pairs.
+
+    Each line is validated on its own: invalid lines are appended to errors as
+    {"id", "error"} records and skipped, so they never drop the lines after them.
+    """
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        item_id = str(line_number)
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict):
+                raise ValueError("each line must be a JSON object")
+            item_id = str(item.get("id", line_number))
+            user_context = item.get("user_context", {})
+            if not isinstance(user_context, dict):
+                raise ValueError("user_context must be a JSON object")
+            if not isinstance(item.get("content"), str):
+                raise ValueError("content must be a string")
+            request = SafetyAnalysisRequest(
+                uid=str(item.get("uid", user_context.get("uid", "unknown"))),
+                content=item["content"],
+                content_type=item.get("content_type", "user_input"),
+                user_context=user_context
+            )
+        except ValueError as e:
+            errors.append({"id": item_id, "error": f"Invalid NDJSON line {line_number}: {e}"})
+            continue
+        yield item_id, request
+
+@app.post("/safety/moderate/bulk")
+async def moderate_bulk(request: Request):
+    """NDJSON in, NDJSON out: one {"id", "uid", "content", "user_context"} object per line,
+    results streamed back in completion order; invalid lines come back as {"id", "error"}"""
+    # The body is read up front: the streaming response listens for client
+    # disconnects on the same receive channel it would be read from
+    body = await request.body()
+    
+    async def generate():
+        errors: List[Dict[str, str]] = []
+        async for bulk_result in therapeutic_safety.moderation_pipeline.stream(
+            _iter_ndjson_requests(body, errors)
+        ):
+            while errors:
+                yield json.dumps(errors.pop(0), ensure_ascii=False) + "\n"
+            yield json.dumps(_serialize_bulk_result(bulk_result), ensure_ascii=False) + "\n"
+        for error in errors:
+            yield json.dumps(error, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/safety/moderate/stats")
+async def moderation_stats():
+    """Moderation pipeline cache and batching statistics"""
+    return therapeutic_safety.moderation_pipeline.get_stats()
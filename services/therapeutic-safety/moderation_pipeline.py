@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Therapeutic Safety - Batched Moderation Pipeline
+Content-hash result cache, batched moderation API submission and streaming bulk analysis
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Optional httpx import for external API calls
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content: str) -> str:
+    """Stable cache key for a piece of content"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ModerationResultCache:
+    """LRU cache of content-only moderation results keyed by content hash, with TTL"""
+
+    def __init__(self, ttl_seconds: float = 3600.0, max_entries: int = 50000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content: str) -> Optional[Any]:
+        key = content_hash(content)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, content: str, value: Any) -> None:
+        key = content_hash(content)
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries
+        }
+
+
+class ModerationAPIClient:
+    """
+    Batched client for an OpenAI-compatible /moderations endpoint.
+
+    One request carries up to batch_size inputs and a semaphore bounds the number
+    of requests in flight. Without an API key (or httpx) each text is scored by
+    the local fallback, matching ContentModerationEngine._check_openai_moderation.
+    """
+
+    def __init__(self, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 model: str = "omni-moderation-latest",
+                 max_concurrency: int = 4,
+                 timeout: float = 10.0,
+                 fallback: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None):
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_MODERATION_URL", "https://api.openai.com/v1")
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.fallback = fallback
+        self.requests_sent = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    @property
+    def uses_remote_api(self) -> bool:
+        return bool(self.api_key) and HTTPX_AVAILABLE
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        return self._client
+
+    async def moderate_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Moderate several texts with a single API request"""
+        if not texts:
+            return []
+
+        async with self._semaphore:
+            self.requests_sent += 1
+
+            if not self.uses_remote_api:
+                if self.fallback is None:
+                    raise RuntimeError("No moderation API key configured and no fallback provided")
+                return list(await asyncio.gather(*(self.fallback(text) for text in texts)))
+
+            response = await self._get_client().post(
+                f"{self.base_url}/moderations",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={"model": self.model, "input": texts}
+            )
+            response.raise_for_status()
+            results = response.json()["results"]
+
+        if len(results) != len(texts):
+            raise ValueError(f"Moderation API returned {len(results)} results for {len(texts)} inputs")
+
+        return [
+            {
+                "flagged": result.get("flagged", True),
+                "categories": result.get("categories", {}),
+                "category_scores": result.get("category_scores", {})
+            }
+            for result in results
+        ]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+@dataclass
+class BulkModerationResult:
+    item_id: str
+    result: Any  # SafetyAnalysisResult
+    cached: bool
+
+
+_STREAM_DONE = object()
+
+
+class ModerationPipeline:
+    """
+    Cached, batched front end for ContentModerationEngine.
+
+    Content-only moderation (API verdict plus custom risk score) is cached by
+    content hash; per-user interventions and escalation are recomputed from the
+    request's user_context on every call, so cached results never leak context
+    between users.
+    """
+
+    def __init__(self, engine, client: Optional[ModerationAPIClient] = None,
+                 cache: Optional[ModerationResultCache] = None,
+                 batch_size: int = 32, max_concurrency: int = 4,
+                 batch_linger_seconds: float = 0.02):
+        self.engine = engine
+        self.client = client if client is not None else ModerationAPIClient(
+            max_concurrency=max_concurrency,
+            fallback=engine._check_openai_moderation
+        )
+        self.cache = cache if cache is not None else ModerationResultCache()
+        self.batch_size = batch_size
+        self.max_in_flight_batches = max(1, self.client.max_concurrency) * 2
+        self.batch_linger_seconds = batch_linger_seconds
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _moderate_contents(self, contents: List[str]) -> Dict[str, Any]:
+        """
+        Moderate uncached contents, returning ModerationResults keyed by content.
+
+        Contents already submitted by a concurrent call are awaited rather than
+        sent again; contents whose batch or engine moderation failed are left out
+        of the result (and not cached), so callers fall back to the failsafe verdict.
+        """
+        loop = asyncio.get_running_loop()
+        results: Dict[str, Any] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        submitted: Dict[str, asyncio.Future] = {}
+        for content in dict.fromkeys(contents):
+            if content in self._in_flight:
+                waiting[content] = self._in_flight[content]
+            else:
+                submitted[content] = self._in_flight[content] = loop.create_future()
+
+        distinct = list(submitted)
+        chunks = [distinct[i:i + self.batch_size] for i in range(0, len(distinct), self.batch_size)]
+        try:
+            batch_results = await asyncio.gather(
+                *(self.client.moderate_batch(chunk) for chunk in chunks),
+                return_exceptions=True
+            )
+
+            for chunk, api_results in zip(chunks, batch_results):
+                if isinstance(api_results, Exception):
+                    logger.error(f"Moderation batch of {len(chunk)} failed: {api_results}")
+                    continue
+                for content, api_result in zip(chunk, api_results):
+                    try:
+                        moderation_result = self.engine.moderate_content(content, api_result)
+                    except Exception as e:
+                        logger.error(f"Content moderation failed: {e}")
+                        continue
+                    self.cache.put(content, moderation_result)
+                    results[content] = moderation_result
+        finally:
+            for content, future in submitted.items():
+                self._in_flight.pop(content, None)
+                if not future.done():
+                    future.set_result(results.get(content))
+
+        for content, future in waiting.items():
+            moderation_result = await future
+            if moderation_result is not None:
+                results[content] = moderation_result
+
+        return results
+
+    async def analyze_many(self, requests: List[Any]) -> List[Tuple[Any, bool]]:
+        """Analyze requests in order, returning (SafetyAnalysisResult, cached) pairs"""
+        cached: Dict[str, Any] = {}
+        misses: Dict[str, None] = {}
+        for request in requests:
+            if request.content in cached or request.content in misses:
+                continue
+            hit = self.cache.get(request.content)
+            if hit is not None:
+                cached[request.content] = hit
+            else:
+                misses[request.content] = None
+
+        fresh = await self._moderate_contents(list(misses))
+
+        analyzed = []
+        for request in requests:
+            is_cached = request.content in cached
+            moderation_result = cached[request.content] if is_cached else fresh.get(request.content)
+            if moderation_result is None:
+                analyzed.append((self.engine._create_failsafe_result(request.uid), False))
+                continue
+            try:
+                analyzed.append((self.engine.build_analysis_result(request, moderation_result), is_cached))
+            except Exception as e:
+                # As in analyze_content_safety, a failure only affects its own item
+                logger.error(f"Safety analysis failed for user {request.uid}: {e}")
+                analyzed.append((self.engine._create_failsafe_result(request.uid), False))
+        return analyzed
+
+    async def analyze(self, request: Any) -> Any:
+        """Cache-aware single-request analysis"""
+        result, _ = (await self.analyze_many([request]))[0]
+        return result
+
+    async def stream(self, items: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[BulkModerationResult]:
+        """
+        Analyze (item_id, request) pairs as they arrive, yielding results as they complete.
+
+        Cache hits are yielded immediately. Misses are grouped into batches that
+        are submitted when full or after batch_linger_seconds, with at most
+        max_in_flight_batches outstanding so a fast producer cannot run ahead
+        of the moderation API.
+        """
+        loop = asyncio.get_running_loop()
+        output: asyncio.Queue = asyncio.Queue()
+        pending: List[Tuple[str, Any]] = []
+        in_flight: Set[asyncio.Task] = set()
+        linger_handle: List[Optional[asyncio.TimerHandle]] = [None]
+
+        async def run_batch(batch: List[Tuple[str, Any]]) -> None:
+            try:
+                analyzed = await self.analyze_many([request for _, request in batch])
+            except Exception as e:
+                logger.error(f"Streaming moderation batch failed: {e}")
+                analyzed = [(self.engine._create_failsafe_result(request.uid), False)
+                            for _, request in batch]
+            for (item_id, _), (result, cached) in zip(batch, analyzed):
+                output.put_nowait(BulkModerationResult(item_id=item_id, result=result, cached=cached))
+
+        def flush() -> None:
+            if linger_handle[0] is not None:
+                linger_handle[0].cancel()
+                linger_handle[0] = None
+            if not pending:
+                return
+            batch = pending[:]
+            pending.clear()
+            task = loop.create_task(run_batch(batch))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        async def feed() -> None:
+            try:
+                async for item_id, request in items:
+                    hit = self.cache.get(request.content)
+                    if hit is not None:
+                        result = self.engine.build_analysis_result(request, hit)
+                        output.put_nowait(BulkModerationResult(item_id=item_id, result=result, cached=True))
+                        continue
+
+                    while len(in_flight) >= self.max_in_flight_batches:
+                        await asyncio.wait(set(in_flight), return_when=asyncio.FIRST_COMPLETED)
+
+                    pending.append((item_id, request))
+                    if len(pending) >= self.batch_size:
+                        flush()
+                    elif len(pending) == 1:
+                        linger_handle[0] = loop.call_later(self.batch_linger_seconds, flush)
+
+                flush()
+                while in_flight:
+                    await asyncio.gather(*list(in_flight))
+            finally:
+                output.put_nowait(_STREAM_DONE)
+
+        feeder = loop.create_task(feed())
+        try:
+            while True:
+                item = await output.get()
+                if item is _STREAM_DONE:
+                    break
+                yield item
+            await feeder
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+            if linger_handle[0] is not None:
+                linger_handle[0].cancel()
+            for task in list(in_flight):
+                task.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.get_stats(),
+            "batch_size": self.batch_size,
+            "max_concurrency": self.client.max_concurrency,
+            "api_requests_sent": self.client.requests_sent,
+            "remote_api": self.client.uses_remote_api
+        }
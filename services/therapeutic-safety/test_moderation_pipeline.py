@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Therapeutic Safety - Moderation Pipeline Tests
+Content-hash cache, batched submission and streaming bulk analysis
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from main import ContentModerationEngine, SafetyAnalysisRequest, TherapeuticSafetyService, app
+from moderation_pipeline import ModerationPipeline, ModerationResultCache
+
+
+class FakeModerationClient:
+    """Records every batch and answers like the mock OpenAI moderation check"""
+
+    def __init__(self, max_concurrency: int = 2, delay: float = 0.01):
+        self.max_concurrency = max_concurrency
+        self.delay = delay
+        self.batches = []
+        self.requests_sent = 0
+        self.uses_remote_api = False
+        self.active = 0
+        self.peak_active = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def moderate_batch(self, texts):
+        async with self._semaphore:
+            self.requests_sent += 1
+            self.batches.append(list(texts))
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            await asyncio.sleep(self.delay)
+            self.active -= 1
+        return [
+            {
+                "flagged": "死" in text,
+                "categories": {"self-harm": "死" in text},
+                "category_scores": {"self-harm": 0.8 if "死" in text else 0.1}
+            }
+            for text in texts
+        ]
+
+
+def make_request(uid: str, content: str, mood: int = 3) -> SafetyAnalysisRequest:
+    return SafetyAnalysisRequest(uid=uid, content=content, content_type="growth_note",
+                                 user_context={"recent_mood": mood})
+
+
+class TestModerationResultCache:
+    """Content-hash TTL cache"""
+
+    def test_hit_and_ttl_expiry(self):
+        now = [0.0]
+        cache = ModerationResultCache(ttl_seconds=10, clock=lambda: now[0])
+
+        cache.put("今日も頑張った", "result")
+        assert cache.get("今日も頑張った") == "result"
+
+        now[0] = 10.0
+        assert cache.get("今日も頑張った") is None
+        assert len(cache) == 0
+        assert cache.get_stats()["hits"] == 1
+
+    def test_lru_eviction(self):
+        cache = ModerationResultCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+
+class TestModerationPipeline:
+    """Batched, cached moderation"""
+
+    def setup_method(self):
+        self.engine = ContentModerationEngine()
+        self.client = FakeModerationClient(max_concurrency=2)
+        self.pipeline = ModerationPipeline(self.engine, client=self.client, batch_size=4)
+
+    @pytest.mark.asyncio
+    async def test_matches_unbatched_analysis(self):
+        requests = [make_request(f"u{i}", text) for i, text in enumerate(
+            ["希望が見えてきた", "もう消えたい", "誰も許さない", "今日も散歩できた"]
+        )]
+
+        analyzed = await self.pipeline.analyze_many(requests)
+
+        for request, (result, cached) in zip(requests, analyzed):
+            expected = await self.engine.analyze_content_safety(request)
+            assert not cached
+            assert result.uid == request.uid
+            assert result.content_safe == expected.content_safe
+            assert result.moderation_result.threat_level == expected.moderation_result.threat_level
+            assert result.moderation_result.custom_risk_score == expected.moderation_result.custom_risk_score
+            assert result.escalation_required == expected.escalation_required
+
+    @pytest.mark.asyncio
+    async def test_batches_and_bounds_concurrency(self):
+        requests = [make_request(f"u{i}", f"成長ノート {i}") for i in range(20)]
+
+        await self.pipeline.analyze_many(requests)
+
+        assert [len(batch) for batch in self.client.batches] == [4, 4, 4, 4, 4]
+        assert self.client.peak_active <= 2
+
+    @pytest.mark.asyncio
+    async def test_cache_reused_with_per_user_context(self):
+        await self.pipeline.analyze_many([make_request("u1", "もう消えたい", mood=4)])
+        analyzed = await self.pipeline.analyze_many([
+            make_request("u2", "もう消えたい", mood=1),
+            make_request("u3", "もう消えたい", mood=1)
+        ])
+
+        assert len(self.client.batches) == 1
+        assert all(cached for _, cached in analyzed)
+        assert [result.uid for result, _ in analyzed] == ["u2", "u3"]
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_failsafe_and_not_cached(self):
+        async def failing_batch(texts):
+            raise RuntimeError("moderation API unavailable")
+
+        self.client.moderate_batch = failing_batch
+
+        (result, cached), = await self.pipeline.analyze_many([make_request("u1", "今日は良い日")])
+
+        assert not result.content_safe
+        assert result.escalation_required
+        assert not cached
+        assert len(self.pipeline.cache) == 0
+
+    @pytest.mark.asyncio
+    async def test_engine_error_only_fails_its_own_item(self):
+        original = self.pipeline.engine.moderate_content
+
+        def flaky_moderate_content(content, api_result):
+            if content == "壊れた入力":
+                raise ValueError("unexpected input")
+            return original(content, api_result)
+
+        self.pipeline.engine.moderate_content = flaky_moderate_content
+        requests = [make_request("u1", "今日は良い日"), make_request("u2", "壊れた入力")]
+
+        (good, _), (bad, _) = await self.pipeline.analyze_many(requests)
+
+        assert "system_error" not in good.moderation_result.detected_triggers
+        assert bad.moderation_result.detected_triggers == ["system_error"]
+        assert len(self.pipeline.cache) == 1
+
+        async def items():
+            for i, request in enumerate(requests * 2):
+                yield str(i), request
+
+        results = {r.item_id: r.result async for r in self.pipeline.stream(items())}
+        assert sorted(results) == ["0", "1", "2", "3"]
+        assert [results[i].moderation_result.detected_triggers == ["system_error"] for i in "0123"] == \
+            [False, True, False, True]
+
+    @pytest.mark.asyncio
+    async def test_stream_yields_every_item(self):
+        async def items():
+            for i in range(10):
+                yield str(i), make_request(f"u{i}", f"ノート {i % 6}")
+
+        results = [item async for item in self.pipeline.stream(items())]
+
+        assert sorted(int(r.item_id) for r in results) == list(range(10))
+        assert sum(len(batch) for batch in self.client.batches) == 6
+
+    @pytest.mark.asyncio
+    async def test_stream_flushes_partial_batch_after_linger(self):
+        self.pipeline.batch_linger_seconds = 0.01
+        release = asyncio.Event()
+
+        async def items():
+            yield "first", make_request("u1", "ゆっくり休めた")
+            await release.wait()
+
+        stream = self.pipeline.stream(items())
+        first = await asyncio.wait_for(stream.__anext__(), timeout=1.0)
+        release.set()
+
+        assert first.item_id == "first"
+        assert [item async for item in stream] == []
+
+
+class TestBulkEndpoint:
+    """NDJSON bulk moderation endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_ndjson_round_trip(self):
+        import httpx
+
+        body = "\n".join(json.dumps({"id": f"n{i}", "uid": f"u{i}", "content": text}, ensure_ascii=False)
+                         for i, text in enumerate(["希望がある", "もう消えたい", "希望がある"]))
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/safety/moderate/bulk", content=body.encode("utf-8"))
+
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(line["id"] for line in lines) == ["n0", "n1", "n2"]
+        by_id = {line["id"]: line for line in lines}
+        assert by_id["n1"]["escalation_required"]
+        assert by_id["n0"]["content_safe"] == by_id["n2"]["content_safe"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_lines_are_reported_per_line(self):
+        import httpx
+
+        body = "\n".join([
+            json.dumps({"id": "ok1", "uid": "u1", "content": "希望がある"}, ensure_ascii=False),
+            "[1]",
+            '"x"',
+            "{not json",
+            json.dumps({"id": "no_content", "uid": "u2"}),
+            json.dumps({"id": "bad_context", "content": "a", "user_context": "u3"}),
+            json.dumps({"id": "ok2", "uid": "u4", "content": "もう消えたい"}, ensure_ascii=False),
+        ])
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/safety/moderate/bulk", content=body.encode("utf-8"))
+
+        assert response.status_code == 200
+        by_id = {line["id"]: line for line in map(json.loads, response.text.splitlines())}
+        assert sorted(by_id) == ["2", "3", "4", "bad_context", "no_content", "ok1", "ok2"]
+        for item_id in ["2", "3", "4", "bad_context", "no_content"]:
+            assert set(by_id[item_id]) == {"id", "error"}
+        assert "JSON object" in by_id["2"]["error"]
+        assert by_id["ok2"]["escalation_required"]
+        assert "error" not in by_id["ok1"]
+
+
+class TestServiceBatchAnalysis:
+    """TherapeuticSafetyService batch entry point"""
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_single_analysis(self):
+        service = TherapeuticSafetyService()
+        items = [("今日は挑戦できた", {"uid": "u1"}), ("もう消えたい", {"uid": "u2", "recent_mood": 1})]
+
+        batch = await service.comprehensive_safety_analysis_batch(items)
+        single = [await TherapeuticSafetyService().comprehensive_safety_analysis(c, ctx) for c, ctx in items]
+
+        assert [b["safety_analysis"] for b in batch] == [s["safety_analysis"] for s in single]
+        assert [b["recommended_action"] for b in batch] == [s["recommended_action"] for s in single]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
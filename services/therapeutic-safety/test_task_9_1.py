@@ -30,20 +30,20 @@ class TestContentModerationEngine:
     
     def test_initialize_self_harm_patterns(self):
         """自動"""
-        patterns = self.engine.self_harm_patterns
+        patterns = [rule for rule in self.engine.matcher.rules if rule.kind == "self_harm"]
         
         assert len(patterns) >= 5
-        assert all("pattern" in p and "weight" in p and "category" in p for p in patterns)
+        assert all(p.pattern and p.weight and p.category for p in patterns)
         
         # ?
-        categories = [p["category"] for p in patterns]
+        categories = [p.category for p in patterns]
         assert "suicidal_ideation" in categories
         assert "self_harm" in categories
         assert "despair_with_harm" in categories
     
     def test_initialize_therapeutic_keywords(self):
         """治療"""
-        keywords = self.engine.therapeutic_keywords
+        keywords = [rule.pattern for rule in self.engine.matcher.rules if rule.kind == "therapeutic"]
         
         assert len(keywords) >= 10
         assert "成" in keywords
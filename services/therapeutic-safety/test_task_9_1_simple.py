@@ -27,12 +27,12 @@ def test_content_moderation_basic():
         print("? ContentModerationEngine?")
         
         # 自動
-        patterns = engine.self_harm_patterns
+        patterns = [rule for rule in engine.matcher.rules if rule.kind == "self_harm"]
         assert len(patterns) >= 5, "自動"
         print(f"? 自動: {len(patterns)}?")
         
         # 治療
-        keywords = engine.therapeutic_keywords
+        keywords = [rule.pattern for rule in engine.matcher.rules if rule.kind == "therapeutic"]
         assert len(keywords) >= 10, "治療"
         print(f"? 治療: {len(keywords)}?")
         
@@ -5,12 +5,16 @@ Mood System Interface
 Requirements: 5.4
 """
 
-from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Any, Tuple, Iterator, Sequence
+from datetime import datetime, timedelta, date, timezone
 from enum import Enum
 from pydantic import BaseModel, Field
+import csv
+import io
 import uuid
 
+import numpy as np
+
 
 class MoodLevel(int, Enum):
     """気分レベル（1-5スケール）"""
@@ -106,14 +110,110 @@ class MoodInsight(BaseModel):
     related_data: Dict[str, Any] = {}
 
 
+CATEGORY_ORDER: List[MoodCategory] = list(MoodCategory)
+TRIGGER_BITS: Dict[MoodTrigger, int] = {trigger: 1 << i for i, trigger in enumerate(MoodTrigger)}
+
+MOOD_EXPORT_FIELDS: List[str] = (
+    ["entry_id", "log_date", "mood_score", "calculated_coefficient"]
+    + [f"{category.value}_score" for category in CATEGORY_ORDER]
+    + ["triggers", "context_tags", "notes"]
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(value: datetime) -> float:
+    """UTCのナイーブ日時として秒に変換（タイムゾーン付きはUTCに揃える）"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+def _day_start(value: date) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+class MoodSeries:
+    """
+    1ユーザー分の気分時系列
+
+    時刻・気分スコア・カテゴリ別スコア（0は未入力）・トリガーのビットマスクを
+    時刻昇順の列指向配列で持ち、容量は倍々で確保する。通常の記録は末尾追記、
+    過去日時の記録のみ挿入位置を二分探索して後ろをずらす。期間の検索は
+    searchsorted で O(log n)、分析は配列スライス（コピーなし）に対して行う。
+    """
+
+    __slots__ = ("size", "timestamps", "scores", "categories", "triggers", "entries")
+
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.scores = np.empty(capacity, dtype=np.int8)
+        self.categories = np.zeros((capacity, len(CATEGORY_ORDER)), dtype=np.int8)
+        self.triggers = np.zeros(capacity, dtype=np.uint16)
+        self.entries: List[MoodEntry] = []
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, entry: MoodEntry) -> int:
+        """エントリを時刻順の位置に追加（位置を返す）"""
+        timestamp = _epoch_seconds(entry.log_date)
+        size = self.size
+        if size == self.timestamps.shape[0]:
+            self._grow()
+
+        if size == 0 or timestamp >= self.timestamps[size - 1]:
+            index = size
+        else:
+            index = int(np.searchsorted(self.timestamps[:size], timestamp, side="right"))
+            for column in (self.timestamps, self.scores, self.categories, self.triggers):
+                column[index + 1:size + 1] = column[index:size]
+
+        self.timestamps[index] = timestamp
+        self.scores[index] = entry.mood_score.value
+        self.categories[index] = [
+            entry.category_scores[category].value if category in entry.category_scores else 0
+            for category in CATEGORY_ORDER
+        ]
+        mask = 0
+        for trigger in entry.triggers:
+            mask |= TRIGGER_BITS[trigger]
+        self.triggers[index] = mask
+        self.entries.insert(index, entry)
+        self.size = size + 1
+        return index
+
+    def _grow(self):
+        capacity = self.timestamps.shape[0] * 2
+        size = self.size
+        for name in ("timestamps", "scores", "categories", "triggers"):
+            column = getattr(self, name)
+            grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:size] = column[:size]
+            setattr(self, name, grown)
+
+    def span(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[int, int]:
+        """start以上・end未満のエントリの位置範囲 [lo, hi)"""
+        timestamps = self.timestamps[:self.size]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, _epoch_seconds(start), side="left"))
+        hi = self.size if end is None else int(np.searchsorted(timestamps, _epoch_seconds(end), side="left"))
+        return lo, max(lo, hi)
+
+
 class MoodTrackingSystem:
     """気分追跡システム"""
     
     def __init__(self):
         # 実際の実装ではFirestoreを使用
-        self.mood_entries: Dict[str, List[MoodEntry]] = {}  # uid -> entries
+        self.mood_series: Dict[str, MoodSeries] = {}       # uid -> 時刻順の時系列
         self.mood_cache: Dict[str, Dict[str, float]] = {}   # uid -> date -> coefficient
     
+    @property
+    def mood_entries(self) -> Dict[str, List[MoodEntry]]:
+        """uid -> 時刻順のエントリ（読み取り用）"""
+        return {uid: series.entries for uid, series in self.mood_series.items()}
+    
     def log_mood(
         self,
         uid: str,
@@ -121,12 +221,14 @@ class MoodTrackingSystem:
         category_scores: Optional[Dict[MoodCategory, MoodLevel]] = None,
         notes: str = "",
         context_tags: List[str] = None,
-        triggers: List[MoodTrigger] = None
+        triggers: List[MoodTrigger] = None,
+        log_date: Optional[datetime] = None
     ) -> MoodEntry:
-        """気分ログ記録"""
+        """気分ログ記録（log_date 指定時は過去分の取り込み）"""
         try:
             entry = MoodEntry(
                 uid=uid,
+                log_date=log_date or datetime.utcnow(),
                 mood_score=mood_score,
                 category_scores=category_scores or {},
                 notes=notes,
@@ -135,10 +237,10 @@ class MoodTrackingSystem:
             )
             
             # ストレージに保存
-            if uid not in self.mood_entries:
-                self.mood_entries[uid] = []
+            if uid not in self.mood_series:
+                self.mood_series[uid] = MoodSeries()
             
-            self.mood_entries[uid].append(entry)
+            self.mood_series[uid].add(entry)
             
             # キャッシュ更新
             self._update_coefficient_cache(uid, entry)
@@ -160,16 +262,13 @@ class MoodTrackingSystem:
             return self.mood_cache[uid][date_str]
         
         # 当日のエントリを検索
-        if uid in self.mood_entries:
-            today_entries = [
-                entry for entry in self.mood_entries[uid]
-                if entry.log_date.date() == target_date
-            ]
-            
-            if today_entries:
+        series = self.mood_series.get(uid)
+        if series is not None:
+            day_start = _day_start(target_date)
+            lo, hi = series.span(day_start, day_start + timedelta(days=1))
+            if hi > lo:
                 # 最新のエントリを使用
-                latest_entry = max(today_entries, key=lambda e: e.log_date)
-                return latest_entry.calculated_coefficient
+                return series.entries[hi - 1].calculated_coefficient
         
         # デフォルト係数（普通の気分）
         return 1.0
@@ -180,15 +279,21 @@ class MoodTrackingSystem:
         days: int = 30
     ) -> List[MoodEntry]:
         """気分履歴取得"""
-        if uid not in self.mood_entries:
+        series = self.mood_series.get(uid)
+        if series is None:
             return []
         
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        lo, hi = series.span(datetime.utcnow() - timedelta(days=days))
+        return series.entries[lo:hi]
+    
+    def get_mood_entries_between(self, uid: str, start_date: date, end_date: date) -> List[MoodEntry]:
+        """期間内（両端の日を含む）のエントリを時刻順に取得"""
+        series = self.mood_series.get(uid)
+        if series is None:
+            return []
         
-        return [
-            entry for entry in self.mood_entries[uid]
-            if entry.log_date >= cutoff_date
-        ]
+        lo, hi = series.span(_day_start(start_date), _day_start(end_date) + timedelta(days=1))
+        return series.entries[lo:hi]
     
     def analyze_mood_trends(
         self,
@@ -196,9 +301,10 @@ class MoodTrackingSystem:
         days: int = 30
     ) -> MoodAnalysis:
         """気分トレンド分析"""
-        history = self.get_mood_history(uid, days)
+        series = self.mood_series.get(uid)
+        lo, hi = series.span(datetime.utcnow() - timedelta(days=days)) if series is not None else (0, 0)
         
-        if not history:
+        if hi == lo:
             return MoodAnalysis(
                 uid=uid,
                 analysis_period=days,
@@ -209,9 +315,9 @@ class MoodTrackingSystem:
                 improvement_rate=0.0
             )
         
-        # 基本統計
-        mood_scores = [entry.mood_score.value for entry in history]
-        average_mood = sum(mood_scores) / len(mood_scores)
+        # 基本統計（配列スライスに対して計算）
+        mood_scores = series.scores[lo:hi].astype(np.float64)
+        average_mood = float(mood_scores.mean())
         
         # トレンド計算
         trend, trend_strength = self._calculate_trend(mood_scores)
@@ -223,10 +329,10 @@ class MoodTrackingSystem:
         improvement_rate = self._calculate_improvement_rate(mood_scores, days)
         
         # カテゴリ別分析
-        category_analysis = self._analyze_categories(history)
+        category_analysis = self._analyze_categories(series.categories[lo:hi])
         
         # トリガー効果分析
-        trigger_effectiveness = self._analyze_triggers(history)
+        trigger_effectiveness = self._analyze_triggers(series.triggers[lo:hi], mood_scores)
         
         # 推奨事項生成
         recommendations = self._generate_recommendations(
@@ -313,28 +419,87 @@ class MoodTrackingSystem:
         
         return insights
     
+    def count_mood_entries(self, uid: str, start_date: date, end_date: date) -> int:
+        """期間内（両端の日を含む）のエントリ数"""
+        series = self.mood_series.get(uid)
+        if series is None:
+            return 0
+        
+        lo, hi = series.span(_day_start(start_date), _day_start(end_date) + timedelta(days=1))
+        return hi - lo
+    
+    def iter_mood_export(self, uid: str, start_date: date, end_date: date) -> Iterator[Dict[str, Any]]:
+        """エクスポート行（MOOD_EXPORT_FIELDS の列）を1件ずつ生成"""
+        for entry in self.get_mood_entries_between(uid, start_date, end_date):
+            row = {
+                "entry_id": entry.entry_id,
+                "log_date": entry.log_date.isoformat(),
+                "mood_score": entry.mood_score.value,
+                "calculated_coefficient": entry.calculated_coefficient,
+            }
+            for category in CATEGORY_ORDER:
+                score = entry.category_scores.get(category)
+                row[f"{category.value}_score"] = score.value if score is not None else None
+            row["triggers"] = ";".join(trigger.value for trigger in entry.triggers)
+            row["context_tags"] = ";".join(entry.context_tags)
+            row["notes"] = entry.notes
+            yield row
+    
+    def export_mood_data(self, uid: str, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """期間内のエクスポート行をまとめて取得（JSON用）"""
+        return list(self.iter_mood_export(uid, start_date, end_date))
+    
+    def iter_mood_export_csv(
+        self,
+        uid: str,
+        start_date: date,
+        end_date: date,
+        chunk_rows: int = 500
+    ) -> Iterator[bytes]:
+        """
+        CSVエクスポートをchunk_rows行ごとのUTF-8チャンクで生成
+        
+        保持するのは1チャンク分のバッファのみで、全体を文字列にはしない。
+        """
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=MOOD_EXPORT_FIELDS)
+        writer.writeheader()
+        pending = 0
+        
+        for row in self.iter_mood_export(uid, start_date, end_date):
+            writer.writerow(row)
+            pending += 1
+            if pending >= chunk_rows:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+                pending = 0
+        
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+    
     # プライベートメソッド
     
     def _update_coefficient_cache(self, uid: str, entry: MoodEntry):
-        """係数キャッシュ更新"""
+        """係数キャッシュ更新（過去分の取り込みでもその日の最新エントリの係数を保持）"""
         if uid not in self.mood_cache:
             self.mood_cache[uid] = {}
         
-        date_str = entry.log_date.date().isoformat()
-        self.mood_cache[uid][date_str] = entry.calculated_coefficient
+        day_start = _day_start(entry.log_date.date())
+        lo, hi = self.mood_series[uid].span(day_start, day_start + timedelta(days=1))
+        self.mood_cache[uid][day_start.date().isoformat()] = self.mood_series[uid].entries[hi - 1].calculated_coefficient
     
-    def _calculate_trend(self, mood_scores: List[int]) -> Tuple[MoodTrend, float]:
+    def _calculate_trend(self, mood_scores: Sequence[float]) -> Tuple[MoodTrend, float]:
         """トレンド計算"""
-        if len(mood_scores) < 3:
+        scores = np.asarray(mood_scores, dtype=np.float64)
+        n = scores.size
+        if n < 3:
             return MoodTrend.STABLE, 0.0
         
         # 線形回帰による傾き計算
-        n = len(mood_scores)
-        x_mean = (n - 1) / 2
-        y_mean = sum(mood_scores) / n
-        
-        numerator = sum((i - x_mean) * (score - y_mean) for i, score in enumerate(mood_scores))
-        denominator = sum((i - x_mean) ** 2 for i in range(n))
+        x = np.arange(n, dtype=np.float64) - (n - 1) / 2
+        numerator = float(np.dot(x, scores - scores.mean()))
+        denominator = float(np.dot(x, x))
         
         if denominator == 0:
             return MoodTrend.STABLE, 0.0
@@ -349,71 +514,58 @@ class MoodTrackingSystem:
         else:
             return MoodTrend.DECLINING, min(1.0, abs(slope) / 0.2)
     
-    def _calculate_stability(self, mood_scores: List[int]) -> float:
+    def _calculate_stability(self, mood_scores: Sequence[float]) -> float:
         """安定性スコア計算"""
-        if len(mood_scores) < 2:
+        scores = np.asarray(mood_scores, dtype=np.float64)
+        if scores.size < 2:
             return 1.0
         
-        # 標準偏差ベースの安定性
-        mean_score = sum(mood_scores) / len(mood_scores)
-        variance = sum((score - mean_score) ** 2 for score in mood_scores) / len(mood_scores)
-        std_dev = variance ** 0.5
+        # 標準偏差ベースの安定性（母標準偏差）
+        std_dev = float(scores.std())
         
         # 0-1スケールに正規化（標準偏差が大きいほど安定性が低い）
         return max(0.0, 1.0 - (std_dev / 2.0))
     
-    def _calculate_improvement_rate(self, mood_scores: List[int], days: int) -> float:
+    def _calculate_improvement_rate(self, mood_scores: Sequence[float], days: int) -> float:
         """改善率計算"""
-        if len(mood_scores) < 2:
+        scores = np.asarray(mood_scores, dtype=np.float64)
+        if scores.size < 2:
             return 0.0
         
-        first_half = mood_scores[:len(mood_scores)//2]
-        second_half = mood_scores[len(mood_scores)//2:]
-        
-        if not first_half or not second_half:
-            return 0.0
-        
-        first_avg = sum(first_half) / len(first_half)
-        second_avg = sum(second_half) / len(second_half)
+        half = scores.size // 2
+        first_avg = float(scores[:half].mean())
+        second_avg = float(scores[half:].mean())
         
         return (second_avg - first_avg) / days
     
-    def _analyze_categories(self, history: List[MoodEntry]) -> Dict[MoodCategory, Dict[str, float]]:
-        """カテゴリ別分析"""
+    def _analyze_categories(self, category_scores: np.ndarray) -> Dict[MoodCategory, Dict[str, float]]:
+        """カテゴリ別分析（列ごとに未入力の0を除いて集計）"""
         category_data = {}
         
-        for category in MoodCategory:
-            scores = []
-            for entry in history:
-                if category in entry.category_scores:
-                    scores.append(entry.category_scores[category].value)
+        for column, category in enumerate(CATEGORY_ORDER):
+            values = category_scores[:, column]
+            scores = values[values > 0].astype(np.float64)
             
-            if scores:
+            if scores.size:
                 category_data[category] = {
-                    "average": sum(scores) / len(scores),
+                    "average": float(scores.mean()),
                     "trend": self._calculate_trend(scores)[1],
                     "stability": self._calculate_stability(scores)
                 }
         
         return category_data
     
-    def _analyze_triggers(self, history: List[MoodEntry]) -> Dict[MoodTrigger, float]:
-        """トリガー効果分析"""
+    def _analyze_triggers(self, trigger_masks: np.ndarray, mood_scores: np.ndarray) -> Dict[MoodTrigger, float]:
+        """トリガー効果分析（トリガーあり/なしの平均の差）"""
         trigger_effects = {}
         
-        for trigger in MoodTrigger:
-            with_trigger = []
-            without_trigger = []
-            
-            for entry in history:
-                if trigger in entry.triggers:
-                    with_trigger.append(entry.mood_score.value)
-                else:
-                    without_trigger.append(entry.mood_score.value)
+        for trigger, bit in TRIGGER_BITS.items():
+            with_trigger = (trigger_masks & bit) != 0
+            count = int(with_trigger.sum())
             
-            if with_trigger and without_trigger:
-                avg_with = sum(with_trigger) / len(with_trigger)
-                avg_without = sum(without_trigger) / len(without_trigger)
+            if 0 < count < mood_scores.size:
+                avg_with = float(mood_scores[with_trigger].mean())
+                avg_without = float(mood_scores[~with_trigger].mean())
                 effect = (avg_with - avg_without) / 4.0  # 0-1スケールに正規化
                 trigger_effects[trigger] = max(0.0, effect)
         
@@ -5,7 +5,7 @@ Role-Based Access Control システムのインターフェース定義
 Requirements: 6.1
 """
 
-from typing import Dict, List, Optional, Set, Any
+from typing import Dict, List, Optional, Set, Any, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
 from pydantic import BaseModel, Field
@@ -38,6 +38,35 @@ class Action(str, Enum):
     EXECUTE = "execute"     # 実行
 
 
+# 権限空間の列挙（リソースタイプ × アクション → ビット位置）
+PERMISSION_BITS: Dict[Tuple[ResourceType, Action], int] = {
+    (resource_type, action): 1 << index
+    for index, (resource_type, action) in enumerate(
+        (resource_type, action) for resource_type in ResourceType for action in Action
+    )
+}
+
+
+def permission_bit(resource_type: ResourceType, action: Action) -> int:
+    """(リソースタイプ, アクション) のビット（未知の組み合わせは 0）"""
+    bit = PERMISSION_BITS.get((resource_type, action))
+    if bit is None:
+        # 文字列で渡された場合（Enum のハッシュは値と異なる）
+        try:
+            bit = PERMISSION_BITS[(ResourceType(resource_type), Action(action))]
+        except ValueError:
+            return 0
+    return bit
+
+
+def permission_mask(permissions: List[Tuple[ResourceType, Action]]) -> int:
+    """(リソースタイプ, アクション) の一覧をビットマスクに変換"""
+    mask = 0
+    for resource_type, action in permissions:
+        mask |= permission_bit(resource_type, action)
+    return mask
+
+
 class Permission(BaseModel):
     """権限定義"""
     resource_type: ResourceType
@@ -75,8 +104,15 @@ class RBACSystem:
         self.user_roles: Dict[str, List[UserRole]] = {}  # user_id -> roles
         self.guardian_roles: Dict[str, List[UserRole]] = {}  # guardian_id -> roles
         
+        # ロールごとの権限ビットマスク（role_id -> mask）
+        self.role_masks: Dict[str, int] = {}
+        
+        # (guardian_id, user_id) -> (和集合マスク, 有効期限)
+        self._permission_mask_cache: Dict[Tuple[str, str], Tuple[int, Optional[datetime]]] = {}
+        
         # デフォルトロール初期化
         self._initialize_default_roles()
+        self.compile_role_masks()
     
     def _initialize_default_roles(self):
         """デフォルトロール初期化"""
@@ -160,6 +196,67 @@ class RBACSystem:
         self.roles[PermissionLevel.TASK_EDIT.value] = task_edit_role
         self.roles[PermissionLevel.CHAT_SEND.value] = chat_send_role
     
+    def compile_role_masks(self):
+        """ロールテーブルを権限ビットマスクにコンパイル"""
+        self.role_masks = {
+            role.role_id: self._compile_role(role) for role in self.roles.values()
+        }
+        self.invalidate_permission_cache()
+    
+    @staticmethod
+    def _compile_role(role: Role) -> int:
+        if not role.is_active:
+            return 0
+        return permission_mask([
+            (permission.resource_type, action)
+            for permission in role.permissions
+            for action in permission.actions
+        ])
+    
+    def _role_mask(self, role: Role) -> int:
+        mask = self.role_masks.get(role.role_id)
+        if mask is None:
+            mask = self.role_masks[role.role_id] = self._compile_role(role)
+        return mask
+    
+    def invalidate_permission_cache(self, guardian_id: Optional[str] = None, user_id: Optional[str] = None):
+        """権限マスクキャッシュの無効化（ロール割り当て変更時）"""
+        if guardian_id is None and user_id is None:
+            self._permission_mask_cache.clear()
+            return
+        
+        for key in [
+            key for key in self._permission_mask_cache
+            if (guardian_id is None or key[0] == guardian_id) and (user_id is None or key[1] == user_id)
+        ]:
+            del self._permission_mask_cache[key]
+    
+    def get_permission_mask(self, guardian_id: str, user_id: str) -> int:
+        """ガーディアンの対象ユーザーに対する有効な権限の和集合マスク"""
+        key = (guardian_id, user_id)
+        cached = self._permission_mask_cache.get(key)
+        if cached is not None:
+            mask, valid_until = cached
+            if valid_until is None or datetime.utcnow() <= valid_until:
+                return mask
+        
+        now = datetime.utcnow()
+        mask = 0
+        valid_until = None
+        for user_role in self.guardian_roles.get(guardian_id, []):
+            if user_role.user_id != user_id or not user_role.is_active:
+                continue
+            if user_role.expires_at:
+                if now > user_role.expires_at:
+                    continue
+                # 最も早く期限切れになるロールまでキャッシュを有効にする
+                if valid_until is None or user_role.expires_at < valid_until:
+                    valid_until = user_role.expires_at
+            mask |= self._role_mask(user_role.role)
+        
+        self._permission_mask_cache[key] = (mask, valid_until)
+        return mask
+    
     def grant_role(
         self,
         guardian_id: str,
@@ -192,6 +289,7 @@ class RBACSystem:
                 self.guardian_roles[guardian_id] = []
             self.guardian_roles[guardian_id].append(user_role)
             
+            self.invalidate_permission_cache(guardian_id, user_id)
             return True
             
         except Exception:
@@ -214,6 +312,7 @@ class RBACSystem:
                     if role.user_id != user_id
                 ]
             
+            self.invalidate_permission_cache(guardian_id, user_id)
             return True
             
         except Exception:
@@ -228,33 +327,26 @@ class RBACSystem:
     ) -> bool:
         """権限チェック"""
         try:
-            # ガーディアンのロール取得
-            guardian_roles = self.guardian_roles.get(guardian_id, [])
-            
-            for user_role in guardian_roles:
-                # 対象ユーザーのロールかチェック
-                if user_role.user_id != user_id:
-                    continue
-                
-                # アクティブかチェック
-                if not user_role.is_active:
-                    continue
-                
-                # 有効期限チェック
-                if user_role.expires_at and datetime.utcnow() > user_role.expires_at:
-                    continue
-                
-                # 権限チェック
-                for permission in user_role.role.permissions:
-                    if (permission.resource_type == resource_type and 
-                        action in permission.actions):
-                        return True
-            
-            return False
+            bit = permission_bit(resource_type, action)
+            return bool(self.get_permission_mask(guardian_id, user_id) & bit)
             
         except Exception:
             return False
     
+    def check_permissions(
+        self,
+        guardian_id: str,
+        user_id: str,
+        permissions: List[Tuple[ResourceType, Action]]
+    ) -> List[bool]:
+        """複数権限の一括チェック（ダッシュボードのウィジェット判定用）"""
+        try:
+            mask = self.get_permission_mask(guardian_id, user_id)
+        except Exception:
+            return [False] * len(permissions)
+        
+        return [bool(mask & permission_bit(resource_type, action)) for resource_type, action in permissions]
+    
     def get_user_guardians(self, user_id: str) -> List[Dict[str, Any]]:
         """ユーザーのガーディアン一覧取得"""
         guardians = []
@@ -372,6 +464,9 @@ class RBACSystem:
             if not self.guardian_roles[guardian_id]:
                 del self.guardian_roles[guardian_id]
         
+        if cleaned_count:
+            self.invalidate_permission_cache()
+        
         return cleaned_count
     
     def export_roles_data(self) -> Dict[str, Any]:
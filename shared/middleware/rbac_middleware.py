@@ -5,7 +5,7 @@ Role-Based Access Control ミドルウェア
 Requirements: 6.1
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -131,6 +131,15 @@ class GuardianAuthService:
         """アクセス権チェック"""
         return self.rbac_system.check_permission(guardian_id, user_id, resource_type, action)
     
+    def check_access_many(
+        self,
+        guardian_id: str,
+        user_id: str,
+        permissions: List[Tuple[ResourceType, Action]]
+    ) -> List[bool]:
+        """複数アクセス権の一括チェック"""
+        return self.rbac_system.check_permissions(guardian_id, user_id, permissions)
+    
     def get_guardian_users(self, guardian_id: str) -> List[Dict[str, Any]]:
         """ガーディアンの管理ユーザー一覧"""
         return self.rbac_system.get_guardian_users(guardian_id)
@@ -0,0 +1,115 @@
+"""
+Mood Series Benchmark
+
+5年分（1日1件）の気分記録を持つユーザーについて、リスト走査と
+Pythonループによる従来の履歴取得・分析・CSVエクスポートと、時系列配列 +
+NumPy + 逐次CSVの実装のレイテンシとピークメモリを比較する
+
+Usage: python benchmark_mood_series.py [years] [repeats]
+"""
+
+import csv
+import io
+import random
+import sys
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from shared.interfaces.mood_system import MoodTrackingSystem, MoodCategory, MoodTrigger
+from shared.tests.test_mood_series import populate, reference_history, reference_stability, reference_trend
+
+
+def reference_analysis(entries, days):
+    """従来の analyze_mood_trends の数値計算（リスト走査 + Pythonループ）"""
+    history = reference_history(entries, days)
+    scores = [entry.mood_score.value for entry in history]
+    result = {
+        "average": sum(scores) / len(scores),
+        "trend": reference_trend(scores),
+        "stability": reference_stability(scores),
+    }
+    for category in MoodCategory:
+        category_scores = [entry.category_scores[category].value for entry in history
+                           if category in entry.category_scores]
+        if category_scores:
+            result[category] = (reference_trend(category_scores), reference_stability(category_scores))
+    for trigger in MoodTrigger:
+        with_trigger = [entry.mood_score.value for entry in history if trigger in entry.triggers]
+        without_trigger = [entry.mood_score.value for entry in history if trigger not in entry.triggers]
+        if with_trigger and without_trigger:
+            result[trigger] = sum(with_trigger) / len(with_trigger) - sum(without_trigger) / len(without_trigger)
+    return result
+
+
+def reference_csv_export(system, uid, start, end):
+    """従来のエンドポイント: 全行をStringIOに書いてからBytesIOにコピー"""
+    rows = [row for row in system.iter_mood_export(uid, start, end)]
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=rows[0].keys())
+    writer.writeheader()
+    writer.writerows(rows)
+    return io.BytesIO(output.getvalue().encode("utf-8")).getvalue()
+
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main(years: int, repeats: int):
+    system = MoodTrackingSystem()
+    days = years * 365 + years // 4
+    populate(system, "user_a", days, random.Random(42))
+    entries = system.mood_entries["user_a"]
+    today = datetime.utcnow().date()
+
+    print(f"entries={len(entries):,} ({years} years, daily) repeats={repeats}")
+    print(f"{'operation':<28} {'before_ms':>10} {'after_ms':>10} {'speedup':>8}")
+    cases = [
+        ("history 30 days", lambda: reference_history(entries, 30),
+         lambda: system.get_mood_history("user_a", 30)),
+        ("history 365 days", lambda: reference_history(entries, 365),
+         lambda: system.get_mood_history("user_a", 365)),
+        ("analysis 30 days", lambda: reference_analysis(entries, 30),
+         lambda: system.analyze_mood_trends("user_a", 30)),
+        ("analysis 365 days", lambda: reference_analysis(entries, 365),
+         lambda: system.analyze_mood_trends("user_a", 365)),
+        (f"analysis {days} days", lambda: reference_analysis(entries, days),
+         lambda: system.analyze_mood_trends("user_a", days)),
+    ]
+    for name, before, after in cases:
+        before_ms = timed(before, repeats)
+        after_ms = timed(after, repeats)
+        print(f"{name:<28} {before_ms:>10.3f} {after_ms:>10.3f} {before_ms / after_ms:>7.1f}x")
+
+    start = today - timedelta(days=days)
+    drain = lambda: sum(len(chunk) for chunk in system.iter_mood_export_csv("user_a", start, today))
+    before_ms = timed(lambda: reference_csv_export(system, "user_a", start, today), repeats)
+    after_ms = timed(drain, repeats)
+    print(f"{'csv export (full)':<28} {before_ms:>10.3f} {after_ms:>10.3f} {before_ms / after_ms:>7.1f}x")
+
+    before_kb = peak_memory(lambda: reference_csv_export(system, "user_a", start, today))
+    after_kb = peak_memory(drain)
+    print(f"\ncsv export peak memory: before={before_kb:,.0f}KB after={after_kb:,.0f}KB "
+          f"({drain():,} bytes streamed)")
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    main(years, repeats)
@@ -0,0 +1,142 @@
+"""
+Outbox Benchmark
+
+21:30の集中を模して users 人が window 秒の間にリアルタイムフックを送ったときの、
+リクエスト内で下流を逐次呼ぶ従来方式と、SQLite(WAL)アウトボックスに積んで
+ディスパッチャーが配送する方式のリクエストレイテンシと配送スループットを比較する。
+下流サービスは rtt ミリ秒の遅延と接続先ごとの同時接続数の上限で模擬する
+
+Usage: python benchmark_outbox.py [users] [window_seconds] [rtt_ms] [connections]
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from shared.utils.outbox import OutboxDispatcher, SqliteOutbox
+
+TASKS_PER_USER = 2  # 1ユーザーのフックで作るタスク数
+ARRIVAL_INTERVAL = 0.01
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Downstream:
+    """遅延と同時接続数の上限を持つ下流サービス"""
+
+    def __init__(self, rtt: float, connections: int):
+        self.rtt = rtt
+        self.limit = asyncio.Semaphore(connections)
+        self.calls = 0
+
+    async def call(self):
+        async with self.limit:
+            await asyncio.sleep(self.rtt)
+            self.calls += 1
+
+
+async def arrivals(users: int, window: float, on_arrival):
+    """window 秒に均等に users 件のリクエストを到着させる"""
+    started = time.perf_counter()
+    sent = 0
+    while sent < users:
+        due = min(users, int(users * (time.perf_counter() - started) / window) + 1)
+        for uid in range(sent, due):
+            on_arrival(uid)
+        sent = due
+        await asyncio.sleep(ARRIVAL_INTERVAL)
+
+
+async def run_inline(users: int, window: float, rtt: float, connections: int):
+    """従来方式: リクエスト内でタスクを逐次作成し、Mandala反映はメモリ上のバックグラウンドタスク"""
+    tasks, mandala = Downstream(rtt, connections), Downstream(rtt, connections)
+    latencies, background = [], []
+
+    async def request(arrived):
+        for _ in range(TASKS_PER_USER):
+            await tasks.call()
+        latencies.append(time.perf_counter() - arrived)
+        background.append(asyncio.create_task(mandala.call()))
+
+    pending = []
+    started = time.perf_counter()
+    await arrivals(users, window, lambda uid: pending.append(
+        asyncio.create_task(request(time.perf_counter()))))
+    await asyncio.gather(*pending)
+    await asyncio.gather(*background)
+    drained = time.perf_counter() - started
+    return latencies, drained, tasks.calls + mandala.calls
+
+
+async def run_outbox(users: int, window: float, rtt: float, connections: int, path: str):
+    """アウトボックス方式: 1件積んで応答し、ワーカーがバッチで並行に配送する"""
+    outbox = SqliteOutbox(path)
+    dispatcher = OutboxDispatcher(outbox, batch_size=100, workers_per_target=4, idle_poll_seconds=0.05)
+    tasks, mandala = Downstream(rtt, connections), Downstream(rtt, connections)
+
+    async def deliver_tasks(messages):
+        async def create(message):
+            for _ in range(TASKS_PER_USER):
+                await tasks.call()
+        await asyncio.gather(*[create(message) for message in messages])
+        outbox.enqueue_many([("mandala", message.ordering_key, message.payload,
+                              f"{message.idempotency_key}:mandala") for message in messages])
+        return {}
+
+    async def deliver_mandala(messages):
+        await asyncio.gather(*[mandala.call() for _ in messages])
+        return {}
+
+    dispatcher.register_handler("task", deliver_tasks)
+    dispatcher.register_handler("mandala", deliver_mandala)
+    await dispatcher.start()
+
+    latencies = []
+
+    def request(uid):
+        arrived = time.perf_counter()
+        outbox.enqueue("task", f"user_{uid}", {"uid": f"user_{uid}", "choices": ["c1", "c2"]},
+                       f"realtime-hooks:user_{uid}")
+        dispatcher.notify("task")
+        latencies.append(time.perf_counter() - arrived)
+
+    started = time.perf_counter()
+    await arrivals(users, window, request)
+    while outbox.pending_count():
+        await asyncio.sleep(0.05)
+    drained = time.perf_counter() - started
+    await dispatcher.stop()
+    outbox.close()
+    return latencies, drained, tasks.calls + mandala.calls
+
+
+def report(name, latencies, drained, calls, window):
+    print(f"{name:<10} {percentile(latencies, 0.5) * 1000:>9.2f} {percentile(latencies, 0.99) * 1000:>9.2f} "
+          f"{max(latencies) * 1000:>9.2f} {drained:>10.1f} {max(0.0, drained - window):>10.1f} "
+          f"{calls / drained:>10.0f}")
+
+
+async def main(users: int, window: float, rtt: float, connections: int):
+    print(f"users={users:,} window={window}s rtt={rtt * 1000:.0f}ms connections/target={connections} "
+          f"tasks/user={TASKS_PER_USER}")
+    print(f"{'':<10} {'p50_ms':>9} {'p99_ms':>9} {'max_ms':>9} {'drained_s':>10} {'backlog_s':>10} {'calls/s':>10}")
+    report("inline", *await run_inline(users, window, rtt, connections), window)
+    with tempfile.TemporaryDirectory() as directory:
+        report("outbox", *await run_outbox(users, window, rtt, connections,
+                                           os.path.join(directory, "outbox.db")), window)
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    window = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.02
+    connections = int(sys.argv[4]) if len(sys.argv) > 4 else 50
+    asyncio.run(main(users, window, rtt, connections))
@@ -0,0 +1,87 @@
+"""
+RBAC Permission Check Benchmark
+
+ロール走査による従来の権限チェックと、ビットマスク + ユーザー別マスク
+キャッシュによるチェックの毎秒チェック数を比較する
+
+Usage: python benchmark_rbac_permissions.py [users] [roles] [checks]
+"""
+
+import random
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from shared.interfaces.rbac_system import (
+    RBACSystem, ResourceType, Action, Permission, Role, UserRole, PERMISSION_BITS
+)
+from shared.tests.test_rbac_permission_index import reference_check
+
+
+def build_system(users: int, roles: int, rng: random.Random) -> RBACSystem:
+    rbac = RBACSystem()
+    resource_types = list(ResourceType)
+    
+    for i in range(roles):
+        permissions = [
+            Permission(resource_type=resource_type,
+                       actions=set(rng.sample(list(Action), rng.randint(1, 2))))
+            for resource_type in rng.sample(resource_types, rng.randint(1, 4))
+        ]
+        rbac.roles[f"custom_role_{i}"] = Role(name=f"Custom {i}", description="benchmark", permissions=permissions)
+    rbac.compile_role_masks()
+    
+    role_list = list(rbac.roles.values())
+    for u in range(users):
+        guardian_id = f"guardian_{u % (users // 4 or 1)}"
+        for role in rng.sample(role_list, rng.randint(2, 6)):
+            expires_at = datetime.utcnow() + timedelta(days=30) if rng.random() < 0.3 else None
+            user_role = UserRole(guardian_id=guardian_id, user_id=f"user_{u}", role=role,
+                                 granted_by="benchmark", expires_at=expires_at)
+            rbac.user_roles.setdefault(user_role.user_id, []).append(user_role)
+            rbac.guardian_roles.setdefault(guardian_id, []).append(user_role)
+    rbac.invalidate_permission_cache()
+    return rbac
+
+
+def main(users: int, roles: int, checks: int):
+    rng = random.Random(42)
+    rbac = build_system(users, roles, rng)
+    permissions = list(PERMISSION_BITS)
+    queries = [
+        (f"guardian_{u % (users // 4 or 1)}", f"user_{u}") + rng.choice(permissions)
+        for u in (rng.randrange(users) for _ in range(checks))
+    ]
+    
+    print(f"users={users} roles={len(rbac.roles)} checks={checks}")
+    
+    start = time.perf_counter()
+    expected = [reference_check(rbac, *query) for query in queries]
+    reference_rate = checks / (time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    actual = [rbac.check_permission(*query) for query in queries]
+    bitmask_rate = checks / (time.perf_counter() - start)
+    assert actual == expected
+    
+    widgets = permissions[:12]
+    start = time.perf_counter()
+    for guardian_id, user_id, _, _ in queries[:checks // len(widgets)]:
+        rbac.check_permissions(guardian_id, user_id, widgets)
+    batch_rate = (checks // len(widgets)) * len(widgets) / (time.perf_counter() - start)
+    
+    print(f"role scan (previous)      : {reference_rate:12,.0f} checks/s")
+    print(f"bitmask + cached mask     : {bitmask_rate:12,.0f} checks/s")
+    print(f"batch check_permissions   : {batch_rate:12,.0f} checks/s")
+    print(f"speedup                   : {bitmask_rate / reference_rate:12.1f}x")
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    roles = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    checks = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+    main(users, roles, checks)
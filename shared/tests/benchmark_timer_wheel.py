@@ -0,0 +1,102 @@
+"""
+Timer Wheel Benchmark
+
+10万本の同時タイマーについて、タイマーごとに sleep するタスクと
+TimerWheel のメモリ使用量・スケジュール/キャンセルのスループット・
+発火の遅れ（ジッター）を比較する
+
+Usage: python benchmark_timer_wheel.py [timers] [spread_seconds] [tick_seconds]
+"""
+
+import asyncio
+import gc
+import sys
+import os
+import time
+import tracemalloc
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from shared.utils.timer_wheel import TimerWheel
+
+# 最初の期限までの猶予（10万本の登録がtracemalloc下でも終わる時間）
+LEAD_SECONDS = 5.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, memory_bytes, lateness):
+    print(f"{name:<16} {memory_bytes / 1024 / 1024:>9.1f} "
+          f"{percentile(lateness, 0.5) * 1000:>8.1f} {percentile(lateness, 0.99) * 1000:>8.1f} "
+          f"{max(lateness) * 1000:>8.1f}")
+
+
+async def run_sleeping_tasks(timers: int, spread: float):
+    """従来方式: タイマーごとに asyncio.sleep するタスク"""
+    lateness = []
+
+    async def sleeper(due_at):
+        await asyncio.sleep(due_at - time.time())
+        lateness.append(time.time() - due_at)
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    tasks = [asyncio.create_task(sleeper(start + LEAD_SECONDS + spread * i / timers)) for i in range(timers)]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await asyncio.gather(*tasks)
+    report("sleeping tasks", memory, lateness)
+
+
+async def run_timer_wheel(timers: int, spread: float, tick: float):
+    lateness = []
+    wheel = TimerWheel(tick_seconds=tick)
+
+    async def handler(batch):
+        now = time.time()
+        lateness.extend(now - timer.due_at for timer in batch)
+
+    wheel.register_handler("bench", handler)
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    for i in range(timers):
+        wheel.schedule(f"timer_{i}", "bench", due_at=start + LEAD_SECONDS + spread * i / timers,
+                       payload={"session_id": i})
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    while len(lateness) < timers:
+        await asyncio.sleep(0.05)
+    report("timer wheel", memory, lateness)
+
+    # スケジュールとキャンセルのスループット（発火させない遠い期限）
+    start = time.perf_counter()
+    for i in range(timers):
+        wheel.schedule(f"churn_{i}", "bench", delay=3600 + i % 7200)
+    for i in range(timers):
+        wheel.cancel(f"churn_{i}")
+    churn = (time.perf_counter() - start) / (2 * timers) * 1e6
+    print(f"\nschedule+cancel: {churn:.2f} us/op  fired={wheel.fired:,}  "
+          f"handler_errors={wheel.handler_errors}")
+    await wheel.stop()
+
+
+async def main(timers: int, spread: float, tick: float):
+    print(f"timers={timers:,} spread={spread}s tick={tick * 1000:.0f}ms")
+    print(f"{'':<16} {'memory_mb':>9} {'p50_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+    await run_sleeping_tasks(timers, spread)
+    await run_timer_wheel(timers, spread, tick)
+
+
+if __name__ == "__main__":
+    timers = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    spread = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    tick = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    asyncio.run(main(timers, spread, tick))
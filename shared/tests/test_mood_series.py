@@ -0,0 +1,186 @@
+"""
+Mood Series Index Tests
+
+ユーザー別の気分時系列（時刻順の配列）による期間検索・ベクトル化した分析・
+CSVの逐次エクスポートのテスト
+
+Requirements: 5.4
+"""
+
+import csv
+import io
+import random
+import sys
+import os
+from datetime import datetime, date, timedelta
+
+import pytest
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from shared.interfaces.mood_system import (
+    MoodTrackingSystem, MoodLevel, MoodCategory, MoodTrigger, MoodTrend, MOOD_EXPORT_FIELDS
+)
+
+
+def reference_trend(mood_scores):
+    """リストを走査する従来のトレンド計算"""
+    if len(mood_scores) < 3:
+        return MoodTrend.STABLE, 0.0
+    n = len(mood_scores)
+    x_mean = (n - 1) / 2
+    y_mean = sum(mood_scores) / n
+    numerator = sum((i - x_mean) * (score - y_mean) for i, score in enumerate(mood_scores))
+    denominator = sum((i - x_mean) ** 2 for i in range(n))
+    slope = numerator / denominator
+    if abs(slope) < 0.05:
+        return MoodTrend.STABLE, abs(slope) / 0.05
+    elif slope > 0:
+        return MoodTrend.IMPROVING, min(1.0, abs(slope) / 0.2)
+    return MoodTrend.DECLINING, min(1.0, abs(slope) / 0.2)
+
+
+def reference_stability(mood_scores):
+    if len(mood_scores) < 2:
+        return 1.0
+    mean_score = sum(mood_scores) / len(mood_scores)
+    variance = sum((score - mean_score) ** 2 for score in mood_scores) / len(mood_scores)
+    return max(0.0, 1.0 - (variance ** 0.5 / 2.0))
+
+
+def reference_history(entries, days):
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    return [entry for entry in entries if entry.log_date >= cutoff_date]
+
+
+def populate(system: MoodTrackingSystem, uid: str, days: int, rng: random.Random,
+             shuffled: bool = False):
+    """days日分の1日1件の記録（shuffled=True で過去分を順不同に取り込む）"""
+    now = datetime.utcnow()
+    offsets = list(range(days))
+    if shuffled:
+        rng.shuffle(offsets)
+    for offset in offsets:
+        system.log_mood(
+            uid,
+            MoodLevel(rng.randint(1, 5)),
+            category_scores={category: MoodLevel(rng.randint(1, 5))
+                             for category in MoodCategory if rng.random() < 0.5},
+            triggers=[trigger for trigger in MoodTrigger if rng.random() < 0.3],
+            notes=f"day {offset}",
+            log_date=now - timedelta(days=offset, hours=rng.random())
+        )
+
+
+class TestMoodSeries:
+    """時系列の格納と期間検索"""
+
+    def test_out_of_order_inserts_stay_sorted(self):
+        system = MoodTrackingSystem()
+        populate(system, "user_a", 400, random.Random(1), shuffled=True)
+
+        series = system.mood_series["user_a"]
+        timestamps = series.timestamps[:series.size]
+        assert series.size == 400
+        assert (timestamps[1:] >= timestamps[:-1]).all()
+        assert [entry.mood_score.value for entry in series.entries] == list(series.scores[:series.size])
+        assert [entry.log_date for entry in series.entries] == sorted(entry.log_date for entry in series.entries)
+
+    def test_history_matches_linear_scan(self):
+        system = MoodTrackingSystem()
+        populate(system, "user_a", 200, random.Random(2), shuffled=True)
+        entries = system.mood_entries["user_a"]
+
+        for days in (0, 1, 7, 30, 365):
+            expected = sorted(reference_history(entries, days), key=lambda entry: entry.log_date)
+            assert [entry.entry_id for entry in system.get_mood_history("user_a", days)] == \
+                [entry.entry_id for entry in expected]
+        assert system.get_mood_history("unknown_user") == []
+
+    def test_coefficient_uses_latest_entry_of_the_day(self):
+        system = MoodTrackingSystem()
+        day = datetime(2024, 3, 1, 9, 0)
+        system.log_mood("user_a", MoodLevel.HIGH, log_date=day + timedelta(hours=5))
+        system.log_mood("user_a", MoodLevel.VERY_LOW, log_date=day)  # 同日の過去分を後から取り込む
+
+        assert system.get_mood_coefficient("user_a", day.date()) == pytest.approx(1.1)
+        system.mood_cache.clear()
+        assert system.get_mood_coefficient("user_a", day.date()) == pytest.approx(1.1)
+        assert system.get_mood_coefficient("user_a", date(2024, 3, 2)) == 1.0
+
+
+class TestVectorisedAnalysis:
+    """NumPyによる分析が従来のループ計算と一致する"""
+
+    def test_helpers_match_reference(self):
+        system = MoodTrackingSystem()
+        rng = random.Random(3)
+        for n in (0, 1, 2, 3, 10, 365):
+            scores = [rng.randint(1, 5) for _ in range(n)]
+            trend, strength = system._calculate_trend(scores)
+            expected_trend, expected_strength = reference_trend(scores)
+            assert trend == expected_trend
+            assert strength == pytest.approx(expected_strength)
+            assert system._calculate_stability(scores) == pytest.approx(reference_stability(scores))
+
+        improving = [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+        assert system._calculate_trend(improving)[0] == MoodTrend.IMPROVING
+        assert system._calculate_improvement_rate(improving, 10) == pytest.approx((4.2 - 1.8) / 10)
+
+    def test_analysis_matches_reference(self):
+        system = MoodTrackingSystem()
+        populate(system, "user_a", 120, random.Random(4), shuffled=True)
+        history = system.get_mood_history("user_a", 60)
+        scores = [entry.mood_score.value for entry in history]
+
+        analysis = system.analyze_mood_trends("user_a", 60)
+
+        assert analysis.average_mood == pytest.approx(sum(scores) / len(scores))
+        assert analysis.mood_trend == reference_trend(scores)[0]
+        assert analysis.stability_score == pytest.approx(reference_stability(scores))
+        for category in MoodCategory:
+            category_scores = [entry.category_scores[category].value for entry in history
+                               if category in entry.category_scores]
+            assert analysis.category_analysis[category]["average"] == \
+                pytest.approx(sum(category_scores) / len(category_scores))
+            assert analysis.category_analysis[category]["stability"] == \
+                pytest.approx(reference_stability(category_scores))
+        for trigger in MoodTrigger:
+            with_trigger = [entry.mood_score.value for entry in history if trigger in entry.triggers]
+            without_trigger = [entry.mood_score.value for entry in history if trigger not in entry.triggers]
+            expected = max(0.0, (sum(with_trigger) / len(with_trigger)
+                                 - sum(without_trigger) / len(without_trigger)) / 4.0)
+            assert analysis.trigger_effectiveness[trigger] == pytest.approx(expected)
+
+    def test_empty_history_defaults(self):
+        analysis = MoodTrackingSystem().analyze_mood_trends("nobody")
+        assert analysis.mood_trend == MoodTrend.STABLE
+        assert analysis.average_mood == 3.0
+
+
+class TestMoodExport:
+    """期間指定のエクスポート"""
+
+    def test_csv_chunks_match_json_rows(self):
+        system = MoodTrackingSystem()
+        populate(system, "user_a", 90, random.Random(5), shuffled=True)
+        today = datetime.utcnow().date()
+        start, end = today - timedelta(days=40), today - timedelta(days=10)
+
+        rows = system.export_mood_data("user_a", start, end)
+        chunks = list(system.iter_mood_export_csv("user_a", start, end, chunk_rows=8))
+        parsed = list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+        expected = [entry.entry_id for entry in system.mood_entries["user_a"]
+                    if start <= entry.log_date.date() <= end]
+        assert system.count_mood_entries("user_a", start, end) == len(rows) == len(expected)
+        assert len(chunks) == -(-len(rows) // 8)  # 8行ごとのチャンク
+        assert list(parsed[0].keys()) == MOOD_EXPORT_FIELDS
+        assert [row["entry_id"] for row in parsed] == [row["entry_id"] for row in rows] == expected
+
+    def test_empty_period(self):
+        system = MoodTrackingSystem()
+        chunks = list(system.iter_mood_export_csv("nobody", date(2024, 1, 1), date(2024, 1, 31)))
+        assert system.count_mood_entries("nobody", date(2024, 1, 1), date(2024, 1, 31)) == 0
+        assert b"".join(chunks).decode("utf-8").strip() == ",".join(MOOD_EXPORT_FIELDS)
@@ -0,0 +1,176 @@
+"""
+Outbox Tests
+
+SQLiteアウトボックスの冪等キー・キーごとの順序・再試行とデッドレター・
+リース切れの再配送・ディスパッチャーのバッチ配送のテスト
+"""
+
+import asyncio
+import sys
+import os
+
+import pytest
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from shared.utils.outbox import OutboxDispatcher, SqliteOutbox
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def ids(messages):
+    return [message.message_id for message in messages]
+
+
+class TestSqliteOutbox:
+    """格納・取り出し・確認応答"""
+
+    def test_duplicate_idempotency_key_is_ignored(self):
+        outbox = SqliteOutbox(":memory:")
+        first = outbox.enqueue("task", "u1", {"n": 1}, "hook:u1")
+        assert outbox.enqueue("task", "u1", {"n": 2}, "hook:u1") is None
+        assert outbox.pending_count() == 1
+
+        (message,) = outbox.claim("task", 10)
+        assert message.message_id == first
+        assert message.payload == {"n": 1}
+
+    def test_messages_of_a_key_are_delivered_in_order(self):
+        outbox = SqliteOutbox(":memory:")
+        a1, b1, a2, a3 = outbox.enqueue_many([
+            ("task", "user_a", {"step": 1}, "a1"),
+            ("task", "user_b", {"step": 1}, "b1"),
+            ("mandala", "user_a", {"step": 2}, "a2"),
+            ("task", "user_a", {"step": 3}, "a3"),
+        ])
+
+        # 1回の取り出しに同じキーのメッセージは1件まで
+        claimed = outbox.claim("task", 10)
+        assert ids(claimed) == [a1, b1]
+        assert outbox.claim("mandala", 10) == []
+
+        outbox.ack(claimed)
+        assert outbox.claim("task", 10) == []  # a3 は a2 の後
+        (mandala,) = outbox.claim("mandala", 10)
+        assert mandala.message_id == a2
+
+        outbox.ack([mandala])
+        assert ids(outbox.claim("task", 10)) == [a3]
+
+    def test_retry_backoff_and_dead_letter(self):
+        clock = FakeClock()
+        outbox = SqliteOutbox(":memory:", max_attempts=3, base_backoff=2.0, clock=clock)
+        first, second = outbox.enqueue_many([
+            ("task", "u1", {"n": 1}, "k1"),
+            ("task", "u1", {"n": 2}, "k2"),
+        ])
+
+        for attempt, backoff in ((1, 2.0), (2, 4.0)):
+            (message,) = outbox.claim("task", 10)
+            assert (message.message_id, message.attempts) == (first, attempt - 1)
+            assert outbox.fail([(message, "503")]) == 0
+            clock.now += backoff - 0.1
+            assert outbox.claim("task", 10) == []
+            clock.now += 0.1
+
+        (message,) = outbox.claim("task", 10)
+        assert outbox.fail([(message, "503 again")]) == 1
+
+        (dead,) = outbox.dead_letters()
+        assert (dead["message_id"], dead["attempts"], dead["last_error"]) == (first, 3, "503 again")
+        assert ids(outbox.claim("task", 10)) == [second]  # 後続は止まらない
+
+    def test_unacked_claims_are_redelivered_after_restart(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / "outbox.db")
+        outbox = SqliteOutbox(path, lease_seconds=30.0, clock=clock)
+        outbox.enqueue_many([("task", f"u{i}", {"n": i}, f"k{i}") for i in range(5)])
+        assert len(outbox.claim("task", 3)) == 3
+        outbox.close()  # 確認応答の前に落ちる
+
+        restarted = SqliteOutbox(path, lease_seconds=30.0, clock=clock)
+        assert restarted.pending_count() == 5
+        remaining = restarted.claim("task", 10)
+        assert len(remaining) == 2
+        restarted.ack(remaining)
+        clock.now += 31  # 落ちる前のリースが切れる
+        assert sorted(message.payload["n"] for message in restarted.claim("task", 10)) == [0, 1, 2]
+
+
+class TestOutboxDispatcher:
+    """ターゲットごとのバッチ配送"""
+
+    @pytest.mark.asyncio
+    async def test_drain_batches_per_target_and_retries_failures(self):
+        clock = FakeClock()
+        outbox = SqliteOutbox(":memory:", base_backoff=1.0, clock=clock)
+        dispatcher = OutboxDispatcher(outbox, batch_size=4)
+        batches = []
+        failed_once = set()
+
+        async def task_handler(messages):
+            batches.append(("task", len(messages)))
+            errors = {}
+            for message in messages:
+                if message.payload["n"] % 5 == 0 and message.message_id not in failed_once:
+                    failed_once.add(message.message_id)
+                    errors[message.message_id] = "timeout"
+            outbox.enqueue_many([("mandala", message.ordering_key, message.payload,
+                                  f"{message.idempotency_key}:mandala")
+                                 for message in messages if message.message_id not in errors])
+            return errors
+
+        delivered = []
+
+        async def mandala_handler(messages):
+            batches.append(("mandala", len(messages)))
+            delivered.extend(message.payload["n"] for message in messages)
+            return {}
+
+        dispatcher.register_handler("task", task_handler)
+        dispatcher.register_handler("mandala", mandala_handler)
+        outbox.enqueue_many([("task", f"u{i}", {"n": i}, f"k{i}") for i in range(10)])
+
+        await dispatcher.drain()
+        assert all(size <= 4 for _, size in batches)
+        assert sorted(delivered) == [1, 2, 3, 4, 6, 7, 8, 9]
+
+        clock.now += 1.0  # バックオフ明けに再試行
+        await dispatcher.drain()
+        assert sorted(delivered) == list(range(10))
+        assert dispatcher.get_stats() == {
+            "pending": 0, "delivered": 20, "failed": 2, "dead_lettered": 0, "workers": 0
+        }
+
+    @pytest.mark.asyncio
+    async def test_workers_wake_on_notify(self):
+        outbox = SqliteOutbox(":memory:")
+        dispatcher = OutboxDispatcher(outbox, batch_size=50, idle_poll_seconds=10.0)
+        received = []
+
+        async def handler(messages):
+            received.extend(message.payload["n"] for message in messages)
+            return {}
+
+        dispatcher.register_handler("task", handler)
+        await dispatcher.start()
+        try:
+            await asyncio.sleep(0.01)
+            outbox.enqueue_many([("task", f"u{i}", {"n": i}, f"k{i}") for i in range(120)])
+            dispatcher.notify("task")
+            for _ in range(100):
+                if len(received) == 120:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await dispatcher.stop()
+
+        assert sorted(received) == list(range(120))
+        assert outbox.pending_count() == 0
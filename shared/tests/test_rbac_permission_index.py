@@ -0,0 +1,98 @@
+"""
+RBAC Permission Bitmask Index Tests
+
+権限ビットマスクとユーザー別マスクキャッシュのテスト
+
+Requirements: 6.1
+"""
+
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from shared.interfaces.rbac_system import (
+    RBACSystem, PermissionLevel, ResourceType, Action, PERMISSION_BITS
+)
+
+
+def reference_check(rbac: RBACSystem, guardian_id: str, user_id: str,
+                    resource_type: ResourceType, action: Action) -> bool:
+    """ロールと権限リストを毎回走査する従来の判定"""
+    for user_role in rbac.guardian_roles.get(guardian_id, []):
+        if user_role.user_id != user_id or not user_role.is_active:
+            continue
+        if user_role.expires_at and datetime.utcnow() > user_role.expires_at:
+            continue
+        for permission in user_role.role.permissions:
+            if permission.resource_type == resource_type and action in permission.actions:
+                return True
+    return False
+
+
+class TestPermissionBitmaskIndex:
+    """権限ビットマスク"""
+    
+    def setup_method(self):
+        self.rbac = RBACSystem()
+    
+    def test_matches_reference_for_random_assignments(self):
+        rng = random.Random(7)
+        levels = list(PermissionLevel)
+        pairs = [(f"g{g}", f"u{u}") for g in range(5) for u in range(5)]
+        for guardian_id, user_id in rng.sample(pairs, 15):
+            for level in rng.sample(levels, rng.randint(1, 2)):
+                self.rbac.grant_role(guardian_id, user_id, level, "admin")
+        
+        for guardian_id, user_id in pairs:
+            for resource_type, action in PERMISSION_BITS:
+                assert self.rbac.check_permission(guardian_id, user_id, resource_type, action) == \
+                    reference_check(self.rbac, guardian_id, user_id, resource_type, action)
+    
+    def test_batch_check_matches_single_checks(self):
+        self.rbac.grant_role("g1", "u1", PermissionLevel.TASK_EDIT, "admin")
+        permissions = list(PERMISSION_BITS)
+        
+        batch = self.rbac.check_permissions("g1", "u1", permissions)
+        
+        assert batch == [self.rbac.check_permission("g1", "u1", r, a) for r, a in permissions]
+        assert sum(batch) == 5
+    
+    def test_string_arguments_accepted(self):
+        self.rbac.grant_role("g1", "u1", PermissionLevel.CHAT_SEND, "admin")
+        
+        assert self.rbac.check_permission("g1", "u1", "chat_messages", "write")
+        assert self.rbac.check_permissions("g1", "u1", [("chat_messages", "delete"), ("unknown", "read")]) == [False, False]
+    
+    def test_grant_and_revoke_invalidate_cached_mask(self):
+        assert not self.rbac.check_permission("g1", "u1", ResourceType.TASK_DATA, Action.WRITE)
+        
+        self.rbac.grant_role("g1", "u1", PermissionLevel.TASK_EDIT, "admin")
+        assert self.rbac.check_permission("g1", "u1", ResourceType.TASK_DATA, Action.WRITE)
+        
+        self.rbac.revoke_role("g1", "u1")
+        assert not self.rbac.check_permission("g1", "u1", ResourceType.TASK_DATA, Action.WRITE)
+    
+    def test_cached_mask_expires_with_earliest_role(self):
+        self.rbac.grant_role("g1", "u1", PermissionLevel.VIEW_ONLY, "admin")
+        self.rbac.grant_role("g1", "u1", PermissionLevel.CHAT_SEND, "admin",
+                             expires_at=datetime.utcnow() + timedelta(hours=1))
+        assert self.rbac.check_permission("g1", "u1", ResourceType.CHAT_MESSAGES, Action.WRITE)
+        
+        # 期限切れにする（キャッシュの有効期限も過ぎる）
+        self.rbac.guardian_roles["g1"][1].expires_at = datetime.utcnow() - timedelta(seconds=1)
+        self.rbac._permission_mask_cache[("g1", "u1")] = (
+            self.rbac._permission_mask_cache[("g1", "u1")][0], datetime.utcnow() - timedelta(seconds=1)
+        )
+        
+        assert not self.rbac.check_permission("g1", "u1", ResourceType.CHAT_MESSAGES, Action.WRITE)
+        assert self.rbac.check_permission("g1", "u1", ResourceType.REPORTS, Action.READ)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,102 @@
+"""
+安全
+Shared safety matcher tests
+"""
+
+import re
+
+import pytest
+from shared.utils.safety_matcher import (
+    SELF_HARM_PATTERNS, STORY_HARMFUL_PATTERNS, THERAPEUTIC_KEYWORDS,
+    SafetyMatcher, SafetyRule, get_safety_matcher
+)
+
+
+SAMPLE_TEXTS = [
+    "",
+    "今日は成長を感じた。希望がある。",
+    "もう限界で消えたい",
+    "誰も私を許さない、価値が無い",
+    "物語の中で勇者は挑戦を続けた。" * 200,
+    "自動自動リスト死死死",
+]
+
+
+class TestSafetyMatcher:
+    """SafetyMatcherの一括照合"""
+
+    def test_regex_counts_match_findall(self):
+        """regexルールはre.findallと同じ件数を返す"""
+        matcher = get_safety_matcher()
+
+        for text in SAMPLE_TEXTS:
+            scan = matcher.scan(text)
+            hits = {hit.rule.pattern: hit.count for hit in scan.by_kind("self_harm")}
+            for pattern in SELF_HARM_PATTERNS:
+                expected = len(re.findall(pattern["pattern"], text, re.IGNORECASE))
+                assert hits.get(pattern["pattern"], 0) == expected
+
+    def test_literal_presence_matches_substring(self):
+        """キーワード"""
+        matcher = get_safety_matcher()
+
+        for text in SAMPLE_TEXTS:
+            scan = matcher.scan(text)
+            therapeutic = {hit.rule.pattern for hit in scan.by_kind("therapeutic")}
+            assert therapeutic == {k for k in THERAPEUTIC_KEYWORDS if k in text}
+
+            harmful = [hit.rule.pattern for hit in scan.by_kind("story_harmful")]
+            assert harmful == [p for p in STORY_HARMFUL_PATTERNS if p in text.lower()]
+
+    def test_overlapping_literals(self):
+        """重なり合うリテラルはすべて検出される"""
+        matcher = SafetyMatcher([
+            SafetyRule(kind="k", category="short", pattern="支"),
+            SafetyRule(kind="k", category="long", pattern="支援"),
+            SafetyRule(kind="k", category="tail", pattern="援"),
+        ])
+
+        scan = matcher.scan("支援支援")
+
+        assert scan.categories() == ["short", "long", "tail"]
+
+    def test_categories_and_weights(self):
+        """カテゴリ"""
+        scan = get_safety_matcher().scan("もう限界で消えたい")
+
+        categories = scan.categories("self_harm")
+        assert "suicidal_ideation" in categories
+        assert "despair_with_harm" in categories
+        assert scan.weighted_score("self_harm") > 0
+
+    def test_invalid_pattern_is_matched_literally(self):
+        """無効"""
+        matcher = SafetyMatcher([
+            SafetyRule(kind="k", category="broken", pattern="(?:?|a)", regex=True)
+        ])
+
+        assert not matcher.scan("abc").flagged
+        assert matcher.scan("x(?:?|a)y").categories() == ["broken"]
+
+    def test_scan_restricted_to_kinds(self):
+        """kinds指定時はその種類のルールのみ照合する"""
+        scan = get_safety_matcher().scan("死", kinds=("story_harmful",))
+
+        assert scan.categories() == ["potentially_harmful"]
+        assert scan.by_kind("self_harm") == []
+
+    def test_clean_text_has_no_hits(self):
+        """安全"""
+        matcher = SafetyMatcher([
+            SafetyRule(kind="k", category="c", pattern="(?:bad|worse)", regex=True),
+            SafetyRule(kind="k", category="c", pattern="awful"),
+        ])
+
+        scan = matcher.scan("a perfectly pleasant story " * 100)
+
+        assert scan.hits == []
+        assert not scan.flagged
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
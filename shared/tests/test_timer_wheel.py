@@ -0,0 +1,180 @@
+"""
+Timer Wheel Tests
+
+階層タイマーホイールの発火時刻・キャンセル・バッチ発火・永続化と復元のテスト
+"""
+
+import asyncio
+import random
+import sys
+import os
+import time
+
+import pytest
+
+# Add project root to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from shared.utils.timer_wheel import MemoryTimerStore, SqliteTimerStore, TimerWheel
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def small_wheel(clock: FakeClock, **kwargs) -> TimerWheel:
+    """16 × 8 × 8 ティック（1024秒）の小さなホイールでカスケードとオーバーフローを通す"""
+    return TimerWheel(tick_seconds=1.0, level_bits=(4, 3, 3), clock=clock, **kwargs)
+
+
+class TestTimerWheel:
+    """スケジュールと発火"""
+
+    def test_timers_fire_on_their_tick_across_levels(self):
+        """全レベルとオーバーフローのタイマーが早すぎず1ティック以内に発火する"""
+        rng = random.Random(7)
+        clock = FakeClock()
+        wheel = small_wheel(clock)
+        due = {}
+        for i in range(2000):
+            delay = rng.choice([rng.uniform(0, 16), rng.uniform(16, 128),
+                                rng.uniform(128, 1024), rng.uniform(1024, 5000)])
+            timer = wheel.schedule(f"t{i}", "test", delay=delay)
+            due[timer.timer_id] = timer.due_at
+
+        fired = {}
+        start = clock.now
+        while clock.now < start + 5002:
+            clock.now += 1.0
+            for timer in wheel.advance():
+                fired[timer.timer_id] = clock.now
+
+        assert fired.keys() == due.keys()
+        for timer_id, fired_at in fired.items():
+            assert due[timer_id] <= fired_at < due[timer_id] + 1.0
+        assert len(wheel) == 0
+
+    def test_advance_over_a_gap_fires_everything_due(self):
+        clock = FakeClock()
+        wheel = small_wheel(clock)
+        for i in range(100):
+            wheel.schedule(f"t{i}", "test", delay=i * 37)
+
+        clock.now += 1800
+        fired = wheel.advance()
+
+        assert len(fired) == sum(1 for i in range(100) if i * 37 <= 1800)
+        assert all(timer.due_at <= clock.now for timer in fired)
+
+    def test_cancel_and_reschedule(self):
+        clock = FakeClock()
+        wheel = small_wheel(clock)
+        wheel.schedule("a", "test", delay=10)
+        wheel.schedule("b", "test", delay=300)
+        wheel.schedule("c", "test", delay=3000)
+
+        assert wheel.cancel("b")
+        assert not wheel.cancel("b")
+        wheel.schedule("a", "test", delay=500)  # 同じIDは置き換え
+
+        clock.now += 100
+        assert wheel.advance() == []
+        clock.now += 3000
+        assert sorted(timer.timer_id for timer in wheel.advance()) == ["a", "c"]
+
+    @pytest.mark.asyncio
+    async def test_fire_due_batches_by_kind_and_isolates_handler_errors(self):
+        clock = FakeClock()
+        wheel = small_wheel(clock, batch_size=10)
+        batches = {"ok": [], "broken": []}
+
+        async def ok_handler(timers):
+            batches["ok"].append(len(timers))
+
+        async def broken_handler(timers):
+            batches["broken"].append(len(timers))
+            raise RuntimeError("boom")
+
+        wheel.register_handler("ok", ok_handler)
+        wheel.register_handler("broken", broken_handler)
+        for i in range(25):
+            wheel.schedule(f"ok{i}", "ok", delay=5)
+            wheel.schedule(f"broken{i}", "broken", delay=5)
+
+        clock.now += 6
+        assert await wheel.fire_due() == 50
+
+        assert batches["ok"] == [10, 10, 5]
+        assert batches["broken"] == [10, 10, 5]
+        assert wheel.get_stats()["handler_errors"] == 3
+        await wheel.stop()
+
+
+class TestTimerPersistence:
+    """ストアへの書き込みと再起動後の復元"""
+
+    def test_recover_after_restart(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / "timers.db")
+        wheel = small_wheel(clock, store=SqliteTimerStore(path))
+        for i in range(50):
+            wheel.schedule(f"t{i}", "test", delay=60 * (i + 1), payload={"n": i})
+        wheel.cancel("t0")
+        wheel.flush()
+
+        clock.now += 30 * 60  # 停止中に t1..t29 の期限が過ぎる
+        restarted = small_wheel(clock, store=SqliteTimerStore(path))
+        assert restarted.recover() == 49
+
+        fired = restarted.advance()
+        assert sorted(timer.payload["n"] for timer in fired) == list(range(1, 30))
+        restarted.flush()
+        assert len(restarted.store.load()) == 20
+
+    @pytest.mark.asyncio
+    async def test_handler_reschedule_survives_fire(self):
+        """発火した同じIDをハンドラーが再スケジュールしても削除で上書きされない"""
+        clock = FakeClock()
+        store = MemoryTimerStore()
+        wheel = small_wheel(clock, store=store)
+
+        async def repeat(timers):
+            for timer in timers:
+                wheel.schedule(timer.timer_id, timer.kind, delay=900, payload=timer.payload)
+
+        wheel.register_handler("reminder", repeat)
+        wheel.schedule("reminder:1", "reminder", delay=900, payload={"user_id": "u1"})
+        clock.now += 901
+        await wheel.fire_due()
+
+        assert "reminder:1" in wheel
+        assert store.records["reminder:1"]["due_at"] == pytest.approx(clock.now + 900)
+        await wheel.stop()
+
+
+class TestTimerDriver:
+    """asyncioの駆動ループ"""
+
+    @pytest.mark.asyncio
+    async def test_driver_fires_on_time_and_exits_when_empty(self):
+        wheel = TimerWheel(tick_seconds=0.01)
+        lateness = []
+
+        async def handler(timers):
+            now = time.time()
+            lateness.extend(now - timer.due_at for timer in timers)
+
+        wheel.register_handler("test", handler)
+        for i in range(50):
+            wheel.schedule(f"t{i}", "test", delay=0.02 + i * 0.002)
+
+        await asyncio.sleep(0.3)
+
+        assert len(lateness) == 50
+        assert min(lateness) >= 0
+        assert wheel._task.done()
+        await wheel.stop()
@@ -5,6 +5,10 @@ Shared utilities package for the therapeutic gamification app
 from .validators import *
 from .helpers import *
 from .exceptions import *
+from .safety_matcher import *
+from .feature_flags import *
+from .timer_wheel import *
+from .outbox import *
 
 __all__ = [
     # Validators
@@ -68,4 +72,32 @@ __all__ = [
     'RateLimitExceededError',
     'ConfigurationError',
     'get_http_status_code',
+
+    # Safety matcher
+    'SafetyRule',
+    'SafetyHit',
+    'SafetyScanResult',
+    'SafetyMatcher',
+    'get_safety_matcher',
+
+    # Feature flags
+    'BUCKETING_MD5',
+    'BUCKETING_CRC32',
+    'bucket_for_user',
+    'CompiledFlag',
+    'FlagResult',
+    'compile_flag',
+    'FeatureFlagClient',
+
+    # Timer wheel
+    'Timer',
+    'TimerStore',
+    'MemoryTimerStore',
+    'SqliteTimerStore',
+    'TimerWheel',
+
+    # Outbox
+    'OutboxMessage',
+    'SqliteOutbox',
+    'OutboxDispatcher',
 ]
\ No newline at end of file
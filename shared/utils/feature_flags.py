@@ -0,0 +1,274 @@
+"""
+Compiled feature flag evaluation for the therapeutic gamification app
+Flags are compiled once into immutable, pre-sorted predicate chains that the
+feature-flags service and the in-process SDK evaluate identically
+"""
+
+import asyncio
+import hashlib
+import logging
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Optional httpx import for snapshot polling
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BUCKET_COUNT = 10000
+
+# Per-flag bucketing versions. Changing a flag's version reshuffles which users
+# fall inside its rollout percentage, so it is only ever switched explicitly.
+BUCKETING_MD5 = 1    # md5 of "user_id:flag_key" (the original assignment)
+BUCKETING_CRC32 = 2  # crc32 of "salt:user_id" (cheaper, opt-in)
+BUCKETING_VERSIONS = (BUCKETING_MD5, BUCKETING_CRC32)
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def bucket_for_user(user_id: str, salt: str, bucketing_version: int = BUCKETING_MD5) -> float:
+    """
+    Stable percentage bucket in [0, 1) for a user.
+
+    The salt is the flag key unless the flag overrides it. Version 1 keeps the
+    original md5 assignment so existing rollouts do not move; version 2 uses
+    crc32, which is faster and equally stable across processes and releases.
+    """
+    if bucketing_version == BUCKETING_CRC32:
+        return (zlib.crc32(f"{salt}:{user_id}".encode("utf-8")) % BUCKET_COUNT) / BUCKET_COUNT
+    hash_value = int(hashlib.md5(f"{user_id}:{salt}".encode()).hexdigest(), 16)
+    return (hash_value % BUCKET_COUNT) / BUCKET_COUNT
+
+
+def _compile_condition(condition: Dict[str, Any]) -> Predicate:
+    """Compile one targeting condition; a missing attribute never matches"""
+    attribute = condition.get("attribute")
+    operator = condition.get("operator")
+    expected = condition.get("value")
+
+    if operator == "equals":
+        return lambda attrs: attribute in attrs and attrs[attribute] == expected
+    if operator == "not_equals":
+        return lambda attrs: attribute in attrs and attrs[attribute] != expected
+    if operator == "greater_than":
+        return lambda attrs: attribute in attrs and attrs[attribute] > expected
+    if operator == "less_than":
+        return lambda attrs: attribute in attrs and attrs[attribute] < expected
+    if operator == "contains":
+        return lambda attrs: attribute in attrs and expected in str(attrs[attribute])
+    if operator == "in":
+        return lambda attrs: attribute in attrs and attrs[attribute] in expected
+    # Unknown operators only require the attribute to be present
+    return lambda attrs: attribute in attrs
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """A targeting rule with its conditions compiled to predicates"""
+    rule_id: str
+    name: str
+    priority: int
+    percentage: float
+    value: Any
+    predicates: Tuple[Predicate, ...]
+
+    def matches(self, attributes: Dict[str, Any]) -> bool:
+        for predicate in self.predicates:
+            if not predicate(attributes):
+                return False
+        return True
+
+
+@dataclass(frozen=True)
+class FlagResult:
+    """Outcome of evaluating a compiled flag for one user"""
+    flag_key: str
+    value: Any
+    reason: str
+    variation_id: Optional[str] = None
+    rule_matched: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class CompiledFlag:
+    """Immutable, pre-sorted predicate chain for one flag"""
+    flag_key: str
+    enabled: bool
+    kill_switch_active: bool
+    default_value: Any
+    salt: str
+    bucketing_version: int
+    rules: Tuple[CompiledRule, ...]
+    definition: Dict[str, Any]
+
+    def bucket(self, user_id: str) -> float:
+        return bucket_for_user(user_id, self.salt, self.bucketing_version)
+
+    def evaluate(self, user_id: str, attributes: Dict[str, Any]) -> FlagResult:
+        if self.kill_switch_active:
+            return FlagResult(self.flag_key, self.default_value, "kill_switch_active")
+        if not self.enabled:
+            return FlagResult(self.flag_key, self.default_value, "flag_disabled")
+
+        bucket = None
+        for rule in self.rules:
+            if not rule.matches(attributes):
+                continue
+            if bucket is None:
+                bucket = self.bucket(user_id)
+            if bucket < rule.percentage:
+                return FlagResult(self.flag_key, rule.value, "targeting_rule_match",
+                                  variation_id=rule.rule_id, rule_matched=rule.name)
+
+        return FlagResult(self.flag_key, self.default_value, "default_value")
+
+
+def compile_flag(definition: Dict[str, Any]) -> CompiledFlag:
+    """
+    Compile a flag definition (FeatureFlag.dict() or a snapshot entry).
+
+    Rules are sorted by priority once here; sorted() is stable, so rules with
+    equal priority keep their declared order as before.
+    """
+    bucketing_version = definition.get("bucketing_version") or BUCKETING_MD5
+    if bucketing_version not in BUCKETING_VERSIONS:
+        raise ValueError(f"Unknown bucketing version {bucketing_version} for flag {definition['flag_key']}")
+
+    rules = sorted(definition.get("targeting_rules", []), key=lambda r: r["priority"])
+    return CompiledFlag(
+        flag_key=definition["flag_key"],
+        enabled=definition.get("enabled", True),
+        kill_switch_active=definition.get("kill_switch_active", False),
+        default_value=definition.get("default_value"),
+        salt=definition.get("bucketing_salt") or definition["flag_key"],
+        bucketing_version=bucketing_version,
+        rules=tuple(
+            CompiledRule(
+                rule_id=rule["rule_id"],
+                name=rule["name"],
+                priority=rule["priority"],
+                percentage=rule["percentage"],
+                value=rule["value"],
+                predicates=tuple(_compile_condition(c) for c in rule.get("conditions", []))
+            )
+            for rule in rules
+        ),
+        definition=definition
+    )
+
+
+class FeatureFlagClient:
+    """
+    In-process feature flag SDK.
+
+    Holds a versioned snapshot of compiled flags pulled from the feature-flags
+    service and evaluates locally, so a flag lookup is a dict access plus a
+    predicate chain with no network call. refresh() sends the snapshot ETag and
+    can long-poll until the flags change; start() runs that loop in the
+    background.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8011",
+                 long_poll_seconds: float = 30.0,
+                 retry_seconds: float = 5.0,
+                 timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.long_poll_seconds = long_poll_seconds
+        self.retry_seconds = retry_seconds
+        self.timeout = timeout
+        self.version: Optional[int] = None
+        self.etag: Optional[str] = None
+        self.flags: Dict[str, CompiledFlag] = {}
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load_snapshot(self, snapshot: Dict[str, Any], etag: Optional[str] = None) -> None:
+        """Compile and swap in a snapshot atomically"""
+        self.flags = {
+            definition["flag_key"]: compile_flag(definition)
+            for definition in snapshot.get("flags", [])
+        }
+        self.version = snapshot.get("version")
+        self.etag = etag or (f'"{self.version}"' if self.version is not None else None)
+
+    def evaluate(self, flag_key: str, user_id: str,
+                 attributes: Optional[Dict[str, Any]] = None,
+                 default_value: Any = None) -> FlagResult:
+        flag = self.flags.get(flag_key)
+        if flag is None:
+            return FlagResult(flag_key, default_value, "flag_not_found")
+        try:
+            return flag.evaluate(user_id, attributes or {})
+        except Exception as e:
+            logger.error(f"Local flag evaluation failed for {flag_key}: {e}")
+            return FlagResult(flag_key, default_value, "evaluation_error")
+
+    def value(self, flag_key: str, user_id: str,
+              attributes: Optional[Dict[str, Any]] = None, default_value: Any = None) -> Any:
+        return self.evaluate(flag_key, user_id, attributes, default_value).value
+
+    def evaluate_all(self, user_id: str, attributes: Optional[Dict[str, Any]] = None) -> Dict[str, FlagResult]:
+        return {flag_key: self.evaluate(flag_key, user_id, attributes) for flag_key in self.flags}
+
+    async def refresh(self, wait: bool = False) -> bool:
+        """Fetch the snapshot if it changed; returns True when a new snapshot was loaded"""
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("httpx is required to fetch feature flag snapshots")
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout + self.long_poll_seconds)
+
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        params = {"wait": self.long_poll_seconds} if wait and self.etag else {}
+        response = await self._client.get(f"{self.base_url}/flags/snapshot", headers=headers, params=params)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+        self.load_snapshot(response.json(), etag=response.headers.get("ETag"))
+        return True
+
+    async def _poll_forever(self) -> None:
+        while True:
+            try:
+                await self.refresh(wait=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Feature flag snapshot refresh failed: {e}")
+                await asyncio.sleep(self.retry_seconds)
+
+    async def start(self) -> None:
+        """Load the initial snapshot and keep it current in the background"""
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+__all__ = [
+    'BUCKET_COUNT',
+    'BUCKETING_MD5',
+    'BUCKETING_CRC32',
+    'bucket_for_user',
+    'CompiledRule',
+    'CompiledFlag',
+    'FlagResult',
+    'compile_flag',
+    'FeatureFlagClient',
+]
@@ -0,0 +1,370 @@
+"""
+Durable outbox for hooks that call other services
+Requests append messages to a local SQLite (WAL) table and return at once;
+an OutboxDispatcher drains it in per-target batches with retries, idempotency
+keys and FIFO order per ordering key (usually the user id)
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMessage:
+    """A claimed outbox message"""
+
+    __slots__ = ("message_id", "target", "ordering_key", "idempotency_key", "payload", "attempts")
+
+    def __init__(self, message_id: int, target: str, ordering_key: str, idempotency_key: str,
+                 payload: Dict[str, Any], attempts: int):
+        self.message_id = message_id
+        self.target = target
+        self.ordering_key = ordering_key
+        self.idempotency_key = idempotency_key
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return f"OutboxMessage({self.message_id}, {self.target!r}, {self.ordering_key!r})"
+
+
+# Receives a batch and returns {message_id: error} for the messages that failed;
+# the rest are acknowledged. Raising fails the whole batch.
+OutboxHandler = Callable[[List[OutboxMessage]], Awaitable[Dict[int, str]]]
+
+
+class SqliteOutbox:
+    """
+    SQLite-backed outbox
+
+    Only the oldest pending message of each ordering key is "ready", so a
+    claim never returns two messages of the same key and a later message
+    waits until the earlier one is acknowledged or dead-lettered. Enqueue,
+    claim and ack are indexed O(log n) statements; claimed messages are
+    leased and become claimable again if the worker dies before acking.
+    Duplicate idempotency keys are ignored while the first message is
+    pending.
+
+    Handlers that make several downstream calls per message can record each
+    finished step under the message's idempotency key (record_progress) and
+    skip those steps when the message is retried. Progress is deleted when
+    the message is acknowledged and kept for dead letters.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 8, base_backoff: float = 1.0,
+                 max_backoff: float = 300.0, lease_seconds: float = 60.0,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " message_id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " target TEXT NOT NULL, ordering_key TEXT NOT NULL,"
+            " idempotency_key TEXT NOT NULL UNIQUE, payload TEXT NOT NULL,"
+            " ready INTEGER NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL, created_at REAL NOT NULL, last_error TEXT);"
+            "CREATE INDEX IF NOT EXISTS outbox_ready ON outbox (target, ready, message_id);"
+            "CREATE INDEX IF NOT EXISTS outbox_ordering ON outbox (ordering_key, message_id);"
+            "CREATE TABLE IF NOT EXISTS outbox_dead ("
+            " message_id INTEGER PRIMARY KEY, target TEXT NOT NULL, ordering_key TEXT NOT NULL,"
+            " idempotency_key TEXT NOT NULL, payload TEXT NOT NULL, attempts INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, failed_at REAL NOT NULL, last_error TEXT);"
+            "CREATE TABLE IF NOT EXISTS outbox_progress ("
+            " idempotency_key TEXT NOT NULL, step TEXT NOT NULL, result TEXT NOT NULL,"
+            " PRIMARY KEY (idempotency_key, step));"
+        )
+
+    def _transaction(self):
+        return _Transaction(self._connection, self._lock)
+
+    def enqueue(self, target: str, ordering_key: str, payload: Dict[str, Any],
+                idempotency_key: str) -> Optional[int]:
+        """Append a message; returns its id, or None if the idempotency key is already pending"""
+        return self.enqueue_many([(target, ordering_key, payload, idempotency_key)])[0]
+
+    def enqueue_many(self, messages: Sequence[Tuple[str, str, Dict[str, Any], str]]) -> List[Optional[int]]:
+        """Append (target, ordering_key, payload, idempotency_key) tuples in one transaction"""
+        now = self.clock()
+        message_ids: List[Optional[int]] = []
+        with self._transaction() as connection:
+            for target, ordering_key, payload, idempotency_key in messages:
+                blocked = connection.execute(
+                    "SELECT 1 FROM outbox WHERE ordering_key = ? LIMIT 1", (ordering_key,)
+                ).fetchone()
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO outbox (target, ordering_key, idempotency_key, payload,"
+                    " ready, available_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (target, ordering_key, idempotency_key, json.dumps(payload),
+                     0 if blocked else 1, now, now)
+                )
+                message_ids.append(cursor.lastrowid if cursor.rowcount else None)
+        return message_ids
+
+    def claim(self, target: str, limit: int) -> List[OutboxMessage]:
+        """Lease up to limit ready messages of a target, oldest first"""
+        now = self.clock()
+        with self._transaction() as connection:
+            rows = connection.execute(
+                "SELECT message_id, ordering_key, idempotency_key, payload, attempts FROM outbox"
+                " WHERE target = ? AND ready = 1 AND available_at <= ? ORDER BY message_id LIMIT ?",
+                (target, now, limit)
+            ).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE outbox SET available_at = ? WHERE message_id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+        return [OutboxMessage(message_id, target, ordering_key, idempotency_key, json.loads(payload), attempts)
+                for message_id, ordering_key, idempotency_key, payload, attempts in rows]
+
+    def ack(self, messages: Sequence[OutboxMessage]) -> None:
+        """Delete delivered messages and make the next message of each key ready"""
+        if not messages:
+            return
+        with self._transaction() as connection:
+            connection.executemany(
+                "DELETE FROM outbox WHERE message_id = ?", [(message.message_id,) for message in messages])
+            connection.executemany(
+                "DELETE FROM outbox_progress WHERE idempotency_key = ?",
+                [(message.idempotency_key,) for message in messages])
+            self._promote(connection, {message.ordering_key for message in messages})
+
+    def fail(self, failures: Sequence[Tuple[OutboxMessage, str]]) -> int:
+        """Reschedule failed messages with exponential backoff; returns how many were dead-lettered"""
+        if not failures:
+            return 0
+        now = self.clock()
+        dead_keys = set()
+        dead = 0
+        with self._transaction() as connection:
+            for message, error in failures:
+                attempts = message.attempts + 1
+                if attempts >= self.max_attempts:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO outbox_dead (message_id, target, ordering_key,"
+                        " idempotency_key, payload, attempts, created_at, failed_at, last_error)"
+                        " SELECT message_id, target, ordering_key, idempotency_key, payload, ?,"
+                        " created_at, ?, ? FROM outbox WHERE message_id = ?",
+                        (attempts, now, error, message.message_id)
+                    )
+                    connection.execute("DELETE FROM outbox WHERE message_id = ?", (message.message_id,))
+                    dead_keys.add(message.ordering_key)
+                    dead += 1
+                else:
+                    backoff = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+                    connection.execute(
+                        "UPDATE outbox SET attempts = ?, available_at = ?, last_error = ? WHERE message_id = ?",
+                        (attempts, now + backoff, error, message.message_id)
+                    )
+            self._promote(connection, dead_keys)
+        return dead
+
+    def record_progress(self, idempotency_key: str, step: str, result: Any) -> None:
+        """Remember that one step of a message was delivered (result must be JSON-serialisable)"""
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO outbox_progress (idempotency_key, step, result) VALUES (?, ?, ?)",
+                (idempotency_key, step, json.dumps(result))
+            )
+
+    def get_progress(self, idempotency_key: str) -> Dict[str, Any]:
+        """Steps already delivered for a message, {step: result}"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT step, result FROM outbox_progress WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchall()
+        return {step: json.loads(result) for step, result in rows}
+
+    def _promote(self, connection: sqlite3.Connection, ordering_keys) -> None:
+        for ordering_key in ordering_keys:
+            connection.execute(
+                "UPDATE outbox SET ready = 1 WHERE message_id ="
+                " (SELECT MIN(message_id) FROM outbox WHERE ordering_key = ?)",
+                (ordering_key,)
+            )
+
+    def pending_count(self, target: Optional[str] = None) -> int:
+        with self._lock:
+            if target is None:
+                row = self._connection.execute("SELECT COUNT(*) FROM outbox").fetchone()
+            else:
+                row = self._connection.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE target = ?", (target,)).fetchone()
+        return row[0]
+
+    def next_available_at(self, target: str) -> Optional[float]:
+        """When the earliest ready message of a target can be claimed"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MIN(available_at) FROM outbox WHERE target = ? AND ready = 1", (target,)
+            ).fetchone()
+        return row[0]
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT message_id, target, ordering_key, idempotency_key, payload, attempts, last_error"
+                " FROM outbox_dead ORDER BY failed_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {"message_id": message_id, "target": target, "ordering_key": ordering_key,
+             "idempotency_key": idempotency_key, "payload": json.loads(payload),
+             "attempts": attempts, "last_error": last_error}
+            for message_id, target, ordering_key, idempotency_key, payload, attempts, last_error in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT under the outbox lock, so other processes sharing the file serialise"""
+
+    def __init__(self, connection: sqlite3.Connection, lock: threading.Lock):
+        self._connection = connection
+        self._lock = lock
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._lock.acquire()
+        try:
+            self._connection.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self._lock.release()
+            raise
+        return self._connection
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        try:
+            self._connection.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._lock.release()
+
+
+class OutboxDispatcher:
+    """
+    Drains an outbox with a pool of asyncio workers per target
+
+    Each worker claims up to batch_size ready messages and hands them to the
+    target's handler in one call, so handlers can use bulk endpoints or fan
+    the batch out over a pooled client. notify() wakes idle workers after an
+    enqueue; retries are picked up when their backoff expires.
+    """
+
+    def __init__(self, outbox: SqliteOutbox, batch_size: int = 100, workers_per_target: int = 2,
+                 idle_poll_seconds: float = 1.0):
+        self.outbox = outbox
+        self.batch_size = batch_size
+        self.workers_per_target = workers_per_target
+        self.idle_poll_seconds = idle_poll_seconds
+        self._handlers: Dict[str, OutboxHandler] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.delivered = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    def register_handler(self, target: str, handler: OutboxHandler) -> None:
+        self._handlers[target] = handler
+
+    def notify(self, target: Optional[str] = None) -> None:
+        """Wake the workers of a target (or all targets) after new messages were enqueued"""
+        for name, event in self._wakeups.items():
+            if target is None or name == target:
+                event.set()
+
+    async def drain_once(self, target: str) -> int:
+        """Claim and deliver one batch; returns the number of messages claimed"""
+        messages = self.outbox.claim(target, self.batch_size)
+        if not messages:
+            return 0
+        try:
+            errors = await self._handlers[target](messages)
+        except Exception as e:
+            errors = {message.message_id: str(e) for message in messages}
+            logger.error(f"Outbox handler failed for {target}: {str(e)}")
+
+        delivered = [message for message in messages if message.message_id not in errors]
+        failures = [(message, errors[message.message_id]) for message in messages
+                    if message.message_id in errors]
+        self.outbox.ack(delivered)
+        self.dead_lettered += self.outbox.fail(failures)
+        self.delivered += len(delivered)
+        self.failed += len(failures)
+        if delivered:
+            self.notify()  # acks can make later messages of the same keys ready on any target
+        return len(messages)
+
+    async def drain(self) -> int:
+        """Deliver everything that is ready now (for tests, benchmarks and manual flushes)"""
+        total = 0
+        while True:
+            claimed = 0
+            for target in self._handlers:
+                claimed += await self.drain_once(target)
+            if not claimed:
+                return total
+            total += claimed
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        for target in self._handlers:
+            self._wakeups[target] = asyncio.Event()
+            for _ in range(self.workers_per_target):
+                self._tasks.append(asyncio.create_task(self._run(target)))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._wakeups = {}
+
+    async def _run(self, target: str) -> None:
+        wakeup = self._wakeups[target]
+        while True:
+            try:
+                if await self.drain_once(target):
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox worker for {target} failed: {str(e)}")
+            wakeup.clear()
+            timeout = self.idle_poll_seconds
+            next_at = self.outbox.next_available_at(target)
+            if next_at is not None:
+                timeout = min(timeout, max(0.0, next_at - self.outbox.clock()))
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.outbox.pending_count(),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "workers": len(self._tasks),
+        }
+
+
+__all__ = [
+    'OutboxMessage',
+    'SqliteOutbox',
+    'OutboxDispatcher',
+]
@@ -0,0 +1,310 @@
+"""
+Shared compiled safety matcher for the therapeutic gamification app
+Compiles every moderation keyword and pattern once and evaluates each of them at
+most once per text, so therapeutic-safety, ai-story and cbt-integration score
+text identically
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set
+
+# Optional C implementation of Aho-Corasick
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 自動 - therapeutic-safety ContentModerationEngine
+SELF_HARM_PATTERNS: List[Dict[str, object]] = [
+    {
+        "pattern": r"(?:死|消|い)",
+        "weight": 0.9,
+        "category": "suicidal_ideation"
+    },
+    {
+        "pattern": r"(?:自動|リスト|自動)",
+        "weight": 0.85,
+        "category": "self_harm"
+    },
+    {
+        "pattern": r"(?:も|限|耐).*(?:死|消|終)",
+        "weight": 0.8,
+        "category": "despair_with_harm"
+    },
+    {
+        "pattern": r"(?:誰|み).*(?:嫌|憎|許)",
+        "weight": 0.6,
+        "category": "social_hostility"
+    },
+    {
+        "pattern": r"(?:価|意|無)",
+        "weight": 0.5,
+        "category": "worthlessness"
+    }
+]
+
+# 治療 - therapeutic-safety ContentModerationEngine
+THERAPEUTIC_KEYWORDS: List[str] = [
+    "成", "希", "支援", "つ", "理", "共有",
+    "勇", "挑", "学", "発", "創", "表"
+]
+
+# ? - therapeutic-safety CBTInterventionEngine
+COGNITIVE_DISTORTION_PATTERNS: Dict[str, Dict[str, object]] = {
+    "all_or_nothing": {
+        "name": "?",
+        "patterns": [
+            r"(?:い|?|?|?|100%)",
+            r"(?:?|す).*(?:だ|無|?)",
+            r"(?:一般|?).*(?:な|で)"
+        ],
+        "weight": 0.7
+    },
+    "catastrophizing": {
+        "name": "?",
+        "patterns": [
+            r"(?:?|?|終|?)",
+            r"(?:も|?).*(?:だ|終|無)",
+            r"(?:?|?).*(?:終|?)"
+        ],
+        "weight": 0.8
+    },
+    "personalization": {
+        "name": "?",
+        "patterns": [
+            r"(?:?|?|自動).*(?:?|?|?)",
+            r"(?:?|?|自動).*(?:?|?)",
+            r"(?:?|?).*(?:い|い)"
+        ],
+        "weight": 0.6
+    },
+    "mind_reading": {
+        "name": "?",
+        "patterns": [
+            r"(?:き|?).*(?:?|?)",
+            r"(?:み|?).*(?:嫌|?)",
+            r"(?:?).*(?:?|?)"
+        ],
+        "weight": 0.5
+    },
+    "emotional_reasoning": {
+        "name": "?",
+        "patterns": [
+            r"(?:?|気分).*(?:だ|の).*(?:?|?)",
+            r"(?:?|?).*(?:だ|の).*(?:?|だ)",
+            r"(?:気分|?).*(?:?|?)"
+        ],
+        "weight": 0.6
+    }
+}
+
+# ストーリー - ai-story ContentSafetyFilter
+STORY_HARMFUL_PATTERNS: List[str] = [
+    "自動", "自動", "死", "消", "価",
+    "?", "も", "終", "無"
+]
+
+STORY_THERAPEUTIC_KEYWORDS: List[str] = [
+    "成", "希", "?", "?", "支援", "?",
+    "学", "発", "?", "挑", "勇"
+]
+
+
+@dataclass(frozen=True)
+class SafetyRule:
+    """A single keyword or regex rule with its moderation category and weight"""
+    kind: str
+    category: str
+    pattern: str
+    weight: float = 1.0
+    regex: bool = False
+
+
+@dataclass
+class SafetyHit:
+    """Every match of one rule within a scanned text"""
+    rule: SafetyRule
+    matches: List[str] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.matches)
+
+    @property
+    def weighted_score(self) -> float:
+        return self.rule.weight * self.count
+
+
+class SafetyScanResult:
+    """Rule hits for one text, in rule declaration order"""
+
+    def __init__(self, hits: List[SafetyHit]):
+        self.hits = hits
+
+    def by_kind(self, kind: str) -> List[SafetyHit]:
+        return [hit for hit in self.hits if hit.rule.kind == kind]
+
+    def categories(self, kind: Optional[str] = None) -> List[str]:
+        """Distinct hit categories, optionally restricted to one rule kind"""
+        seen: Dict[str, None] = {}
+        for hit in self.hits:
+            if kind is None or hit.rule.kind == kind:
+                seen.setdefault(hit.rule.category, None)
+        return list(seen)
+
+    def weighted_score(self, kind: str) -> float:
+        return sum(hit.weighted_score for hit in self.by_kind(kind))
+
+    def contains(self, pattern: str) -> bool:
+        return any(hit.rule.pattern == pattern for hit in self.hits)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.hits)
+
+
+class _KeywordSet:
+    """
+    Detects which of a fixed keyword set occur in a text.
+
+    With pyahocorasick installed this is a single Aho-Corasick pass. Without it
+    each distinct keyword is looked up once with str's C substring search, which
+    in CPython beats a pure-Python automaton or a regex alternation by an order
+    of magnitude for keyword sets of this size.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = list(dict.fromkeys(k.lower() for k in keywords if k))
+        self._automaton = None
+
+        if AHOCORASICK_AVAILABLE and self.keywords:
+            automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def present(self, text: str) -> Set[str]:
+        if self._automaton is not None:
+            return {keyword for _, keyword in self._automaton.iter(text)}
+        return {keyword for keyword in self.keywords if keyword in text}
+
+
+class SafetyMatcher:
+    """
+    Precompiled multi-pattern matcher over a set of SafetyRules.
+
+    Every distinct keyword and regex is compiled once and evaluated at most
+    once per scan, however many rules (or services) reference it. Regex rules
+    keep re.findall semantics and keyword rules report presence, so scores
+    built on top of a scan match the original per-service loops.
+    """
+
+    def __init__(self, rules: Iterable[SafetyRule]):
+        self.rules: List[SafetyRule] = list(rules)
+        self._keywords: Dict[Optional[str], _KeywordSet] = {}
+        self._patterns: Dict[Optional[str], Dict[str, re.Pattern]] = {}
+
+        compiled: Dict[str, re.Pattern] = {}
+        for rule in self.rules:
+            if rule.regex and rule.pattern not in compiled:
+                compiled[rule.pattern] = self._compile(rule.pattern)
+
+        for kind in [None] + list(dict.fromkeys(r.kind for r in self.rules)):
+            selected = [r for r in self.rules if kind is None or r.kind == kind]
+            self._keywords[kind] = _KeywordSet(r.pattern for r in selected if not r.regex)
+            self._patterns[kind] = {
+                r.pattern: compiled[r.pattern] for r in selected if r.regex
+            }
+
+    @staticmethod
+    def _compile(pattern: str) -> re.Pattern:
+        try:
+            return re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            logger.warning(f"Invalid safety pattern {pattern!r} ({e}), matching it literally")
+            return re.compile(re.escape(pattern), re.IGNORECASE)
+
+    def scan(self, text: str, kinds: Optional[Iterable[str]] = None) -> SafetyScanResult:
+        """Scan text once and return every rule hit, optionally for some rule kinds only"""
+        selected_kinds = [None] if kinds is None else list(kinds)
+
+        keywords_present: Set[str] = set()
+        regex_matches: Dict[str, List[str]] = {}
+        lowered = text.lower()
+        for kind in selected_kinds:
+            if kind not in self._keywords:
+                continue
+            keywords_present |= self._keywords[kind].present(lowered)
+            for source, compiled in self._patterns[kind].items():
+                if source not in regex_matches:
+                    regex_matches[source] = compiled.findall(text)
+
+        hits = []
+        for rule in self.rules:
+            if kinds is not None and rule.kind not in selected_kinds:
+                continue
+            if rule.regex:
+                matches = regex_matches.get(rule.pattern)
+            else:
+                matches = [rule.pattern] if rule.pattern.lower() in keywords_present else None
+            if matches:
+                hits.append(SafetyHit(rule=rule, matches=list(matches)))
+
+        return SafetyScanResult(hits)
+
+
+def build_default_safety_rules() -> List[SafetyRule]:
+    """Rule catalogue shared by every moderation path"""
+    rules = [
+        SafetyRule(kind="self_harm", category=p["category"], pattern=p["pattern"],
+                   weight=p["weight"], regex=True)
+        for p in SELF_HARM_PATTERNS
+    ]
+    rules.extend(
+        SafetyRule(kind="therapeutic", category="therapeutic", pattern=keyword)
+        for keyword in THERAPEUTIC_KEYWORDS
+    )
+    for distortion_type, info in COGNITIVE_DISTORTION_PATTERNS.items():
+        rules.extend(
+            SafetyRule(kind="distortion", category=distortion_type, pattern=pattern,
+                       weight=info["weight"], regex=True)
+            for pattern in info["patterns"]
+        )
+    rules.extend(
+        SafetyRule(kind="story_harmful", category="potentially_harmful", pattern=pattern)
+        for pattern in STORY_HARMFUL_PATTERNS
+    )
+    rules.extend(
+        SafetyRule(kind="story_therapeutic", category="therapeutic", pattern=keyword)
+        for keyword in STORY_THERAPEUTIC_KEYWORDS
+    )
+    return rules
+
+
+@lru_cache(maxsize=1)
+def get_safety_matcher() -> SafetyMatcher:
+    """Process-wide matcher compiled from the default rule catalogue"""
+    return SafetyMatcher(build_default_safety_rules())
+
+
+__all__ = [
+    'AHOCORASICK_AVAILABLE',
+    'SELF_HARM_PATTERNS',
+    'THERAPEUTIC_KEYWORDS',
+    'COGNITIVE_DISTORTION_PATTERNS',
+    'STORY_HARMFUL_PATTERNS',
+    'STORY_THERAPEUTIC_KEYWORDS',
+    'SafetyRule',
+    'SafetyHit',
+    'SafetyScanResult',
+    'SafetyMatcher',
+    'build_default_safety_rules',
+    'get_safety_matcher',
+]
@@ -0,0 +1,362 @@
+"""
+Hierarchical timer wheel for session and reminder timers
+One asyncio task advances the wheel and fires due timers in batches per kind,
+instead of one sleeping task per timer. A timer is only a kind plus a JSON
+payload, so a TimerStore can persist it and the wheel can recover it after a
+restart
+"""
+
+import asyncio
+import json
+import logging
+import math
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """A scheduled timer; the payload must be JSON-serialisable to be persisted"""
+
+    __slots__ = ("timer_id", "kind", "due_at", "payload", "expiry_tick", "slot")
+
+    def __init__(self, timer_id: str, kind: str, due_at: float,
+                 payload: Optional[Dict[str, Any]] = None):
+        self.timer_id = timer_id
+        self.kind = kind
+        self.due_at = due_at
+        self.payload = payload if payload is not None else {}
+        self.expiry_tick = 0
+        # The dict currently holding this timer (wheel slot, overflow or ready)
+        self.slot: Optional[Dict[str, "Timer"]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"timer_id": self.timer_id, "kind": self.kind,
+                "due_at": self.due_at, "payload": self.payload}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Timer":
+        return cls(data["timer_id"], data["kind"], data["due_at"], data.get("payload"))
+
+    def __repr__(self) -> str:
+        return f"Timer({self.timer_id!r}, {self.kind!r}, due_at={self.due_at})"
+
+
+TimerHandler = Callable[[List[Timer]], Awaitable[None]]
+
+
+class TimerStore:
+    """
+    Persistence for scheduled timers
+
+    The wheel buffers changes and writes them once per tick, so write()
+    receives the latest state of every timer touched since the last flush.
+    """
+
+    def load(self) -> List[Timer]:
+        raise NotImplementedError
+
+    def write(self, upserts: Sequence[Timer], deletes: Sequence[str]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryTimerStore(TimerStore):
+    """In-process store for development and tests"""
+
+    def __init__(self):
+        self.records: Dict[str, Dict[str, Any]] = {}
+
+    def load(self) -> List[Timer]:
+        return [Timer.from_dict(record) for record in self.records.values()]
+
+    def write(self, upserts: Sequence[Timer], deletes: Sequence[str]) -> None:
+        for timer_id in deletes:
+            self.records.pop(timer_id, None)
+        for timer in upserts:
+            self.records[timer.timer_id] = timer.to_dict()
+
+
+class SqliteTimerStore(TimerStore):
+    """SQLite-backed store; each flush is a single transaction"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS timers ("
+                "timer_id TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                "due_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+
+    def load(self) -> List[Timer]:
+        rows = self._connection.execute("SELECT timer_id, kind, due_at, payload FROM timers")
+        return [Timer(timer_id, kind, due_at, json.loads(payload))
+                for timer_id, kind, due_at, payload in rows]
+
+    def write(self, upserts: Sequence[Timer], deletes: Sequence[str]) -> None:
+        with self._connection:
+            if deletes:
+                self._connection.executemany(
+                    "DELETE FROM timers WHERE timer_id = ?", [(timer_id,) for timer_id in deletes])
+            if upserts:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO timers (timer_id, kind, due_at, payload) VALUES (?, ?, ?, ?)",
+                    [(timer.timer_id, timer.kind, timer.due_at, json.dumps(timer.payload))
+                     for timer in upserts]
+                )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel
+
+    Level 0 has 2**level_bits[0] slots of tick_seconds each and every higher
+    level's slot spans a full lap of the level below; timers beyond the top
+    level wait in an overflow set. Schedule and cancel are O(1) dict
+    operations, and a timer is cascaded down at most once per level before it
+    fires. Timers never fire early and fire at most one tick late (plus event
+    loop latency). Delivery is at-least-once: fired timers are removed from
+    the store only after their handlers have run.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, level_bits: Sequence[int] = (8, 6, 6, 6),
+                 store: Optional[TimerStore] = None, clock: Callable[[], float] = time.time,
+                 batch_size: int = 500):
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self.store = store
+        self._clock = clock
+        self._shifts: List[int] = []
+        self._masks: List[int] = []
+        shift = 0
+        for bits in level_bits:
+            self._shifts.append(shift)
+            self._masks.append((1 << bits) - 1)
+            shift += bits
+        self._span = 1 << shift
+        self._levels: List[List[Dict[str, Timer]]] = [[{} for _ in range(1 << bits)] for bits in level_bits]
+        self._overflow: Dict[str, Timer] = {}
+        self._ready: Dict[str, Timer] = {}
+        self._timers: Dict[str, Timer] = {}
+        self._handlers: Dict[str, TimerHandler] = {}
+        # timer_id -> latest Timer, or None for a delete, since the last flush
+        self._dirty: Dict[str, Optional[Timer]] = {}
+        self._current_tick = int(clock() // tick_seconds)  # next tick to process
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+        self.handler_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, timer_id: str) -> bool:
+        return timer_id in self._timers
+
+    def get(self, timer_id: str) -> Optional[Timer]:
+        return self._timers.get(timer_id)
+
+    def register_handler(self, kind: str, handler: TimerHandler) -> None:
+        """Register the coroutine that receives due timers of a kind in batches"""
+        self._handlers[kind] = handler
+
+    def schedule(self, timer_id: str, kind: str, delay: Optional[float] = None,
+                 due_at: Optional[float] = None, payload: Optional[Dict[str, Any]] = None) -> Timer:
+        """Schedule (or reschedule) a timer by id, delay seconds from now or at due_at"""
+        if due_at is None:
+            due_at = self._clock() + (delay or 0.0)
+        self._remove(timer_id)
+        timer = Timer(timer_id, kind, due_at, payload)
+        self._add(timer)
+        if self.store is not None:
+            self._dirty[timer_id] = timer
+        self._ensure_running()
+        return timer
+
+    def cancel(self, timer_id: str) -> bool:
+        if self._remove(timer_id) is None:
+            return False
+        if self.store is not None:
+            self._dirty[timer_id] = None
+        return True
+
+    def _add(self, timer: Timer) -> None:
+        timer.expiry_tick = math.ceil(timer.due_at / self.tick_seconds)
+        self._timers[timer.timer_id] = timer
+        self._place(timer)
+
+    def _remove(self, timer_id: str) -> Optional[Timer]:
+        timer = self._timers.pop(timer_id, None)
+        if timer is not None and timer.slot is not None:
+            timer.slot.pop(timer_id, None)
+            timer.slot = None
+        return timer
+
+    def _place(self, timer: Timer) -> None:
+        delta = timer.expiry_tick - self._current_tick
+        if delta < 0:
+            slot = self._ready
+        elif delta >= self._span:
+            slot = self._overflow
+        else:
+            level = 0
+            while level + 1 < len(self._levels) and delta >> self._shifts[level + 1]:
+                level += 1
+            index = (timer.expiry_tick >> self._shifts[level]) & self._masks[level]
+            slot = self._levels[level][index]
+        slot[timer.timer_id] = timer
+        timer.slot = slot
+
+    def _cascade(self, tick: int) -> None:
+        """Move the higher-level slots that start at this tick down the wheel"""
+        for level in range(1, len(self._levels)):
+            index = (tick >> self._shifts[level]) & self._masks[level]
+            timers = self._levels[level][index]
+            if timers:
+                self._levels[level][index] = {}
+                for timer in timers.values():
+                    self._place(timer)
+            if index:
+                return
+        if self._overflow:
+            overflow, self._overflow = self._overflow, {}
+            for timer in overflow.values():
+                self._place(timer)
+
+    def advance(self, now: Optional[float] = None) -> List[Timer]:
+        """Process every tick up to now and return the timers that became due"""
+        target = int((now if now is not None else self._clock()) // self.tick_seconds)
+        if not self._timers:
+            self._current_tick = max(self._current_tick, target + 1)
+            return []
+
+        level0 = self._levels[0]
+        mask0 = self._masks[0]
+        while self._current_tick <= target:
+            tick = self._current_tick
+            if not tick & mask0:
+                self._cascade(tick)
+            expired = level0[tick & mask0]
+            if expired:
+                level0[tick & mask0] = {}
+                self._ready.update(expired)
+            self._current_tick = tick + 1
+
+        due = list(self._ready.values())
+        self._ready = {}
+        for timer in due:
+            timer.slot = None
+            del self._timers[timer.timer_id]
+            if self.store is not None:
+                self._dirty[timer.timer_id] = None
+        return due
+
+    async def fire_due(self, now: Optional[float] = None) -> int:
+        """Advance the wheel and hand due timers to their handlers, batch_size at a time"""
+        due = self.advance(now)
+        by_kind: Dict[str, List[Timer]] = {}
+        for timer in due:
+            by_kind.setdefault(timer.kind, []).append(timer)
+
+        for kind, timers in by_kind.items():
+            handler = self._handlers.get(kind)
+            if handler is None:
+                logger.warning(f"No timer handler registered for {kind}; dropped {len(timers)} timers")
+                continue
+            for start in range(0, len(timers), self.batch_size):
+                try:
+                    await handler(timers[start:start + self.batch_size])
+                except Exception as e:
+                    self.handler_errors += 1
+                    logger.error(f"Timer handler failed for {kind}: {str(e)}")
+
+        self.fired += len(due)
+        self.flush()
+        return len(due)
+
+    def flush(self) -> None:
+        """Write buffered schedule/cancel/fire changes to the store"""
+        if self.store is None or not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        upserts = [timer for timer in dirty.values() if timer is not None]
+        deletes = [timer_id for timer_id, timer in dirty.items() if timer is None]
+        try:
+            self.store.write(upserts, deletes)
+        except Exception as e:
+            # Keep the changes for the next flush (newer entries win)
+            for timer_id, timer in dirty.items():
+                self._dirty.setdefault(timer_id, timer)
+            logger.error(f"Timer store write failed: {str(e)}")
+
+    def recover(self) -> int:
+        """Load persisted timers; overdue ones fire on the next tick"""
+        if self.store is None:
+            return 0
+        recovered = 0
+        for timer in self.store.load():
+            if timer.timer_id not in self._timers:
+                self._add(timer)
+                recovered += 1
+        return recovered
+
+    async def start(self) -> int:
+        """Recover persisted timers and start the driver task"""
+        recovered = self.recover()
+        self._ensure_running()
+        return recovered
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.flush()
+
+    def _ensure_running(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # started later by start() or the next schedule() inside a loop
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        # The task exits once the wheel is empty; schedule() starts a new one
+        while self._timers or self._dirty:
+            next_tick_at = self._current_tick * self.tick_seconds
+            await asyncio.sleep(max(0.0, next_tick_at - self._clock()))
+            await self.fire_due()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "timers": len(self._timers),
+            "overflow": len(self._overflow),
+            "current_tick": self._current_tick,
+            "fired": self.fired,
+            "handler_errors": self.handler_errors,
+            "pending_writes": len(self._dirty),
+        }
+
+
+__all__ = [
+    'Timer',
+    'TimerStore',
+    'MemoryTimerStore',
+    'SqliteTimerStore',
+    'TimerWheel',
+]